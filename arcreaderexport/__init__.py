@@ -0,0 +1,7 @@
+"""
+Support package for CreateRemoteArcReaderGDB_v2.py.
+
+Holds the pieces of the PortableDuluth.gdb export that are shared between the
+nightly export script and the helper tools (retries, run reports, ...). Modules
+are kept importable on both the ArcGIS Desktop Python 2.7 install and Python 3.
+"""
@@ -0,0 +1,9 @@
+"""python -m arcreaderexport <command>: see arcreaderexport.cli."""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+from arcreaderexport.cli import main
+
+sys.exit(main())
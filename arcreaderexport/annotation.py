@@ -0,0 +1,165 @@
+"""
+Export of the annotation classes of portableGISdict (gasDistribution_MainAnno, ssAnno,
+stsAnnoCB, SteamMain_Anno, LotAnno, ParcelAnno, ...).
+
+Annotation is copied with a filter instead of whole:
+
+    - unplaced annotation (Status 1, kept by the editors for later placement) and
+      annotation without text are dropped; ArcReader never draws them,
+    - annotation classes switched off in TapNCurb.pmf (layers.HIDDEN_ANNOTATION_CLASSES,
+      AnnotationClassIDs per feature class) are dropped,
+    - off ArcGIS (LocalBackend, GeoPackage) the Element blob of each feature (the
+      serialized text symbol only ArcGIS can draw) is not written; the text, font &
+      placement fields stay. File gdb outputs keep it, since ArcReader draws from it,
+    - per-theme annotation can be merged into one class (layers.ANNOTATION_MERGE_GROUPS,
+      off by default since the map must then point at the merged class).
+
+Every annotation copy is recorded with its source & output rows and seconds, so the
+run report (section 'annotation') shows what each class saved; the dropped rows are
+also left out of the validation of that class (validate.compareClass 'sourceWhere').
+benchmarks/bench_annotation.py compares the size & copy time of full and filtered
+copies class by class.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import time
+
+# Fields every geodatabase annotation feature class has
+ANNOTATION_FIELDS = ('AnnotationClassID', 'Element', 'Status', 'TextString')
+PLACED = 0
+
+# Renumbered when classes are merged, so not compared by validation
+MERGED_FIELDS = ('AnnotationClassID',)
+
+
+def isAnnotation(description):
+    """Returns True if a describe() result has the fields of an annotation feature class."""
+    names = set(name.split('.')[-1].lower() for name, _ in description.get('fields', ()))
+    return all(field.lower() in names for field in ANNOTATION_FIELDS)
+
+
+def annotationWhere(hiddenClassIds=()):
+    """Returns the where clause of the annotation that is drawn (placed, with text, class not hidden)."""
+    where = "Status = {0:d} AND TextString IS NOT NULL AND TextString <> ''".format(PLACED)
+    if hiddenClassIds:
+        where += ' AND AnnotationClassID NOT IN ({0})'.format(', '.join(str(int(classId)) for classId in hiddenClassIds))
+    return where
+
+
+def withoutElements(description):
+    """Returns a describe() result without the Element blob (and other blob fields)."""
+    return dict(description, fields=[field for field in description['fields'] if field[1] != 'Blob'])
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class AnnotationExport(object):
+    """
+    PURPOSE:
+    Copies & merges annotation classes with the drawn-annotation filter through a backend and
+    keeps a result per output class for the run report.
+
+    PARAMETERS:
+    backend = storage backend (arcreaderexport.backends) with copyAnnotation & mergeAnnotation.
+    hiddenClasses = dictionary of feature class name to AnnotationClassIDs not drawn (layers.HIDDEN_ANNOTATION_CLASSES).
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, backend, hiddenClasses=None, logger=None):
+        self.backend = backend
+        self.hiddenClasses = hiddenClasses or {}
+        self.logger = logger
+        self.results = []
+
+    def _record(self, name, sourcePaths, outputPath, sourceRows, started, merged=False):
+        output = self.backend.describe(outputPath)
+        rows = output.get('count', 0)
+        result = {'name': name, 'output': outputPath, 'sourceRows': sourceRows, 'rows': rows,
+                  'droppedRows': sourceRows - rows, 'merged': len(sourcePaths) if merged else None,
+                  'seconds': round(time.time() - started, 3)}
+        self.results.append(result)
+        if self.logger is not None:
+            self.logger.info('Annotation {0}: {1} of {2} rows copied ({3} hidden, unplaced or empty dropped)'.format(
+                name, rows, sourceRows, result['droppedRows']))
+        return {'rows': rows, 'sourceRows': sourceRows, 'droppedRows': result['droppedRows']}
+
+    def copy(self, sourcePath, outDatasetPath, name, description=None):
+        """
+        PURPOSE:
+        Copies the drawn annotation of one class. Returns a dictionary for the run report
+        (rows, sourceRows, droppedRows), or None if sourcePath is not an annotation class.
+
+        PARAMETERS:
+        sourcePath = annotation feature class path.
+        outDatasetPath = gdb or feature dataset path to copy into.
+        name = output class name (also the key of hiddenClasses).
+        description = describe() result of the source (read if not given).
+        """
+        description = description or self.backend.describe(sourcePath)
+        if not description.get('exists') or not isAnnotation(description):
+            return None
+        started = time.time()
+        where = annotationWhere(self.hiddenClasses.get(name, ()))
+        self.backend.copyAnnotation(sourcePath, outDatasetPath, name, where)
+        return self._record(name, [sourcePath], os.path.join(outDatasetPath, name), description['count'], started)
+
+    def merge(self, sources, outputPath, referenceScale):
+        """
+        PURPOSE:
+        Merges the drawn annotation of several classes into outputPath. Returns a dictionary
+        for the run report (rows, sourceRows, droppedRows).
+
+        PARAMETERS:
+        sources = list of (class name, path) of the annotation classes of one theme (sharing their fields).
+        outputPath = merged output class path.
+        referenceScale = reference scale of the merged class (the scale its text was placed at).
+        """
+        started = time.time()
+        sourcePaths = [path for _, path in sources]
+        # Hidden classes are dropped per source class, before the merge renumbers them
+        wheres = [annotationWhere(self.hiddenClasses.get(name, ())) for name, _ in sources]
+        sourceRows = sum(self.backend.describe(path)['count'] for path in sourcePaths)
+        self.backend.mergeAnnotation(list(zip(sourcePaths, wheres)), outputPath, referenceScale)
+        return self._record(os.path.basename(outputPath), sourcePaths, outputPath, sourceRows, started, merged=True)
+
+    def summary(self):
+        sourceRows = sum(result['sourceRows'] for result in self.results)
+        rows = sum(result['rows'] for result in self.results)
+        return {'classes': len(self.results), 'sourceRows': sourceRows, 'rows': rows,
+                'droppedRows': sourceRows - rows, 'results': self.results}
+
+
+def annotationTasks(tasks, reader, hiddenClasses=None, mergeGroups=None):
+    """
+    PURPOSE:
+    Function returns validation tasks ('name', 'source', 'output') with the annotation filter of
+    AnnotationExport applied: annotation sources are compared with the where clause of the rows
+    copied ('sourceWhere') and the members of a merge group are replaced by one task of the
+    merged class over all of them.
+
+    PARAMETERS:
+    tasks = validation tasks of the copied classes (see export.validationTasks).
+    reader = object with describe() (sources without the annotation fields are compared whole).
+    hiddenClasses = dictionary like layers.HIDDEN_ANNOTATION_CLASSES.
+    mergeGroups = dictionary like layers.ANNOTATION_MERGE_GROUPS.
+    """
+    from arcreaderexport.layers import ANNOTATION_CLASSES
+    hiddenClasses = hiddenClasses or {}
+    members = dict((fc, name) for name, group in (mergeGroups or {}).items() for fc in group['classes'])
+    result, merged = [], {}
+    for task in tasks:
+        if task['name'] not in ANNOTATION_CLASSES or not isAnnotation(reader.describe(task['source'])):
+            result.append(task)
+            continue
+        where = annotationWhere(hiddenClasses.get(task['name'], ()))
+        if task['name'] in members:
+            merged.setdefault(members[task['name']], []).append((task, where))
+        else:
+            result.append(dict(task, sourceWhere=where))
+    for name, parts in sorted(merged.items()):
+        outputPath = os.path.dirname(parts[0][0]['output'].replace('\\', '/')) + '/' + name
+        result.append({'name': name, 'source': [task['source'] for task, _ in parts], 'output': outputPath,
+                       'sourceWhere': [where for _, where in parts], 'ignoreFields': MERGED_FIELDS})
+    return result
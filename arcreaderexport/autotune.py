@@ -0,0 +1,402 @@
+"""
+Parallel copies with the number of tasks in flight per source tuned during the run.
+
+A fixed worker count either leaves the machine idle or overloads the source, and the
+right number changes with the size of the classes & whatever else the machine is
+doing. AutotunedPool runs the copy tasks of step 3a through the TaskRunner (so
+retries, circuit breakers & the run report work as before) on up to 'workers'
+threads, so only for a thread-safe backend (LocalBackend): arcpy is not, and the
+production exports on ArcpyBackend copy one class at a time without this pool. It
+keeps one AimdLimiter per source setting how many of that source's tasks may run at
+once, the way TCP sets its window:
+
+    additive increase        one more task in flight after each round (as many
+                             completed tasks as the limit), unless it was slower
+                             than the round before it with fewer tasks in flight
+    multiplicative decrease  the limit halved on a transient failure, on a round
+                             slower than the one before it with fewer in flight, when
+                             the source's latency (a timed backend.exists() on it)
+                             climbs to latencyFactor x its lowest, or while the
+                             CPU or disk of this machine is saturated
+
+CPU & disk use come from psutil when it is installed; otherwise from the load
+average & /proc/diskstats where they exist (Linux), and are not watched elsewhere.
+
+Every change of limit is logged with its reason & kept for the run report (section
+'concurrency'), with the rows / second each source reached.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from arcreaderexport.retry import TRANSIENT, classifyError
+
+try:
+    import psutil
+    HAVE_PSUTIL = True
+except ImportError:
+    HAVE_PSUTIL = False
+
+MAX_CHANGES = 50        # limit changes kept per source for the run report
+
+
+def _cpuShare():
+    if HAVE_PSUTIL:
+        return psutil.cpu_percent(None) / 100.0
+    if hasattr(os, 'getloadavg'):
+        try:
+            from multiprocessing import cpu_count
+            return min(1.0, os.getloadavg()[0] / cpu_count())
+        except (OSError, NotImplementedError):
+            return None
+    return None
+
+
+def _diskBusyMilliseconds():
+    # Busy time of the busiest disk so far
+    if HAVE_PSUTIL:
+        try:
+            counters = psutil.disk_io_counters(perdisk=True) or {}
+        except (OSError, RuntimeError):
+            return None
+        return max([getattr(disk, 'busy_time', disk.read_time + disk.write_time) for disk in counters.values()] or [0])
+    try:
+        with open('/proc/diskstats') as statsFile:
+            return max([int(line.split()[12]) for line in statsFile if len(line.split()) > 12] or [0])
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 3) if values else None
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ResourceMonitor(object):
+    """
+    PURPOSE:
+    Samples the share (0 to 1) of CPU & disk time in use on this machine since the last sample;
+    None where it cannot be read.
+
+    PARAMETERS:
+    clock = function returning the current time in seconds.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.samples = []
+        _cpuShare()     # psutil's CPU share is measured from the previous call
+        self._lastDisk = (clock(), _diskBusyMilliseconds())
+
+    def sample(self):
+        now, busy = self.clock(), _diskBusyMilliseconds()
+        disk = None
+        if busy is not None and self._lastDisk[1] is not None and now > self._lastDisk[0]:
+            disk = min(1.0, (busy - self._lastDisk[1]) / ((now - self._lastDisk[0]) * 1000.0))
+        self._lastDisk = (now, busy)
+        sample = {'cpu': _cpuShare(), 'disk': disk}
+        self.samples.append(sample)
+        return sample
+
+    def summary(self):
+        return {'samples': len(self.samples), 'psutil': HAVE_PSUTIL,
+                'cpuMean': _mean([sample['cpu'] for sample in self.samples]),
+                'cpuMax': max([sample['cpu'] for sample in self.samples if sample['cpu'] is not None] or [None]),
+                'diskMean': _mean([sample['disk'] for sample in self.samples]),
+                'diskMax': max([sample['disk'] for sample in self.samples if sample['disk'] is not None] or [None])}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class AimdLimiter(object):
+    """
+    PURPOSE:
+    Number of tasks of one source allowed in flight: raised by one after each good round of tasks
+    & halved on a sign of overload (not protected by a lock; AutotunedPool calls it under its own).
+
+    PARAMETERS:
+    source = source name (SDE connection file).
+    initial, minimum, maximum = starting, lowest & highest limit.
+    decrease = factor the limit is multiplied by on overload.
+    tolerance = share of the previous round's rows / second a round with more tasks in flight may
+        lose before it counts as overload.
+    latencyFactor = multiple of the lowest latency at which the source counts as overloaded.
+    minLatency = seconds of latency below which the source never counts as overloaded.
+    hold = seconds after a decrease in which further signs of the same overload are ignored.
+    clock = function returning the current time in seconds.
+    logger = optional logging.Logger for the limit changes.
+    """
+
+    def __init__(self, source, initial=1, minimum=1, maximum=4, decrease=0.5, tolerance=0.1, latencyFactor=3.0,
+                 minLatency=0.25, hold=10.0, clock=time.time, logger=None):
+        self.source = source
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = max(self.minimum, min(self.maximum, initial))
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.latencyFactor = latencyFactor
+        self.minLatency = minLatency
+        self.hold = hold
+        self.clock = clock
+        self.logger = logger
+        self.saturated = False
+        self.started = clock()
+        self.changes = [{'time': 0.0, 'limit': self.limit, 'reason': 'start'}]
+        self.lastRound = None           # (limit, rows / second) of the last round
+        self.roundRows = self.roundTasks = 0
+        self.roundStart = self.lastDecrease = None
+        self.firstStart = self.lastFinish = None
+        self.tasks = self.rows = self.failures = 0
+        self.latency = self.lowestLatency = None
+
+    def taskStarted(self):
+        now = self.clock()
+        if self.firstStart is None:
+            self.firstStart = now
+        if self.roundStart is None:
+            self.roundStart = now
+
+    def taskDone(self, rows, counted=True):
+        """Records a finished task (counted=False for a failed or deferred one) & adjusts the limit after each round."""
+        now = self.clock()
+        self.tasks += 1
+        self.rows += rows or 0
+        self.lastFinish = now
+        if not counted:
+            return
+        self.roundRows += rows or 0
+        self.roundTasks += 1
+        if self.roundTasks < self.limit:
+            return
+        seconds = now - self.roundStart
+        rate = self.roundRows / seconds if seconds > 0 else None
+        self.roundRows = self.roundTasks = 0
+        self.roundStart = now
+        if rate is None:
+            return
+        lastRound, self.lastRound = self.lastRound, (self.limit, rate)
+        if lastRound is not None and lastRound[0] < self.limit and rate < lastRound[1] * (1.0 - self.tolerance):
+            self._decrease('{0:0.0f} rows/sec with {1} in flight, {2:0.0f} with {3}'.format(
+                rate, self.limit, lastRound[1], lastRound[0]))
+        else:
+            self._increase('{0:0.0f} rows/sec with {1} in flight'.format(rate, self.limit))
+
+    def failure(self, reason):
+        """Records a transient failure of one attempt (a sign the source is overloaded)."""
+        self.failures += 1
+        self._decrease(reason)
+
+    def latencySample(self, seconds):
+        """Records one timed round trip to the source."""
+        self.latency = seconds
+        self.lowestLatency = seconds if self.lowestLatency is None else min(self.lowestLatency, seconds)
+        if seconds >= self.minLatency and seconds >= self.lowestLatency * self.latencyFactor:
+            self._decrease('latency {0:0.2f} s, lowest {1:0.2f} s'.format(seconds, self.lowestLatency))
+
+    def overload(self, reason):
+        self._decrease(reason)
+
+    def _increase(self, reason):
+        if not self.saturated and self.limit < self.maximum:
+            self._change(self.limit + 1, reason)
+
+    def _decrease(self, reason):
+        now = self.clock()
+        if self.lastDecrease is not None and now - self.lastDecrease < self.hold:
+            return
+        limit = max(self.minimum, int(self.limit * self.decrease))
+        if limit < self.limit:
+            self.lastDecrease = now
+            self._change(limit, reason)
+
+    def _change(self, limit, reason):
+        if self.logger is not None:
+            self.logger.info('Concurrency of {0}: {1} -> {2} tasks in flight ({3})'.format(
+                self.source, self.limit, limit, reason))
+        self.limit = limit
+        self.roundRows = self.roundTasks = 0
+        self.roundStart = self.clock()
+        self.changes.append({'time': round(self.clock() - self.started, 1), 'limit': limit, 'reason': reason})
+
+    def summary(self):
+        """Returns the limits chosen & the rows / second reached, for the run report."""
+        end = self.lastFinish if self.lastFinish is not None else self.clock()
+        weighted, previous = 0.0, self.changes[0]
+        for change in self.changes[1:] + [{'time': end - self.started}]:
+            weighted += previous['limit'] * max(0.0, change['time'] - previous['time'])
+            previous = change
+        seconds = end - self.firstStart if self.firstStart is not None else 0.0
+        return {'limit': self.limit, 'maxLimit': max(change['limit'] for change in self.changes),
+                'meanLimit': round(weighted / (end - self.started), 2) if end > self.started else self.limit,
+                'tasks': self.tasks, 'failures': self.failures, 'rows': self.rows,
+                'rowsPerSecond': round(self.rows / seconds, 1) if seconds > 0 else None,
+                'latency': None if self.latency is None else round(self.latency, 3),
+                'lowestLatency': None if self.lowestLatency is None else round(self.lowestLatency, 3),
+                'changes': self.changes[-MAX_CHANGES:]}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class AutotunedPool(object):
+    """
+    PURPOSE:
+    Runs submitted tasks through a TaskRunner on up to 'workers' threads, with at most its
+    AimdLimiter's limit of each source's tasks in flight. Tasks start highest priority (estimated
+    seconds) first, so a long copy does not start last & leave the run waiting on it alone; tasks
+    of equal priority start in the order submitted.
+
+    PARAMETERS:
+    taskRunner = retry.TaskRunner the tasks run through.
+    workers = most tasks in flight over all sources.
+    perSource = highest limit of one source.
+    probe = function(source) timed as the source's latency (such as backend.exists), or None.
+    monitor = ResourceMonitor of this machine (None to ignore its load).
+    cpuHigh, diskHigh = shares of CPU / disk time at which the machine counts as saturated.
+    probeInterval = seconds between latency probes of one source.
+    sampleInterval = seconds between resource samples.
+    clock = function returning the current time in seconds.
+    logger = optional logging.Logger.
+    limiterOptions = other AimdLimiter settings (initial, decrease, tolerance, ...).
+    """
+
+    def __init__(self, taskRunner, workers=4, perSource=4, probe=None, monitor=None, cpuHigh=0.9, diskHigh=0.9,
+                 probeInterval=30.0, sampleInterval=2.0, clock=time.time, logger=None, **limiterOptions):
+        self.taskRunner = taskRunner
+        self.workers = max(1, workers)
+        self.perSource = max(1, perSource)
+        self.probe = probe
+        self.monitor = monitor
+        self.cpuHigh = cpuHigh
+        self.diskHigh = diskHigh
+        self.probeInterval = probeInterval
+        self.sampleInterval = sampleInterval
+        self.clock = clock
+        self.logger = logger
+        self.limiterOptions = limiterOptions
+        self.condition = threading.Condition()
+        self.pending = []
+        self.running = 0
+        self.inFlight = {}
+        self.limiters = {}
+        self.lastProbe = {}
+        self.lastSample = None
+
+    def limiter(self, source):
+        if source not in self.limiters:
+            options = dict(self.limiterOptions, maximum=min(self.perSource, self.workers))
+            self.limiters[source] = AimdLimiter(source, clock=self.clock, logger=self.logger, **options)
+        return self.limiters[source]
+
+    def submit(self, name, source, func, args=(), onDone=None, priority=0.0):
+        """Queues func(*args) as task 'name' of 'source'; onDone(status) is called once it has run."""
+        with self.condition:
+            self.pending.append({'name': name, 'source': source, 'func': func, 'args': tuple(args), 'onDone': onDone,
+                                 'priority': priority or 0.0})
+            self.condition.notify()
+
+    def join(self):
+        """Runs the queued tasks (& any their onDone queues) & returns once all have finished."""
+        pool = ThreadPool(self.workers)
+        try:
+            with self.condition:
+                while self.pending or self.running:
+                    self._sample()
+                    self._dispatch(pool)
+                    self.condition.wait(self.sampleInterval)
+        finally:
+            pool.close()
+            pool.join()
+        if self.logger is not None:
+            for source, limiter in sorted(self.limiters.items()):
+                summary = limiter.summary()
+                self.logger.info('Copied {0} tasks from {1}: {2} rows at {3} rows/sec, {4} in flight at the end '
+                                 '(at most {5}, {6} on average)'.format(summary['tasks'], source, summary['rows'],
+                                                                       summary['rowsPerSecond'], summary['limit'],
+                                                                       summary['maxLimit'], summary['meanLimit']))
+
+    def _dispatch(self, pool):
+        for task in sorted(self.pending, key=lambda task: -task['priority']):
+            if self.running >= self.workers:
+                return
+            source = task['source']
+            if self.inFlight.get(source, 0) >= self.limiter(source).limit:
+                continue
+            self.pending.remove(task)
+            self.running += 1
+            self.inFlight[source] = self.inFlight.get(source, 0) + 1
+            self.limiter(source).taskStarted()
+            pool.apply_async(self._run, (task,))
+
+    def _sample(self):
+        now = self.clock()
+        if self.monitor is None or (self.lastSample is not None and now - self.lastSample < self.sampleInterval):
+            return
+        self.lastSample = now
+        sample = self.monitor.sample()
+        saturated = [name for name, share, high in (('cpu', sample['cpu'], self.cpuHigh),
+                                                    ('disk', sample['disk'], self.diskHigh))
+                     if share is not None and share >= high]
+        for source, limiter in self.limiters.items():
+            limiter.saturated = bool(saturated)
+            if saturated and self.inFlight.get(source, 0) > 1:
+                limiter.overload(', '.join('{0} {1:0.0%}'.format(name, sample[name]) for name in saturated) + ' busy')
+
+    def _probe(self, source):
+        with self.condition:
+            now = self.clock()
+            if self.probe is None or now - self.lastProbe.get(source, now - self.probeInterval) < self.probeInterval:
+                return
+            self.lastProbe[source] = now
+        started = self.clock()
+        try:
+            self.probe(source)
+        except Exception:
+            return
+        with self.condition:
+            self.limiter(source).latencySample(self.clock() - started)
+
+    def _run(self, task):
+        source, result = task['source'], {}
+
+        def attempt(*args):
+            try:
+                value = task['func'](*args)
+            except Exception as e:
+                messages = self.taskRunner.messagesFn() if self.taskRunner.messagesFn else ''
+                if classifyError(e, messages) == TRANSIENT:
+                    with self.condition:
+                        self.limiter(source).failure('transient failure of {0}'.format(task['name']))
+                raise
+            if isinstance(value, dict):
+                result.update(value)
+            return value
+
+        status = 'failed'
+        try:
+            self._probe(source)
+            status = self.taskRunner.run(task['name'], source, attempt, *task['args'])
+            if task['onDone'] is not None:
+                task['onDone'](status)
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.info('XXX Failed to run {0} in the copy pool: {1}'.format(task['name'], e))
+        finally:
+            with self.condition:
+                self.running -= 1
+                self.inFlight[source] -= 1
+                self.limiter(source).taskDone(result.get('rows'), counted=status == 'done')
+                self.condition.notify()
+
+    def summary(self):
+        """Returns the settings, each source's limits & rows / second, and this machine's load, for the run report."""
+        with self.condition:
+            return {'workers': self.workers, 'perSource': self.perSource,
+                    'sources': dict((source, limiter.summary()) for source, limiter in self.limiters.items()),
+                    'resources': self.monitor.summary() if self.monitor is not None else None}
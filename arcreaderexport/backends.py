@@ -0,0 +1,427 @@
+"""
+Storage backends the export steps (arcreaderexport.steps) run against.
+
+A backend does everything the steps used to call arcpy for:
+
+    exists, describe, iterBatches, listClasses, spatialReference   (read)
+    createWorkspace, createDataset, createLike, openInsert           (write)
+    addField, deleteRows                                             (in-place updates)
+    deltaReader                                                      (versioned A/D tables, see changecapture)
+    copyClass, copyTable, clip                                       (geoprocessing)
+    copyAnnotation, mergeAnnotation                                  (filtered annotation, see annotation)
+    compact, copyWorkspace, moveWorkspace, deleteWorkspace           (file gdb upkeep)
+    close                                                            (connections, once the pools & the run end)
+    messages                                                         (error text for retry.classifyError)
+
+ArcpyBackend calls arcpy (imported on first use) and is what CreateRemoteArcReaderGDB_v2.py
+runs with. LocalBackend keeps every workspace (a .gdb, a .sde connection) as a
+localstore.LocalStore SQLite file in one folder, so the whole pipeline can be run,
+timed & profiled on a machine without ArcGIS (see benchmarks/bench_pipeline_local.py).
+
+Paths are the same for both: the first path part ending in .gdb / .sde / .gpkg is the
+workspace and the rest names the feature dataset & class, for example
+    Database Connections\\cihl-gisdat-01_sde_current_gisuser.sde\\sde.SDE.GPS\\sde.SDE.EngGPSPts
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import re
+import shutil
+import threading
+
+from arcreaderexport.annotation import withoutElements
+from arcreaderexport.localstore import LocalStore
+from arcreaderexport.streamcopy import ArcpyWriter, copyFields, streamCopy
+from arcreaderexport.validate import ArcpyReader
+
+WORKSPACE_SUFFIXES = ('.gdb', '.sde', '.gpkg')
+
+# Field types of describe() results as AddField_management takes them
+ARCPY_FIELD_TYPES = {'String': 'TEXT', 'Integer': 'LONG', 'SmallInteger': 'SHORT', 'Double': 'DOUBLE',
+                     'Single': 'FLOAT', 'Date': 'DATE', 'Guid': 'GUID', 'Blob': 'BLOB'}
+
+# Temporary field ArcpyBackend.reorderClass sorts a class on
+ORDER_FIELD = 'SPATIAL_ORDER'
+
+
+def splitWorkspace(path):
+    """Returns (workspace path, [dataset / class parts]) of a path (workspace None if the path has none)."""
+    parts = [part for part in re.split(r'[\\/]+', path) if part]
+    for index, part in enumerate(parts):
+        if part.lower().endswith(WORKSPACE_SUFFIXES):
+            return '/'.join(parts[:index + 1]), parts[index + 1:]
+    return None, parts
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ArcpyBackend(object):
+    """
+    PURPOSE:
+    Backend of file gdb / SDE workspaces through arcpy (imported on first use, with overwriteOutput on).
+
+    Not thread-safe: arcpy geoprocessing & its messages (arcpy.GetMessages) are process-global,
+    so the export copies one class at a time with it & validates in worker processes.
+    """
+
+    threadSafe = False
+
+    def __init__(self):
+        self.reader = ArcpyReader()
+        self.writer = ArcpyWriter()
+
+    def __repr__(self):
+        return 'ArcpyBackend()'
+
+    def close(self):
+        """Nothing to release: arcpy keeps its own workspace connections."""
+
+    def _arcpy(self):
+        import arcpy
+        arcpy.env.overwriteOutput = True
+        return arcpy
+
+    def messages(self):
+        return self._arcpy().GetMessages(2)
+
+    def exists(self, path):
+        return self._arcpy().Exists(path)
+
+    def describe(self, path):
+        return self.reader.describe(path)
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        return self.reader.iterBatches(path, fields, batchSize, where=where)
+
+    def listClasses(self, workspacePath):
+        """Returns the feature class & table paths in a workspace, relative to it ('dataset/class' or 'class')."""
+        arcpy = self._arcpy()
+        classes = []
+        for dirPath, _, names in arcpy.da.Walk(workspacePath, datatype=['FeatureClass', 'Table']):
+            relative = os.path.relpath(dirPath, workspacePath)
+            classes.extend(name if relative == '.' else relative.replace('\\', '/') + '/' + name for name in names)
+        return sorted(classes)
+
+    def spatialReference(self, path):
+        return self._arcpy().Describe(path).spatialReference
+
+    def createWorkspace(self, directoryPath, name):
+        self._arcpy().CreateFileGDB_management(directoryPath, name)
+
+    def createDataset(self, workspacePath, name, spatialReference):
+        self._arcpy().CreateFeatureDataset_management(workspacePath, name, spatialReference)
+
+    def createLike(self, outputPath, sourcePath, description):
+        self.writer.createLike(outputPath, sourcePath, description)
+
+    def openInsert(self, path, fields):
+        return self.writer.openInsert(path, fields)
+
+    def addField(self, path, fieldName, fieldType):
+        self._arcpy().AddField_management(path, fieldName, ARCPY_FIELD_TYPES.get(fieldType, fieldType))
+
+    def deleteRows(self, path, where):
+        deleted = 0
+        with self._arcpy().da.UpdateCursor(path, ['OID@'], where) as cursor:
+            for _ in cursor:
+                cursor.deleteRow()
+                deleted += 1
+        return deleted
+
+    def deltaReader(self, workspacePath):
+        """Returns a changecapture.DeltaReader of an SDE connection's repository & delta tables."""
+        from arcreaderexport.changecapture import SDE_REPOSITORY_PREFIX, ArcSdeSql, DeltaReader
+        return DeltaReader(ArcSdeSql(workspacePath), repositoryPrefix=SDE_REPOSITORY_PREFIX, qualifyDeltaTables=True)
+
+    def copyClass(self, inPath, outDatasetPath, name):
+        self._arcpy().FeatureClassToFeatureClass_conversion(inPath, outDatasetPath, name)
+
+    def copyClasses(self, inPaths, outDatasetPath, names):
+        """
+        Copies several classes into a dataset in one FeatureClassToGeodatabase call; network classes come out
+        as simple features (the geometric network is not copied, so its connectivity is not rebuilt).
+        """
+        self._arcpy().FeatureClassToGeodatabase_conversion(inPaths, outDatasetPath)
+        missing = [name for name in names if not self.exists(os.path.join(outDatasetPath, name))]
+        if missing:
+            raise IOError('classes not copied into {0}: {1}'.format(outDatasetPath, ', '.join(missing)))
+
+    def reuseClass(self, previousPath, outPath):
+        """Copies a class of the previous (local) file gdb into the new one, gdb to gdb."""
+        self._arcpy().Copy_management(previousPath, outPath)
+
+    def copyDataset(self, inPath, outPath):
+        """Copies a whole feature dataset, its geometric network included (rebuilt in the output)."""
+        self._arcpy().Copy_management(inPath, outPath)
+
+    def copyTable(self, inPath, outPath):
+        self._arcpy().Copy_management(inPath, outPath)
+
+    def clip(self, inPath, clipPath, outPath):
+        self._arcpy().Clip_analysis(inPath, clipPath, outPath)
+
+    def copyAnnotation(self, inPath, outDatasetPath, name, where):
+        # Element blobs are kept: ArcReader draws annotation from them
+        self._arcpy().FeatureClassToFeatureClass_conversion(inPath, outDatasetPath, name, where)
+
+    def mergeAnnotation(self, sources, outPath, referenceScale):
+        """Copies the (path, where) sources next to outPath, then appends them into one class keeping their annotation classes."""
+        arcpy = self._arcpy()
+        outDir, outName = os.path.split(outPath)
+        tempPaths = []
+        try:
+            for index, (path, where) in enumerate(sources):
+                self.copyAnnotation(path, outDir, '{0}_part{1}'.format(outName, index), where)
+                tempPaths.append(os.path.join(outDir, '{0}_part{1}'.format(outName, index)))
+            arcpy.AppendAnnotation_management(tempPaths, outPath, referenceScale, 'CREATE_CLASSES',
+                                              'NO_SYMBOL_REQUIRED', 'AUTO_CREATE', 'AUTO_UPDATE')
+        finally:
+            for tempPath in tempPaths:
+                arcpy.Delete_management(tempPath)
+
+    def compact(self, workspacePath):
+        """Compacts a file gdb, which also releases its stale locks."""
+        self._arcpy().Compact_management(workspacePath)
+
+    def reorderClass(self, path, oids):
+        """Rewrites a class with its rows in the order of oids: ranks them in a temporary field, Sorts on it & replaces the class."""
+        arcpy = self._arcpy()
+        rank = dict((oid, index) for index, oid in enumerate(oids))
+        arcpy.AddField_management(path, ORDER_FIELD, 'LONG')
+        with arcpy.da.UpdateCursor(path, ['OID@', ORDER_FIELD]) as cursor:
+            for row in cursor:
+                cursor.updateRow([row[0], rank.get(row[0], len(rank))])
+        orderedPath = path + '_ordered'
+        arcpy.Sort_management(path, orderedPath, [[ORDER_FIELD, 'ASCENDING']])
+        arcpy.Delete_management(path)
+        arcpy.Rename_management(orderedPath, path)
+        arcpy.DeleteField_management(path, ORDER_FIELD)
+
+    def workspaceStats(self, workspacePath):
+        """Returns {'bytes', 'freeBytes', 'tables'} of a file gdb: its size on disk (arcpy has no per-table sizes or free space)."""
+        size = sum(os.path.getsize(os.path.join(workspacePath, name)) for name in os.listdir(workspacePath)
+                   if not name.endswith('.lock'))
+        return {'bytes': size, 'freeBytes': None, 'tables': {}}
+
+    def copyWorkspace(self, workspacePath, newPath):
+        shutil.copytree(workspacePath, newPath, ignore=shutil.ignore_patterns('*.lock'))
+
+    def moveWorkspace(self, workspacePath, newPath):
+        shutil.move(workspacePath, newPath)
+
+    def deleteWorkspace(self, workspacePath):
+        shutil.rmtree(workspacePath)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class LocalBackend(object):
+    """
+    PURPOSE:
+    In-process backend keeping each workspace as a LocalStore SQLite file, for running the
+    steps without arcpy. Classes in a feature dataset are named 'dataset/class' in the store.
+
+    PARAMETERS:
+    rootDir = folder holding the workspace files (created if missing).
+
+    Clip is approximate: features whose bounding box intersects the extent of the clip
+    class are copied whole (geometries are not cut), which keeps the I/O of a clip
+    without needing a geometry library.
+    """
+
+    threadSafe = True       # each thread reads & writes through its own SQLite connection
+
+    def __init__(self, rootDir):
+        self.rootDir = rootDir
+        if not os.path.isdir(rootDir):
+            os.makedirs(rootDir)
+        self._local = threading.local()     # one connection per thread (validation runs in threads)
+        self._stores = []                   # the stores of every thread, closed by close()
+        self._storesLock = threading.Lock()
+
+    def __repr__(self):
+        return 'LocalBackend({0!r})'.format(self.rootDir)
+
+    def messages(self):
+        return ''
+
+    def workspaceFile(self, workspacePath):
+        """Returns the SQLite file that stands in for a workspace path."""
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', workspacePath.replace('\\', '/').strip('/').lower())
+        return os.path.join(self.rootDir, name + '.sqlite')
+
+    def store(self, workspacePath):
+        """Returns this thread's LocalStore of a workspace (created if missing or closed)."""
+        stores = self._local.__dict__.setdefault('stores', {})
+        dbFile = self.workspaceFile(workspacePath)
+        store = stores.get(dbFile)
+        if store is None or store.closed:
+            store = stores[dbFile] = LocalStore(dbFile)
+            with self._storesLock:
+                self._stores.append(store)
+        return store
+
+    def close(self):
+        """
+        Closes the stores of every thread, those of finished pool threads included (their connections are
+        otherwise only closed by the garbage collector). Call once no other thread is using the backend;
+        each thread opens its stores again on next use.
+        """
+        self._closeStores(lambda store: True)
+
+    def _closeStore(self, workspacePath):
+        # Every thread's connection to the workspace, so its file can be replaced, moved or removed
+        dbFile = self.workspaceFile(workspacePath)
+        self._closeStores(lambda store: store.dbPath == dbFile)
+
+    def _closeStores(self, matches):
+        with self._storesLock:
+            closing = [store for store in self._stores if matches(store)]
+            self._stores = [store for store in self._stores if not matches(store)]
+        for store in closing:
+            store.close()
+
+    def _locate(self, path):
+        workspacePath, parts = splitWorkspace(path)
+        if workspacePath is None:
+            raise IOError('no workspace (.gdb, .sde, .gpkg) in path: {0}'.format(path))
+        return workspacePath, '/'.join(parts)
+
+    def exists(self, path):
+        workspacePath, name = self._locate(path)
+        if not os.path.exists(self.workspaceFile(workspacePath)):
+            return False
+        store = self.store(workspacePath)
+        return not name or name in store.listDatasets() or store.describe(name).get('exists', False)
+
+    def describe(self, path):
+        workspacePath, name = self._locate(path)
+        if not os.path.exists(self.workspaceFile(workspacePath)):
+            return {'exists': False}
+        return self.store(workspacePath).describe(name)
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        workspacePath, name = self._locate(path)
+        return self.store(workspacePath).iterBatches(name, fields, batchSize, where=where)
+
+    def listClasses(self, workspacePath):
+        return self.store(workspacePath).listClasses()
+
+    def spatialReference(self, path):
+        workspacePath, name = self._locate(path)
+        store = self.store(workspacePath)
+        if name in store.listDatasets():
+            return store.datasetSpatialReference(name)
+        return store.describe(name).get('spatialReference')
+
+    def createWorkspace(self, directoryPath, name):
+        workspacePath = directoryPath.rstrip('/\\') + '/' + name
+        self._closeStore(workspacePath)
+        if os.path.exists(self.workspaceFile(workspacePath)):
+            os.remove(self.workspaceFile(workspacePath))
+        self.store(workspacePath)
+
+    def createDataset(self, workspacePath, name, spatialReference):
+        self.store(workspacePath).createDataset(name, spatialReference)
+
+    def createLike(self, outputPath, sourcePath, description):
+        workspacePath, name = self._locate(outputPath)
+        if description.get('hasShape') and not description.get('spatialReference'):
+            description = dict(description, spatialReference=self.spatialReference(sourcePath))
+        self.store(workspacePath).createLike(name, sourcePath, description)
+
+    def openInsert(self, path, fields):
+        workspacePath, name = self._locate(path)
+        return self.store(workspacePath).openInsert(name, fields)
+
+    def addField(self, path, fieldName, fieldType):
+        workspacePath, name = self._locate(path)
+        self.store(workspacePath).addField(name, fieldName, fieldType)
+
+    def deleteRows(self, path, where):
+        workspacePath, name = self._locate(path)
+        return self.store(workspacePath).deleteRows(name, where)
+
+    def deltaReader(self, workspacePath):
+        """Returns a changecapture.DeltaReader of the stand-in SDE_ & A/D tables in a workspace's store."""
+        from arcreaderexport.changecapture import DeltaReader, SqliteSql
+        return DeltaReader(SqliteSql(self.store(workspacePath).connection))
+
+    def copyClass(self, inPath, outDatasetPath, name):
+        streamCopy(self, self, inPath, outDatasetPath.rstrip('/\\') + '/' + name)
+
+    def reuseClass(self, previousPath, outPath):
+        """Copies a class of the previous gdb's store into the new one within SQLite (no rows pass through Python)."""
+        previousWorkspace, previousName = self._locate(previousPath)
+        workspacePath, name = self._locate(outPath)
+        self.store(workspacePath).copyClassFrom(self.workspaceFile(previousWorkspace), previousName, name)
+
+    def copyClasses(self, inPaths, outDatasetPath, names):
+        for inPath, name in zip(inPaths, names):
+            self.copyClass(inPath, outDatasetPath, name)
+
+    def copyTable(self, inPath, outPath):
+        streamCopy(self, self, inPath, outPath)
+
+    def clip(self, inPath, clipPath, outPath):
+        extent = self.describe(clipPath).get('extent')
+        if extent is None:
+            raise IOError('clip features are missing or empty: {0}'.format(clipPath))
+        description = self.describe(inPath)
+        if not description.get('exists'):
+            raise IOError('source does not exist: {0}'.format(inPath))
+        fields = copyFields(description)
+        where = 'maxx >= {0!r} AND minx <= {2!r} AND maxy >= {1!r} AND miny <= {3!r}'.format(*extent)
+        self.createLike(outPath, inPath, description)
+        inserter = self.openInsert(outPath, fields)
+        try:
+            for batch in self.iterBatches(inPath, fields, 5000, where=where):
+                inserter.insertRows(batch)
+        finally:
+            inserter.close()
+
+    def copyAnnotation(self, inPath, outDatasetPath, name, where):
+        self.mergeAnnotation([(inPath, where)], outDatasetPath.rstrip('/\\') + '/' + name, None)
+
+    def mergeAnnotation(self, sources, outPath, referenceScale):
+        """
+        Writes the rows of the (path, where) sources into one class without their Element blobs (only ArcGIS
+        draws those); AnnotationClassIDs are kept as they are & referenceScale is not used.
+        """
+        description = withoutElements(self.describe(sources[0][0]))
+        fields = copyFields(description)
+        self.createLike(outPath, sources[0][0], description)
+        inserter = self.openInsert(outPath, fields)
+        try:
+            for path, where in sources:
+                for batch in self.iterBatches(path, fields, 5000, where=where):
+                    inserter.insertRows(batch)
+        finally:
+            inserter.close()
+
+    def compact(self, workspacePath):
+        self.store(workspacePath).connection.execute('VACUUM')
+
+    def reorderClass(self, path, oids):
+        workspacePath, name = self._locate(path)
+        self.store(workspacePath).reorderClass(name, oids)
+
+    def workspaceStats(self, workspacePath):
+        """Returns the LocalStore.tableStats() of a workspace (sizes, free space & fragmentation per class)."""
+        return self.store(workspacePath).tableStats()
+
+    def copyWorkspace(self, workspacePath, newPath):
+        self._closeStore(newPath)
+        shutil.copyfile(self.workspaceFile(workspacePath), self.workspaceFile(newPath))
+
+    def moveWorkspace(self, workspacePath, newPath):
+        self._closeStore(workspacePath)
+        self._closeStore(newPath)
+        if os.path.exists(self.workspaceFile(newPath)):
+            os.remove(self.workspaceFile(newPath))
+        os.rename(self.workspaceFile(workspacePath), self.workspaceFile(newPath))
+
+    def deleteWorkspace(self, workspacePath):
+        self._closeStore(workspacePath)
+        os.remove(self.workspaceFile(workspacePath))
@@ -0,0 +1,516 @@
+"""
+Change-data capture of versioned SDE classes from their adds (A) & deletes (D) tables.
+
+Edits to a versioned class in the City SDE are not written to its base table: each
+edit adds rows to the class's delta tables, named after its registration id in
+SDE_table_registry,
+
+    a<id>   every column of the class + SDE_STATE_ID      (row versions added)
+    D<id>   SDE_STATE_ID, SDE_DELETES_ROW_ID, DELETED_AT  (row versions deleted)
+
+and every edit session moves the version (SDE_versions) to a new state on its lineage
+(SDE_states, SDE_state_lineages). The rows changed between the state an output was
+last exported at and the version's current state are then the OBJECTIDs of the A & D
+rows whose state is on the current lineage and newer than the exported one.
+
+ChangeCapture uses this for the hot layers (layers.CHANGE_CAPTURE_CLASSES): their
+outputs keep each row's source OBJECTID in a SOURCE_OID field, so an incremental run
+deletes the output rows of the changed OBJECTIDs and reads just those rows back from
+the version with a cursor. A run's cost follows the number of edits instead of the
+size of the class. The first export of a class, a weekly rebuild, a schema change, a
+compress since the last export or a reconcile that left the exported state off the
+lineage fall back to a full keyed copy. The state each output was exported at is kept in a JSON file next to the run
+reports and only saved once the run's validation passed, so a rejected gdb is
+re-synced from the older state on the next run.
+
+The repository & delta tables are read with SQL (arcpy.ArcSDESQLExecute on SDE). The
+bottom of this module keeps the same tables in a localstore.LocalStore (the SDE
+connection's SQLite file of backends.LocalBackend), so the capture can be developed
+and benchmarked without the City network (benchmarks/bench_changecapture.py).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sqlite3
+import time
+
+from arcreaderexport import oidquery
+from arcreaderexport.localstore import BBOX_COLUMNS, OID_FIELD, wkbBounds
+from arcreaderexport.manifest import readJson, writeJson
+from arcreaderexport.runreport import REPORT_DIR
+from arcreaderexport.streamcopy import DEFAULT_BATCH_SIZE, copyFields
+
+STATE_FILE = 'ExportChangeState.json'
+SOURCE_OID_FIELD = 'SOURCE_OID'
+DEFAULT_VERSION = ('SDE', 'DEFAULT')        # (owner, name) of the version the export reads
+SDE_REPOSITORY_PREFIX = 'sde.sde.SDE_'      # repository tables of the SQL Server 'sde' schema geodatabase
+
+DELTA = 'delta'
+FULL = 'full'
+
+
+def _quote(name):
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+def _unqualified(names):
+    return set(name.split('.')[-1].lower() for name in names)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class SqliteSql(object):
+    """query(sql, params) on a sqlite3 connection (the stand-in tables of a LocalStore)."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def query(self, sql, params=()):
+        return self.connection.execute(sql, params).fetchall()
+
+
+class ArcSdeSql(object):
+    """
+    PURPOSE:
+    query(sql, params) through arcpy.ArcSDESQLExecute on an SDE connection file (arcpy imported on
+    first use). ArcSDESQLExecute takes no parameters, so the '?' markers are replaced by literals.
+    """
+
+    def __init__(self, connectionFile):
+        self.connectionFile = connectionFile
+        self._execute = None
+
+    def _literal(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return repr(value)
+        return "'{0}'".format(str(value).replace("'", "''"))
+
+    def query(self, sql, params=()):
+        if self._execute is None:
+            import arcpy
+            self._execute = arcpy.ArcSDESQLExecute(self.connectionFile).execute
+        pieces = sql.split('?')
+        if len(pieces) != len(params) + 1:
+            raise ValueError('{0} parameters for {1} markers: {2}'.format(len(params), len(pieces) - 1, sql))
+        text = pieces[0] + ''.join(self._literal(value) + piece for value, piece in zip(params, pieces[1:]))
+        result = self._execute(text)
+        # ArcSDESQLExecute returns True for no rows, a bare value for one value, else a list of lists
+        if result is True or result is None:
+            return []
+        if not isinstance(result, list):
+            return [(result,)]
+        return [tuple(row) if isinstance(row, (list, tuple)) else (row,) for row in result]
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class DeltaReader(object):
+    """
+    PURPOSE:
+    Reads registration ids, version states & changed OBJECTIDs from the SDE repository & delta tables.
+
+    PARAMETERS:
+    sql = object with query(sql, params) returning a list of row tuples (SqliteSql, ArcSdeSql).
+    repositoryPrefix = prefix of the repository tables ('SDE_' in the stand-in; SDE_REPOSITORY_PREFIX on SQL Server).
+    qualifyDeltaTables = True to name delta tables like their class ('sde.SDE.a12'), False for 'a12'.
+    """
+
+    def __init__(self, sql, repositoryPrefix='SDE_', qualifyDeltaTables=False):
+        self.sql = sql
+        self.repositoryPrefix = repositoryPrefix
+        self.qualifyDeltaTables = qualifyDeltaTables
+
+    def _table(self, name):
+        return self.repositoryPrefix + name
+
+    def _deltaTable(self, className, kind, registrationId):
+        qualifier = className.rsplit('.', 1)[0] + '.' if self.qualifyDeltaTables and '.' in className else ''
+        return '{0}{1}{2:d}'.format(qualifier, kind, int(registrationId))
+
+    def registrationId(self, className):
+        """Returns the registration id of a class ('sde.SDE.EngGPSPts' or 'EngGPSPts'), or None if not registered."""
+        parts = className.split('.')
+        owner = parts[-2] if len(parts) > 1 else DEFAULT_VERSION[0]
+        rows = self.sql.query('SELECT registration_id FROM {0} WHERE UPPER(table_name) = ? AND UPPER(owner) = ?'.format(
+            self._table('table_registry')), (parts[-1].upper(), owner.upper()))
+        return int(rows[0][0]) if rows else None
+
+    def isVersioned(self, className):
+        """Returns True if the class is registered & has its A and D tables."""
+        registrationId = self.registrationId(className)
+        if registrationId is None:
+            return False
+        try:
+            for kind in ('a', 'D'):
+                self.sql.query('SELECT 1 FROM {0} WHERE 1 = 0'.format(self._deltaTable(className, kind, registrationId)))
+        except Exception:
+            return False
+        return True
+
+    def currentState(self, version=DEFAULT_VERSION):
+        """Returns the state id of a version ((owner, name); SDE.DEFAULT by default)."""
+        rows = self.sql.query('SELECT state_id FROM {0} WHERE UPPER(owner) = ? AND UPPER(name) = ?'.format(
+            self._table('versions')), (version[0].upper(), version[1].upper()))
+        if not rows:
+            raise IOError('version {0}.{1} not found'.format(*version))
+        return int(rows[0][0])
+
+    def lastCompress(self):
+        """Returns the start time of the last compress (as text), or None if none is logged."""
+        rows = self.sql.query('SELECT MAX(compress_start) FROM {0}'.format(self._table('compress_log')))
+        return str(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    def lineageName(self, stateId):
+        rows = self.sql.query('SELECT lineage_name FROM {0} WHERE state_id = ?'.format(self._table('states')),
+                              (int(stateId),))
+        return int(rows[0][0]) if rows else None
+
+    def inLineage(self, stateId, toState):
+        """Returns True if stateId is on the lineage of toState (False once a compress removed it)."""
+        lineageName = self.lineageName(toState)
+        if lineageName is None:
+            return False
+        rows = self.sql.query('SELECT 1 FROM {0} WHERE lineage_name = ? AND lineage_id = ? AND lineage_id <= ?'.format(
+            self._table('state_lineages')), (lineageName, int(stateId), int(toState)))
+        return bool(rows)
+
+    def changedIds(self, className, sinceState, toState, oidField=OID_FIELD):
+        """
+        PURPOSE:
+        Returns the set of OBJECTIDs added, updated or deleted on the lineage of toState after sinceState.
+
+        PARAMETERS:
+        className = class name as in registrationId().
+        sinceState = state id the output was last exported at.
+        toState = current state id of the version.
+        oidField = OBJECTID field of the class (& of its A table).
+        """
+        registrationId = self.registrationId(className)
+        lineage = 'SELECT lineage_id FROM {0} WHERE lineage_name = ? AND lineage_id > ? AND lineage_id <= ?'.format(
+            self._table('state_lineages'))
+        lineageParams = (self.lineageName(toState), int(sinceState), int(toState))
+        rows = self.sql.query(
+            'SELECT {0} FROM {1} WHERE SDE_STATE_ID IN ({3}) '
+            'UNION SELECT SDE_DELETES_ROW_ID FROM {2} WHERE DELETED_AT IN ({3})'.format(
+                _quote(oidField), self._deltaTable(className, 'a', registrationId),
+                self._deltaTable(className, 'D', registrationId), lineage), lineageParams + lineageParams)
+        return set(int(row[0]) for row in rows)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def keyedCopy(backend, sourcePath, outputPath, batchSize=DEFAULT_BATCH_SIZE):
+    """
+    PURPOSE:
+    Function creates outputPath like sourcePath plus a SOURCE_OID field & copies every
+    row with its source OBJECTID into it. Returns the number of rows copied.
+
+    PARAMETERS:
+    backend = storage backend (arcreaderexport.backends) of both classes.
+    sourcePath = versioned source class path.
+    outputPath = output class path.
+    batchSize = rows read & inserted at a time.
+    """
+    description = backend.describe(sourcePath)
+    if not description.get('exists'):
+        raise IOError('source does not exist: {0}'.format(sourcePath))
+    fields = copyFields(description)
+    backend.createLike(outputPath, sourcePath, description)
+    backend.addField(outputPath, SOURCE_OID_FIELD, 'Integer')
+    rows = 0
+    inserter = backend.openInsert(outputPath, [SOURCE_OID_FIELD] + fields)
+    try:
+        for batch in backend.iterBatches(sourcePath, ['OID@'] + fields, batchSize):
+            inserter.insertRows(batch)
+            rows += len(batch)
+    finally:
+        inserter.close()
+    return rows
+
+
+def applyChanges(backend, sourcePath, outputPath, changedIds, batchSize=DEFAULT_BATCH_SIZE, description=None):
+    """
+    PURPOSE:
+    Function replaces the output rows of the changed source OBJECTIDs by the source's
+    current rows (none for deleted ones). Returns a dictionary of rows deleted & inserted.
+    Every delete runs (and closes its update cursor) before the insert cursor is opened:
+    arcpy does not allow an insert & an update cursor on one workspace outside an edit session.
+
+    PARAMETERS:
+    backend = storage backend of both classes.
+    sourcePath = versioned source class path (read at the version's current state).
+    outputPath = output class path with a SOURCE_OID field (see keyedCopy).
+    changedIds = OBJECTIDs changed in the source (DeltaReader.changedIds).
+    batchSize = rows read & inserted at a time.
+    description = describe() result of the source (read if not given).
+    """
+    description = description or backend.describe(sourcePath)
+    fields = copyFields(description)
+    oidField = oidquery.oidField(description)
+    chunks = list(oidquery.idChunks(changedIds))
+    deleted = inserted = 0
+    for ids in chunks:
+        deleted += backend.deleteRows(outputPath, oidquery.inList(SOURCE_OID_FIELD, ids))
+    if not chunks:
+        return {'deleted': deleted, 'inserted': inserted}
+    inserter = backend.openInsert(outputPath, [SOURCE_OID_FIELD] + fields)
+    try:
+        for ids in chunks:
+            where = oidquery.inList(oidField, ids)
+            for batch in backend.iterBatches(sourcePath, ['OID@'] + fields, batchSize, where=where):
+                inserter.insertRows(batch)
+                inserted += len(batch)
+    finally:
+        inserter.close()
+    return {'deleted': deleted, 'inserted': inserted}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ChangeCapture(object):
+    """
+    PURPOSE:
+    Keeps the outputs of versioned classes in step with their sources from the A & D tables,
+    remembering the state each output was exported at.
+
+    PARAMETERS:
+    backend = storage backend of the sources & outputs; its deltaReader(workspacePath) reads the
+        repository & delta tables of a source workspace.
+    statePath = JSON file of the exported states (next to the run reports by default).
+    version = (owner, name) of the version read.
+    batchSize = rows read & inserted at a time.
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, backend, statePath=None, version=DEFAULT_VERSION, batchSize=DEFAULT_BATCH_SIZE, logger=None):
+        self.backend = backend
+        self.statePath = statePath or os.path.join(REPORT_DIR, STATE_FILE)
+        self.version = version
+        self.batchSize = batchSize
+        self.logger = logger
+        self.saved = (readJson(self.statePath) or {}).get('classes', {})
+        self.pending = {}
+        self.results = []
+        self._versioned = {}
+
+    def _reader(self, sourcePath):
+        from arcreaderexport.backends import splitWorkspace
+        workspacePath, parts = splitWorkspace(sourcePath)
+        return self.backend.deltaReader(workspacePath), parts[-1]
+
+    def handles(self, sourcePath):
+        """Returns True if sourcePath is a versioned class (checked once per source; False if it cannot be read)."""
+        if sourcePath not in self._versioned:
+            try:
+                reader, className = self._reader(sourcePath)
+                self._versioned[sourcePath] = reader.isVersioned(className)
+            except Exception as e:
+                self._versioned[sourcePath] = False
+                if self.logger is not None:
+                    self.logger.info('Cannot read delta tables of {0}; copying it in full ({1})'.format(sourcePath, e))
+        return self._versioned[sourcePath]
+
+    def _canApply(self, saved, registrationId, outputPath, sourceDescription, reader, toState):
+        # A compress moves delta rows into the base tables & can fold states into older ones
+        if not saved or saved.get('registrationId') != registrationId or saved.get('compress') != reader.lastCompress():
+            return False
+        output = self.backend.describe(outputPath)
+        if not output.get('exists'):
+            return False
+        outputNames = _unqualified(name for name, _ in output['fields'])
+        sourceNames = _unqualified(field for field in copyFields(sourceDescription) if field != 'SHAPE@')
+        if SOURCE_OID_FIELD.lower() not in outputNames or not sourceNames <= outputNames:
+            return False
+        return saved['state'] == toState or reader.inLineage(saved['state'], toState)
+
+    def sync(self, sourcePath, outputPath):
+        """
+        PURPOSE:
+        Brings outputPath up to the version's current state: applies the changed rows when the
+        output was exported at a state still on the lineage, else makes a full keyed copy.
+        Returns a dictionary for the run report (rows, mode, changedIds, fromState, toState).
+
+        PARAMETERS:
+        sourcePath = versioned source class path.
+        outputPath = output class path.
+        """
+        started = time.time()
+        reader, className = self._reader(sourcePath)
+        registrationId = reader.registrationId(className)
+        # The state is read before the rows, so edits made during the copy are applied again next run
+        toState = reader.currentState(self.version)
+        saved = self.saved.get(outputPath)
+        description = self.backend.describe(sourcePath)
+        result = {'source': sourcePath, 'output': outputPath, 'toState': toState,
+                  'fromState': saved['state'] if saved else None}
+        if self._canApply(saved, registrationId, outputPath, description, reader, toState):
+            changedIds = reader.changedIds(className, saved['state'], toState, oidquery.oidField(description)) \
+                if saved['state'] != toState else set()
+            counts = applyChanges(self.backend, sourcePath, outputPath, changedIds, self.batchSize, description)
+            result.update(mode=DELTA, changedIds=len(changedIds), rows=counts['inserted'], deleted=counts['deleted'])
+        else:
+            result.update(mode=FULL, changedIds=None, rows=keyedCopy(self.backend, sourcePath, outputPath, self.batchSize))
+        result['seconds'] = round(time.time() - started, 3)
+        self.pending[outputPath] = {'source': sourcePath, 'registrationId': registrationId, 'state': toState,
+                                    'compress': reader.lastCompress(), 'updated': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        self.results.append(result)
+        if self.logger is not None:
+            self.logger.info('Change capture of {0}: {1} copy from state {2} to {3} ({4} changed ids, {5} rows written)'.format(
+                outputPath, result['mode'], result['fromState'], toState, result['changedIds'], result['rows']))
+        return {'rows': result['rows'], 'mode': result['mode'], 'changedIds': result['changedIds'],
+                'fromState': result['fromState'], 'toState': toState}
+
+    def commit(self):
+        """Saves the states of this run's outputs (call once the gdb passed validation)."""
+        if not self.pending:
+            return
+        self.saved.update(self.pending)
+        self.pending = {}
+        writeJson(self.statePath, {'classes': self.saved})
+
+    def discard(self):
+        """Forgets this run's states (the gdb was rejected & its backup restored)."""
+        self.pending = {}
+
+    def summary(self):
+        return {'classes': len(self.results), 'delta': sum(1 for result in self.results if result['mode'] == DELTA),
+                'full': sum(1 for result in self.results if result['mode'] == FULL), 'results': self.results}
+
+#-------------------------------------------------------------------------------------------------------
+# Local SQLite stand-in of the SDE versioning tables (for a LocalStore; see backends.LocalBackend)
+#-------------------------------------------------------------------------------------------------------
+
+def createVersionTables(store):
+    """Creates the SDE_ repository tables in a LocalStore, with SDE.DEFAULT at state 0 (the base tables)."""
+    connection = store.connection
+    with connection:
+        connection.execute('CREATE TABLE IF NOT EXISTS SDE_table_registry '
+                           '(registration_id INTEGER PRIMARY KEY, table_name TEXT, owner TEXT, class_name TEXT)')
+        connection.execute('CREATE TABLE IF NOT EXISTS SDE_versions (name TEXT, owner TEXT, state_id INTEGER)')
+        connection.execute('CREATE TABLE IF NOT EXISTS SDE_states '
+                           '(state_id INTEGER PRIMARY KEY, lineage_name INTEGER, parent_state_id INTEGER)')
+        connection.execute('CREATE TABLE IF NOT EXISTS SDE_state_lineages (lineage_name INTEGER, lineage_id INTEGER)')
+        connection.execute('CREATE TABLE IF NOT EXISTS SDE_compress_log '
+                           '(compress_id INTEGER PRIMARY KEY, compress_start TEXT, start_state_count INTEGER, '
+                           'compress_end TEXT, end_state_count INTEGER, compress_status TEXT)')
+        if not connection.execute('SELECT 1 FROM SDE_states WHERE state_id = 0').fetchone():
+            connection.execute('INSERT INTO SDE_states VALUES (0, 0, 0)')
+            connection.execute('INSERT INTO SDE_state_lineages VALUES (0, 0)')
+            connection.execute('INSERT INTO SDE_versions VALUES (?, ?, 0)', (DEFAULT_VERSION[1], DEFAULT_VERSION[0]))
+
+
+def registerVersioned(store, className):
+    """
+    PURPOSE:
+    Function registers a LocalStore class as versioned: a registry row & its empty
+    a<id> (class columns + SDE_STATE_ID) and D<id> tables. Returns the registration id.
+
+    PARAMETERS:
+    store = localstore.LocalStore holding the class (an SDE connection of LocalBackend).
+    className = class name in the store ('sde.SDE.GPS/sde.SDE.EngGPSPts').
+    """
+    createVersionTables(store)
+    connection = store.connection
+    parts = className.split('/')[-1].split('.')
+    with connection:
+        row = connection.execute('SELECT registration_id FROM SDE_table_registry WHERE class_name = ?', (className,)).fetchone()
+        if row:
+            return row[0]
+        registrationId = connection.execute(
+            'INSERT INTO SDE_table_registry (table_name, owner, class_name) VALUES (?, ?, ?)',
+            (parts[-1], parts[-2] if len(parts) > 1 else DEFAULT_VERSION[0], className)).lastrowid
+        connection.execute('CREATE TABLE a{0:d} AS SELECT * FROM {1} WHERE 0'.format(registrationId, _quote(className)))
+        connection.execute('ALTER TABLE a{0:d} ADD COLUMN SDE_STATE_ID INTEGER'.format(registrationId))
+        connection.execute('CREATE TABLE D{0:d} (SDE_STATE_ID INTEGER, SDE_DELETES_ROW_ID INTEGER, DELETED_AT INTEGER)'.format(
+            registrationId))
+    return registrationId
+
+
+def _newState(connection):
+    """Adds a state after SDE.DEFAULT's on its lineage & moves DEFAULT to it. Returns the new state id."""
+    parent = connection.execute('SELECT state_id FROM SDE_versions WHERE owner = ? AND name = ?',
+                                (DEFAULT_VERSION[0], DEFAULT_VERSION[1])).fetchone()[0]
+    lineageName = connection.execute('SELECT lineage_name FROM SDE_states WHERE state_id = ?', (parent,)).fetchone()[0]
+    stateId = connection.execute('SELECT MAX(state_id) FROM SDE_states').fetchone()[0] + 1
+    connection.execute('INSERT INTO SDE_states VALUES (?, ?, ?)', (stateId, lineageName, parent))
+    connection.execute('INSERT INTO SDE_state_lineages VALUES (?, ?)', (lineageName, stateId))
+    connection.execute('UPDATE SDE_versions SET state_id = ? WHERE owner = ? AND name = ?',
+                       (stateId, DEFAULT_VERSION[0], DEFAULT_VERSION[1]))
+    return stateId
+
+
+def editVersioned(store, className, inserts=(), updates=None, deletes=()):
+    """
+    PURPOSE:
+    Function makes one edit session on a versioned LocalStore class in a new DEFAULT state:
+    the class table is kept at DEFAULT's current rows (what a cursor on the version reads)
+    and every row version added or deleted is recorded in a<id> / D<id>. Returns the new state id.
+
+    PARAMETERS:
+    store = localstore.LocalStore holding the class.
+    className = versioned class name (see registerVersioned).
+    inserts = list of dictionaries of field name to value ('SHAPE' as WKB) of new rows.
+    updates = dictionary of OBJECTID to a dictionary of the field values to change.
+    deletes = OBJECTIDs to delete.
+    """
+    connection = store.connection
+    table = _quote(className)
+    registrationId = connection.execute('SELECT registration_id FROM SDE_table_registry WHERE class_name = ?',
+                                        (className,)).fetchone()[0]
+    addTable, deleteTable = 'a{0:d}'.format(registrationId), 'D{0:d}'.format(registrationId)
+
+    def rowState(oid):
+        row = connection.execute('SELECT MAX(SDE_STATE_ID) FROM {0} WHERE {1} = ?'.format(addTable, _quote(OID_FIELD)),
+                                 (oid,)).fetchone()
+        return row[0] or 0
+
+    def addVersion(oid, stateId):
+        connection.execute('INSERT INTO {0} SELECT *, ? FROM {1} WHERE {2} = ?'.format(addTable, table, _quote(OID_FIELD)),
+                           (stateId, oid))
+
+    def values(row):
+        row = dict(row)
+        if row.get('SHAPE') is not None:
+            row.update(zip(BBOX_COLUMNS, wkbBounds(row['SHAPE'])))
+            row['SHAPE'] = sqlite3.Binary(row['SHAPE'])
+        return row
+
+    with connection:
+        stateId = _newState(connection)
+        for oid in deletes:
+            connection.execute('INSERT INTO {0} VALUES (?, ?, ?)'.format(deleteTable), (rowState(oid), oid, stateId))
+            connection.execute('DELETE FROM {0} WHERE {1} = ?'.format(table, _quote(OID_FIELD)), (oid,))
+        for oid, changes in sorted((updates or {}).items()):
+            connection.execute('INSERT INTO {0} VALUES (?, ?, ?)'.format(deleteTable), (rowState(oid), oid, stateId))
+            changes = values(changes)
+            connection.execute('UPDATE {0} SET {1} WHERE {2} = ?'.format(
+                table, ', '.join('{0} = ?'.format(_quote(name)) for name in changes), _quote(OID_FIELD)),
+                list(changes.values()) + [oid])
+            addVersion(oid, stateId)
+        for row in inserts:
+            row = values(row)
+            oid = connection.execute('INSERT INTO {0} ({1}) VALUES ({2})'.format(
+                table, ', '.join(_quote(name) for name in row), ', '.join('?' * len(row))), list(row.values())).lastrowid
+            addVersion(oid, stateId)
+    return stateId
+
+
+def compressVersions(store):
+    """
+    Compresses the stand-in like an SDE compress with only DEFAULT: the delta rows are dropped
+    (the class tables already hold DEFAULT's rows), DEFAULT moves back to state 0 and the compress
+    is logged in SDE_compress_log. The state rows are kept so new state ids keep increasing, as SDE's do.
+    """
+    connection = store.connection
+    with connection:
+        stateCount = connection.execute('SELECT COUNT(*) FROM SDE_states').fetchone()[0]
+        started = time.strftime('%Y-%m-%d %H:%M:%S')
+        connection.execute('INSERT INTO SDE_compress_log (compress_start, start_state_count, compress_end, '
+                           'end_state_count, compress_status) VALUES (?, ?, ?, 1, ?)',
+                           (started, stateCount, started, 'SUCCESS'))
+        for (registrationId,) in connection.execute('SELECT registration_id FROM SDE_table_registry').fetchall():
+            connection.execute('DELETE FROM a{0:d}'.format(registrationId))
+            connection.execute('DELETE FROM D{0:d}'.format(registrationId))
+        connection.execute('DELETE FROM SDE_state_lineages WHERE lineage_id <> 0')
+        connection.execute('UPDATE SDE_versions SET state_id = 0')
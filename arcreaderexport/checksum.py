@@ -0,0 +1,140 @@
+"""
+Order-independent checksums of table rows.
+
+Each row is normalized (numbers rounded, dates truncated to seconds, text encoded
+as UTF-8) and hashed to a 64-bit integer; the table checksum is the sum of all
+row hashes modulo 2**64. Because addition is commutative the checksum does not
+depend on row order or OBJECTID numbering, so a source SDE class and its copy in
+PortableDuluth.gdb hash the same even though FeatureClassToFeatureClass renumbers
+the rows. Rows are fed in batches so a class never has to be held in memory.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import hashlib
+import struct
+import zlib
+
+MASK64 = (1 << 64) - 1
+_SEPARATOR = b'\x1f'
+
+try:
+    _TEXT_TYPES = (str, unicode)
+    _INT_TYPES = (int, long)
+    _BINARY_TYPES = (bytearray, memoryview, buffer)    # sqlite3 reads blobs as buffer
+except NameError:  # Python 3
+    _TEXT_TYPES = (str,)
+    _INT_TYPES = (int,)
+    _BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def normalizeValue(value, precision=6):
+    """
+    PURPOSE:
+    Function returns a byte string for one field value that is the same for the
+    source and the copied feature class (floats rounded to 'precision' decimals).
+
+    PARAMETERS:
+    value = field value returned by a cursor.
+    precision = number of decimals floats are rounded to.
+    """
+    if value is None:
+        return b'\x00'
+    if isinstance(value, bool):
+        return b'b1' if value else b'b0'
+    if isinstance(value, _INT_TYPES):
+        return ('n%d' % value).encode('ascii')
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 2 ** 53:
+            return ('n%d' % int(value)).encode('ascii')
+        return ('n%.*f' % (precision, value)).encode('ascii')
+    if isinstance(value, datetime.datetime):
+        return value.replace(microsecond=0).isoformat().encode('ascii')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat().encode('ascii')
+    if isinstance(value, (tuple, list)):
+        return b'(' + b','.join(normalizeValue(item, precision) for item in value) + b')'
+    if isinstance(value, _BINARY_TYPES):
+        return b'x' + bytes(value)
+    if isinstance(value, _TEXT_TYPES):
+        return b's' + value.encode('utf-8')
+    return b'r' + repr(value).encode('utf-8')
+
+
+def rowHash(row, precision=6):
+    """Returns the 64-bit hash (int) of one row (sequence of field values)."""
+    data = _SEPARATOR.join(normalizeValue(value, precision) for value in row)
+    return struct.unpack('<Q', hashlib.sha1(data).digest()[:8])[0]
+
+
+def valueHash(value, precision=6):
+    """Returns a cheap 32-bit hash (int) of one field value, the same for the source and the copy."""
+    return zlib.crc32(normalizeValue(value, precision)) & 0xffffffff
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class TableChecksum(object):
+    """
+    PURPOSE:
+    Accumulates an order-independent checksum over batches of rows.
+
+    PARAMETERS:
+    sampleEvery = 1 hashes every row; N keeps only rows whose hash is divisible by N.
+        The sample is chosen by content, so both sides of a comparison sample the same rows.
+    precision = decimals floats are rounded to before hashing.
+    sampleField = index of the field whose value picks the sampled rows (such as the shape centroid);
+        a row left out of the sample is then skipped before the rest of it is normalized & hashed.
+        None picks them by the hash of the whole row, which costs as much as hashing every row.
+    """
+
+    def __init__(self, sampleEvery=1, precision=6, sampleField=None):
+        self.sampleEvery = max(int(sampleEvery), 1)
+        self.precision = precision
+        self.sampleField = sampleField if self.sampleEvery > 1 else None
+        self.rows = 0
+        self.sampled = 0
+        self.total = 0
+
+    def update(self, rows):
+        """Adds a batch (list of row tuples) to the checksum."""
+        sampleEvery, sampleField, precision = self.sampleEvery, self.sampleField, self.precision
+        total = self.total
+        sampled = 0
+        for row in rows:
+            if sampleField is not None:
+                if valueHash(row[sampleField], precision) % sampleEvery:
+                    continue
+                value = rowHash(row, precision)
+            else:
+                value = rowHash(row, precision)
+                if sampleEvery > 1 and value % sampleEvery:
+                    continue
+            total += value
+            sampled += 1
+        self.total = total & MASK64
+        self.rows += len(rows)
+        self.sampled += sampled
+        return self
+
+    def combine(self, other):
+        """Adds another TableChecksum (such as one computed by another worker) into this one."""
+        self.total = (self.total + other.total) & MASK64
+        self.rows += other.rows
+        self.sampled += other.sampled
+        return self
+
+    def hexdigest(self):
+        return '%016x' % self.total
+
+
+def checksumBatches(batches, sampleEvery=1, precision=6):
+    """
+    PURPOSE:
+    Function returns a TableChecksum for an iterable of row batches.
+    """
+    checksum = TableChecksum(sampleEvery, precision)
+    for batch in batches:
+        checksum.update(batch)
+    return checksum
@@ -0,0 +1,137 @@
+"""
+Command line entry point of the ArcReader export tools.
+
+    python -m arcreaderexport <command> [options]      (or python -m arcreaderexport.cli)
+
+    status    published version, this machine's copy & which scheduled tier is due
+    plan      estimated runtime & size of an export (arcreaderexport.planner)
+    export    run an export of one tier (what CreateRemoteArcReaderGDB_v2.py runs)
+    validate  validate the published gdb against its sources
+    publish   publish a new version file & manifest of the bundle
+    sync      copy the published bundle to this laptop (arcreaderexport.sync)
+
+Only this module, argparse and arcreaderexport.layers are imported up front; each
+command imports what it needs when it runs, so arcpy (several seconds to import) is
+only loaded by export / validate on the arcpy backend and status & plan start in
+a fraction of a second (see benchmarks/bench_startup.py).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import sys
+
+from arcreaderexport.layers import FULL_TIER, METRICS_PORT, PUBLISH_DIR, TIERS
+
+# Commands whose options are parsed by the module that runs them
+DELEGATED = {'plan': 'arcreaderexport.planner', 'sync': 'arcreaderexport.sync'}
+
+
+def _backend(args):
+    if args.backend == 'local':
+        from arcreaderexport.backends import LocalBackend
+        return LocalBackend(args.local_root)
+    from arcreaderexport.backends import ArcpyBackend
+    return ArcpyBackend()
+
+
+def _logger(args):
+    from arcreaderexport import logs
+    if args.backend == 'local':
+        return logs.setLogger('arcreaderexport', logfilepath=os.path.join(args.local_root, 'ProcessLogfile.log'),
+                              eventsPath=os.path.join(args.local_root, 'ProcessEvents.jsonl'))
+    return logs.setLogger('arcreaderexport')
+
+
+def status(args):
+    from arcreaderexport.freshness import LOCAL_PATH
+    from arcreaderexport.manifest import readVersion
+    from arcreaderexport.scheduler import STATE_PATH, Scheduler
+    published = readVersion(args.share)
+    local = readVersion(args.local or LOCAL_PATH)
+    tier, window = Scheduler([], statePath=args.state or STATE_PATH).due()
+    result = {'published': published, 'local': local,
+              'dueTier': tier, 'dueWindow': window.strftime('%Y-%m-%dT%H:%M:%S') if window else None}
+    print(json.dumps(result, indent=2, sort_keys=True, default=str))
+    return 0
+
+
+def export(args):
+    from arcreaderexport.export import runExport
+    result = runExport(args.tier, backend=_backend(args), logger=_logger(args), publish=not args.no_publish,
+                       useSourceCache=args.backend == 'arcpy',
+                       reportDir=args.local_root if args.backend == 'local' else None, profile=args.profile,
+                       metricsPort=args.metrics_port)
+    return 0 if result['validationPassed'] else 1
+
+
+def validate(args):
+    from arcreaderexport.export import validateExport
+    report = validateExport(args.tier, reader=_backend(args), workers=args.workers)
+    print(json.dumps(report.toDict(), indent=2, sort_keys=True, default=str))
+    return 0 if report.passed else 1
+
+
+def publish(args):
+    from arcreaderexport.export import publishExport
+    versionInfo = publishExport(args.tier, incremental=args.incremental, bundleDir=args.share)
+    print(json.dumps(versionInfo, indent=2, sort_keys=True))
+    return 0
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog='arcreaderexport', description='ArcReader export tools.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    backendParser = argparse.ArgumentParser(add_help=False)
+    backendParser.add_argument('--tier', choices=TIERS, default=FULL_TIER)
+    backendParser.add_argument('--backend', choices=('arcpy', 'local'), default='arcpy')
+    backendParser.add_argument('--local-root', default='localbackend', help='folder of the local backend workspaces')
+
+    command = commands.add_parser('status', help='published version, local copy & due tier')
+    command.add_argument('--share', default=PUBLISH_DIR, help='published bundle folder')
+    command.add_argument('--local', help='laptop bundle folder')
+    command.add_argument('--state', help='scheduler state file')
+    command.set_defaults(func=status)
+
+    commands.add_parser('plan', help='estimate the runtime & size of an export (see plan --help)', add_help=False)
+
+    command = commands.add_parser('export', parents=[backendParser], help='run an export of one tier')
+    command.add_argument('--no-publish', action='store_true', help='validate but do not publish a new version')
+    command.add_argument('--profile', choices=('sample', 'cprofile'),
+                         help='profile every task & write flamegraph input next to the run report')
+    command.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                         help='serve Prometheus metrics on this port during the run')
+    command.set_defaults(func=export)
+
+    command = commands.add_parser('validate', parents=[backendParser], help='validate the gdb against its sources')
+    command.add_argument('--workers', type=int, default=4)
+    command.set_defaults(func=validate)
+
+    command = commands.add_parser('publish', help='publish a new version file & manifest')
+    command.add_argument('--tier', choices=TIERS, default=FULL_TIER)
+    command.add_argument('--incremental', action='store_true')
+    command.add_argument('--share', default=PUBLISH_DIR, help='published bundle folder')
+    command.set_defaults(func=publish)
+
+    commands.add_parser('sync', help='copy the published bundle to this laptop (see sync --help)', add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in DELEGATED:
+        import importlib
+        return importlib.import_module(DELEGATED[argv[0]]).main(argv[1:])
+    parser = buildParser()
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Content hashes of source classes kept across runs, so unchanged classes are not exported again.
+
+FeatureClassToFeatureClass rewrites a class every run even when nothing in SDE changed.
+ContentHashes reads each plain copy's source once with a cursor, in batches, and hashes
+it with checksum.TableChecksum (row hashes summed, so the hash does not depend on row
+order or OBJECTID numbering) over every copied field and the full geometry (WKB), next
+to a hash of its schema (fields, geometry type, spatial reference). The hashes of the
+classes in the published gdb are kept in a JSON file next to the run reports; when a
+source hashes the same as the published copy of its class:
+
+    - an incremental run leaves the class in place (the gdb is updated where it is),
+    - a full rebuild copies the class over from PortableDuluth_backup.gdb (the
+      published gdb renamed) with backend.reuseClass: a gdb-to-gdb copy on local disk
+      instead of an export from SDE through the geoprocessing stack.
+
+A class in a file gdb is a set of files numbered by the gdb's own catalog, so it cannot
+be hard-linked into another gdb one class at a time; reuseClass is the closest copy.
+Like the change capture state, a run's hashes are only saved once its validation passed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import time
+
+from arcreaderexport.checksum import TableChecksum
+from arcreaderexport.manifest import readJson, writeJson
+from arcreaderexport.runreport import REPORT_DIR
+from arcreaderexport.streamcopy import DEFAULT_BATCH_SIZE, copyFields
+
+HASH_FILE = 'ExportContentHashes.json'
+
+UNCHANGED = 'unchanged'     # left in place (incremental run)
+REUSED = 'reused'           # copied over from the previous gdb (full rebuild)
+COPIED = 'copied'           # exported from the source
+
+
+def schemaHash(description):
+    """Returns a hash of a describe() result's fields, geometry type & spatial reference."""
+    schema = [sorted((name.split('.')[-1].lower(), fieldType) for name, fieldType in description['fields']),
+              description.get('shapeType'), str(getattr(description.get('spatialReference'), 'name',
+                                                        description.get('spatialReference')))]
+    return hashlib.sha1(json.dumps(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def contentHash(reader, path, batchSize=DEFAULT_BATCH_SIZE, description=None):
+    """
+    PURPOSE:
+    Function reads a class in batches & returns {'hash', 'schema', 'rows'}: the order-independent
+    hash of its rows (copied fields & WKB geometry), its schema hash and its row count.
+
+    PARAMETERS:
+    reader = object with describe() & iterBatches() (a backend).
+    path = class path.
+    batchSize = rows read & hashed at a time.
+    description = describe() result of the class (read if not given).
+    """
+    description = description or reader.describe(path)
+    fields = [field for field in copyFields(description) if field != 'SHAPE@']
+    if description.get('hasShape'):
+        fields.append('SHAPE@WKB')
+    checksum = TableChecksum()
+    for batch in reader.iterBatches(path, fields, batchSize):
+        checksum.update(batch)
+    return {'hash': checksum.hexdigest(), 'schema': schemaHash(description), 'rows': checksum.rows}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ContentHashes(object):
+    """
+    PURPOSE:
+    Decides per plain copy whether its source changed since the published gdb was exported,
+    & reuses the published copy of the class when it did not.
+
+    PARAMETERS:
+    backend = storage backend of the sources & outputs (with reuseClass).
+    outputGdb = path of the gdb written (the output paths' prefix).
+    previousGdb = path of the published gdb of the last run, or None when the run updates it in place.
+    statePath = JSON file of the hashes (next to the run reports by default).
+    batchSize = rows read & hashed at a time.
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, backend, outputGdb, previousGdb=None, statePath=None, batchSize=DEFAULT_BATCH_SIZE, logger=None):
+        self.backend = backend
+        self.outputGdb = outputGdb.replace('\\', '/').rstrip('/')
+        self.previousGdb = previousGdb.replace('\\', '/').rstrip('/') if previousGdb else None
+        self.statePath = statePath or os.path.join(REPORT_DIR, HASH_FILE)
+        self.batchSize = batchSize
+        self.logger = logger
+        self.saved = (readJson(self.statePath) or {}).get('classes', {})
+        self.pending = {}
+        self.results = []
+
+    def _key(self, outputPath):
+        outputPath = outputPath.replace('\\', '/')
+        if not outputPath.startswith(self.outputGdb + '/'):
+            return None
+        return outputPath[len(self.outputGdb) + 1:]
+
+    def _present(self, path, entry):
+        # The schema of a copy differs from its source's (field names, shape metrics), so only rows are checked
+        description = self.backend.describe(path)
+        return bool(description.get('exists')) and description.get('count') == entry['rows']
+
+    def reuse(self, sourcePath, outputPath):
+        """
+        PURPOSE:
+        Hashes sourcePath & returns a dictionary for the run report (rows, content, seconds) when
+        outputPath was left in place or reused from the previous gdb, or None when the class must
+        be copied (its hash is then saved for the copy by commit()).
+
+        PARAMETERS:
+        sourcePath = source class path.
+        outputPath = output class path inside outputGdb.
+        """
+        key = self._key(outputPath)
+        if key is None:
+            return None
+        started = time.time()
+        entry = contentHash(self.backend, sourcePath, self.batchSize)
+        entry.update(source=sourcePath, updated=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self.pending[key] = entry
+        saved = self.saved.get(key)
+        content = COPIED
+        if saved and (saved['hash'], saved['schema'], saved['rows']) == (entry['hash'], entry['schema'], entry['rows']):
+            if self.previousGdb is None:
+                if self._present(outputPath, entry):
+                    content = UNCHANGED
+            elif self._present(self.previousGdb + '/' + key, entry):
+                self.backend.reuseClass(self.previousGdb + '/' + key, outputPath)
+                content = REUSED
+        result = {'output': key, 'rows': entry['rows'], 'content': content, 'hash': entry['hash'],
+                  'seconds': round(time.time() - started, 3)}
+        self.results.append(result)
+        if self.logger is not None:
+            self.logger.info('Content hash of {0}: {1} ({2} rows, {3})'.format(sourcePath, entry['hash'], entry['rows'],
+                                                                             content))
+        if content == COPIED:
+            return None
+        return {'rows': entry['rows'], 'content': content, 'seconds': result['seconds']}
+
+    def commit(self):
+        """Saves the hashes of this run's outputs (call once the gdb passed validation)."""
+        if not self.pending:
+            return
+        self.saved.update(self.pending)
+        self.pending = {}
+        writeJson(self.statePath, {'classes': self.saved})
+
+    def discard(self):
+        """Forgets this run's hashes (the gdb was rejected & its backup restored)."""
+        self.pending = {}
+
+    def summary(self):
+        counts = dict((content, sum(1 for result in self.results if result['content'] == content))
+                      for content in (UNCHANGED, REUSED, COPIED))
+        return dict(counts, classes=len(self.results), results=self.results)
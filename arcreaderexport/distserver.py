@@ -0,0 +1,399 @@
+"""
+Fan-out distribution server for the published ArcReader bundle.
+
+Serves PortableDuluth.version.json, the manifest and every bundle file over HTTP
+so laptops (arcreaderexport.sync with --server) can pull updates without
+mounting the S: share, and many laptops can be fed at once:
+
+    python -m arcreaderexport.distserver --bundle S:\\...\\ArcReaderRemoteUpdate --port 8765
+                                         [--client-kbps 2000] [--total-kbps 20000]
+
+    GET /version                  version file
+    GET /manifest                 manifest (JSON)
+    GET /files/<manifest path>    a bundle file; "Range: bytes=start-end" supported (206)
+
+File bodies are sent with loop.sendfile() (os.sendfile on Linux / TransmitFile
+via the proactor on Windows) so data goes from the page cache to the socket
+without passing through Python. Each client address has its own token bucket and
+all clients share a total one; with a limit set, a body is sent as a series of
+sendfile() calls no larger than the tokens granted.
+
+Only paths listed in the current manifest are served. The version file & manifest
+are read once per publish and kept in memory: every CHECK_INTERVAL seconds a worker
+thread stats the version file (on the share) and rereads both only when its mtime
+or size changed, so requests never wait on a file read of the share on the event
+loop. Requires Python 3.7+ (this runs on the distribution server, not inside
+ArcMap's Python 2.7).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import unquote
+
+from arcreaderexport.manifest import MANIFEST_FILE, VERSION_FILE
+from arcreaderexport.peer import DISCOVERY_PORT, DISCOVERY_QUERY, PEER_PORT, verifyInstalled
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_REASONS = {200: 'OK', 206: 'Partial Content', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 416: 'Range Not Satisfiable', 503: 'Service Unavailable'}
+CHUNK = 256 * 1024
+CHECK_INTERVAL = 5.0        # seconds between checks of the version file for a new publish
+
+
+class AsyncTokenBucket(object):
+    """
+    PURPOSE:
+    Token bucket for asyncio tasks; grant() waits until some bytes may be sent.
+
+    PARAMETERS:
+    rate = bytes per second (None or 0 for no limit).
+    burst = bucket size in bytes (a quarter second of traffic by default, at least one CHUNK).
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = (burst or max(CHUNK, int(rate * 0.25))) if rate else 0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def grant(self, wanted):
+        """Returns how many of 'wanted' bytes may be sent now (waits until at least one chunk is allowed)."""
+        if not self.rate:
+            return wanted
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                allowed = int(min(wanted, self.tokens, CHUNK))
+                if allowed >= min(wanted, CHUNK):
+                    self.tokens -= allowed
+                    return allowed
+                await asyncio.sleep((min(wanted, CHUNK) - self.tokens) / float(self.rate))
+
+    def refund(self, amount):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _openFile(path):
+    """Returns (open file, size) of a bundle file; run in a worker thread, as the share may be slow."""
+    dataFile = open(path, 'rb')
+    return dataFile, os.fstat(dataFile.fileno()).st_size
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class DistributionServer(object):
+    """
+    PURPOSE:
+    asyncio HTTP server for one published bundle folder.
+
+    PARAMETERS:
+    bundleDir = string path of the published bundle folder.
+    clientRate = bytes per second allowed per client address (None for no limit).
+    totalRate = bytes per second shared by all clients (None for no limit).
+    maxClients = largest number of connections served at once; others get 503.
+    checkInterval = seconds between checks of the version file for a new publish.
+    """
+
+    def __init__(self, bundleDir, clientRate=None, totalRate=None, maxClients=200, checkInterval=CHECK_INTERVAL):
+        self.bundleDir = bundleDir
+        self.clientRate = clientRate
+        self.totalBucket = AsyncTokenBucket(totalRate)
+        self.clientBuckets = {}
+        self.maxClients = maxClients
+        self.connections = 0
+        self.stats = {'requests': 0, 'bytesSent': 0, 'rejected': 0, 'peakConnections': 0}
+        self.checkInterval = checkInterval
+        self._versionKey = None     # (mtime, size) of the version file last read
+        self._published = None      # (version info, version file bytes, manifest bytes, {path: size}) being served
+        self._watcher = None
+        self.server = None
+
+    async def start(self, host='0.0.0.0', port=8765):
+        await self.refresh()
+        self._watcher = asyncio.ensure_future(self._watch())
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    @property
+    def version(self):
+        """Version info being served (None while nothing is)."""
+        return self._published[0] if self._published else None
+
+    async def refresh(self):
+        """Rereads the version file & manifest in a worker thread if the version file changed."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._refresh)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            print('XXX Failed to read the published version of {0}: {1}'.format(self.bundleDir, e))
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.checkInterval)
+            await self.refresh()
+
+    def _refresh(self):
+        # Runs in a worker thread; a half-written version file raises & is read again at the next check
+        versionPath = os.path.join(self.bundleDir, VERSION_FILE)
+        try:
+            stat = os.stat(versionPath)
+        except OSError:
+            self._versionKey = self._published = None
+            return
+        key = (stat.st_mtime, stat.st_size)
+        if key == self._versionKey:
+            return
+        with open(versionPath, 'rb') as versionFile:
+            versionBytes = versionFile.read()
+        self._published = self._readPublished(json.loads(versionBytes.decode('utf-8')), versionBytes)
+        self._versionKey = key
+
+    def _readPublished(self, version, versionBytes):
+        """Returns the (version, version bytes, manifest bytes, {path: size}) to serve for a version, or None."""
+        with open(os.path.join(self.bundleDir, MANIFEST_FILE), 'rb') as manifestFile:
+            manifestBytes = manifestFile.read()
+        manifest = json.loads(manifestBytes.decode('utf-8'))
+        return version, versionBytes, manifestBytes, dict((entry['path'], entry['size']) for entry in manifest['files'])
+
+    def _bucket(self, client):
+        if client not in self.clientBuckets:
+            self.clientBuckets[client] = AsyncTokenBucket(self.clientRate)
+        return self.clientBuckets[client]
+
+    async def _handle(self, reader, writer):
+        client = (writer.get_extra_info('peername') or ('?',))[0]
+        if self.connections >= self.maxClients:
+            self.stats['rejected'] += 1
+            await self._respond(writer, 503, b'busy, try again later', keepAlive=False)
+            writer.close()
+            return
+        self.connections += 1
+        self.stats['peakConnections'] = max(self.stats['peakConnections'], self.connections)
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keepAlive = headers.get('connection', '').lower() != 'close'
+                self.stats['requests'] += 1
+                if not await self._route(requestLine.decode('latin-1').split(), headers, writer, client, keepAlive):
+                    break
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _route(self, parts, headers, writer, client, keepAlive):
+        if len(parts) != 3:
+            await self._respond(writer, 400, b'bad request', keepAlive=False)
+            return False
+        method, target, _ = parts
+        if method not in ('GET', 'HEAD'):
+            await self._respond(writer, 405, b'', keepAlive)
+            return True
+        published = self._published
+        if published is None:
+            await self._respond(writer, 503, b'nothing published', keepAlive)
+            return True
+        version, versionBytes, manifestBytes, paths = published
+        if target == '/version':
+            await self._respond(writer, 200, versionBytes if method == 'GET' else b'', keepAlive, len(versionBytes),
+                                'application/json')
+            return True
+        if target == '/manifest':
+            await self._respond(writer, 200, manifestBytes if method == 'GET' else b'', keepAlive, len(manifestBytes),
+                                'application/json', {'X-Bundle-Version': str(version.get('version'))})
+            return True
+        relPath = unquote(target[len('/files/'):]) if target.startswith('/files/') else None
+        if relPath not in paths:
+            await self._respond(writer, 404, b'not found', keepAlive)
+            return True
+        return await self._sendFile(writer, client, relPath, version.get('version'), headers.get('range'),
+                                    method == 'HEAD', keepAlive)
+
+    async def _sendFile(self, writer, client, relPath, bundleVersion, rangeHeader, headOnly, keepAlive):
+        path = os.path.join(self.bundleDir, *relPath.split('/'))
+        try:
+            dataFile, size = await asyncio.get_running_loop().run_in_executor(None, _openFile, path)
+        except (IOError, OSError):
+            await self._respond(writer, 404, b'not found', keepAlive)
+            return True
+        with dataFile:
+            return await self._sendRange(writer, client, dataFile, size, bundleVersion, rangeHeader, headOnly,
+                                         keepAlive)
+
+    async def _sendRange(self, writer, client, dataFile, size, bundleVersion, rangeHeader, headOnly, keepAlive):
+        start, end, status = 0, size - 1, 200
+        if rangeHeader:
+            match = _RANGE.match(rangeHeader)
+            if not match or (not match.group(1) and not match.group(2)):
+                await self._respond(writer, 416, b'', keepAlive, extra={'Content-Range': 'bytes */%d' % size})
+                return True
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end or start >= size:
+                await self._respond(writer, 416, b'', keepAlive, extra={'Content-Range': 'bytes */%d' % size})
+                return True
+            status = 206
+        length = end - start + 1 if size else 0
+        extra = {'Accept-Ranges': 'bytes', 'X-Bundle-Version': str(bundleVersion)}
+        if status == 206:
+            extra['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+        await self._respond(writer, status, None, keepAlive, length, 'application/octet-stream', extra)
+        if headOnly or not length:
+            return True
+
+        loop = asyncio.get_running_loop()
+        clientBucket = self._bucket(client)
+        limited = bool(self.clientRate or self.totalBucket.rate)
+        offset, remaining = start, length
+        while remaining:
+            count = remaining
+            if limited:
+                count = await clientBucket.grant(count)
+                allowed = await self.totalBucket.grant(count)
+                clientBucket.refund(count - allowed)
+                count = allowed
+            sent = await loop.sendfile(writer.transport, dataFile, offset, count)
+            if not sent:
+                return False        # the file was cut short since it was opened (a new publish); drop the connection
+            offset += sent
+            remaining -= sent
+            self.stats['bytesSent'] += sent
+        return True
+
+    async def _respond(self, writer, status, body, keepAlive, length=None, contentType='text/plain', extra=None):
+        length = len(body or b'') if length is None else length
+        lines = ['HTTP/1.1 %d %s' % (status, _REASONS.get(status, '')),
+                 'Content-Length: %d' % length,
+                 'Content-Type: %s' % contentType,
+                 'Connection: %s' % ('keep-alive' if keepAlive else 'close')]
+        for name, value in (extra or {}).items():
+            lines.append('%s: %s' % (name, value))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class PeerServer(DistributionServer):
+    """
+    PURPOSE:
+    DistributionServer for a laptop's installed bundle (LAN peer mode). The installed
+    files are checked against their manifest before serving, and again whenever the
+    laptop installs a new version; nothing is served while they do not match. The
+    check hashes the whole gdb, so it runs once per manifest, in the worker thread
+    that reads the version file, never on the event loop.
+    """
+
+    checkedSha1 = None
+    verified = False
+
+    def _readPublished(self, version, versionBytes):
+        if version.get('manifestSha1') != self.checkedSha1:
+            bad = verifyInstalled(self.bundleDir)
+            self.checkedSha1, self.verified = version.get('manifestSha1'), not bad
+            if bad:
+                print('Not serving version {0}: {1} file(s) do not match the manifest'.format(
+                    version.get('version'), len(bad)))
+        return DistributionServer._readPublished(self, version, versionBytes) if self.verified else None
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Answers arcreaderexport.peer.discoverPeers queries with the version & port being served."""
+
+    def __init__(self, server, port):
+        self.server = server
+        self.port = port
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, sender):
+        version = self.server.version if data == DISCOVERY_QUERY else None
+        if version is not None:
+            answer = {'version': version.get('version'), 'port': self.port}
+            self.transport.sendto(json.dumps(answer).encode('utf-8'), sender)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+async def serve(bundleDir, host, port, clientRate=None, totalRate=None, maxClients=200):
+    server = DistributionServer(bundleDir, clientRate, totalRate, maxClients)
+    boundPort = await server.start(host, port)
+    print('Serving {0} on {1}:{2}'.format(bundleDir, host, boundPort))
+    async with server.server:
+        await server.server.serve_forever()
+
+
+async def servePeer(localDir, host='0.0.0.0', port=PEER_PORT, discoveryPort=DISCOVERY_PORT, clientRate=None):
+    """
+    PURPOSE:
+    Serves a laptop's installed bundle to other laptops until cancelled.
+
+    PARAMETERS:
+    localDir = string path of the laptop's bundle folder.
+    host, port = where to listen for block requests.
+    discoveryPort = UDP port answered for discoverPeers (None to not answer).
+    clientRate = bytes per second allowed per peer (None for no limit).
+    """
+    server = PeerServer(localDir, clientRate=clientRate)
+    boundPort = await server.start(host, port)
+    if discoveryPort:
+        await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: DiscoveryProtocol(server, boundPort), local_addr=(host, discoveryPort), allow_broadcast=True)
+    print('Serving {0} to peers on {1}:{2}'.format(localDir, host, boundPort))
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='distserver', description='Serve the published ArcReader bundle to laptops.')
+    parser.add_argument('--bundle', required=True, help='published bundle folder')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--client-kbps', type=float, default=0, help='per-laptop cap in kilobytes/second (0 = none)')
+    parser.add_argument('--total-kbps', type=float, default=0, help='cap for all laptops together (0 = none)')
+    parser.add_argument('--max-clients', type=int, default=200)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.bundle, args.host, args.port, args.client_kbps * 1024 or None,
+                          args.total_kbps * 1024 or None, args.max_clients))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+One export run of PortableDuluth.gdb: the steps CreateRemoteArcReaderGDB_v2.py used to run at import.
+
+runExport() goes through the numbered steps of the script for one refresh tier:
+
+    1. new empty gdb (full rebuild) or a backup of the classes the run rewrites (incremental)
+    2. feature datasets (full rebuild)
+    3. copies of the tier's SDE classes (3a; in parallel on a thread-safe backend, only the edited rows of versioned hot layers,
+       unchanged classes kept from the previous gdb) & Sections_SLC (3b)
+    4. the Assessor's table
+    5. the Rice Lake Township clips
+    6. retries of deferred copies, then the spatial row order (full rebuild) & compaction of the gdb
+    7. validation, then publication of the version file & manifest (or the backup restored)
+    8. the run report
+
+Nothing happens when the module is imported: arcpy is only imported by ArcpyBackend
+once a step needs it, and pyarrow only when the source cache is used, so the quick
+commands of arcreaderexport.cli (status, plan) start without either.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import time
+
+from arcreaderexport import layers
+
+PUBLISHED_GDB = 'PortableDuluth.gdb'
+BACKUP_GDB = 'PortableDuluth_backup.gdb'
+
+
+def validationTasks(tier=layers.FULL_TIER, reader=None):
+    """
+    Returns the validation tasks ('name', 'source', 'output') of a tier's copies (clips are not compared);
+    with a reader, annotation classes are compared with the filter & merges they were copied with.
+    """
+    tasks = [{'name': task['name'], 'source': task['input'], 'output': task['output']}
+             for task in layers.exportTasks(tier) if task['stage'] in ('copy', 'table')]
+    if reader is None:
+        return tasks
+    from arcreaderexport.annotation import annotationTasks
+    return annotationTasks(tasks, reader, layers.HIDDEN_ANNOTATION_CLASSES, layers.ANNOTATION_MERGE_GROUPS)
+
+
+def validateExport(tier=layers.FULL_TIER, reader=None, logger=None, workers=4, profiler=None):
+    """
+    PURPOSE:
+    Function validates the published gdb's layers of a tier against their sources
+    & returns the ValidationReport.
+
+    PARAMETERS:
+    tier = 'hourly', 'nightly' or 'weekly'.
+    reader = object with describe() & iterBatches() (a backend; ArcpyBackend by default).
+    logger = logging.Logger for the summary (optional).
+    workers = number of classes validated at once.
+    profiler = profiling.TaskProfiler each class is profiled with (optional).
+    """
+    from arcreaderexport.validate import validateOutput
+    if reader is None:
+        from arcreaderexport.backends import ArcpyBackend
+        reader = ArcpyBackend()
+    report = validateOutput(validationTasks(tier, reader), reader=reader, workers=workers, batchSize=5000,
+                            profiler=profiler)
+    if logger is not None:
+        report.logSummary(logger)
+    return report
+
+
+def publishExport(tier=layers.FULL_TIER, incremental=False, bundleDir=layers.PUBLISH_DIR):
+    """Publishes a new version file & manifest of the bundle in bundleDir and returns the version info."""
+    from arcreaderexport.manifest import publishManifest
+    return publishManifest(bundleDir, extra={'tier': tier, 'incremental': incremental})
+
+
+def runExport(tier=layers.FULL_TIER, backend=None, logger=None, publish=True, useSourceCache=True, reportDir=None,
+              useChangeCapture=True, useContentHashes=True, optimizeOutput=True, copyWorkers=layers.COPY_WORKERS,
+              profile=None, writeMetrics=True, metricsPort=layers.METRICS_PORT):
+    """
+    PURPOSE:
+    Function runs one export of the tier's layers into PortableDuluth.gdb & returns
+    a dictionary of the run: tier, fullRebuild, validation passed, version published,
+    run report path and elapsed seconds.
+
+    PARAMETERS:
+    tier = 'hourly', 'nightly' or 'weekly' (the weekly run rebuilds the whole gdb).
+    backend = storage backend of arcreaderexport.backends (ArcpyBackend by default).
+    logger = logging.Logger (the ProcessLogfile.log logger by default).
+    publish = False to validate without publishing a new version.
+    useSourceCache = True to read streamed sources through the Arrow cache when pyarrow is installed.
+    reportDir = folder the run report is written to (runreport.REPORT_DIR by default); the change
+        capture state & content hash files are kept there too.
+    useChangeCapture = True to update layers.CHANGE_CAPTURE_CLASSES from their SDE adds / deletes tables.
+    useContentHashes = True to keep the published copy of plain classes whose source did not change.
+    optimizeOutput = True to store large classes in spatial order & compact the gdb before validation.
+    copyWorkers = most copies of step 3a run at once, with the number per source tuned during the run
+        (1 copies one class at a time, as it always does on a backend that is not threadSafe).
+    profile = 'sample' or 'cprofile' to profile every task & write Profile_<run>_<stamp>.folded (flamegraph
+        input) next to the run report (see arcreaderexport/profiling.py); None (default) to run unprofiled.
+    writeMetrics = True to write the Prometheus metrics of the run (arcreaderexport/metrics.py) to
+        layers.METRICS_TEXTFILE, or to arcreaderexport.prom in reportDir when it is given.
+    metricsPort = port the metrics are served on over HTTP during the run (None: not served).
+    """
+    from arcreaderexport import logs
+    from arcreaderexport.annotation import AnnotationExport
+    from arcreaderexport.retry import TaskRunner
+    from arcreaderexport.runreport import RunReport
+    from arcreaderexport.steps import ExportSteps, RICE_LAKE_DATASET
+
+    startTimeSeconds = time.time()
+    if logger is None:
+        logger = logs.setLogger('arcreaderexport.export')
+    if backend is None:
+        from arcreaderexport.backends import ArcpyBackend
+        backend = ArcpyBackend()
+    fullRebuild = tier == layers.FULL_TIER
+    logger.info('Export tier: {0} ({1})'.format(tier, 'full rebuild' if fullRebuild else 'incremental'))
+
+    # Run report & task runner shared by all copy steps.
+    ## Failed copies are classified (transient, lock, schema) and retried with backoff; a source whose
+    ## circuit breaker opens has its remaining tasks deferred to the end of the run (step 6).
+    runReport = RunReport(runName=tier)
+    taskRunner = TaskRunner(report=runReport, logger=logger, messagesFn=backend.messages)
+    # Opt-in profile of every task (copies, clips, table copies & validated classes), see arcreaderexport/profiling.py
+    profiler = None
+    if profile:
+        from arcreaderexport.profiling import TaskProfiler
+        taskRunner.profiler = profiler = TaskProfiler(profile)
+    # Prometheus metrics of the tasks, sources & publication (see arcreaderexport/metrics.py), for the textfile
+    ## collector & on metricsPort while the run goes
+    metrics = metricsServer = None
+    if writeMetrics or metricsPort:
+        from arcreaderexport.metrics import METRICS_FILE, ExportMetrics, MetricsServer
+        metricsPath = None
+        if writeMetrics:
+            metricsPath = os.path.join(reportDir, METRICS_FILE) if reportDir else layers.METRICS_TEXTFILE
+        taskRunner.metrics = metrics = ExportMetrics(metricsPath, bundleDir=layers.PUBLISH_DIR, logger=logger)
+        metrics.runStarted(tier)
+        if metricsPort:
+            metricsServer = MetricsServer(metrics.registry, metricsPort)
+            try:
+                logger.info('Serving metrics on port {0}'.format(metricsServer.start()))
+            except (IOError, OSError) as e:
+                logger.error('XXX Failed to serve metrics on port {0}: {1}'.format(metricsPort, e))
+                metricsServer = None
+
+    # A run that raises is still recorded as failed & the metrics server stopped (finally below).
+    runRecorded = False
+    try:
+        # Local Arrow cache of the streamed source classes (see arcreaderexport/sourcecache.py): a class whose
+        ## fingerprint did not change since the last run is copied from local memory-mapped files instead of SDE.
+        ## Validation still reads the sources themselves, so edits the fingerprint misses are not hidden.
+        sourceCache, sourceReader = None, backend
+        if useSourceCache:
+            from arcreaderexport.sourcecache import HAVE_ARROW, CachedReader, SourceCache
+            if HAVE_ARROW:
+                sourceCache = SourceCache(reader=backend)
+                sourceReader = CachedReader(sourceCache, backend)
+        # Versioned hot layers are updated from their adds / deletes tables (see arcreaderexport/changecapture.py)
+        ## with the state of the last export that passed validation.
+        changeCapture = None
+        if useChangeCapture:
+            from arcreaderexport.changecapture import STATE_FILE, ChangeCapture
+            changeCapture = ChangeCapture(backend, statePath=os.path.join(reportDir, STATE_FILE) if reportDir else None,
+                                          logger=logger)
+        # Annotation classes are copied without their unplaced & hidden annotation (see arcreaderexport/annotation.py)
+        annotationExport = AnnotationExport(backend, layers.HIDDEN_ANNOTATION_CLASSES, logger)
+        # Copies of step 3a run in parallel, with the tasks in flight per source tuned from their rows / second,
+        ## the source's latency & this machine's CPU & disk use (see arcreaderexport/autotune.py)
+        ## They start longest first, from their durations in past run reports or their source row counts
+        ## (see arcreaderexport/planner.py), so a large class such as Parcels does not start last.
+        ## The copies run on threads, so only on a thread-safe backend: arcpy is not (see backends.ArcpyBackend),
+        ## so production exports copy one class at a time, in the order of layers.py.
+        copyPool = estimator = None
+        if copyWorkers > 1 and not getattr(backend, 'threadSafe', False):
+            logger.info('{0} is not thread-safe; copying one class at a time instead of {1} at once'.format(
+                backend, copyWorkers))
+            copyWorkers = 1
+        if copyWorkers > 1:
+            from arcreaderexport.autotune import AutotunedPool, ResourceMonitor
+            from arcreaderexport.planner import DurationEstimator, History, loadReports
+            from arcreaderexport.runreport import REPORT_DIR
+            copyPool = AutotunedPool(taskRunner, workers=copyWorkers, perSource=layers.COPY_WORKERS_PER_SOURCE,
+                                     probe=metrics.timedProbe(backend.exists) if metrics else backend.exists,
+                                     monitor=ResourceMonitor(), logger=logger)
+            estimator = DurationEstimator(History(loadReports(reportDir or REPORT_DIR, tier=tier)),
+                                          rowCounter=lambda path: backend.describe(path).get('count'))
+        steps = ExportSteps(backend, taskRunner, logger, sourceReader=sourceReader, sourceCache=sourceCache,
+                            changeCapture=changeCapture, annotationExport=annotationExport, copyPool=copyPool,
+                            estimator=estimator)
+
+        # 1. New empty gdb (the published one is renamed to the backup name); incremental (hourly / nightly)
+        # runs keep the published gdb & only copy the classes they rewrite into the backup gdb, so the backup
+        # costs what the run changes rather than a copy of the whole gdb every hour.
+        setupStartSeconds = time.time()
+        backedUpClasses = None
+        if fullRebuild or not backend.exists(layers.PORTABLE_GDB):
+            fullRebuild = True
+            previousGdb = os.path.join(layers.PUBLISH_DIR, BACKUP_GDB) if backend.exists(layers.PORTABLE_GDB) else None
+            steps.createEmpytGDB(directoryPath=layers.PUBLISH_DIR, originalGDB=PUBLISHED_GDB, backupNameGDB=BACKUP_GDB)
+        else:
+            previousGdb = None
+            backedUpClasses = steps.backupClasses(layers.outputClasses(tier), directoryPath=layers.PUBLISH_DIR,
+                                                  originalGDB=PUBLISHED_GDB, backupNameGDB=BACKUP_GDB)
+        # Plain classes whose source hashes the same as at the last export are kept in place (incremental run)
+        ## or copied over from the backup gdb (full rebuild) instead of exported again
+        ## (see arcreaderexport/contenthash.py)
+        contentHashes = None
+        if useContentHashes:
+            from arcreaderexport.contenthash import HASH_FILE, ContentHashes
+            steps.contentHashes = contentHashes = ContentHashes(
+                backend, layers.PORTABLE_GDB, previousGdb=previousGdb,
+                statePath=os.path.join(reportDir, HASH_FILE) if reportDir else None, logger=logger)
+
+        # 2. Feature datasets of portableGISdict (arcreaderexport/layers.py) in the new gdb
+        if fullRebuild:
+            steps.copyFeatureDatasets(fdList=list(layers.portableGISdict.keys()), toGDBpath=layers.PORTABLE_GDB)
+        # Time of steps 1 & 2 is kept in the run report for the planner (arcreaderexport.planner)
+        runReport.addSection('setup', {'elapsed': round(time.time() - setupStartSeconds, 3),
+                                       'fullRebuild': fullRebuild})
+
+        # 3a. Copy each feature class of the tier (and more frequent tiers) into its feature dataset
+        steps.copyFCtoFC(fromGDBpath=layers.SDE_CONNECTION, fdToFc_Dict=layers.layersForTier(tier), toGDBpath=layers.PORTABLE_GDB)
+
+        # 3b. "Sections_SLC" from ArcReaderUpdate_files.gdb into the "ParcelFeatures" dataset (used for SurveyParcelInfo.pmf)
+        if layers.includesLayer(tier, 'Sections_SLC'):
+            steps.copySingleFCtoFC(fromGDBpath=layers.DEFAULT_GDB, toGDBpath=layers.PORTABLE_GDB + '/ParcelFeatures',
+                                   fc='Sections_SLC')
+
+        # 4. County Assessor's table
+        if layers.includesLayer(tier, 'Assessor'):
+            steps.updateAssessorTable(toGDBpath=layers.PORTABLE_GDB)
+
+        # 5. St. Louis County's layers clipped to Rice Lake Township
+        if layers.includesLayer(tier, RICE_LAKE_DATASET):
+            steps.clipAndCopyRiceLakeFC(toGDB_RiceLake_path=layers.PORTABLE_GDB + '/' + RICE_LAKE_DATASET)
+
+        # 6. Retry copies that were deferred because their source's circuit breaker opened
+        taskRunner.runDeferred()
+
+        # 6b. Large plain classes rewritten in spatial order (full rebuild) & the gdb compacted (see arcreaderexport/optimize.py)
+        if optimizeOutput:
+            from arcreaderexport.optimize import GdbOptimizer
+            try:
+                runReport.addSection('optimize', GdbOptimizer(backend, logger=logger).optimize(
+                    layers.PORTABLE_GDB, reorder=fullRebuild, classes=layers.plainCopyClasses(tier)))
+            except Exception:
+                logger.error('XXX Failed to optimize {0}'.format(layers.PORTABLE_GDB), exc_info=True)
+
+        # 7. Validate the gdb against its sources; on any mismatch or missing class keep the previous gdb
+        # published instead. Otherwise publish a new version file & manifest for the laptops.
+        validationReport = validateExport(tier, reader=backend, logger=logger, profiler=profiler)
+        runReport.addSection('validation', validationReport.toDict())
+        if sourceCache is not None:
+            runReport.addSection('sourceCache', sourceCache.stats)
+        if changeCapture is not None:
+            runReport.addSection('changeCapture', changeCapture.summary())
+        runReport.addSection('annotation', annotationExport.summary())
+        if copyPool is not None:
+            runReport.addSection('concurrency', copyPool.summary())
+            runReport.addSection('copyOrder', estimator.summary())
+        if contentHashes is not None:
+            runReport.addSection('contentHashes', contentHashes.summary())
+        versionInfo = None
+        if not validationReport.passed:
+            if changeCapture is not None:
+                changeCapture.discard()
+            if contentHashes is not None:
+                contentHashes.discard()
+            if fullRebuild:
+                steps.restoreBackupGDB(directoryPath=layers.PUBLISH_DIR, originalGDB=PUBLISHED_GDB,
+                                       backupNameGDB=BACKUP_GDB)
+            elif backedUpClasses is not None:
+                steps.restoreBackupClasses(backedUpClasses, directoryPath=layers.PUBLISH_DIR, originalGDB=PUBLISHED_GDB,
+                                           backupNameGDB=BACKUP_GDB)
+            else:
+                logger.error('XXX Validation failed & no backup of {0} was made; it is left as the run wrote it'.format(
+                    PUBLISHED_GDB))
+        else:
+            if changeCapture is not None:
+                try:
+                    changeCapture.commit()
+                except (IOError, OSError) as e:
+                    logger.error('XXX Failed to save change capture state: %s' % e)
+            if contentHashes is not None:
+                try:
+                    contentHashes.commit()
+                except (IOError, OSError) as e:
+                    logger.error('XXX Failed to save content hashes: %s' % e)
+            if publish:
+                try:
+                    versionInfo = publishExport(tier, incremental=not fullRebuild)
+                    runReport.addSection('published', versionInfo)
+                    print('Published version {0} ({1} files)'.format(versionInfo['version'], versionInfo['files']))
+                    logger.info('Published {3} version {0} of PortableDuluth.gdb ({1} files, {2} bytes)'.format(
+                        versionInfo['version'], versionInfo['files'], versionInfo['bytes'], tier))
+                except (IOError, OSError) as e:
+                    logger.error('XXX Failed to publish version file: %s' % e)
+
+        # 8. Write the metrics, the profile & the run report
+        if metrics is not None:
+            metrics.runFinished(tier, time.time() - startTimeSeconds, validationReport.passed,
+                                len(validationReport.failures), versionInfo)
+            runRecorded = True
+        if profiler is not None:
+            from arcreaderexport.runreport import REPORT_DIR
+            try:
+                profileSection = profiler.finish(reportDir or REPORT_DIR, runReport.fileStem('Profile'))
+                runReport.addSection('profile', profileSection)
+                print('Profile written to: ' + profileSection['folded'])
+            except (IOError, OSError) as e:
+                logger.error('XXX Failed to write profile: %s' % e)
+        runReport.finish()
+        runReport.logSummary(logger)
+        reportPath = None
+        try:
+            reportPath = runReport.write(reportDir) if reportDir else runReport.write()
+            print('Run report written to: ' + reportPath)
+        except (IOError, OSError) as e:
+            logger.error('Error writing run report: %s' % e)
+    except BaseException:
+        if metrics is not None and not runRecorded:
+            metrics.runFinished(tier, time.time() - startTimeSeconds, False)
+        raise
+    finally:
+        if metricsServer is not None:
+            metricsServer.stop()
+        backend.close()
+
+    elapsedTimeSeconds = time.time() - startTimeSeconds
+    print('----------------------------------------------')
+    print('\nScript completed in {0:0.2f} minutes (or {1:.2f} seconds)\nReview database located: {2}'.format(
+        elapsedTimeSeconds / 60.0, elapsedTimeSeconds, layers.PORTABLE_GDB))
+    print('----------------------------------------------')
+    logger.info('\n----------\nScript completed in {0:0.2f} minutes. \nReview database located: {1}.'.format(
+        elapsedTimeSeconds / 60.0, layers.PORTABLE_GDB))
+    logs.flushLogs()
+    return {'tier': tier, 'fullRebuild': fullRebuild, 'validationPassed': validationReport.passed,
+            'version': versionInfo['version'] if versionInfo else None, 'runReport': reportPath,
+            'elapsed': round(elapsedTimeSeconds, 3)}
@@ -0,0 +1,113 @@
+"""
+Laptop-side freshness check for the ArcReader map & database.
+
+Run from the laptop batch script before (or instead of) copying the bundle:
+
+    python -m arcreaderexport.freshness --share S:\\GIS_Public\\GIS_Data\\MapDocuments\\Published_Maps\\ArcReaderRemoteUpdate
+                                        --local C:\\ArcReader [--max-age-days 7]
+
+The check costs one small file read on the share (PortableDuluth.version.json)
+and one on the laptop; it never walks the gdb folder. It prints a one-line
+message for the field worker and exits with a code the batch script can test
+with "if errorlevel":
+
+    0  = current     the laptop already has the published version
+    0  = offline     share not reachable, local copy younger than max-age-days
+    10 = sync        a newer version is published (or nothing is installed yet)
+    20 = stale       share not reachable and the local copy is older than max-age-days,
+                     or the published version itself is (the exports have stopped)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import datetime
+import sys
+
+from arcreaderexport.manifest import readVersion
+
+SHARE_PATH = r'S:\GIS_Public\GIS_Data\MapDocuments\Published_Maps\ArcReaderRemoteUpdate'
+LOCAL_PATH = r'C:\ArcReader'
+
+CURRENT = 'current'
+OFFLINE = 'offline'
+SYNC = 'sync'
+STALE = 'stale'
+EXIT_CODES = {CURRENT: 0, OFFLINE: 0, SYNC: 10, STALE: 20}
+
+
+def ageDays(versionInfo, now=None):
+    """Returns the age in days of a version file's publish time (None if unknown)."""
+    try:
+        published = datetime.datetime.strptime(versionInfo['published'], '%Y-%m-%dT%H:%M:%S')
+    except (KeyError, TypeError, ValueError):
+        return None
+    return ((now or datetime.datetime.now()) - published).total_seconds() / 86400.0
+
+
+def checkFreshness(sharePath=SHARE_PATH, localPath=LOCAL_PATH, maxAgeDays=7, now=None):
+    """
+    PURPOSE:
+    Function compares the published version file with the laptop's copy and returns
+    a dictionary with the 'decision' ('current', 'offline', 'sync', 'stale'), both
+    versions, the local & published ages in days and a message for the field worker.
+    A laptop that has the published version is still warned ('stale') when that version
+    is older than maxAgeDays, since no newer export has been published.
+
+    PARAMETERS:
+    sharePath = string path of the published bundle folder (the S: share, or any local folder).
+    localPath = string path of the laptop's bundle folder.
+    maxAgeDays = age in days after which an offline laptop (or the published version) is warned.
+    now = datetime used as the current time (now by default).
+    """
+    published = readVersion(sharePath)
+    local = readVersion(localPath)
+    age = ageDays(local, now) if local else None
+    publishedAge = ageDays(published, now) if published else None
+    result = {
+        'sharedVersion': published.get('version') if published else None,
+        'localVersion': local.get('version') if local else None,
+        'localPublished': local.get('published') if local else None,
+        'localAgeDays': round(age, 1) if age is not None else None,
+        'publishedAgeDays': round(publishedAge, 1) if publishedAge is not None else None,
+    }
+    if published is None:
+        if age is not None and age <= maxAgeDays:
+            result['decision'] = OFFLINE
+            result['message'] = 'City network not available; ArcReader data from {0} is {1:0.0f} day(s) old.'.format(
+                result['localPublished'], age)
+        else:
+            result['decision'] = STALE
+            result['message'] = ('ArcReader map & database are more than {0:g} days old{1}. Please connect to the '
+                                 'City network and update the map as soon as possible.').format(
+                maxAgeDays, ' (published {0})'.format(result['localPublished']) if local else ' or missing')
+    elif local is None or int(published.get('version', 0)) > int(local.get('version', 0)):
+        result['decision'] = SYNC
+        result['message'] = 'A newer ArcReader database is available (version {0}, published {1}).'.format(
+            published.get('version'), published.get('published'))
+    elif publishedAge is not None and publishedAge > maxAgeDays:
+        result['decision'] = STALE
+        result['message'] = ('ArcReader map & database are up to date, but the latest version was published '
+                             '{0:0.0f} days ago ({1}). Please let GIS know the map is no longer being updated.').format(
+            publishedAge, published.get('published'))
+    else:
+        result['decision'] = CURRENT
+        result['message'] = 'ArcReader map & database are up to date (version {0}, published {1}).'.format(
+            local.get('version'), local.get('published'))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='freshness', description='Check whether the laptop ArcReader data is current.')
+    parser.add_argument('--share', default=SHARE_PATH, help='published bundle folder')
+    parser.add_argument('--local', default=LOCAL_PATH, help='laptop bundle folder')
+    parser.add_argument('--max-age-days', type=float, default=7, help='warn when offline data is older than this')
+    args = parser.parse_args(argv)
+
+    result = checkFreshness(args.share, args.local, args.max_age_days)
+    print(result['message'])
+    return EXIT_CODES[result['decision']]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""
+GeoPackage (OGC, SQLite) output for the export, usable without arcpy.
+
+The export normally writes PortableDuluth.gdb with arcpy, so it only runs on a
+Windows machine with ArcGIS. GeoPackageStore writes the same feature datasets &
+classes as portableGISdict into one .gpkg file with the standard library's sqlite3,
+so the pipeline & its benchmarks also run on Linux build machines:
+
+    * one feature table per class (OBJECTID, SHAPE, attributes); the feature dataset
+      of each class is kept in the arcreader_datasets table (GeoPackage has no
+      feature datasets), output paths are 'Dataset/Class' like in the file gdb
+    * geometry stored as GeoPackage binary (header + envelope + WKB)
+    * an R-tree spatial index per feature class (gpkg_rtree_index extension); rows
+      are added to it directly during the bulk load and its triggers are created
+      when the inserter closes, so later edits by ArcGIS / QGIS keep it current
+    * WAL journal & synchronous=NORMAL while loading, each batch one transaction;
+      close() checkpoints the WAL & switches back to a rollback journal so the
+      result is a single file that can be copied to the laptops
+    * page size chosen when the file is created (8 KiB default, see
+      benchmarks/bench_geopackage.py for throughput by batch & page size)
+
+GeoPackageStore has the writer methods used by streamcopy (createLike, openInsert)
+and the reader methods of validate.ArcpyReader (describe, iterBatches), so
+streamcopy.streamCopy and validate.compareClass work on it unchanged.
+
+    python -m arcreaderexport.geopackage --output PortableDuluth.gpkg [--tier weekly] [--source-store stand-in.sqlite]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+
+from arcreaderexport.layers import FULL_TIER, SDE_CONNECTION, TIERS, layersForTier
+from arcreaderexport.localstore import BBOX_COLUMNS, wkbBounds, wkbMetrics
+from arcreaderexport.streamcopy import DEFAULT_BATCH_SIZE, streamCopy
+
+OID_FIELD = 'OBJECTID'
+GEOMETRY_FIELD = 'SHAPE'
+DEFAULT_PAGE_SIZE = 8192
+DATASETS_TABLE = 'arcreader_datasets'
+
+GPKG_APPLICATION_ID = 0x47504B47     # 'GPKG'
+GPKG_USER_VERSION = 10200            # GeoPackage 1.2
+
+_SQL_TYPES = {'String': 'TEXT', 'Integer': 'INTEGER', 'SmallInteger': 'SMALLINT', 'Double': 'DOUBLE',
+              'Single': 'FLOAT', 'Date': 'DATETIME', 'Guid': 'TEXT', 'GlobalID': 'TEXT', 'Blob': 'BLOB'}
+_FIELD_TYPES = {'TEXT': 'String', 'INTEGER': 'Integer', 'SMALLINT': 'SmallInteger', 'MEDIUMINT': 'Integer',
+                'DOUBLE': 'Double', 'REAL': 'Double', 'FLOAT': 'Single', 'DATETIME': 'Date', 'DATE': 'Date',
+                'BLOB': 'Blob'}
+_GEOMETRY_TYPES = {'Point': 'POINT', 'Multipoint': 'MULTIPOINT', 'Polyline': 'MULTILINESTRING',
+                   'Polygon': 'MULTIPOLYGON'}
+_SHAPE_TYPES = dict((value, key) for key, value in _GEOMETRY_TYPES.items())
+
+_CORE_TABLES = [
+    'CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, '
+    'organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)',
+    "CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, "
+    "description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')), "
+    "min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER, "
+    "CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))",
+    'CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, '
+    'geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL, '
+    'CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name), '
+    'CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name), '
+    'CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))',
+    'CREATE TABLE gpkg_extensions (table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, '
+    'definition TEXT NOT NULL, scope TEXT NOT NULL, '
+    'CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))',
+    'CREATE TABLE {0} (table_name TEXT NOT NULL PRIMARY KEY, dataset TEXT)'.format(DATASETS_TABLE),
+]
+
+_CORE_SRS = [
+    ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+    ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+    ('WGS 84 geodetic', 4326, 'EPSG', 4326,
+     'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,AUTHORITY["EPSG","7030"]],'
+     'AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+     'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]',
+     'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid'),
+]
+
+# R-tree triggers of the gpkg_rtree_index extension; {t} = table, {c} = geometry column, {i} = id column
+_RTREE_TRIGGERS = [
+    'CREATE TRIGGER "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}" WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}")) '
+    'BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), '
+    'ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update1" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND '
+    '(NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}")) BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES '
+    '(NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND '
+    '(NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update3" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND '
+    '(NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; '
+    'INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), '
+    'ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND '
+    '(NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD."{i}", NEW."{i}"); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}" WHEN old."{c}" NOT NULL '
+    'BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END',
+]
+
+
+def _quote(name):
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+def _splitPath(path):
+    """Returns (dataset or None, class name) of 'Dataset/Class', 'Dataset\\Class' or 'Class'."""
+    parts = [part for part in path.replace('\\', '/').split('/') if part]
+    return ('/'.join(parts[:-1]) or None), parts[-1]
+
+#-------------------------------------------------------------------------------------------------------
+# GeoPackage binary geometry (header + envelope + WKB)
+#-------------------------------------------------------------------------------------------------------
+
+def gpkgGeometry(wkb, srsId=-1):
+    """Returns the GeoPackage binary blob of a WKB geometry, with its xy envelope, and the envelope."""
+    minx, miny, maxx, maxy = wkbBounds(wkb)
+    # flags: little-endian header (bit 0), envelope [minx, maxx, miny, maxy] (bits 1-3 = 1)
+    return struct.pack('<2sBBi4d', b'GP', 0, 0x03, srsId, minx, maxx, miny, maxy) + bytes(wkb), (minx, miny, maxx, maxy)
+
+
+def _headerSize(blob):
+    flags = bytearray(blob[3:4])[0]
+    return 8 + {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}[(flags >> 1) & 0x07]
+
+
+def gpkgWkb(blob):
+    """Returns the WKB part of a GeoPackage binary geometry."""
+    return bytes(blob[_headerSize(blob):])
+
+
+def _envelope(blob):
+    """Returns (minx, maxx, miny, maxy) of a GeoPackage geometry, read from its header when it has one."""
+    if blob is None:
+        return None
+    flags = bytearray(blob[3:4])[0]
+    if flags & 0x10:
+        return None     # empty geometry
+    if (flags >> 1) & 0x07:
+        return struct.unpack_from('<4d' if flags & 0x01 else '>4d', blob, 8)
+    minx, miny, maxx, maxy = wkbBounds(gpkgWkb(blob))
+    return minx, maxx, miny, maxy
+
+
+def _registerFunctions(connection):
+    """Registers the ST_ functions the R-tree triggers call (normally provided by ArcGIS / GDAL / SpatiaLite)."""
+    connection.create_function('ST_IsEmpty', 1, lambda blob: 1 if _envelope(blob) is None else 0)
+    for name, index in (('ST_MinX', 0), ('ST_MaxX', 1), ('ST_MinY', 2), ('ST_MaxY', 3)):
+        connection.create_function(name, 1, lambda blob, index=index: (_envelope(blob) or (None,) * 4)[index])
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class GeoPackageStore(object):
+    """
+    PURPOSE:
+    Feature classes & tables in one GeoPackage file, written in bulk transactions & read in batches.
+
+    PARAMETERS:
+    gpkgPath = string path of the .gpkg file (created if missing).
+    pageSize = SQLite page size in bytes for a new file (512 - 65536, a power of 2).
+    cacheKb = SQLite page cache size in KiB.
+    srsId = spatial reference id of new feature classes (-1 = undefined cartesian).
+    srsDefinition = (name, organization, organization id, WKT) to register srsId with, if it is not -1, 0 or 4326.
+    wal = True to load in WAL journal mode (switched back to a rollback journal on close).
+    """
+
+    def __init__(self, gpkgPath, pageSize=DEFAULT_PAGE_SIZE, cacheKb=16384, srsId=-1, srsDefinition=None, wal=True):
+        self.gpkgPath = gpkgPath
+        self.srsId = srsId
+        self.wal = wal
+        created = not os.path.exists(gpkgPath) or os.path.getsize(gpkgPath) == 0
+        self.connection = sqlite3.connect(gpkgPath)
+        _registerFunctions(self.connection)
+        if created:
+            self.connection.execute('PRAGMA page_size = {0:d}'.format(pageSize))   # only before the first table
+            self.connection.execute('PRAGMA application_id = {0:d}'.format(GPKG_APPLICATION_ID))
+            self.connection.execute('PRAGMA user_version = {0:d}'.format(GPKG_USER_VERSION))
+            with self.connection:
+                for sql in _CORE_TABLES:
+                    self.connection.execute(sql)
+                self.connection.executemany('INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', _CORE_SRS)
+        if srsDefinition and srsId not in (-1, 0, 4326):
+            name, organization, organizationId, wkt = srsDefinition
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+                                        (name, srsId, organization, organizationId, wkt, None))
+        self.connection.execute('PRAGMA cache_size = -{0:d}'.format(cacheKb))
+        if wal:
+            self.connection.execute('PRAGMA journal_mode = WAL')
+            self.connection.execute('PRAGMA synchronous = NORMAL')
+
+    def __repr__(self):
+        return 'GeoPackageStore({0!r})'.format(self.gpkgPath)
+
+    def close(self):
+        """Checkpoints the WAL into the file & leaves a single self-contained .gpkg."""
+        if self.connection is None:
+            return
+        if self.wal:
+            self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.connection.execute('PRAGMA journal_mode = DELETE')
+        self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _geometryColumn(self, table):
+        row = self.connection.execute('SELECT column_name, geometry_type_name, srs_id FROM gpkg_geometry_columns '
+                                      'WHERE table_name = ?', (table,)).fetchone()
+        return row
+
+    def layout(self):
+        """Returns {dataset: [class names]} of the classes in the GeoPackage (None = no dataset)."""
+        result = {}
+        for table, dataset in self.connection.execute(
+                'SELECT c.table_name, d.dataset FROM gpkg_contents c LEFT JOIN {0} d ON d.table_name = c.table_name '
+                'ORDER BY c.table_name'.format(DATASETS_TABLE)):
+            result.setdefault(dataset, []).append(table)
+        return result
+
+    def listClasses(self):
+        return [row[0] for row in self.connection.execute('SELECT table_name FROM gpkg_contents ORDER BY table_name')]
+
+    def createClass(self, path, fields, shapeType=None, srsId=None):
+        """
+        PURPOSE:
+        Creates (or replaces) a feature table (shapeType 'Point', 'Multipoint', 'Polyline',
+        'Polygon') with its R-tree, or an attribute table (shapeType None).
+
+        PARAMETERS:
+        path = 'Dataset/Class' or class name.
+        fields = list of (field name, arcpy field type) of the attribute fields.
+        shapeType = geometry type, or None for a table.
+        srsId = spatial reference id (the store's srsId by default).
+        """
+        dataset, table = _splitPath(path)
+        srsId = self.srsId if srsId is None else srsId
+        fields = [(name, fieldType) for name, fieldType in fields
+                  if fieldType not in ('OID', 'Geometry') and name not in BBOX_COLUMNS]
+        columns = ['{0} INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL'.format(_quote(OID_FIELD))]
+        if shapeType:
+            columns.append('{0} {1}'.format(_quote(GEOMETRY_FIELD), _GEOMETRY_TYPES.get(shapeType, 'GEOMETRY')))
+        columns.extend('{0} {1}'.format(_quote(name), _SQL_TYPES.get(fieldType, 'TEXT')) for name, fieldType in fields)
+        self._drop(table)
+        with self.connection:
+            self.connection.execute('CREATE TABLE {0} ({1})'.format(_quote(table), ', '.join(columns)))
+            self.connection.execute('INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, ?, ?, ?)',
+                                    (table, 'features' if shapeType else 'attributes', table, srsId if shapeType else None))
+            self.connection.execute('INSERT INTO {0} VALUES (?, ?)'.format(DATASETS_TABLE), (table, dataset))
+            if shapeType:
+                self.connection.execute('INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, 0, 0)',
+                                        (table, GEOMETRY_FIELD, _GEOMETRY_TYPES.get(shapeType, 'GEOMETRY'), srsId))
+                self.connection.execute('CREATE VIRTUAL TABLE {0} USING rtree(id, minx, maxx, miny, maxy)'.format(
+                    _quote('rtree_{0}_{1}'.format(table, GEOMETRY_FIELD))))
+                self.connection.execute("INSERT INTO gpkg_extensions VALUES (?, ?, 'gpkg_rtree_index', "
+                                        "'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')",
+                                        (table, GEOMETRY_FIELD))
+
+    def _drop(self, table):
+        with self.connection:
+            self.connection.execute('DROP TABLE IF EXISTS {0}'.format(_quote(table)))
+            self.connection.execute('DROP TABLE IF EXISTS {0}'.format(_quote('rtree_{0}_{1}'.format(table, GEOMETRY_FIELD))))
+            for sql in ('DELETE FROM gpkg_extensions WHERE table_name = ?',
+                        'DELETE FROM gpkg_geometry_columns WHERE table_name = ?',
+                        'DELETE FROM gpkg_contents WHERE table_name = ?',
+                        'DELETE FROM {0} WHERE table_name = ?'.format(DATASETS_TABLE)):
+                self.connection.execute(sql, (table,))
+
+    def createLike(self, outputPath, sourcePath, description):
+        """Creates outputPath with the fields & geometry type of a describe() result (sourcePath is not needed here)."""
+        userFields = [field for field in description['fields'] if field[1] not in ('OID', 'Geometry')]
+        shapeType = description.get('shapeType') or ('Geometry' if description.get('hasShape') else None)
+        self.createClass(outputPath, userFields, shapeType)
+
+    def describe(self, path):
+        """Returns {'exists', 'count', 'extent', 'fields', 'hasShape', 'shapeType'} like ArcpyReader.describe."""
+        _, table = _splitPath(path)
+        if self.connection.execute('SELECT 1 FROM gpkg_contents WHERE table_name = ?', (table,)).fetchone() is None:
+            return {'exists': False}
+        geometry = self._geometryColumn(table)
+        count = self.connection.execute('SELECT COUNT(*) FROM {0}'.format(_quote(table))).fetchone()[0]
+        extent = None
+        if geometry:
+            extent = self.connection.execute('SELECT MIN(minx), MIN(miny), MAX(maxx), MAX(maxy) FROM {0}'.format(
+                _quote('rtree_{0}_{1}'.format(table, geometry[0])))).fetchone()
+            extent = None if extent[0] is None else tuple(extent)
+        fields = []
+        for _, name, sqlType, _, _, primaryKey in self.connection.execute('PRAGMA table_info({0})'.format(_quote(table))):
+            if primaryKey:
+                fields.append((name, 'OID'))
+            elif geometry and name == geometry[0]:
+                fields.append((name, 'Geometry'))
+            else:
+                fields.append((name, _FIELD_TYPES.get(sqlType.upper(), 'String')))
+        return {'exists': True, 'count': count, 'extent': extent, 'fields': fields, 'hasShape': bool(geometry),
+                'shapeType': _SHAPE_TYPES.get(geometry[1]) if geometry else None,
+                'spatialReference': geometry[2] if geometry else None}
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        """
+        PURPOSE:
+        Yields lists of up to batchSize row tuples; 'SHAPE@' / 'SHAPE@WKB' return WKB and
+        'SHAPE@XY', 'SHAPE@LENGTH', 'SHAPE@AREA' are derived from it.
+
+        PARAMETERS:
+        path = 'Dataset/Class' or class name.
+        fields = field names and cursor tokens to read.
+        batchSize = rows per batch.
+        where = optional SQL condition.
+        """
+        _, table = _splitPath(path)
+        columns, derived = [], []
+        for field in fields:
+            if field == 'OID@':
+                columns.append(_quote(OID_FIELD))
+            elif field.startswith('SHAPE@'):
+                columns.append(_quote(GEOMETRY_FIELD))
+                derived.append((len(columns) - 1, field))
+            else:
+                columns.append(_quote(field))
+        sql = 'SELECT {0} FROM {1}'.format(', '.join(columns), _quote(table))
+        if where:
+            sql += ' WHERE ' + where
+        cursor = self.connection.execute(sql + ' ORDER BY {0}'.format(_quote(OID_FIELD)))
+        try:
+            while True:
+                rows = cursor.fetchmany(batchSize)
+                if not rows:
+                    break
+                if derived:
+                    rows = [self._deriveShape(row, derived) for row in rows]
+                yield rows
+        finally:
+            cursor.close()
+
+    def _deriveShape(self, row, derived):
+        row = list(row)
+        for index, token in derived:
+            if row[index] is None:
+                continue
+            wkb = gpkgWkb(row[index])
+            if token in ('SHAPE@', 'SHAPE@WKB'):
+                row[index] = wkb
+            else:
+                centroid, length, area = wkbMetrics(wkb)
+                row[index] = {'SHAPE@XY': centroid, 'SHAPE@LENGTH': length, 'SHAPE@AREA': area}[token]
+        return tuple(row)
+
+    def openInsert(self, path, fields):
+        """Returns an inserter with insertRows(rows) & close(); each batch is one transaction."""
+        return _Inserter(self, path, fields)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class _Inserter(object):
+
+    def __init__(self, store, path, fields):
+        self.store = store
+        self.connection = store.connection
+        _, self.table = _splitPath(path)
+        geometry = store._geometryColumn(self.table)
+        self.srsId = geometry[2] if geometry else -1
+        self.rtree = 'rtree_{0}_{1}'.format(self.table, GEOMETRY_FIELD) if geometry else None
+        self.shapeIndex = None
+        columns = [_quote(OID_FIELD)]
+        for index, field in enumerate(fields):
+            if field in ('SHAPE@', 'SHAPE@WKB'):
+                self.shapeIndex = index
+                columns.append(_quote(GEOMETRY_FIELD))
+            else:
+                columns.append(_quote(field))
+        self.sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(_quote(self.table), ', '.join(columns),
+                                                               ', '.join('?' * len(columns)))
+        # Rows are numbered here so the R-tree can be filled in the same pass; once its
+        # triggers exist (a class appended to later) they keep the R-tree current instead.
+        self.triggers = self.rtree is not None and self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (self.rtree + '_insert',)).fetchone() is not None
+        self.nextOid = (self.connection.execute('SELECT MAX({0}) FROM {1}'.format(
+            _quote(OID_FIELD), _quote(self.table))).fetchone()[0] or 0) + 1
+        self.extent = None
+        self.rows = 0
+
+    def insertRows(self, rows):
+        index = self.shapeIndex
+        values, boxes = [], []
+        for offset, row in enumerate(rows):
+            oid = self.nextOid + offset
+            row = tuple(row)
+            if index is not None and row[index] is not None:
+                blob, (minx, miny, maxx, maxy) = gpkgGeometry(row[index], self.srsId)
+                row = row[:index] + (sqlite3.Binary(blob),) + row[index + 1:]
+                boxes.append((oid, minx, maxx, miny, maxy))
+            values.append((oid,) + row)
+        with self.connection:
+            self.connection.executemany(self.sql, values)
+            if boxes and not self.triggers:
+                self.connection.executemany('INSERT INTO {0} VALUES (?, ?, ?, ?, ?)'.format(_quote(self.rtree)), boxes)
+        if boxes:
+            minx = min(box[1] for box in boxes)
+            maxx = max(box[2] for box in boxes)
+            miny = min(box[3] for box in boxes)
+            maxy = max(box[4] for box in boxes)
+            if self.extent is not None:
+                minx, miny = min(minx, self.extent[0]), min(miny, self.extent[1])
+                maxx, maxy = max(maxx, self.extent[2]), max(maxy, self.extent[3])
+            self.extent = (minx, miny, maxx, maxy)
+        self.nextOid += len(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        """Records the class extent in gpkg_contents & creates the R-tree triggers after the bulk load."""
+        if self.connection is None:
+            return
+        with self.connection:
+            if self.extent is not None:
+                old = self.connection.execute('SELECT min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name = ?',
+                                              (self.table,)).fetchone()
+                extent = self.extent if old is None or old[0] is None else (
+                    min(old[0], self.extent[0]), min(old[1], self.extent[1]),
+                    max(old[2], self.extent[2]), max(old[3], self.extent[3]))
+                self.connection.execute("UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?, "
+                                        "last_change = strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE table_name = ?",
+                                        extent + (self.table,))
+            if self.rtree is not None and not self.triggers:
+                for sql in _RTREE_TRIGGERS:
+                    self.connection.execute(sql.format(t=self.table, c=GEOMETRY_FIELD, i=OID_FIELD))
+                self.triggers = True
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def sdeSourcePath(dataset, fc):
+    """Returns the SDE path of a portableGISdict class, as CreateRemoteArcReaderGDB_v2.py builds it."""
+    return SDE_CONNECTION + '\\sde.SDE.' + dataset + '\\sde.SDE.' + fc
+
+
+def exportLayout(reader, store, fdToFc_Dict, sourcePathFn=sdeSourcePath, batchSize=DEFAULT_BATCH_SIZE, logger=None):
+    """
+    PURPOSE:
+    Function streams every class of a portableGISdict-style dictionary into the GeoPackage
+    as 'Dataset/Class' and returns {class: streamCopy stats}; missing sources are reported
+    with an 'error' entry and skipped.
+
+    PARAMETERS:
+    reader = object with describe() & iterBatches() for the sources (ArcpyReader, LocalStore).
+    store = GeoPackageStore written to.
+    fdToFc_Dict = dictionary of feature dataset -> list of feature classes.
+    sourcePathFn = function (dataset, fc) -> source path.
+    batchSize = rows per bulk insert transaction.
+    """
+    results = {}
+    for dataset in sorted(fdToFc_Dict):
+        for fc in fdToFc_Dict[dataset]:
+            try:
+                results[fc] = streamCopy(reader, store, sourcePathFn(dataset, fc), dataset + '/' + fc, batchSize)
+            except IOError as e:
+                results[fc] = {'error': str(e)}
+                if logger is not None:
+                    logger.info('XXX GeoPackage export of {0} failed: {1}'.format(fc, e))
+                continue
+            if logger is not None:
+                logger.info('Exported {0} rows of {1} to {2}'.format(results[fc]['rows'], fc, store.gpkgPath))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='geopackage', description='Export the portableGISdict layers to a GeoPackage.')
+    parser.add_argument('--output', required=True, help='.gpkg file to write (replaced if it exists)')
+    parser.add_argument('--tier', choices=TIERS, default=FULL_TIER)
+    parser.add_argument('--source-store', help='local stand-in SQLite store (localstore) to read instead of SDE')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--srs-id', type=int, default=-1)
+    args = parser.parse_args(argv)
+
+    if args.source_store:
+        from arcreaderexport.localstore import LocalStore
+        reader, sourcePathFn = LocalStore(args.source_store), lambda dataset, fc: fc
+    else:
+        from arcreaderexport.validate import ArcpyReader
+        reader, sourcePathFn = ArcpyReader(), sdeSourcePath
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    started = time.time()
+    with GeoPackageStore(args.output, pageSize=args.page_size, srsId=args.srs_id) as store:
+        results = exportLayout(reader, store, layersForTier(args.tier), sourcePathFn, args.batch_size)
+    failed = sorted(fc for fc, result in results.items() if 'error' in result)
+    print(json.dumps({'output': args.output, 'seconds': round(time.time() - started, 3),
+                      'rows': sum(result.get('rows', 0) for result in results.values()),
+                      'bytes': os.path.getsize(args.output), 'failed': failed, 'classes': results},
+                     indent=2, sort_keys=True))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Layers exported to PortableDuluth.gdb and how often each one is refreshed.
+
+portableGISdict maps each feature dataset to the feature classes copied from SDE
+(moved here from CreateRemoteArcReaderGDB_v2.py so the scheduler & later tools can
+read it without importing arcpy). Every layer belongs to one refresh tier:
+
+    hourly  = hot layers edited during the day (GPS points, pavement restoration)
+    nightly = layers that change daily (Assessor's table, downloaded each night)
+    weekly  = everything else; the weekly run is the full rebuild of the gdb
+
+A run of one tier exports the layers of that tier and of every more frequent tier,
+so a nightly run also refreshes the hourly layers. Hourly & nightly runs update the
+published gdb in place and are published as incremental versions.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+HOURLY = 'hourly'
+NIGHTLY = 'nightly'
+WEEKLY = 'weekly'
+TIERS = (HOURLY, NIGHTLY, WEEKLY)    # most to least frequent
+FULL_TIER = WEEKLY
+
+# Sources & output of the export (as used by CreateRemoteArcReaderGDB_v2.py)
+SDE_CONNECTION = r'Database Connections\cihl-gisdat-01_sde_current_gisuser.sde'
+DEFAULT_GDB = 'S:/GIS_Public/GIS_Data/DefaultGDB/ArcReaderUpdate_files.gdb'
+ASSESSOR_TABLE = r'Database Connections\cihl-databa-01_MCIS.sde\Assessor.dbo.vwGISParcel'
+COUNTY_SDE = 'Database Connections/slc_sde_viewer.sde/'
+PUBLISH_DIR = 'S:/GIS_Public/GIS_Data/MapDocuments/Published_Maps/ArcReaderRemoteUpdate/'
+PORTABLE_GDB = PUBLISH_DIR + 'PortableDuluth.gdb'
+
+##
+### Test dictionary (less data)
+##portableGISdict = {
+##    'Buildings': [
+##        'Buildings_DLH' 
+##    ],
+##
+##    'LakeSuperior': [
+##        'Lake',
+##        'LakeNoIsland',
+##        'Shoreline'
+##    ],
+##
+##    # this dataset won't show feature classes in versions??
+##    'Landuse': [
+##        'Shoreland_Management_Zones'
+##    ],
+##
+##    'Maintenance': [
+##        'UtilityOps_PavementRestorationPts',
+##        'UtilityOps_PavementRestoration'
+##    ],
+##
+##    'GPS': [
+##        'EngGPSPts'
+##    ]
+##}
+
+
+# Dictionary for feature datasets with
+portableGISdict = {
+    'Buildings': [
+        'Buildings_DLH' 
+    ],
+
+    'LakeSuperior': [
+        'Lake',
+        'LakeNoIsland',
+        'Shoreline'
+    ],
+
+    # this dataset won't show feature classes in versions??
+    'Landuse': [
+        'Shoreland_Management_Zones'
+    ],
+
+
+    'Maintenance': [
+        'UtilityOps_PavementRestorationPts',
+        'UtilityOps_PavementRestoration'
+    ],
+
+    'GPS': [
+        'EngGPSPts'
+    ],
+
+    'Streams': [
+        'DuluthStream_cl',
+        'DuluthStreams_Ortho',
+        'wrmo',
+        'floodplain_stlouisco'
+    ],
+
+    'DEM': [
+        'dem_ctour10ft'
+    ],
+
+    'Streets': [
+        'Streets_PM',
+        'Streets_DouglasCO'
+    ],
+
+# Un-comment out feature classes when new SDE schema is used
+    'Gas': [
+        'gasMeterSetting'
+        ,'gasCPRectifierCable'
+        ,'gasShutDown_Section'
+        ,'gasCPRectifier'
+        ,'gasValve'
+        ,'gasManholes'
+        ,'gasCPTestPoint'
+        ,'gasCPAnode'
+        ,'gasDistribution_MainAnno'
+        ,'gasValveAnno'
+        ,'gasControllableFitting'
+        ,'gasRegulatorStation'
+        ,'GasPipeCasing'
+        ,'gasNonControllableFitting'
+        ,'gasTownBorderStation'
+        ,'gasSection_ValveAnno'
+        ,'gasDistributionMain'
+        ,'GasServices'
+        ,'gasVault'
+        ,'gasTransmissionMain'
+        ,'gasAbandonedGasPipe'
+        #,'gasFuelLine'
+        #,'gasValve_Bypass'
+        #,'gasValve_EFV'
+        #,'gasValve_Line'
+        #,'gasValve_Regulator'
+        #,'gasValve_Section'
+        #,'gasValve_Service'  
+    ],
+
+    'Watersheds': [
+        'Watersheds_DLH'
+    ],
+
+    'Cadastral': [
+        'Curblines',
+        'Boundary'
+    ],
+
+    'limits': [
+        'engProjectAreas',
+        'wgareas',
+        'duluthbndline',
+        'cityarea'
+    ],
+
+    'SteamSystem': [
+        'SteamTraps',
+        'SteamManholes',
+        'SteamAnchors',
+        'Meter_Address',
+        'SteamLateral_Anno',
+        'MeterBuildingParcel',
+        'SteamCasings',
+        'SteamMapBnd',
+        'SteamAnodeWire',
+        'SteamLateral',
+        'SteamVault',
+        'SteamMains',
+        'SteamAnode',
+        'SteamFittings',
+        'SteamMain_Anno',
+        'LeaderLines',
+        'SteamValves'
+    ],
+
+    'SanitarySewerNetwork': [
+        'ssAnnoLeaders',
+        'ssAnno',
+        'ssLateralLine',
+        'ssMeter',
+        'ssSystemValve',
+        'ssControlValve',
+        'ssFitting',
+        'ssNetworkStructure',
+        'ssGravityMain',
+        'ssWyes',
+        'ssPump',
+        'ssManhole',
+        'ssCleanOut',
+        'ssDischargePoint',
+        'ssPressurizedMain'
+    ],
+
+    'SanitarySewerFeatures': [
+        'TracerBox'
+    ],
+
+    'Water_Distribution_Features': [
+        'wUndergroundEnclosure',
+        'wAnode',
+        'wCasing',
+        'wOperationalAreas',
+        'wWaterStructure',
+        'wInsulation'
+    ],
+
+    'Water_Distribution_Network': [
+        'wFitting',
+        'wNetworkStructure',
+        'wControlValve',
+        'wRegulatorStation',
+        'wPressurizedMain',
+        'wHydrant',
+        'wServiceValves',
+        'wLateralLine',
+        'wGravityMainAnno',
+        'wSystemValve',
+        'wSystemValveAnno',
+        'wGravityMain',
+        'wManhole'
+    ],
+
+    'ParcelFeatures': [
+        'LotAnno',
+        'PLS_lines',
+        'ROW',
+        'corners_pls',
+        'StreetName',
+        'Subdivision',
+        'BoundaryDLH',
+        'survey_pts',
+        'Block',
+        'QuarterQuarter',
+        'Sections',
+        'Quarters',
+        'Discrepancy_Pts',
+        'Lots',
+        'ParcelAnno',
+        'Parcels'
+    ],
+
+    'StormSewerFeatures': [
+        'stsCatchment',
+        'stsConstruction',
+        'stsBMP_Systems',
+        'stsWaterStructure'
+    ],
+
+    'StormSewerNetwork': [
+        'stsFitting',
+        'stsAnnoCB',
+        'stsNetworkStructure',
+        'stsAnno',
+        'stsAnnoLeaders',
+        'stsInletsOutlets',
+        'stsGravityMain',
+        'stsSystemValve',
+        'stsCatchBasin',
+        'stsAnnoCBLeaders',
+        'stsManhole',
+        'stsPressurizedMain'
+    ]
+
+}
+
+
+# Refresh tier of each layer that is not weekly: feature class names in portableGISdict
+# plus the extra tasks of CreateRemoteArcReaderGDB_v2.py ('Sections_SLC', 'Assessor', 'Rice_Lake_Twnshp').
+layerTiers = {
+    'EngGPSPts': HOURLY,
+    'UtilityOps_PavementRestorationPts': HOURLY,
+    'UtilityOps_PavementRestoration': HOURLY,
+    'Assessor': NIGHTLY,
+}
+
+# Large plain feature classes copied with the memory-bounded streaming copy (arcreaderexport.streamcopy)
+# instead of FeatureClassToFeatureClass, and the rows read & inserted per batch.
+STREAMING_COPY_CLASSES = ('Parcels', 'dem_ctour10ft')
+STREAMING_BATCH_SIZE = 5000
+
+# Versioned hot layers kept up to date from their SDE adds / deletes tables (arcreaderexport.changecapture):
+# incremental runs only copy the rows edited since the last export instead of the whole class.
+CHANGE_CAPTURE_CLASSES = ('EngGPSPts', 'UtilityOps_PavementRestorationPts', 'UtilityOps_PavementRestoration')
+
+# Annotation classes of portableGISdict (leader lines are plain line classes), copied without their
+# unplaced & empty annotation (arcreaderexport.annotation)
+ANNOTATION_CLASSES = tuple(sorted(fc for fcs in portableGISdict.values() for fc in fcs
+                                  if 'anno' in fc.lower() and not fc.endswith('Leaders')))
+
+# AnnotationClassIDs switched off in TapNCurb.pmf, per annotation feature class; they are not exported
+HIDDEN_ANNOTATION_CLASSES = {}
+
+# Per-theme annotation merged into one class: merged name -> dataset, member classes & reference scale.
+## Off until TapNCurb.pmf points at the merged classes, e.g.
+##    'stsAnnoAll': {'dataset': 'StormSewerNetwork', 'classes': ('stsAnno', 'stsAnnoCB'), 'referenceScale': 1200},
+ANNOTATION_MERGE_GROUPS = {}
+
+# Feature datasets holding a geometric network. The laptops only view them (no tracing), so their plain
+# classes are copied together as simple features in one bulk copy per dataset; the network topology &
+# connectivity are not copied or rebuilt. Empty this to copy them class by class.
+FLATTENED_NETWORK_DATASETS = ('SanitarySewerNetwork', 'StormSewerNetwork', 'Water_Distribution_Network')
+
+# Copy tasks of step 3a run at once, and the most of them reading one source at a time; how many do is tuned
+# during the run (arcreaderexport.autotune). COPY_WORKERS = 1 copies one class at a time. The copies run on
+# threads, so only the thread-safe LocalBackend runs them at once: production exports (the arcpy backend)
+# always copy one class at a time, whatever these are set to.
+COPY_WORKERS = 4
+COPY_WORKERS_PER_SOURCE = 4
+
+# Feature classes with at least this many rows are stored in the order of a space-filling curve over their
+# centroids after a full rebuild (arcreaderexport.optimize), so a small map extent is read from few pages.
+SPATIAL_ORDER_MIN_ROWS = 5000
+SPATIAL_ORDER_CURVE = 'hilbert'     # or 'zorder'
+
+# Write the streamed classes (STREAMING_COPY_CLASSES) in SPATIAL_ORDER_CURVE order as they are copied, on
+# incremental runs too; the post-build stage then finds them already in order.
+SPATIAL_SORT_ON_WRITE = True
+
+# Prometheus metrics of the export (arcreaderexport.metrics), written at the start & end of each run for the
+# textfile collector of windows_exporter / node_exporter; also served over HTTP on METRICS_PORT while a run
+# is going (None: not served).
+METRICS_TEXTFILE = r'C:\Program Files\windows_exporter\textfile_inputs\arcreaderexport.prom'
+METRICS_PORT = None
+
+
+def layerTier(name, tiers=None):
+    """Returns the refresh tier of a feature class or task name (weekly unless listed in layerTiers)."""
+    return (layerTiers if tiers is None else tiers).get(name, WEEKLY)
+
+
+def includesLayer(runTier, name, tiers=None):
+    """Returns True if a run of runTier exports the layer 'name'."""
+    return TIERS.index(layerTier(name, tiers)) <= TIERS.index(runTier)
+
+
+def layersForTier(runTier, fdToFc_Dict=None, tiers=None):
+    """
+    PURPOSE:
+    Function returns the part of a feature dataset / feature class dictionary that a
+    run of runTier exports (datasets without any such feature class are left out).
+
+    PARAMETERS:
+    runTier = 'hourly', 'nightly' or 'weekly'.
+    fdToFc_Dict = dictionary like portableGISdict (portableGISdict by default).
+    tiers = dictionary of layer name to tier (layerTiers by default).
+    """
+    if runTier not in TIERS:
+        raise ValueError('unknown refresh tier {0!r}; expected one of {1}'.format(runTier, ', '.join(TIERS)))
+    selected = {}
+    for key, val in (portableGISdict if fdToFc_Dict is None else fdToFc_Dict).items():
+        fcs = [fc for fc in val if includesLayer(runTier, fc, tiers)]
+        if fcs:
+            selected[key] = fcs
+    return selected
+
+
+def exportTasks(runTier=FULL_TIER, fdToFc_Dict=None, tiers=None):
+    """
+    PURPOSE:
+    Function returns the list of copy / table / clip tasks a run of runTier performs,
+    each a dictionary with 'name', 'stage', 'source' (connection), 'input' and 'output' paths.
+
+    PARAMETERS:
+    runTier = 'hourly', 'nightly' or 'weekly'.
+    fdToFc_Dict = dictionary like portableGISdict (portableGISdict by default).
+    tiers = dictionary of layer name to tier (layerTiers by default).
+    """
+    tasks = []
+    for key, val in sorted(layersForTier(runTier, fdToFc_Dict, tiers).items()):
+        for fc in val:
+            tasks.append({'name': fc, 'stage': 'copy', 'source': SDE_CONNECTION,
+                          'input': SDE_CONNECTION + '\\sde.SDE.' + key + '\\sde.SDE.' + fc,
+                          'output': '/'.join([PORTABLE_GDB, key, fc])})
+    if includesLayer(runTier, 'Sections_SLC', tiers):
+        tasks.append({'name': 'Sections_SLC', 'stage': 'copy', 'source': DEFAULT_GDB,
+                      'input': DEFAULT_GDB + '/Sections_SLC', 'output': PORTABLE_GDB + '/ParcelFeatures/Sections_SLC'})
+    if includesLayer(runTier, 'Assessor', tiers):
+        tasks.append({'name': 'Assessor', 'stage': 'table', 'source': ASSESSOR_TABLE,
+                      'input': ASSESSOR_TABLE, 'output': PORTABLE_GDB + '/Assessor'})
+    if includesLayer(runTier, 'Rice_Lake_Twnshp', tiers):
+        for countyName, name in (('sde.STLOUIS.CDSTRL_ROW', 'RLT_ROW'), ('sde.STLOUIS.TRANS_RoadCenterlinesPW', 'RLT_Streets'),
+                                 ('sde.STLOUIS.CDSTRL_ParcelInfo', 'RLT_Parcels')):
+            tasks.append({'name': name, 'stage': 'clip', 'source': COUNTY_SDE, 'input': COUNTY_SDE + countyName,
+                          'output': PORTABLE_GDB + '/Rice_Lake_Twnshp/' + name})
+    return tasks
+
+
+def plainCopyClasses(runTier=FULL_TIER, fdToFc_Dict=None, tiers=None):
+    """
+    PURPOSE:
+    Function returns the set of classes a run of runTier copies as plain features, relative to
+    PORTABLE_GDB ('dataset/class'): every copy task but the annotation & change-captured classes.
+
+    PARAMETERS:
+    runTier = 'hourly', 'nightly' or 'weekly'.
+    fdToFc_Dict = dictionary like portableGISdict (portableGISdict by default).
+    tiers = dictionary of layer name to tier (layerTiers by default).
+    """
+    return set(task['output'][len(PORTABLE_GDB) + 1:] for task in exportTasks(runTier, fdToFc_Dict, tiers)
+               if task['stage'] == 'copy' and task['name'] not in ANNOTATION_CLASSES
+               and task['name'] not in CHANGE_CAPTURE_CLASSES)
+
+
+def outputClasses(runTier=FULL_TIER, fdToFc_Dict=None, tiers=None):
+    """
+    PURPOSE:
+    Function returns the classes & tables a run of runTier writes, relative to PORTABLE_GDB
+    ('dataset/class'): the outputs of its tasks & of the annotation merge groups it includes.
+
+    PARAMETERS:
+    runTier = 'hourly', 'nightly' or 'weekly'.
+    fdToFc_Dict = dictionary like portableGISdict (portableGISdict by default).
+    tiers = dictionary of layer name to tier (layerTiers by default).
+    """
+    names = [task['output'][len(PORTABLE_GDB) + 1:] for task in exportTasks(runTier, fdToFc_Dict, tiers)]
+    selected = layersForTier(runTier, fdToFc_Dict, tiers)
+    for name, group in sorted(ANNOTATION_MERGE_GROUPS.items()):
+        if any(fc in selected.get(group['dataset'], ()) for fc in group['classes']):
+            names.append(group['dataset'] + '/' + name)
+    return names
+
+
+def tierFromArgs(argv):
+    """Returns the tier given as '--tier <tier>' (or a bare tier name) in argv; the full weekly rebuild by default."""
+    for index, arg in enumerate(argv):
+        if arg == '--tier' and index + 1 < len(argv):
+            arg = argv[index + 1]
+        elif arg.startswith('--tier='):
+            arg = arg.split('=', 1)[1]
+        if arg in TIERS:
+            return arg
+    return FULL_TIER
@@ -0,0 +1,404 @@
+"""
+Local stand-in for SDE / file gdb classes, kept in one SQLite database.
+
+Used to develop and benchmark the export steps without arcpy or the City network.
+Each feature class or table is a SQLite table with an OBJECTID, the attribute
+fields and, for feature classes, the geometry as WKB plus its bounding box
+(minx, miny, maxx, maxy) so extents & window queries do not decode geometries.
+
+LocalStore has the same reader methods as validate.ArcpyReader (describe,
+iterBatches) and the writer methods used by streamcopy (createLike, openInsert),
+with class names in place of paths. The cursor tokens 'SHAPE@' / 'SHAPE@WKB' (WKB), 'SHAPE@XY'
+(centroid), 'SHAPE@LENGTH', 'SHAPE@AREA' and 'OID@' are understood.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import math
+import sqlite3
+import struct
+
+GEOMETRY_FIELD = 'SHAPE'
+OID_FIELD = 'OBJECTID'
+BBOX_COLUMNS = ('minx', 'miny', 'maxx', 'maxy')
+
+_SQL_TYPES = {'String': 'TEXT', 'Integer': 'INTEGER', 'SmallInteger': 'INTEGER', 'Double': 'REAL',
+              'Single': 'REAL', 'Date': 'TEXT', 'Guid': 'TEXT', 'GlobalID': 'TEXT', 'Blob': 'BLOB'}
+
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_MULTILINESTRING = 5
+WKB_MULTIPOLYGON = 6
+
+
+def _quote(name):
+    return '"{0}"'.format(name.replace('"', '""'))
+
+#-------------------------------------------------------------------------------------------------------
+# WKB helpers (2D, little-endian)
+#-------------------------------------------------------------------------------------------------------
+
+def pointWkb(x, y):
+    return struct.pack('<BIdd', 1, WKB_POINT, x, y)
+
+
+def lineWkb(points):
+    flat = [value for point in points for value in point]
+    return struct.pack('<BII%dd' % len(flat), 1, WKB_LINESTRING, len(points), *flat)
+
+
+def polygonWkb(rings):
+    """rings = list of closed rings (lists of (x, y)); the first is the outer ring."""
+    parts = [struct.pack('<BII', 1, WKB_POLYGON, len(rings))]
+    for ring in rings:
+        flat = [value for point in ring for value in point]
+        parts.append(struct.pack('<I%dd' % len(flat), len(ring), *flat))
+    return b''.join(parts)
+
+
+def parseWkb(blob, offset=0):
+    """Returns (geometry type, parts, next offset); parts is a list of coordinate lists (rings / lines / the point)."""
+    byteOrder = '<' if bytearray(blob[offset:offset + 1])[0] == 1 else '>'
+    geometryType = struct.unpack_from(byteOrder + 'I', blob, offset + 1)[0] % 1000
+    offset += 5
+    if geometryType == WKB_POINT:
+        x, y = struct.unpack_from(byteOrder + 'dd', blob, offset)
+        return geometryType, [[(x, y)]], offset + 16
+    if geometryType in (WKB_LINESTRING, WKB_POLYGON):
+        ringCount = 1
+        if geometryType == WKB_POLYGON:
+            ringCount = struct.unpack_from(byteOrder + 'I', blob, offset)[0]
+            offset += 4
+        parts = []
+        for _ in range(ringCount):
+            count = struct.unpack_from(byteOrder + 'I', blob, offset)[0]
+            flat = struct.unpack_from(byteOrder + '%dd' % (2 * count), blob, offset + 4)
+            parts.append(list(zip(flat[0::2], flat[1::2])))
+            offset += 4 + 16 * count
+        return geometryType, parts, offset
+    if geometryType in (WKB_MULTILINESTRING, WKB_MULTIPOLYGON):
+        count = struct.unpack_from(byteOrder + 'I', blob, offset)[0]
+        offset += 4
+        parts = []
+        for _ in range(count):
+            _, subParts, offset = parseWkb(blob, offset)
+            parts.extend(subParts)
+        return geometryType, parts, offset
+    raise ValueError('unsupported WKB geometry type {0}'.format(geometryType))
+
+
+def wkbBounds(blob):
+    """Returns (minx, miny, maxx, maxy) of a WKB geometry."""
+    _, parts, _ = parseWkb(blob)
+    xs = [x for part in parts for x, _ in part]
+    ys = [y for part in parts for _, y in part]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def wkbMetrics(blob):
+    """Returns ((centroid x, centroid y), length, area) of a WKB geometry (length is the perimeter for polygons)."""
+    geometryType, parts, _ = parseWkb(blob)
+    if geometryType == WKB_POINT:
+        return parts[0][0], 0.0, 0.0
+    length = 0.0
+    for part in parts:
+        length += sum(math.hypot(x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in zip(part, part[1:]))
+    if geometryType in (WKB_POLYGON, WKB_MULTIPOLYGON):
+        area, cx, cy = 0.0, 0.0, 0.0
+        for ring in parts:
+            for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+                cross = x0 * y1 - x1 * y0
+                area += cross / 2.0
+                cx += (x0 + x1) * cross
+                cy += (y0 + y1) * cross
+        if area:
+            return (cx / (6.0 * area), cy / (6.0 * area)), length, abs(area)
+    points = [point for part in parts for point in part]
+    return (sum(x for x, _ in points) / len(points), sum(y for _, y in points) / len(points)), length, 0.0
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class LocalStore(object):
+    """
+    PURPOSE:
+    Feature classes & tables in one SQLite file, read & written in batches.
+
+    PARAMETERS:
+    dbPath = string path of the SQLite file (created if missing; ':memory:' for a temporary store).
+    cacheKb = SQLite page cache size in KiB, which bounds its memory use.
+    """
+
+    def __init__(self, dbPath, cacheKb=2048):
+        self.dbPath = dbPath
+        # Parallel copies wait for each other's writes; a store is used by one thread but may be closed by
+        ## another (LocalBackend.close, once the pool threads are done)
+        self.connection = sqlite3.connect(dbPath, timeout=60, check_same_thread=False)
+        self.closed = False
+        self.connection.execute('PRAGMA cache_size = -{0:d}'.format(cacheKb))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS classes '
+                                '(name TEXT PRIMARY KEY, shapeType TEXT, fields TEXT, spatialReference TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS datasets (name TEXT PRIMARY KEY, spatialReference TEXT)')
+        self.connection.commit()
+
+    def __repr__(self):
+        return 'LocalStore({0!r})'.format(self.dbPath)
+
+    def close(self):
+        self.connection.close()
+        self.closed = True
+
+    def _classInfo(self, name):
+        row = self.connection.execute('SELECT shapeType, fields, spatialReference FROM classes WHERE name = ?',
+                                      (name,)).fetchone()
+        if row is None:
+            return None
+        return {'shapeType': row[0], 'fields': [tuple(field) for field in json.loads(row[1])], 'spatialReference': row[2]}
+
+    def listClasses(self):
+        return [row[0] for row in self.connection.execute('SELECT name FROM classes ORDER BY name')]
+
+    def listDatasets(self):
+        return [row[0] for row in self.connection.execute('SELECT name FROM datasets ORDER BY name')]
+
+    def createDataset(self, name, spatialReference=None):
+        """Creates (or replaces) a feature dataset; its classes are named 'dataset/class'."""
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO datasets VALUES (?, ?)', (name, spatialReference))
+
+    def datasetSpatialReference(self, name):
+        row = self.connection.execute('SELECT spatialReference FROM datasets WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def createClass(self, name, fields, shapeType=None, spatialReference=None):
+        """
+        PURPOSE:
+        Creates (or replaces) a feature class (shapeType 'Point', 'Polyline', 'Polygon')
+        or a table (shapeType None).
+
+        PARAMETERS:
+        name = class name.
+        fields = list of (field name, arcpy field type) of the attribute fields.
+        shapeType = geometry type, or None for a table.
+        spatialReference = optional spatial reference name / WKT kept with the class.
+        """
+        fields = [(fieldName, fieldType) for fieldName, fieldType in fields
+                  if fieldType not in ('OID', 'Geometry') and fieldName not in BBOX_COLUMNS]
+        columns = ['{0} INTEGER PRIMARY KEY'.format(_quote(OID_FIELD))]
+        if shapeType:
+            columns.append('{0} BLOB'.format(_quote(GEOMETRY_FIELD)))
+            columns.extend('{0} REAL'.format(column) for column in BBOX_COLUMNS)
+        columns.extend('{0} {1}'.format(_quote(fieldName), _SQL_TYPES.get(fieldType, 'TEXT')) for fieldName, fieldType in fields)
+        self.connection.execute('DROP TABLE IF EXISTS {0}'.format(_quote(name)))
+        self.connection.execute('CREATE TABLE {0} ({1})'.format(_quote(name), ', '.join(columns)))
+        self.connection.execute('INSERT OR REPLACE INTO classes VALUES (?, ?, ?, ?)',
+                                (name, shapeType, json.dumps(fields), spatialReference))
+        self.connection.commit()
+
+    def createLike(self, outputPath, sourcePath, description):
+        """Creates outputPath with the fields & geometry type of a describe() result (sourcePath is not needed here)."""
+        userFields = [field for field in description['fields'] if field[1] not in ('OID', 'Geometry')]
+        shapeType = description.get('shapeType') or ('Polygon' if description.get('hasShape') else None)
+        self.createClass(outputPath, userFields, shapeType, description.get('spatialReference'))
+
+    def copyClassFrom(self, dbPath, sourceName, name):
+        """Creates class 'name' as a copy of a class in another store file, in one INSERT ... SELECT."""
+        previous = LocalStore(dbPath)
+        try:
+            info = previous._classInfo(sourceName)
+        finally:
+            previous.close()
+        if info is None:
+            raise IOError('no class {0} in {1}'.format(sourceName, dbPath))
+        # Created before the ATTACH: unqualified names would also match the attached store's tables
+        self.createClass(name, info['fields'], info['shapeType'], info['spatialReference'])
+        self.connection.execute('ATTACH DATABASE ? AS previous', (dbPath,))
+        try:
+            with self.connection:
+                self.connection.execute('INSERT INTO main.{0} SELECT * FROM previous.{1}'.format(
+                    _quote(name), _quote(sourceName)))
+        finally:
+            self.connection.execute('DETACH DATABASE previous')
+
+    def reorderClass(self, name, oids):
+        """
+        PURPOSE:
+        Rewrites a class with its rows stored in the order of oids, renumbered 1..n in that order
+        (rows are stored by OBJECTID, so rows next to each other in oids share pages).
+
+        PARAMETERS:
+        name = class name.
+        oids = every OBJECTID of the class, in the new order.
+        """
+        info = self._classInfo(name)
+        orderedName = name + '__ordered'
+        self.createClass(orderedName, info['fields'], info['shapeType'], info['spatialReference'])
+        columns = ', '.join(_quote(row[1]) for row in self.connection.execute('PRAGMA table_info({0})'.format(
+            _quote(name))) if row[1] != OID_FIELD)
+        with self.connection:
+            self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS rowOrder (rank INTEGER PRIMARY KEY, oid INTEGER)')
+            self.connection.execute('DELETE FROM rowOrder')
+            self.connection.executemany('INSERT INTO rowOrder (oid) VALUES (?)', ((oid,) for oid in oids))
+            self.connection.execute('INSERT INTO {0} ({1}) SELECT {2} FROM rowOrder JOIN {3} t ON t.{4} = rowOrder.oid '
+                                    'ORDER BY rowOrder.rank'.format(
+                                        _quote(orderedName), columns,
+                                        ', '.join('t.' + column for column in columns.split(', ')),
+                                        _quote(name), _quote(OID_FIELD)))
+            self.connection.execute('DELETE FROM rowOrder')
+            self.connection.execute('DROP TABLE {0}'.format(_quote(name)))
+            self.connection.execute('ALTER TABLE {0} RENAME TO {1}'.format(_quote(orderedName), _quote(name)))
+            self.connection.execute('DELETE FROM classes WHERE name = ?', (orderedName,))
+
+    def tableStats(self):
+        """
+        Returns {'bytes', 'freeBytes', 'pageSize', 'tables'} of the store from SQLite's dbstat table: per class
+        its pages, leafPages, rows per leaf page, unusedBytes (free space inside its pages) & fragmentation (share
+        of leaf pages not stored right after the one before them).
+        """
+        pageSize = self.connection.execute('PRAGMA page_size').fetchone()[0]
+        pageCount = self.connection.execute('PRAGMA page_count').fetchone()[0]
+        freePages = self.connection.execute('PRAGMA freelist_count').fetchone()[0]
+        classes = set(self.listClasses())
+        tables = {}
+        previous = {}
+        for name, pageno, pagetype, cells, unused in self.connection.execute(
+                'SELECT name, pageno, pagetype, ncell, unused FROM dbstat ORDER BY name, path'):
+            if name not in classes:
+                continue
+            table = tables.setdefault(name, {'pages': 0, 'leafPages': 0, 'rows': 0, 'unusedBytes': 0, 'jumps': 0})
+            table['pages'] += 1
+            table['unusedBytes'] += unused
+            if pagetype == 'leaf':
+                table['leafPages'] += 1
+                table['rows'] += cells
+                if name in previous and pageno != previous[name] + 1:
+                    table['jumps'] += 1
+                previous[name] = pageno
+        for table in tables.values():
+            jumps = table.pop('jumps')
+            table['bytes'] = table['pages'] * pageSize
+            table['rowsPerPage'] = round(table['rows'] / float(table['leafPages']), 1) if table['leafPages'] else 0
+            table['fragmentation'] = round(jumps / float(table['leafPages'] - 1), 3) if table['leafPages'] > 1 else 0.0
+        return {'bytes': pageCount * pageSize, 'freeBytes': freePages * pageSize, 'pageSize': pageSize, 'tables': tables}
+
+    def addField(self, path, fieldName, fieldType):
+        """Adds an attribute field (arcpy field type) to a class."""
+        info = self._classInfo(path)
+        with self.connection:
+            self.connection.execute('ALTER TABLE {0} ADD COLUMN {1} {2}'.format(
+                _quote(path), _quote(fieldName), _SQL_TYPES.get(fieldType, 'TEXT')))
+            self.connection.execute('UPDATE classes SET fields = ? WHERE name = ?',
+                                    (json.dumps(info['fields'] + [(fieldName, fieldType)]), path))
+
+    def deleteRows(self, path, where):
+        """Deletes the rows of a class matching an SQL condition & returns how many were deleted."""
+        with self.connection:
+            return self.connection.execute('DELETE FROM {0} WHERE {1}'.format(_quote(path), where)).rowcount
+
+    def describe(self, path):
+        """Returns {'exists', 'count', 'extent', 'fields', 'hasShape', 'shapeType'} like ArcpyReader.describe."""
+        info = self._classInfo(path)
+        if info is None:
+            return {'exists': False}
+        hasShape = bool(info['shapeType'])
+        count = self.connection.execute('SELECT COUNT(*) FROM {0}'.format(_quote(path))).fetchone()[0]
+        extent = None
+        if hasShape:
+            extent = self.connection.execute('SELECT MIN(minx), MIN(miny), MAX(maxx), MAX(maxy) FROM {0}'.format(
+                _quote(path))).fetchone()
+            extent = None if extent[0] is None else tuple(extent)
+        fields = [(OID_FIELD, 'OID')] + ([(GEOMETRY_FIELD, 'Geometry')] if hasShape else []) + info['fields']
+        return {'exists': True, 'count': count, 'extent': extent, 'fields': fields, 'hasShape': hasShape,
+                'shapeType': info['shapeType'], 'spatialReference': info['spatialReference']}
+
+    def iterBatches(self, path, fields, batchSize, where=None, orderBy=None):
+        """
+        PURPOSE:
+        Yields lists of up to batchSize row tuples; only one batch is held in memory.
+
+        PARAMETERS:
+        path = class name.
+        fields = field names and cursor tokens to read.
+        batchSize = rows per batch.
+        where = optional SQL condition (e.g. on minx / maxx for a window query).
+        orderBy = optional SQL order (OBJECTID by default).
+        """
+        columns, derived = [], []
+        for field in fields:
+            if field == 'OID@':
+                columns.append(_quote(OID_FIELD))
+            elif field.startswith('SHAPE@'):
+                columns.append(_quote(GEOMETRY_FIELD))
+                derived.append((len(columns) - 1, field))
+            else:
+                columns.append(_quote(field))
+        sql = 'SELECT {0} FROM {1}'.format(', '.join(columns), _quote(path))
+        if where:
+            sql += ' WHERE ' + where
+        sql += ' ORDER BY ' + (orderBy or _quote(OID_FIELD))
+        cursor = self.connection.execute(sql)
+        try:
+            while True:
+                rows = cursor.fetchmany(batchSize)
+                if not rows:
+                    break
+                if derived:
+                    rows = [self._deriveShape(row, derived) for row in rows]
+                yield rows
+        finally:
+            cursor.close()
+
+    def _deriveShape(self, row, derived):
+        row = list(row)
+        for index, token in derived:
+            blob = row[index]
+            if blob is None or token in ('SHAPE@', 'SHAPE@WKB'):
+                continue
+            centroid, length, area = wkbMetrics(blob)
+            row[index] = {'SHAPE@XY': centroid, 'SHAPE@LENGTH': length, 'SHAPE@AREA': area}[token]
+        return tuple(row)
+
+    def openInsert(self, path, fields):
+        """Returns an inserter with insertRows(rows) & close(); each batch is one transaction."""
+        return _Inserter(self, path, fields)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class _Inserter(object):
+
+    def __init__(self, store, path, fields):
+        self.store = store
+        self.shapeIndex = None
+        columns = []
+        for index, field in enumerate(fields):
+            if field in ('SHAPE@', 'SHAPE@WKB'):
+                self.shapeIndex = index
+                columns.append(_quote(GEOMETRY_FIELD))
+            else:
+                columns.append(_quote(field))
+        if self.shapeIndex is not None:
+            columns.extend(BBOX_COLUMNS)
+        self.sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(_quote(path), ', '.join(columns),
+                                                               ', '.join('?' * len(columns)))
+        self.rows = 0
+
+    def insertRows(self, rows):
+        if self.shapeIndex is not None:
+            index = self.shapeIndex
+            rows = [tuple(row[:index]) + (sqlite3.Binary(row[index]),) + tuple(row[index + 1:]) + wkbBounds(row[index])
+                    if row[index] else tuple(row) + (None,) * 4 for row in rows]
+        with self.store.connection:
+            self.store.connection.executemany(self.sql, rows)
+        self.rows += len(rows)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
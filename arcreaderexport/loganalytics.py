@@ -0,0 +1,327 @@
+"""
+Log analytics over ProcessLogfile.log (and ProcessEvents.jsonl) history.
+
+ProcessLogfile.log keeps every run the export script ever made. Instead of
+reading the whole file, this tool keeps a small sidecar index
+(<logfile>.idx) of the byte offset and start time of every run (each run
+begins with the "Restart ArcReader export script" header). The index is
+updated incrementally by scanning only the bytes appended since the last
+call, and queries read just the byte ranges of the runs they need through a
+memory map.
+
+USAGE:
+    python -m arcreaderexport.loganalytics runs     [--last N] [--since YYYY-MM-DD]
+    python -m arcreaderexport.loganalytics trends   --class Parcels [--last N]
+    python -m arcreaderexport.loganalytics failures [--last N] [--top N]
+    python -m arcreaderexport.loganalytics slowest  [--last N] [--top N]
+    (add --log PATH for another log file, --events to read ProcessEvents.jsonl
+     instead of the text log, --json for JSON output)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+
+from arcreaderexport.logs import EVENTS_PATH, LOGFILE_PATH
+
+INDEX_VERSION = 1
+TEXT_MARKER = b'Restart ArcReader export script'
+EVENTS_MARKER = b'"stage": "start"'
+_SIGNATURE_BYTES = 256
+
+_TEXT_LINE = re.compile(br'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3}) - Running Module: .*?\|-\| ?(.*)$')
+_COPIED = re.compile(r'^Copied fc: (.*) to fc: (.*)$')
+_CLIPPED = re.compile(r'^Clipped (.*) by (.*) into (.*)$')
+_FAILED_COPY = re.compile(r'^XXX Failed to copy from SDE dbs \((.*)\) to PortableGIS fc \((.*)\)$')
+_FAILED_CLIP = re.compile(r'^XXX Failed to clip (.*) by (.*) into (.*)$')
+_FAILED_TASK = re.compile(r'^XXX Task (\S+) from .* failed after')
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _parseTime(text):
+    return datetime.datetime.strptime(text[:19].replace('T', ' '), _TIME_FORMAT)
+
+
+def _className(path):
+    return re.split(r'[\\/]', path.strip())[-1]
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class RunIndex(object):
+    """
+    PURPOSE:
+    Sidecar index of run start offsets in a log file, kept up to date incrementally.
+
+    PARAMETERS:
+    logPath = string path of ProcessLogfile.log or ProcessEvents.jsonl.
+    events = True if logPath holds JSON events (one per line) instead of text lines.
+    indexPath = string path of the sidecar index (logPath + '.idx' by default).
+    """
+
+    def __init__(self, logPath, events=False, indexPath=None):
+        self.logPath = logPath
+        self.events = events
+        self.indexPath = indexPath or logPath + '.idx'
+        self.size = 0
+        self.signature = None
+        self.runs = []   # list of [offset, 'YYYY-mm-dd HH:MM:SS']
+
+    def load(self):
+        """Reads the sidecar index (if any) and brings it up to date with the log file."""
+        if os.path.exists(self.indexPath):
+            try:
+                with open(self.indexPath) as indexFile:
+                    saved = json.load(indexFile)
+                if saved.get('version') == INDEX_VERSION and saved.get('events') == self.events:
+                    self.size, self.signature, self.runs = saved['size'], saved['signature'], saved['runs']
+            except (IOError, OSError, ValueError, KeyError):
+                self.size, self.signature, self.runs = 0, None, []
+        self.update()
+        return self
+
+    def update(self):
+        """Scans only the bytes appended since the last update (or rebuilds if the log was replaced)."""
+        logSize = os.path.getsize(self.logPath) if os.path.exists(self.logPath) else 0
+        if logSize == 0:
+            self.size, self.signature, self.runs = 0, None, []
+            return
+        with open(self.logPath, 'rb') as logFile:
+            data = mmap.mmap(logFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                signature = hashlib.sha1(data[:_SIGNATURE_BYTES]).hexdigest()
+                if logSize < self.size or (self.size >= _SIGNATURE_BYTES and signature != self.signature):
+                    self.size, self.runs = 0, []
+                if logSize != self.size:
+                    self._scan(data, max(0, self.size - len(TEXT_MARKER) - 64), logSize)
+                    self.size = logSize
+                self.signature = signature
+            finally:
+                data.close()
+        self.save()
+
+    def _scan(self, data, start, end):
+        marker = EVENTS_MARKER if self.events else TEXT_MARKER
+        known = set(run[0] for run in self.runs)
+        position = data.find(marker, start, end)
+        while position != -1:
+            lineStart = data.rfind(b'\n', 0, position) + 1
+            if not self.events:
+                # The header is a multi-line message; its record starts on the line holding ' |-| '.
+                recordMark = data.rfind(b' |-| ', 0, position)
+                lineStart = data.rfind(b'\n', 0, recordMark) + 1 if recordMark != -1 else lineStart
+            if lineStart not in known:
+                stamp = data[lineStart:lineStart + 64].decode('utf-8', 'replace')
+                if self.events:
+                    match = re.search(r'"time": "([^"]+)"', data[lineStart:data.find(b'\n', lineStart)].decode('utf-8', 'replace'))
+                    stamp = match.group(1) if match else ''
+                self.runs.append([lineStart, stamp[:19].replace('T', ' ')])
+                known.add(lineStart)
+            position = data.find(marker, position + len(marker), end)
+        self.runs.sort()
+
+    def save(self):
+        try:
+            with open(self.indexPath, 'w') as indexFile:
+                json.dump({'version': INDEX_VERSION, 'events': self.events, 'size': self.size,
+                           'signature': self.signature, 'runs': self.runs}, indexFile)
+        except (IOError, OSError):
+            pass   # read-only share; the index is rebuilt in memory next time
+
+    def ranges(self, last=None, since=None):
+        """Returns [(start offset, end offset, start time string)] of the selected runs, oldest first."""
+        bounds = []
+        for number, (offset, stamp) in enumerate(self.runs):
+            end = self.runs[number + 1][0] if number + 1 < len(self.runs) else self.size
+            bounds.append((offset, end, stamp))
+        if since:
+            bounds = [bound for bound in bounds if bound[2] >= since]
+        if last:
+            bounds = bounds[-last:]
+        return bounds
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def _textRecords(chunk):
+    """
+    PURPOSE:
+    Function parses one run of the text log into (time, record) pairs; a record is a
+    dictionary with 'className', 'status' and 'duration' (seconds since the previous line).
+    """
+    previous = None
+    for line in chunk.splitlines():
+        match = _TEXT_LINE.match(line)
+        if not match:
+            continue
+        when = _parseTime(match.group(1).decode('ascii'))
+        when = when.replace(microsecond=int(match.group(2)) * 1000)
+        message = match.group(3).decode('utf-8', 'replace').strip()
+        elapsed = (when - previous).total_seconds() if previous else 0.0
+        previous = when
+        record = None
+        for pattern, status, group in ((_COPIED, 'done', 2), (_CLIPPED, 'done', 3), (_FAILED_COPY, 'failed', 2),
+                                       (_FAILED_CLIP, 'failed', 3), (_FAILED_TASK, 'failed', 1)):
+            found = pattern.match(message)
+            if found:
+                record = {'className': _className(found.group(group)), 'status': status, 'duration': elapsed}
+                break
+        yield when, record
+
+
+def _eventRecords(chunk):
+    """Parses one run of ProcessEvents.jsonl into (time, record) pairs."""
+    for line in chunk.splitlines():
+        try:
+            event = json.loads(line.decode('utf-8', 'replace'))
+            when = _parseTime(event['time'])
+        except (ValueError, KeyError):
+            continue
+        record = None
+        if event.get('className') and event.get('status') in ('done', 'failed') and event.get('stage') != 'validate':
+            record = {'className': event['className'], 'status': event['status'],
+                      'duration': event.get('duration') or 0.0, 'rows': event.get('rows')}
+        yield when, record
+
+
+def readRuns(logPath, events=False, last=None, since=None):
+    """
+    PURPOSE:
+    Function returns a list of run summaries (start, elapsed seconds, class records)
+    for the selected runs, reading only their byte ranges from the memory-mapped log.
+
+    PARAMETERS:
+    logPath = string path of the log (ProcessLogfile.log or ProcessEvents.jsonl).
+    events = True if logPath holds JSON events.
+    last = only the last N runs.
+    since = only runs starting on or after this 'YYYY-mm-dd' string.
+    """
+    index = RunIndex(logPath, events).load()
+    runs = []
+    if not index.runs:
+        return runs
+    parse = _eventRecords if events else _textRecords
+    with open(logPath, 'rb') as logFile:
+        data = mmap.mmap(logFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for start, end, stamp in index.ranges(last, since):
+                first = lastSeen = None
+                records = []
+                for when, record in parse(data[start:end]):
+                    first = first or when
+                    lastSeen = when
+                    if record:
+                        records.append(record)
+                runs.append({'start': stamp, 'offset': start, 'bytes': end - start,
+                             'elapsed': (lastSeen - first).total_seconds() if first else 0.0,
+                             'records': records})
+        finally:
+            data.close()
+    return runs
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def summarizeRuns(runs):
+    rows = []
+    for run in runs:
+        done = set(r['className'] for r in run['records'] if r['status'] == 'done')
+        failed = set(r['className'] for r in run['records'] if r['status'] == 'failed') - done
+        rows.append({'start': run['start'], 'minutes': round(run['elapsed'] / 60.0, 1),
+                     'copied': len(done), 'failed': len(failed)})
+    return rows
+
+
+def classTrend(runs, className):
+    rows = []
+    for run in runs:
+        durations = [r['duration'] for r in run['records']
+                     if r['className'].lower() == className.lower() and r['status'] == 'done']
+        if durations:
+            rows.append({'start': run['start'], 'seconds': round(sum(durations), 1)})
+    return rows
+
+
+def failureFrequency(runs, top=20):
+    counts = {}
+    for run in runs:
+        done = set(r['className'] for r in run['records'] if r['status'] == 'done')
+        for name in set(r['className'] for r in run['records'] if r['status'] == 'failed') - done:
+            counts[name] = counts.get(name, 0) + 1
+    rows = [{'className': name, 'failedRuns': count, 'ofRuns': len(runs),
+             'rate': round(count / float(len(runs)), 3)} for name, count in counts.items()]
+    rows.sort(key=lambda row: (-row['failedRuns'], row['className']))
+    return rows[:top]
+
+
+def slowestRuns(runs, top=10):
+    rows = summarizeRuns(runs)
+    rows.sort(key=lambda row: -row['minutes'])
+    return rows[:top]
+
+
+def _printTable(rows, columns):
+    if not rows:
+        print('(no matching runs)')
+        return
+    widths = [max(len(column), max(len(str(row[column])) for row in rows)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+_COLUMNS = {
+    'index': ['runs', 'bytes', 'index'],
+    'runs': ['start', 'minutes', 'copied', 'failed'],
+    'slowest': ['start', 'minutes', 'copied', 'failed'],
+    'trends': ['start', 'seconds'],
+    'failures': ['className', 'failedRuns', 'ofRuns', 'rate'],
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='loganalytics', description='Query ArcReader export log history.')
+    parser.add_argument('command', choices=['runs', 'trends', 'failures', 'slowest', 'index'])
+    parser.add_argument('--log', help='log file (default ProcessLogfile.log, or ProcessEvents.jsonl with --events)')
+    parser.add_argument('--events', action='store_true', help='read the structured JSON events log')
+    parser.add_argument('--class', dest='className', help='feature class for trends')
+    parser.add_argument('--last', type=int, default=None, help='only the last N runs')
+    parser.add_argument('--since', help='only runs on or after YYYY-MM-DD')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    logPath = args.log or (EVENTS_PATH if args.events else LOGFILE_PATH)
+    if not os.path.exists(logPath):
+        parser.error('log file not found: {0}'.format(logPath))
+    if args.command == 'index':
+        index = RunIndex(logPath, args.events).load()
+        rows = [{'runs': len(index.runs), 'bytes': index.size, 'index': index.indexPath}]
+    else:
+        if args.command == 'trends' and not args.className:
+            parser.error('trends needs --class')
+        runs = readRuns(logPath, args.events, args.last, args.since)
+        if args.command == 'runs':
+            rows = summarizeRuns(runs)
+        elif args.command == 'trends':
+            rows = classTrend(runs, args.className)
+        elif args.command == 'failures':
+            rows = failureFrequency(runs, args.top)
+        else:
+            rows = slowestRuns(runs, args.top)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _printTable(rows, _COLUMNS[args.command])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Logging for the ArcReader export: ProcessLogfile.log plus structured JSON events.
+
+Log calls never write to the S: share directly. Each record is put on a bounded
+in-memory queue and returns immediately; one background thread per log file
+formats queued records in batches, appends them to a buffer file on local disk
+and then appends the buffer to the file on the share. If the share is
+unreachable the buffer keeps growing locally and is flushed on a later batch.
+Each process has its own buffer file (<log file name>.<pid>.buffer), as several
+exports & the scheduler may log to one file at once; the buffer left by a process
+that ended before the share came back is appended by the next one to flush.
+A batch that fails to be written is reported on stderr & the writer carries on.
+
+When the queue is full the handler's policy decides what happens:
+    'block'      = wait up to blockTimeout seconds for room, then drop the record
+    'dropNewest' = drop the record being logged
+    'dropOldest' = drop the oldest queued record to make room
+Dropped records are counted and reported in the log once there is room again.
+
+Structured fields are passed with logEvent() (or extra={'event': {...}}) and
+show up as keys of the JSON event: stage, className, rows, duration, errorClass, ...
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import errno
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+LOGFILE_PATH = r'S:\GIS_Public\Tools\Code\Python\ArcReaderExport\ProcessLogfile.log'
+EVENTS_PATH = r'S:\GIS_Public\Tools\Code\Python\ArcReaderExport\ProcessEvents.jsonl'
+LOCAL_BUFFER_DIR = os.path.join(tempfile.gettempdir(), 'ArcReaderExportLogs')
+
+TEXT_FORMAT = '%(asctime)s - Running Module: %(name)s; Line#: %(lineno)d} %(levelname)s |-| %(message)s'
+RESTART_HEADER = """\n\n----------------Restart ArcReader export script----------------\n\n"""
+
+BLOCK = 'block'
+DROP_NEWEST = 'dropNewest'
+DROP_OLDEST = 'dropOldest'
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    PURPOSE:
+    Formats a record as one JSON object per line: time, level, logger, line, message,
+    the structured event fields and, for errors, the traceback.
+    """
+
+    def format(self, record):
+        event = {
+            'time': datetime.datetime.fromtimestamp(record.created).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3],
+            'level': record.levelname,
+            'logger': record.name,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        event.update(getattr(record, 'event', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event['traceback'] = record.exc_text
+        return json.dumps(event, sort_keys=True, default=str)
+
+
+class BatchingFileHandler(logging.Handler):
+    """
+    PURPOSE:
+    Non-blocking log handler: queues records and appends them to targetPath in batches
+    from a background thread, staging each batch in a local buffer file first.
+
+    PARAMETERS:
+    targetPath = string path of the log file (usually on the S: share).
+    bufferDir = local folder for the buffer files.
+    maxQueue = largest number of records waiting to be written.
+    batchSize = largest number of records written per batch.
+    flushInterval = seconds a partial batch may wait before it is written.
+    policy = 'block', 'dropNewest' or 'dropOldest' (what to do when the queue is full).
+    blockTimeout = seconds the 'block' policy waits before dropping the record.
+    """
+
+    def __init__(self, targetPath, bufferDir=LOCAL_BUFFER_DIR, maxQueue=10000, batchSize=500,
+                 flushInterval=2.0, policy=BLOCK, blockTimeout=1.0):
+        logging.Handler.__init__(self)
+        self.targetPath = targetPath
+        if not os.path.isdir(bufferDir):
+            os.makedirs(bufferDir)
+        self.bufferDir = bufferDir
+        self.bufferPath = os.path.join(bufferDir, '{0}.{1}.buffer'.format(os.path.basename(targetPath), os.getpid()))
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.policy = policy
+        self.blockTimeout = blockTimeout
+        self.queue = queue.Queue(maxQueue)
+        self.dropped = 0
+        self.written = 0
+        self.shareErrors = 0
+        self.writeErrors = 0
+        self._droppedLock = threading.Lock()
+        self._thread = threading.Thread(target=self._writerLoop, name='log-writer-' + os.path.basename(targetPath))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            # Freeze the message now; the record is formatted later on the writer thread.
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self._put(record)
+        except Exception:
+            self.handleError(record)
+
+    def _put(self, record):
+        try:
+            if self.policy == BLOCK:
+                self.queue.put(record, True, self.blockTimeout)
+            elif self.policy == DROP_OLDEST:
+                while True:
+                    try:
+                        self.queue.put_nowait(record)
+                        break
+                    except queue.Full:
+                        try:
+                            self.queue.get_nowait()
+                            self.queue.task_done()
+                            self._countDropped()
+                        except queue.Empty:
+                            pass
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self._countDropped()
+
+    def _countDropped(self):
+        with self._droppedLock:
+            self.dropped += 1
+
+    def _writerLoop(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.time() + self.flushInterval
+            while len(batch) < self.batchSize:
+                try:
+                    item = self.queue.get(True, max(deadline - time.time(), 0.001)) if not batch \
+                        else self.queue.get_nowait()
+                except queue.Empty:
+                    if batch or time.time() >= deadline:
+                        break
+                    continue
+                if item is _STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._writeBatch(batch)
+            except Exception as e:
+                # the thread must keep draining the queue, or every 'block' log call would wait on it
+                self.writeErrors += 1
+                sys.stderr.write('XXX Failed to write {0} log records to {1}: {2!r}\n'.format(
+                    len(batch), self.targetPath, e))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _writeBatch(self, records):
+        lines = []
+        with self._droppedLock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.append(self.format(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'XXX Log queue full; dropped {0} log records'.format(dropped),
+                'event': {'stage': 'logging', 'dropped': dropped}})))
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            with io.open(self.bufferPath, 'a', encoding='utf-8') as bufferFile:
+                bufferFile.write(u'\n'.join(_text(line) for line in lines) + u'\n')
+            self.written += len(lines)
+        self._flushBuffer()
+
+    def _flushBuffer(self):
+        """Appends the local buffer file (& any left by ended processes) to the target file and empties it."""
+        self._adoptBuffers()
+        if not os.path.exists(self.bufferPath) or os.path.getsize(self.bufferPath) == 0:
+            return
+        try:
+            with io.open(self.bufferPath, 'r', encoding='utf-8') as bufferFile:
+                pending = bufferFile.read()
+            with io.open(self.targetPath, 'a', encoding='utf-8') as targetFile:
+                targetFile.write(pending)
+            open(self.bufferPath, 'w').close()
+        except (IOError, OSError):
+            self.shareErrors += 1   # share unreachable; keep the buffer for the next batch
+
+    def _adoptBuffers(self):
+        # Moves the buffers of this log file left by processes that are no longer running into this
+        ## process's buffer; the rename claims each one, so two processes never both append it
+        prefix = os.path.join(self.bufferDir, os.path.basename(self.targetPath) + '.')
+        for path in glob.glob(prefix + '*.buffer*'):
+            pid = path[len(prefix):].split('.')[0]
+            if path == self.bufferPath or not pid.isdigit() or processAlive(int(pid)):
+                continue
+            claimed = self.bufferPath + '.adopting'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue    # taken by another process
+            with io.open(claimed, 'r', encoding='utf-8') as orphanFile:
+                pending = orphanFile.read()
+            with io.open(self.bufferPath, 'a', encoding='utf-8') as bufferFile:
+                bufferFile.write(pending)
+            os.remove(claimed)
+
+    def flush(self):
+        """Waits until every queued record has been written."""
+        if self._thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+        logging.Handler.close(self)
+
+def _text(line):
+    return line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+
+
+def processAlive(pid):
+    """Returns True if a process with this id is running (through OpenProcess on Windows, where os.kill ends it)."""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)       # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5                 # access denied: running as another user
+        exitCode = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exitCode))) and exitCode.value == 259
+        finally:                                                # 259 = STILL_ACTIVE
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+_handlers = {}
+_handlersLock = threading.Lock()
+
+
+def getHandler(targetPath, formatter, **options):
+    """
+    PURPOSE:
+    Function returns the single BatchingFileHandler for targetPath, creating it on
+    first use, so every module logging to the same file shares one writer thread.
+    """
+    with _handlersLock:
+        if targetPath not in _handlers:
+            handler = BatchingFileHandler(targetPath, **options)
+            handler.setLevel(logging.INFO)
+            handler.setFormatter(formatter)
+            _handlers[targetPath] = handler
+        return _handlers[targetPath]
+
+
+def setLogger(name, logfilepath=LOGFILE_PATH, eventsPath=EVENTS_PATH, **options):
+    """
+    PURPOSE:
+    Function returns a logger writing text lines to logfilepath and JSON events to
+    eventsPath through the non-blocking batching handlers. Calling it again (from
+    another module, or for the same name) never adds duplicate handlers, and the
+    "Restart ArcReader export script" header is written once per process.
+
+    PARAMETERS:
+    name = logger name (the calling module's __name__).
+    logfilepath = string path of the text log (ProcessLogfile.log).
+    eventsPath = string path of the JSON events log; None to skip JSON events.
+    options = BatchingFileHandler settings (bufferDir, maxQueue, batchSize, flushInterval, policy, ...).
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = True
+
+    targets = [(logfilepath, logging.Formatter(TEXT_FORMAT))]
+    if eventsPath:
+        targets.append((eventsPath, JsonFormatter()))
+    isNewRun = logfilepath not in _handlers
+    for targetPath, formatter in targets:
+        handler = getHandler(targetPath, formatter, **options)
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+
+    # add logging header
+    if isNewRun:
+        logger.info(RESTART_HEADER, extra={'event': {'stage': 'start'}})
+    return logger
+
+
+def logEvent(logger, message, level=logging.INFO, **fields):
+    """
+    PURPOSE:
+    Function logs message with structured event fields, such as
+    logEvent(logger, 'Copied fc', stage='copy', className='Parcels', rows=41230, duration=12.4).
+    The record carries the file, line & function of the caller (not of this function).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    caller = sys._getframe(1)
+    logger.handle(logger.makeRecord(logger.name, level, caller.f_code.co_filename, caller.f_lineno, message, None,
+                                    None, caller.f_code.co_name, {'event': fields}))
+
+
+def flushLogs():
+    """Waits until every queued log record has been written to its file."""
+    for handler in list(_handlers.values()):
+        handler.flush()
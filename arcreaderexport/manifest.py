@@ -0,0 +1,167 @@
+"""
+Published bundle manifest & version files.
+
+A published bundle is the ArcReaderRemoteUpdate folder holding PortableDuluth.gdb
+and TapNCurb.pmf. Each successful export writes two small files next to them:
+
+    PortableDuluth.version.json  = tiny probe file: version number, publish time,
+                                   and the name / SHA-1 of the full manifest.
+    PortableDuluth.manifest.json = every bundle file with its size, modified time and
+                                   the SHA-1 of each fixed-size block, so laptops can
+                                   verify (and resume) transfers block by block.
+
+Laptops only read the version file to decide whether anything changed, instead
+of walking the gdb folder over the network. Both files are written to a temporary
+name first and then renamed, so a reader never sees a half-written file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import hashlib
+import json
+import os
+
+VERSION_FILE = 'PortableDuluth.version.json'
+MANIFEST_FILE = 'PortableDuluth.manifest.json'
+BUNDLE_ITEMS = ('PortableDuluth.gdb', 'TapNCurb.pmf')
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def replaceFile(tempPath, path):
+    """Renames tempPath over path (os.rename cannot replace an existing file on Windows / Python 2)."""
+    if hasattr(os, 'replace'):
+        os.replace(tempPath, path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tempPath, path)
+
+
+def writeJson(path, data):
+    """Writes data as JSON to path through a temporary file & rename."""
+    tempPath = path + '.tmp'
+    with open(tempPath, 'w') as jsonFile:
+        json.dump(data, jsonFile, indent=1, sort_keys=True)
+    replaceFile(tempPath, path)
+
+
+def readJson(path):
+    """Returns the JSON data in path, or None if it does not exist or cannot be read."""
+    try:
+        with open(path) as jsonFile:
+            return json.load(jsonFile)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def readVersion(bundleDir):
+    """Returns the version file data of a bundle folder (one small file read), or None."""
+    return readJson(os.path.join(bundleDir, VERSION_FILE))
+
+
+def readManifest(bundleDir):
+    return readJson(os.path.join(bundleDir, MANIFEST_FILE))
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def listBundleFiles(bundleDir, items=BUNDLE_ITEMS):
+    """
+    PURPOSE:
+    Function returns a sorted list of (relative path with '/' separators, full path)
+    for every file of the bundle items (folders such as a gdb are walked).
+
+    PARAMETERS:
+    bundleDir = string path of the published folder.
+    items = names of the gdb folders & files that make up the bundle.
+    """
+    files = []
+    for item in items:
+        itemPath = os.path.join(bundleDir, item)
+        if os.path.isdir(itemPath):
+            for root, dirs, names in os.walk(itemPath):
+                for name in names:
+                    if name.endswith('.lock'):
+                        continue    # ArcGIS lock files are not part of the data
+                    fullPath = os.path.join(root, name)
+                    files.append((os.path.relpath(fullPath, bundleDir).replace(os.sep, '/'), fullPath))
+        elif os.path.isfile(itemPath):
+            files.append((item, itemPath))
+    return sorted(files)
+
+
+def blockHashes(path, blockSize=BLOCK_SIZE):
+    """Returns the list of SHA-1 hex digests of each blockSize block of a file."""
+    hashes = []
+    with open(path, 'rb') as dataFile:
+        while True:
+            block = dataFile.read(blockSize)
+            if not block:
+                break
+            hashes.append(hashlib.sha1(block).hexdigest())
+    return hashes
+
+
+def buildManifest(bundleDir, version, items=BUNDLE_ITEMS, blockSize=BLOCK_SIZE, previous=None):
+    """
+    PURPOSE:
+    Function returns the manifest dictionary of a bundle folder.
+
+    PARAMETERS:
+    bundleDir = string path of the published folder.
+    version = integer version number being published.
+    items = names of the gdb folders & files that make up the bundle.
+    blockSize = bytes per hashed block.
+    previous = the last published manifest; block hashes of files whose size & modified
+        time did not change are reused instead of reading the file again.
+    """
+    known = {}
+    if previous and previous.get('blockSize') == blockSize:
+        known = dict((entry['path'], entry) for entry in previous.get('files', []))
+    files = []
+    for relPath, fullPath in listBundleFiles(bundleDir, items):
+        stat = os.stat(fullPath)
+        entry = {'path': relPath, 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+        old = known.get(relPath)
+        if old and old['size'] == entry['size'] and old['mtime'] == entry['mtime'] and 'blocks' in old:
+            entry['blocks'] = old['blocks']
+        else:
+            entry['blocks'] = blockHashes(fullPath, blockSize)
+        files.append(entry)
+    return {'version': version, 'items': list(items), 'blockSize': blockSize, 'files': files,
+            'bytes': sum(entry['size'] for entry in files)}
+
+
+def publishManifest(bundleDir, items=BUNDLE_ITEMS, published=None, blockSize=BLOCK_SIZE, extra=None):
+    """
+    PURPOSE:
+    Function writes a new manifest & version file for the bundle and returns the
+    version file data. The version number is one more than the last published one.
+    The manifest is written first so the version file never points at a missing manifest.
+
+    PARAMETERS:
+    bundleDir = string path of the published folder (ArcReaderRemoteUpdate).
+    items = names of the gdb folders & files that make up the bundle.
+    published = datetime of publication (now by default).
+    blockSize = bytes per hashed block in the manifest.
+    extra = dictionary of other values for the version file (e.g. the export tier).
+    """
+    previous = readVersion(bundleDir) or {}
+    version = int(previous.get('version', 0)) + 1
+    manifest = buildManifest(bundleDir, version, items, blockSize, readManifest(bundleDir))
+    manifestPath = os.path.join(bundleDir, MANIFEST_FILE)
+    writeJson(manifestPath, manifest)
+    with open(manifestPath, 'rb') as manifestFile:
+        manifestSha1 = hashlib.sha1(manifestFile.read()).hexdigest()
+    versionInfo = {
+        'version': version,
+        'published': (published or datetime.datetime.now()).strftime('%Y-%m-%dT%H:%M:%S'),
+        'manifest': MANIFEST_FILE,
+        'manifestSha1': manifestSha1,
+        'bytes': manifest['bytes'],
+        'files': len(manifest['files']),
+    }
+    versionInfo.update(extra or {})
+    writeJson(os.path.join(bundleDir, VERSION_FILE), versionInfo)
+    return versionInfo
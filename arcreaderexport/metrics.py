@@ -0,0 +1,414 @@
+"""
+Prometheus metrics of the export: a textfile for the collector & an optional HTTP endpoint.
+
+Until now the only view of the exporter's health was ProcessLogfile.log. ExportMetrics
+keeps counters, gauges & histograms of the pipeline in the Prometheus text format
+(version 0.0.4), so staleness & slowdowns can be alerted on:
+
+    arcreader_export_tasks_total{stage,status}             tasks done / failed
+    arcreader_export_task_retries_total{stage}             attempts after the first
+    arcreader_export_rows_copied_total{stage}              rows written by the tasks done
+    arcreader_export_task_duration_seconds{stage,source}   histogram of task durations
+    arcreader_export_source_latency_seconds{source}        histogram of each source's round trip
+    arcreader_export_runs_total{tier,result}               runs published / validated / failed
+    arcreader_export_bytes_published_total                 bytes of the bundles published
+    arcreader_export_run_in_progress                       1 while a run is going
+    arcreader_export_last_run_*{tier}                      start, duration & result of each tier's last run
+    arcreader_export_published_*                           version, bytes & time of the published bundle
+    arcreader_export_publication_age_seconds               seconds since it was published
+
+The textfile (layers.METRICS_TEXTFILE, for the textfile collector of windows_exporter or
+node_exporter) is written through a temporary file & rename when a run starts & ends.
+Its series are read back when the next run starts, so the counters keep counting up
+from run to run & the last run of each tier stays listed. With a port, MetricsServer
+serves the same metrics while the run goes (the publication age as of the scrape):
+
+    curl http://localhost:9464/metrics
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import os
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from arcreaderexport.manifest import readVersion, replaceFile
+
+PREFIX = 'arcreader_export_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_FILE = 'arcreaderexport.prom'      # textfile name when the run report folder is given
+DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_SERIES = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _escape(value):
+    return '{0}'.format(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _unescape(value):
+    return re.sub(r'\\(.)', lambda match: '\n' if match.group(1) == 'n' else match.group(1), value)
+
+
+def _number(value):
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return '{0:d}'.format(int(value))
+    return repr(value)
+
+
+def _series(name, labels, value):
+    if not labels:
+        return '{0} {1}'.format(name, _number(value))
+    return '{0}{{{1}}} {2}'.format(name, ','.join('{0}="{1}"'.format(label, _escape(labelValue))
+                                                   for label, labelValue in labels), _number(value))
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class Metric(object):
+    """
+    PURPOSE:
+    One counter, gauge or histogram & its series, by label values.
+
+    PARAMETERS:
+    name = metric name (as written; PREFIX is not added).
+    help = one-line description for the # HELP line.
+    kind = 'counter', 'gauge' or 'histogram'.
+    labelNames = names of the labels of each series.
+    buckets = upper bounds of a histogram's buckets (+Inf is added).
+    """
+
+    def __init__(self, name, help, kind, labelNames=(), buckets=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelNames = tuple(labelNames)
+        self.buckets = tuple(buckets or ()) + (float('inf'),) if kind == 'histogram' else ()
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = float(value)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {'buckets': [0.0] * len(self.buckets), 'sum': 0.0, 'count': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def seriesNames(self):
+        if self.kind == 'histogram':
+            return [self.name + '_bucket', self.name + '_sum', self.name + '_count']
+        return [self.name]
+
+    def lines(self):
+        """Returns the # HELP, # TYPE & series lines of the metric (histogram buckets cumulative)."""
+        lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} {1}'.format(self.name, self.kind)]
+        with self.lock:
+            for key in sorted(self.values):
+                labels = list(zip(self.labelNames, key))
+                value = self.values[key]
+                if self.kind != 'histogram':
+                    lines.append(_series(self.name, labels, value))
+                    continue
+                for bound, count in zip(self.buckets, value['buckets']):
+                    lines.append(_series(self.name + '_bucket', labels + [('le', _number(bound))], count))
+                lines.append(_series(self.name + '_sum', labels, value['sum']))
+                lines.append(_series(self.name + '_count', labels, value['count']))
+        return lines
+
+    def load(self, seriesName, labels, value):
+        """Sets one series read back from a textfile; returns False if it does not fit this metric."""
+        bound = labels.pop('le', None)
+        if set(labels) != set(self.labelNames):
+            return False
+        key = self._key(labels)
+        with self.lock:
+            if self.kind != 'histogram':
+                self.values[key] = value
+                return True
+            series = self.values.setdefault(key, {'buckets': [0.0] * len(self.buckets), 'sum': 0.0, 'count': 0.0})
+            if seriesName.endswith('_bucket'):
+                if bound is None or float(bound) not in self.buckets:
+                    return False
+                series['buckets'][self.buckets.index(float(bound))] = value
+            else:
+                series[seriesName.rsplit('_', 1)[1]] = value
+        return True
+
+    def _key(self, labels):
+        return tuple('{0}'.format(labels.get(name, '')) for name in self.labelNames)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class MetricsRegistry(object):
+    """
+    PURPOSE:
+    The metrics of one process, rendered in the Prometheus text format, written to
+    & read back from a textfile.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labelNames=()):
+        return self._add(Metric(name, help, 'counter', labelNames))
+
+    def gauge(self, name, help, labelNames=()):
+        return self._add(Metric(name, help, 'gauge', labelNames))
+
+    def histogram(self, name, help, labelNames=(), buckets=DURATION_BUCKETS):
+        return self._add(Metric(name, help, 'histogram', labelNames, buckets))
+
+    def onCollect(self, func):
+        """Adds a function run before each render (to set gauges read from elsewhere, such as the version file)."""
+        self.collectors.append(func)
+
+    def render(self):
+        for func in self.collectors:
+            func()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.lines())
+        return '\n'.join(lines) + '\n'
+
+    def writeTextfile(self, path):
+        """Writes the metrics to path through a temporary file & rename (the collector never reads half a file)."""
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tempPath = path + '.tmp'
+        with open(tempPath, 'w') as textFile:
+            textFile.write(self.render())
+        replaceFile(tempPath, path)
+        return path
+
+    def loadTextfile(self, path):
+        """Reads back the series of this registry's metrics from a textfile written before; returns how many were read."""
+        metrics = dict((seriesName, metric) for metric in self.metrics for seriesName in metric.seriesNames())
+        try:
+            with open(path) as textFile:
+                lines = textFile.read().splitlines()
+        except (IOError, OSError):
+            return 0
+        loaded = 0
+        for line in lines:
+            match = _SERIES.match(line)
+            if line.startswith('#') or not match or match.group(1) not in metrics:
+                continue
+            labels = dict((label, _unescape(value)) for label, value in _LABEL.findall(match.group(2) or ''))
+            try:
+                value = float(match.group(3))
+            except ValueError:
+                continue
+            if metrics[match.group(1)].load(match.group(1), labels, value):
+                loaded += 1
+        return loaded
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    """
+    PURPOSE:
+    Serves a MetricsRegistry at /metrics over HTTP from a background thread while a run goes.
+
+    PARAMETERS:
+    registry = MetricsRegistry rendered on each scrape.
+    port = TCP port (0 for any free one; the 'port' attribute has the port once started).
+    host = address listened on (this machine only by default; '' for every interface).
+    """
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Starts serving & returns the port (socket.error if it is taken)."""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer')
+        self.thread.daemon = True
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ExportMetrics(object):
+    """
+    PURPOSE:
+    The export's metrics, recorded by the TaskRunner (its 'metrics' attribute) and
+    runExport, and written to the textfile when a run starts & ends.
+
+    PARAMETERS:
+    textfilePath = path of the .prom file (None: not written).
+    bundleDir = published bundle folder; its version file gives the published_* gauges
+        (None: not reported).
+    logger = logging.Logger for write failures (optional).
+    clock = time function (replaceable for tests).
+    """
+
+    def __init__(self, textfilePath=None, bundleDir=None, logger=None, clock=time.time):
+        self.textfilePath = textfilePath
+        self.bundleDir = bundleDir
+        self.logger = logger
+        self.clock = clock
+        self.registry = registry = MetricsRegistry()
+        self.tasks = registry.counter(PREFIX + 'tasks_total', 'Pipeline tasks finished, by stage & status (done, failed).',
+                                      ('stage', 'status'))
+        self.retries = registry.counter(PREFIX + 'task_retries_total', 'Task attempts after the first, by stage.',
+                                        ('stage',))
+        self.rows = registry.counter(PREFIX + 'rows_copied_total', 'Rows written by the tasks done, by stage.',
+                                     ('stage',))
+        self.taskDuration = registry.histogram(PREFIX + 'task_duration_seconds',
+                                               'Duration of the tasks done (retries included), by stage & source.',
+                                               ('stage', 'source'), DURATION_BUCKETS)
+        self.latency = registry.histogram(PREFIX + 'source_latency_seconds',
+                                          'Round trip of a small request (an exists check) to each source.',
+                                          ('source',), LATENCY_BUCKETS)
+        self.runs = registry.counter(PREFIX + 'runs_total', 'Export runs by tier & result (published, validated, failed).',
+                                     ('tier', 'result'))
+        self.bytesPublished = registry.counter(PREFIX + 'bytes_published_total', 'Bytes of the bundles published.')
+        self.inProgress = registry.gauge(PREFIX + 'run_in_progress', '1 while an export run is going, else 0.')
+        self.runStart = registry.gauge(PREFIX + 'last_run_start_timestamp_seconds',
+                                       'Start time of the last run of each tier.', ('tier',))
+        self.runDuration = registry.gauge(PREFIX + 'last_run_duration_seconds',
+                                          'Duration of the last finished run of each tier.', ('tier',))
+        self.runSuccess = registry.gauge(PREFIX + 'last_run_success',
+                                         '1 if the last run of each tier passed validation, else 0.', ('tier',))
+        self.validationFailures = registry.gauge(PREFIX + 'last_run_validation_failures',
+                                                 'Classes that failed validation in the last run of each tier.', ('tier',))
+        self.publishedVersion = registry.gauge(PREFIX + 'published_version', 'Version number of the published bundle.')
+        self.publishedBytes = registry.gauge(PREFIX + 'published_bytes', 'Size of the published bundle.')
+        self.publishedTime = registry.gauge(PREFIX + 'published_timestamp_seconds', 'Time the bundle was published.')
+        self.publicationAge = registry.gauge(PREFIX + 'publication_age_seconds', 'Seconds since the bundle was published.')
+        if bundleDir:
+            registry.onCollect(self._collectPublication)
+
+    def recordTask(self, stage, source, status, duration, attempts, rows=None):
+        self.tasks.inc(stage=stage, status=status)
+        if attempts > 1:
+            self.retries.inc(attempts - 1, stage=stage)
+        if status == 'done':
+            self.taskDuration.observe(duration, stage=stage, source=source)
+            if rows:
+                self.rows.inc(rows, stage=stage)
+
+    def observeLatency(self, source, seconds):
+        self.latency.observe(seconds, source=source)
+
+    def timedProbe(self, probe):
+        """Returns probe (a function of a source, such as backend.exists) timed into the source latency histogram."""
+        def timed(source):
+            started = self.clock()
+            try:
+                return probe(source)
+            finally:
+                self.observeLatency(source, self.clock() - started)
+        return timed
+
+    def runStarted(self, tier):
+        """Reads back the series of the last run's textfile, marks a run of tier in progress & writes the textfile."""
+        if self.textfilePath:
+            self.registry.loadTextfile(self.textfilePath)
+        self.inProgress.set(1)
+        self.runStart.set(self.clock(), tier=tier)
+        self.write()
+
+    def runFinished(self, tier, elapsed, passed, failures=0, versionInfo=None):
+        """Records the end of a run of tier (versionInfo of the version it published, if any) & writes the textfile."""
+        self.inProgress.set(0)
+        self.runDuration.set(elapsed, tier=tier)
+        self.runSuccess.set(1 if passed else 0, tier=tier)
+        self.validationFailures.set(failures, tier=tier)
+        self.runs.inc(tier=tier, result='published' if versionInfo else 'validated' if passed else 'failed')
+        if versionInfo:
+            self.bytesPublished.inc(versionInfo.get('bytes') or 0)
+        self.write()
+
+    def write(self):
+        if not self.textfilePath:
+            return None
+        try:
+            return self.registry.writeTextfile(self.textfilePath)
+        except (IOError, OSError) as e:
+            if self.logger is not None:
+                self.logger.error('XXX Failed to write metrics to {0}: {1}'.format(self.textfilePath, e))
+            return None
+
+    def _collectPublication(self):
+        versionInfo = readVersion(self.bundleDir)
+        if not versionInfo:
+            return
+        try:
+            published = time.mktime(datetime.datetime.strptime(versionInfo['published'], '%Y-%m-%dT%H:%M:%S').timetuple())
+        except (KeyError, ValueError):
+            return
+        self.publishedVersion.set(versionInfo.get('version') or 0)
+        self.publishedBytes.set(versionInfo.get('bytes') or 0)
+        self.publishedTime.set(published)
+        self.publicationAge.set(max(0.0, self.clock() - published))
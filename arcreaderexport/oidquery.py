@@ -0,0 +1,34 @@
+"""
+OBJECTID lists for keyed reads & deletes.
+
+The change capture (re-reading the edited rows of a class) and the sort-on-write
+copy (reading a class back in curve order) both select rows by OBJECTID with
+'OBJECTID IN (...)' where clauses, ID_CHUNK ids at a time so a clause stays well
+under the database's statement limits.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from arcreaderexport.localstore import OID_FIELD
+
+ID_CHUNK = 1000                             # OBJECTIDs per IN (...) list
+
+
+def idChunks(values, size=ID_CHUNK):
+    """Yields the sorted values in lists of up to size."""
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def inList(field, ids):
+    """Returns the where clause selecting the rows whose field is one of ids."""
+    return '{0} IN ({1})'.format(field, ', '.join(str(int(oid)) for oid in ids))
+
+
+def oidField(description):
+    """Returns the name of the OID field of a describe() result (OBJECTID if it lists none)."""
+    for name, fieldType in description['fields']:
+        if fieldType == 'OID':
+            return name
+    return OID_FIELD
@@ -0,0 +1,145 @@
+"""
+Post-build optimization of the output gdb: spatial row order, compaction & a report of both.
+
+createEmpytGDB only compacts the old gdb to release its locks; the new gdb is left as
+the copies wrote it, with rows in SDE insertion order and the free space left by
+change-capture deletes & replaced classes. GdbOptimizer runs after the copies (before
+validation, so the gdb that is validated is the one published):
+
+    1. measures each table of the output (backend.workspaceStats: size, free space
+       inside its pages & fragmentation on the local backend; the gdb's size on disk
+       on ArcGIS, which has no per-table figures),
+    2. on a full rebuild, rewrites each feature class of at least
+       layers.SPATIAL_ORDER_MIN_ROWS rows in the order of a Hilbert (or Z-order) curve
+       over its centroids (arcreaderexport.spatialorder), unless it already is. Only
+       plain copies are rewritten (layers.plainCopyClasses): rewriting an annotation
+       class breaks its link to its feature class & annotation classes, and a
+       change-captured class is updated in place by its next run,
+    3. compacts the gdb & measures it again.
+
+The run report (section 'optimize') has the sizes before & after and, per reordered
+class, the estimated pages read for a draw of 1% of its extent before & after
+(spatialorder.pagesPerExtent), which is what a laptop's disk pays for each draw.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import time
+
+from arcreaderexport import layers
+from arcreaderexport.annotation import isAnnotation
+from arcreaderexport.spatialorder import pagesPerExtent, sampleExtents, spatialOrder
+from arcreaderexport.streamcopy import DEFAULT_BATCH_SIZE
+
+# Rows per page assumed where the backend has no per-table figures (a file gdb)
+DEFAULT_ROWS_PER_PAGE = 40
+
+
+def _tableFigures(table):
+    return dict((key, table.get(key)) for key in ('bytes', 'unusedBytes', 'fragmentation'))
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class GdbOptimizer(object):
+    """
+    PURPOSE:
+    Reorders the large feature classes of a workspace along a space-filling curve & compacts it,
+    keeping the figures of each step for the run report.
+
+    PARAMETERS:
+    backend = storage backend with workspaceStats, reorderClass & compact.
+    curve = spatialorder.HILBERT or spatialorder.ZORDER.
+    minRows = feature classes with fewer rows are left in their order.
+    batchSize = rows read at a time.
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, backend, curve=layers.SPATIAL_ORDER_CURVE, minRows=layers.SPATIAL_ORDER_MIN_ROWS,
+                 batchSize=DEFAULT_BATCH_SIZE, logger=None):
+        self.backend = backend
+        self.curve = curve
+        self.minRows = minRows
+        self.batchSize = batchSize
+        self.logger = logger
+
+    def reorder(self, path, rowsPerPage=DEFAULT_ROWS_PER_PAGE):
+        """
+        PURPOSE:
+        Rewrites one class in curve order of its centroids & returns a dictionary of rows, ordered
+        (False if it already was, e.g. from a spatially sorted streamCopy), seconds & the estimated
+        pages per 1% extent before & after.
+
+        PARAMETERS:
+        path = feature class path.
+        rowsPerPage = rows stored per page, for the page estimate.
+        """
+        started = time.time()
+        oids, points = [], []
+        for batch in self.backend.iterBatches(path, ['OID@', 'SHAPE@XY'], self.batchSize):
+            for oid, point in batch:
+                oids.append(oid)
+                points.append(tuple(point) if point else None)
+        order = spatialOrder(points, curve=self.curve)
+        extents = sampleExtents(points, rng=random.Random(0))
+        result = {'rows': len(oids), 'pagesPerExtentBefore': round(pagesPerExtent(points, extents, rowsPerPage), 1)}
+        if order == list(range(len(order))):
+            result.update(ordered=False, pagesPerExtentAfter=result['pagesPerExtentBefore'],
+                          seconds=round(time.time() - started, 3))
+            return result
+        self.backend.reorderClass(path, [oids[index] for index in order])
+        result.update(ordered=True, seconds=round(time.time() - started, 3),
+                      pagesPerExtentAfter=round(pagesPerExtent([points[index] for index in order], extents,
+                                                               rowsPerPage), 1))
+        return result
+
+    def optimize(self, workspacePath, reorder=True, classes=None):
+        """
+        PURPOSE:
+        Function reorders (if reorder) & compacts a workspace. Returns a dictionary for the run report:
+        bytes & freeBytes before / after, and per table its figures before / after.
+
+        PARAMETERS:
+        workspacePath = gdb path.
+        reorder = False to only compact (incremental runs leave the order of the classes they update).
+        classes = names of the classes that may be reordered, as listClasses returns them (None: any);
+            annotation classes never are.
+        """
+        started = time.time()
+        before = self.backend.workspaceStats(workspacePath)
+        tables = dict((name, {'before': _tableFigures(table)}) for name, table in before['tables'].items())
+        if reorder:
+            for name in self.backend.listClasses(workspacePath):
+                if classes is not None and name not in classes:
+                    continue
+                path = workspacePath.rstrip('/\\') + '/' + name
+                description = self.backend.describe(path)
+                if not description.get('hasShape') or description.get('count', 0) < self.minRows:
+                    continue
+                if isAnnotation(description):
+                    continue
+                table = before['tables'].get(name, {})
+                try:
+                    result = self.reorder(path, table.get('rowsPerPage') or DEFAULT_ROWS_PER_PAGE)
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.info('XXX Failed to reorder {0} spatially: {1}'.format(path, e))
+                    continue
+                tables.setdefault(name, {}).update(result)
+                if self.logger is not None:
+                    self.logger.info('Spatial order of {0}: {1} rows, {2} -> {3} pages per 1% extent ({4})'.format(
+                        name, result['rows'], result['pagesPerExtentBefore'], result['pagesPerExtentAfter'],
+                        'reordered' if result['ordered'] else 'already in order'))
+        self.backend.compact(workspacePath)
+        after = self.backend.workspaceStats(workspacePath)
+        for name, table in after['tables'].items():
+            tables.setdefault(name, {})['after'] = _tableFigures(table)
+        summary = {'curve': self.curve, 'bytesBefore': before['bytes'], 'bytesAfter': after['bytes'],
+                   'freeBytesBefore': before['freeBytes'], 'freeBytesAfter': after['freeBytes'],
+                   'reordered': sum(1 for table in tables.values() if table.get('ordered')),
+                   'seconds': round(time.time() - started, 3), 'tables': tables}
+        if self.logger is not None:
+            self.logger.info('Optimized {0}: {1} -> {2} bytes, {3} classes reordered'.format(
+                workspacePath, summary['bytesBefore'], summary['bytesAfter'], summary['reordered']))
+        return summary
@@ -0,0 +1,202 @@
+"""
+LAN peer mode: laptops that already hold the current bundle serve it to the others.
+
+When several crews come back to the same garage, one laptop pulls the update from
+the central share and the rest can pull it from that laptop:
+
+    python -m arcreaderexport.peer --local C:\\ArcReader [--port 8766]            (serve this laptop's copy)
+    python -m arcreaderexport.sync --share S:\\...\\ArcReaderRemoteUpdate --local C:\\ArcReader --discover
+    python -m arcreaderexport.sync --share ... --local C:\\ArcReader --peers 10.1.4.21:8766,10.1.4.37:8766
+
+Nothing from a peer is trusted: the version file always comes from the central
+share, the manifest is checked against the SHA-1 in that version file, and every
+block against the manifest. A peer only serves after its own installed files have
+been checked against its manifest, and only peers reporting the central version
+are used. A block that fails verification (or a peer that drops off) marks the
+peer bad and the block is read from the central share instead.
+
+Serving (python -m arcreaderexport.peer) uses distserver.servePeer and needs
+Python 3.7+; PeerSource & discoverPeers also run on Python 2.7.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from arcreaderexport.freshness import LOCAL_PATH
+from arcreaderexport.manifest import blockHashes, readManifest, readVersion
+from arcreaderexport.sync import HttpSource
+
+PEER_PORT = 8766
+DISCOVERY_PORT = 8767
+DISCOVERY_QUERY = b'ARCREADER-PEERS?'
+
+
+def verifyInstalled(bundleDir):
+    """Returns the paths of installed bundle files that do not match the installed manifest ([] when all match)."""
+    manifest = readManifest(bundleDir)
+    if manifest is None:
+        return ['<manifest>']
+    bad = []
+    for entry in manifest['files']:
+        fullPath = os.path.join(bundleDir, *entry['path'].split('/'))
+        if (not os.path.isfile(fullPath) or os.path.getsize(fullPath) != entry['size']
+                or blockHashes(fullPath, manifest['blockSize']) != entry['blocks']):
+            bad.append(entry['path'])
+    return bad
+
+
+def discoverPeers(timeout=2.0, port=DISCOVERY_PORT, address='<broadcast>'):
+    """
+    PURPOSE:
+    Function broadcasts a query on the LAN and returns a list of
+    ('host:port', version) for every peer that answers within timeout seconds.
+
+    PARAMETERS:
+    timeout = seconds to collect answers.
+    port = UDP port the peers listen on.
+    address = where to send the query ('<broadcast>', or one host such as '127.0.0.1').
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    peers = {}
+    try:
+        sock.sendto(DISCOVERY_QUERY, (address, port))
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            sock.settimeout(max(0.01, deadline - time.time()))
+            try:
+                data, sender = sock.recvfrom(4096)
+            except socket.timeout:
+                break
+            try:
+                answer = json.loads(data.decode('utf-8'))
+                peers['{0}:{1}'.format(sender[0], int(answer['port']))] = int(answer['version'])
+            except (ValueError, KeyError, TypeError):
+                continue
+    except (IOError, OSError):
+        pass
+    finally:
+        sock.close()
+    return sorted(peers.items())
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class PeerSource(object):
+    """
+    PURPOSE:
+    Bundle source for SyncClient that reads blocks from LAN peers and falls back
+    to the central source. Same interface as LocalSource / HttpSource.
+
+    PARAMETERS:
+    primary = the central source (LocalSource of the S: share, or HttpSource of the distribution server).
+    peers = list of 'host:port' strings of laptops running arcreaderexport.peer.
+    timeout = seconds to wait on a peer before falling back.
+    """
+
+    def __init__(self, primary, peers, timeout=10):
+        self.primary = primary
+        self.candidates = [HttpSource('http://' + peer, timeout=timeout) for peer in peers]
+        self.peers = []
+        self.blockSize = None
+        self.blocks = {}
+        self.lock = threading.Lock()
+        self.stats = {'peerBytes': 0, 'primaryBytes': 0, 'peerFailures': 0}
+
+    def __repr__(self):
+        return 'PeerSource({0!r}, {1} peer(s))'.format(self.primary, len(self.candidates))
+
+    def readVersion(self):
+        """The central version is authoritative; only peers holding that version are used."""
+        published = self.primary.readVersion()
+        if published is not None:
+            self.peers = [peer for peer in self.candidates
+                          if (peer.readVersion() or {}).get('manifestSha1') == published.get('manifestSha1')]
+        self.published = published
+        return published
+
+    def readManifestBytes(self):
+        expected = (getattr(self, 'published', None) or {}).get('manifestSha1')
+        manifestBytes = None
+        for peer in list(self.peers):
+            try:
+                data = peer.readManifestBytes()
+            except IOError:
+                self._dropPeer(peer)
+                continue
+            if hashlib.sha1(data).hexdigest() == expected:
+                manifestBytes = data
+                break
+            self._dropPeer(peer)
+        if manifestBytes is None:
+            manifestBytes = self.primary.readManifestBytes()
+        manifest = json.loads(manifestBytes.decode('utf-8'))
+        self.blockSize = manifest['blockSize']
+        self.blocks = dict((entry['path'], entry['blocks']) for entry in manifest['files'])
+        return manifestBytes
+
+    def readRange(self, relPath, offset, length):
+        expected = None
+        if self.blockSize and offset % self.blockSize == 0 and relPath in self.blocks:
+            blocks = self.blocks[relPath]
+            number = offset // self.blockSize
+            expected = blocks[number] if number < len(blocks) else None
+        peers = list(self.peers)
+        if expected and peers:
+            # Spread blocks across peers; try the others before the central source.
+            start = int(hashlib.sha1('{0}:{1}'.format(relPath, offset).encode('utf-8')).hexdigest()[:8], 16) % len(peers)
+            for peer in peers[start:] + peers[:start]:
+                try:
+                    data = peer.readRange(relPath, offset, length)
+                except IOError:
+                    self._dropPeer(peer)
+                    continue
+                if len(data) == length and hashlib.sha1(data).hexdigest() == expected:
+                    self._count('peerBytes', length)
+                    return data
+                self._dropPeer(peer)
+        data = self.primary.readRange(relPath, offset, length)
+        self._count('primaryBytes', len(data))
+        return data
+
+    def _dropPeer(self, peer):
+        with self.lock:
+            if peer in self.peers:
+                self.peers.remove(peer)
+                self.stats['peerFailures'] += 1
+
+    def _count(self, key, amount):
+        with self.lock:
+            self.stats[key] += amount
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='peer', description="Serve this laptop's ArcReader bundle to other laptops.")
+    parser.add_argument('--local', default=LOCAL_PATH, help='laptop bundle folder')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=PEER_PORT)
+    parser.add_argument('--discovery-port', type=int, default=DISCOVERY_PORT, help='UDP port for discovery (0 = off)')
+    parser.add_argument('--client-kbps', type=float, default=0, help='cap per peer in kilobytes/second (0 = none)')
+    args = parser.parse_args(argv)
+    import asyncio                                     # Python 3 only
+    from arcreaderexport.distserver import servePeer
+    try:
+        asyncio.run(servePeer(args.local, args.host, args.port, args.discovery_port or None,
+                              args.client_kbps * 1024 or None))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
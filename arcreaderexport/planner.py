@@ -0,0 +1,357 @@
+"""
+Dry-run planner: estimated duration & size of an export run, without copying anything.
+
+    python -m arcreaderexport.planner [--tier weekly] [--workers 1] [--per-source 0]
+                                      [--count-rows] [--reports <RunReports folder>] [--json]
+
+Each task of the run (arcreaderexport.layers.exportTasks) is estimated from, in order:
+
+    history = median duration of the task in the last run reports (RunReport_*.json) of the
+              tier, from the runs that copied it (not left in place by its content hash or
+              updated by change capture, which take a fraction of a copy)
+    rows    = source row count (--count-rows asks the sources through arcpy, or from the
+              row counts kept by validation in past reports) / rows-per-second of its source
+    default = median duration of all past tasks (or DEFAULT_TASK_SECONDS with no history)
+
+Output size is rows x bytes-per-row, with bytes-per-row taken from past published
+bundle sizes. The copy / table / clip tasks are then scheduled largest first on
+--workers slots (at most --per-source at once against one source) between the fixed
+steps (new gdb & feature datasets or the backup copy, validation, publishing), which gives the expected
+total runtime and the critical path: the chain of tasks that ends last.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import heapq
+import json
+import os
+import sys
+
+from arcreaderexport.layers import FULL_TIER, TIERS, exportTasks
+from arcreaderexport.runreport import REPORT_DIR
+
+DEFAULT_TASK_SECONDS = 60.0
+DEFAULT_TASK_OVERHEAD = 5.0         # seconds per copy apart from moving rows
+DEFAULT_ROWS_PER_SECOND = 2000.0
+DEFAULT_BYTES_PER_ROW = 400.0
+DEFAULT_SETUP_SECONDS = {'full': 120.0, 'incremental': 60.0}   # new gdb & feature datasets / backup copy
+DEFAULT_VALIDATE_ROWS_PER_SECOND = 20000.0
+HASH_BYTES_PER_SECOND = 50.0 * 1024 * 1024
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def loadReports(reportDir=REPORT_DIR, last=10, tier=None):
+    """Returns the last run reports in reportDir (oldest first), of one tier if given; unreadable files are skipped."""
+    reports = []
+    for path in glob.glob(os.path.join(reportDir, 'RunReport_*.json')):
+        try:
+            with open(path) as reportFile:
+                report = json.load(reportFile)
+        except (IOError, OSError, ValueError):
+            continue
+        if tier is not None and report.get('summary', {}).get('runName') != tier:
+            continue
+        reports.append((report.get('summary', {}).get('started', ''), report))
+    reports.sort(key=lambda item: item[0])
+    return [report for _, report in reports[-last:]] if last else [report for _, report in reports]
+
+
+class History(object):
+    """
+    PURPOSE:
+    Per-task & per-source statistics from past run reports. Tasks that did not copy their
+    class (left in place or reused by content hash, or a change capture delta) are left out.
+
+    PARAMETERS:
+    reports = list of run report dictionaries (see loadReports).
+    """
+
+    def __init__(self, reports):
+        # imported here so 'plan --help' (arcreaderexport.cli) does not load sqlite3 & the copy modules
+        from arcreaderexport.changecapture import DELTA
+        from arcreaderexport.contenthash import REUSED, UNCHANGED
+        self.reports = reports
+        durations, rows, sourceRows, sourceSeconds = {}, {}, {}, {}
+        validateRows, validateSeconds, publishedBytes, publishedRows = 0, 0.0, [], []
+        setupSeconds = {}
+        for report in reports:
+            counts = dict((result['name'], result['rows']) for result in report.get('validation', {}).get('results', [])
+                          if result.get('rows') is not None)
+            for task in report.get('tasks', []):
+                if task.get('status') != 'done':
+                    continue
+                if task.get('content') in (UNCHANGED, REUSED) or task.get('mode') == DELTA:
+                    continue        # not copied: its duration says nothing of a copy's
+                duration = task.get('duration', 0.0) - task.get('timeLost', 0.0)
+                durations.setdefault(task['name'], []).append(duration)
+                taskRows = task.get('rows', counts.get(task['name']))
+                if taskRows is not None:
+                    rows.setdefault(task['name'], []).append(taskRows)
+                    sourceRows[task['source']] = sourceRows.get(task['source'], 0) + taskRows
+                    sourceSeconds[task['source']] = sourceSeconds.get(task['source'], 0.0) + duration
+            validation = report.get('validation')
+            if validation and counts:
+                validateRows += sum(counts.values())
+                validateSeconds += validation.get('elapsed', 0.0)
+            published = report.get('published')
+            if published and counts and report.get('summary', {}).get('runName') == FULL_TIER:
+                publishedBytes.append(published.get('bytes', 0))
+                publishedRows.append(sum(counts.values()))
+            setup = report.get('setup')
+            if setup and setup.get('elapsed') is not None:
+                kind = 'full' if setup.get('fullRebuild') else 'incremental'
+                setupSeconds.setdefault(kind, []).append(setup['elapsed'])
+        self.durations = dict((name, _median(values)) for name, values in durations.items())
+        self.rows = dict((name, _median(values)) for name, values in rows.items())
+        self.rowsPerSecond = dict((source, sourceRows[source] / sourceSeconds[source])
+                                  for source in sourceRows if sourceSeconds[source] > 0 and sourceRows[source] > 0)
+        self.validateRowsPerSecond = validateRows / validateSeconds if validateSeconds > 0 else None
+        self.bytesPerRow = sum(publishedBytes) / float(sum(publishedRows)) if sum(publishedRows) else None
+        self.setupSeconds = dict((kind, _median(values)) for kind, values in setupSeconds.items())
+        self.defaultSeconds = _median(list(self.durations.values()))
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def estimateTask(task, history, rowCount=None):
+    """
+    PURPOSE:
+    Function returns a copy of task with estimated 'seconds', 'rows', 'bytes' and the
+    'basis' of the estimate ('history', 'rows' or 'default').
+
+    PARAMETERS:
+    task = dictionary from layers.exportTasks.
+    history = History of past runs.
+    rowCount = current source row count (None if not counted).
+    """
+    estimate = dict(task)
+    rows = rowCount if rowCount is not None else history.rows.get(task['name'])
+    if task['name'] in history.durations and rowCount is None:
+        estimate['seconds'], estimate['basis'] = history.durations[task['name']], 'history'
+    elif rows is not None:
+        rate = history.rowsPerSecond.get(task['source'], DEFAULT_ROWS_PER_SECOND)
+        estimate['seconds'], estimate['basis'] = DEFAULT_TASK_OVERHEAD + rows / rate, 'rows'
+    else:
+        estimate['seconds'] = history.defaultSeconds if history.defaultSeconds is not None else DEFAULT_TASK_SECONDS
+        estimate['basis'] = 'default'
+    estimate['rows'] = rows
+    estimate['bytes'] = int(rows * (history.bytesPerRow or DEFAULT_BYTES_PER_ROW)) if rows is not None else None
+    return estimate
+
+
+def scheduleTasks(tasks, workers=1, perSource=None, largestFirst=True):
+    """
+    PURPOSE:
+    Function simulates running the estimated tasks largest first (or in the order
+    given) on 'workers' slots, with at most perSource tasks of one source at once.
+    Sets 'start', 'finish' and 'worker' on each task and returns (makespan seconds,
+    critical path task list).
+
+    PARAMETERS:
+    tasks = list of estimated task dictionaries (see estimateTask).
+    workers = number of tasks run at once.
+    perSource = largest number of tasks run at once against one source (None for no limit).
+    largestFirst = False to start the tasks in list order.
+    """
+    workers = max(1, workers)
+    pending = sorted(tasks, key=lambda task: -task['seconds']) if largestFirst else list(tasks)
+    free = [(0.0, worker) for worker in range(workers)]      # (time the worker is free, worker)
+    heapq.heapify(free)
+    running = []                                              # (finish, source)
+    lastOnWorker = {}
+    while pending:
+        now, worker = heapq.heappop(free)
+        running = [item for item in running if item[0] > now]
+        busy = {}
+        for _, source in running:
+            busy[source] = busy.get(source, 0) + 1
+        task = next((task for task in pending if not perSource or busy.get(task['source'], 0) < perSource), None)
+        if task is None:
+            # Every remaining task waits on a busy source; try again when the next one of those finishes.
+            heapq.heappush(free, (min(finish for finish, _ in running), worker))
+            continue
+        pending.remove(task)
+        task['start'], task['finish'], task['worker'] = now, now + task['seconds'], worker
+        task['previous'] = lastOnWorker.get(worker)
+        lastOnWorker[worker] = task
+        running.append((task['finish'], task['source']))
+        heapq.heappush(free, (task['finish'], worker))
+    if not tasks:
+        return 0.0, []
+    last = max(tasks, key=lambda task: task['finish'])
+    makespan = last['finish']
+    path = []
+    while last is not None:
+        path.append(last)
+        last = last['previous']
+    for task in tasks:
+        del task['previous']
+    return makespan, list(reversed(path))
+
+
+class DurationEstimator(object):
+    """
+    PURPOSE:
+    Estimated seconds of the tasks of a run, so the pool of parallel copies (thread-safe backends
+    only) can start the longest first (autotune.AutotunedPool): a task's median duration in past run reports, else its source
+    row count / its source's rows per second, else the median of all tasks (see estimateTask).
+
+    PARAMETERS:
+    history = History of past runs.
+    rowCounter = function returning the row count of an input path, asked only for tasks without
+        a past duration (None to use the row counts of past reports only).
+    """
+
+    def __init__(self, history, rowCounter=None):
+        self.history = history
+        self.rowCounter = rowCounter
+        self.estimates = {}
+
+    def seconds(self, name, source, inputPath=None):
+        """Returns the estimated seconds of task 'name'; inputPath is one path or a list (a bulk copy)."""
+        if name not in self.estimates:
+            rowCount = None
+            if name not in self.history.durations and self.rowCounter is not None and inputPath:
+                try:
+                    paths = inputPath if isinstance(inputPath, (list, tuple)) else [inputPath]
+                    rowCount = sum(self.rowCounter(path) or 0 for path in paths)
+                except Exception:
+                    rowCount = None
+            self.estimates[name] = estimateTask({'name': name, 'source': source}, self.history, rowCount)
+        return self.estimates[name]['seconds']
+
+    def summary(self, first=10):
+        """Returns the number of past reports, the tasks per basis & the longest estimates, for the run report."""
+        basis = {}
+        for estimate in self.estimates.values():
+            basis[estimate['basis']] = basis.get(estimate['basis'], 0) + 1
+        longest = sorted(self.estimates.values(), key=lambda estimate: -estimate['seconds'])[:first]
+        return {'reports': len(self.history.reports), 'basis': basis,
+                'longest': [{'name': estimate['name'], 'seconds': round(estimate['seconds'], 1),
+                             'basis': estimate['basis']} for estimate in longest]}
+
+
+def planRun(tier=FULL_TIER, workers=1, perSource=None, history=None, rowCounter=None, tasks=None):
+    """
+    PURPOSE:
+    Function returns the plan of one run: estimated tasks, fixed steps, critical path,
+    expected total seconds & output bytes.
+
+    PARAMETERS:
+    tier = refresh tier of the run ('hourly', 'nightly' or 'weekly').
+    workers = number of copy tasks run at once.
+    perSource = largest number of tasks run at once against one source (None for no limit).
+    history = History of past runs (none by default).
+    rowCounter = function returning the row count of a task's input path, or None.
+    tasks = list of tasks (layers.exportTasks(tier) by default).
+    """
+    history = history or History([])
+    tasks = exportTasks(tier) if tasks is None else tasks
+    estimates = []
+    for task in tasks:
+        rowCount = None
+        if rowCounter is not None:
+            try:
+                rowCount = rowCounter(task['input'])
+            except Exception:
+                rowCount = None
+        estimates.append(estimateTask(task, history, rowCount))
+    copySeconds, criticalPath = scheduleTasks(estimates, workers, perSource)
+
+    totalRows = sum(task['rows'] or 0 for task in estimates)
+    totalBytes = sum(task['bytes'] or 0 for task in estimates)
+    steps = []
+    kind = 'full' if tier == FULL_TIER else 'incremental'
+    steps.append(('setup', history.setupSeconds.get(kind, DEFAULT_SETUP_SECONDS[kind])))
+    steps.append(('copy', copySeconds))
+    # Validation reads every row of the source & the output, 4 classes at a time.
+    steps.append(('validate', 2 * totalRows / (history.validateRowsPerSecond or DEFAULT_VALIDATE_ROWS_PER_SECOND) / 4.0))
+    steps.append(('publish', totalBytes / HASH_BYTES_PER_SECOND))
+    return {
+        'tier': tier,
+        'workers': workers,
+        'perSource': perSource,
+        'reports': len(history.reports),
+        'tasks': estimates,
+        'steps': [{'step': name, 'seconds': round(seconds, 1)} for name, seconds in steps],
+        'criticalPath': [task['name'] for task in criticalPath],
+        'serialSeconds': round(sum(task['seconds'] for task in estimates), 1),
+        'totalSeconds': round(sum(seconds for _, seconds in steps), 1),
+        'rows': totalRows,
+        'bytes': totalBytes,
+        'unknownSize': [task['name'] for task in estimates if task['bytes'] is None],
+    }
+
+
+def arcpyRowCounter(path):
+    import arcpy
+    return int(arcpy.GetCount_management(path).getOutput(0))
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def _printTable(rows, columns):
+    widths = [max(len(column), max(len(str(row[column])) for row in rows)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+def printPlan(plan):
+    rows = []
+    for task in sorted(plan['tasks'], key=lambda task: -task['seconds']):
+        rows.append({'task': task['name'], 'stage': task['stage'], 'basis': task['basis'],
+                     'rows': '' if task['rows'] is None else int(task['rows']),
+                     'MB': '' if task['bytes'] is None else '{0:0.1f}'.format(task['bytes'] / 1048576.0),
+                     'seconds': '{0:0.1f}'.format(task['seconds']), 'worker': task['worker'],
+                     'start': '{0:0.0f}'.format(task['start'])})
+    if rows:
+        _printTable(rows, ['task', 'stage', 'basis', 'rows', 'MB', 'seconds', 'worker', 'start'])
+    print('')
+    print('Plan for a {0} run with {1} worker(s){2}, from {3} past report(s):'.format(
+        plan['tier'], plan['workers'], ' ({0} per source)'.format(plan['perSource']) if plan['perSource'] else '',
+        plan['reports']))
+    for step in plan['steps']:
+        print('  {0:<10} {1:8.1f} min'.format(step['step'], step['seconds'] / 60.0))
+    print('  {0:<10} {1:8.1f} min   (tasks one after another: {2:0.1f} min)'.format(
+        'total', plan['totalSeconds'] / 60.0, plan['serialSeconds'] / 60.0))
+    print('Expected output: {0:0.1f} MB, {1} rows{2}'.format(
+        plan['bytes'] / 1048576.0, int(plan['rows']),
+        '; size unknown for {0} task(s)'.format(len(plan['unknownSize'])) if plan['unknownSize'] else ''))
+    path = plan['criticalPath']
+    print('Critical path ({0} task(s)): {1}{2}'.format(len(path), ' -> '.join(path[:10]),
+                                                       ' -> ... ({0} more)'.format(len(path) - 10) if len(path) > 10 else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='planner', description='Estimate the runtime & size of an export run.')
+    parser.add_argument('--tier', choices=TIERS, default=FULL_TIER)
+    parser.add_argument('--workers', type=int, default=1, help='copy tasks run at once')
+    parser.add_argument('--per-source', type=int, default=0, help='largest number of tasks at once per source (0 = no limit)')
+    parser.add_argument('--reports', default=REPORT_DIR, help='folder of RunReport_*.json files')
+    parser.add_argument('--last', type=int, default=10, help='number of past reports of the tier to use')
+    parser.add_argument('--count-rows', action='store_true', help='ask each source for its current row count (needs arcpy)')
+    parser.add_argument('--json', action='store_true', help='print the plan as JSON')
+    args = parser.parse_args(argv)
+
+    history = History(loadReports(args.reports, args.last, args.tier))
+    plan = planRun(args.tier, args.workers, args.per_source or None, history,
+                   arcpyRowCounter if args.count_rows else None)
+    if args.json:
+        print(json.dumps(plan, indent=1, sort_keys=True))
+    else:
+        printPlan(plan)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
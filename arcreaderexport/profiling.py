@@ -0,0 +1,326 @@
+"""
+Opt-in profiling of the pipeline tasks, written as flamegraph input next to the run report.
+
+When a run is slow, the run report says which tasks took the time but not whether it
+went to arcpy, to Python in this package or to waiting on I/O. A TaskProfiler set on
+the TaskRunner (taskRunner.profiler) profiles every task it runs (each class copy,
+table copy & clip, and each validated class) in one of two modes:
+
+    sample      a thread takes the stack of every running task each 'interval'
+                seconds (sys._current_frames); cheap enough for a production run and
+                right with copies in parallel. Time inside an arcpy call shows on the
+                frame that called arcpy.
+    cprofile    cProfile of each task; exact call counts but slower, and before
+                Python 3.12 only (one cProfile at a time there: tasks that start
+                while another is profiled run unprofiled and are counted)
+
+Both keep "collapsed" stacks (frames joined by ';' & the microseconds spent in the
+last one), rooted at the task's stage & name, so the time of each task, class and
+function adds up across threads. Worker processes (validateOutput with useProcesses)
+write their stacks to a part file of the run's parts folder; mergeProfiles adds them
+up and writes, next to RunReport_<run>_<stamp>.json:
+
+    Profile_<run>_<stamp>.folded    input of flamegraph.pl, speedscope or inferno
+    Profile_<run>_<stamp>.prof      pstats of every task (cprofile mode; snakeviz)
+
+and returns the run report section 'profile' (time per stage, slowest tasks, the
+functions with the most time of their own).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import cProfile
+import glob
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+MODES = ('sample', 'cprofile')
+SAMPLE_INTERVAL = 0.005     # seconds between stacks in sample mode
+MAX_DEPTH = 100             # frames kept under a task's root
+TOP = 15                    # functions & tasks listed in the run report section
+
+_PROCESS_PROFILERS = {}
+
+
+def _label(fileName, line, function):
+    if fileName == '~':
+        return function
+    return '{0} ({1}:{2})'.format(function, os.path.basename(fileName), line)
+
+
+def _codeLabel(code):
+    return _label(code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def _runTask(func, args, kwargs):
+    # Bottom frame of every sampled task; stacks are taken from the frame above it
+    return func(*args, **kwargs)
+
+
+def foldStats(stats, root):
+    """
+    PURPOSE:
+    Function returns {collapsed stack: microseconds} of the stats of one cProfile run
+    (pstats.Stats().stats), each stack starting with root. The time a function spends
+    under each of its callers is split in proportion to the cumulative time cProfile
+    recorded per caller.
+    """
+    callees = {}
+    for func, entry in stats.items():
+        for caller, edge in entry[4].items():
+            if isinstance(edge, tuple):
+                callees.setdefault(caller, []).append((func, edge[3]))
+    folded = {}
+
+    def walk(func, stack, onStack, share):
+        frames = stack + [_label(*func)]
+        selfTime = int(stats[func][2] * share * 1e6)
+        if selfTime > 0:
+            key = ';'.join(frames)
+            folded[key] = folded.get(key, 0) + selfTime
+        if len(frames) > MAX_DEPTH:
+            return
+        for callee, edgeTime in callees.get(func, ()):
+            total = stats[callee][3]
+            if callee in onStack or total <= 0:
+                continue
+            calleeShare = min(1.0, share * edgeTime / total)
+            if total * calleeShare >= 1e-6:
+                walk(callee, frames, onStack | set([callee]), calleeShare)
+
+    for func, entry in stats.items():
+        if not entry[4]:
+            walk(func, [root], set([func]), 1.0)
+    return folded
+
+
+def summarize(folded, tasks, top=TOP):
+    """Returns the run report section of collapsed stacks & task times: totals, time per stage, slowest tasks & functions."""
+    stages, functions, total = {}, {}, 0
+    for stack, microseconds in folded.items():
+        frames = stack.split(';')
+        total += microseconds
+        if len(frames) > 1:
+            functions[frames[-1]] = functions.get(frames[-1], 0) + microseconds
+    for task in tasks.values():
+        stages[task['stage']] = round(stages.get(task['stage'], 0.0) + task['seconds'], 3)
+    slowest = sorted(tasks.values(), key=lambda task: -task['seconds'])[:top]
+    return {'tasks': len(tasks), 'seconds': round(sum(task['seconds'] for task in tasks.values()), 3),
+            'profiledSeconds': round(total / 1e6, 3), 'stages': stages,
+            'unprofiled': sum(task.get('unprofiled', 0) for task in tasks.values()),
+            'slowestTasks': [dict(task, seconds=round(task['seconds'], 3)) for task in slowest],
+            'selfTime': [{'function': function, 'seconds': round(microseconds / 1e6, 3),
+                          'share': round(microseconds / float(total), 4)}
+                         for function, microseconds in sorted(functions.items(), key=lambda item: -item[1])[:top]]}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class TaskProfiler(object):
+    """
+    PURPOSE:
+    Profiles each task run through call() and keeps their collapsed stacks, the
+    time of each task & (cprofile mode) their merged pstats, for every thread of
+    this process.
+
+    PARAMETERS:
+    mode = 'sample' or 'cprofile' (see MODES).
+    interval = seconds between stacks in sample mode.
+    partsDir = folder the part files of worker processes are written to (a new
+        temporary folder by default; removed by finish()).
+    clock = time function (replaceable for tests).
+    """
+
+    def __init__(self, mode='sample', interval=SAMPLE_INTERVAL, partsDir=None, clock=time.time):
+        if mode not in MODES:
+            raise ValueError('Unknown profile mode {0}; expected one of {1}'.format(mode, ', '.join(MODES)))
+        self.mode = mode
+        self.interval = interval
+        self.partsDir = partsDir or tempfile.mkdtemp(prefix='profile_')
+        self.clock = clock
+        self.pid = os.getpid()
+        self.folded = {}
+        self.tasks = {}
+        self.stats = None
+        self.lock = threading.Lock()
+        self.running = {}
+        self.sampling = False
+        _PROCESS_PROFILERS[(self.pid, self.partsDir)] = self
+
+    def settings(self):
+        """Returns what a worker process needs to profile its tasks into this profiler's parts (see processProfiler)."""
+        return {'mode': self.mode, 'interval': self.interval, 'partsDir': self.partsDir, 'pid': self.pid}
+
+    def call(self, stage, name, func, args=(), kwargs=None):
+        """
+        PURPOSE:
+        Runs func(*args, **kwargs) as task 'name' of 'stage' under the profiler &
+        returns its result (exceptions are raised as they are; the time still counts).
+        """
+        kwargs = kwargs or {}
+        root = '{0};{1}'.format(stage, name)
+        started = self.clock()
+        unprofiled = 0
+        try:
+            if self.mode == 'cprofile':
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    # Python 3.12+: another task is being profiled in this process
+                    unprofiled = 1
+                    return func(*args, **kwargs)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    self._addProfile(profile, root)
+            return self._sampled(root, func, args, kwargs)
+        finally:
+            self._addTask(stage, name, self.clock() - started, unprofiled)
+
+    def writePart(self, partsDir=None):
+        """Writes this process's stacks, task times (& pstats) to part files of partsDir & returns the json path."""
+        partsDir = partsDir or self.partsDir
+        if not os.path.isdir(partsDir):
+            os.makedirs(partsDir)
+        partPath = os.path.join(partsDir, 'part_{0}.json'.format(os.getpid()))
+        with self.lock:
+            part = {'mode': self.mode, 'pid': os.getpid(), 'folded': self.folded, 'tasks': list(self.tasks.values())}
+            with open(partPath, 'w') as partFile:
+                json.dump(part, partFile)
+            if self.stats is not None:
+                self.stats.dump_stats(os.path.join(partsDir, 'part_{0}.prof'.format(os.getpid())))
+        return partPath
+
+    def finish(self, outputDir, stem):
+        """
+        PURPOSE:
+        Writes this process's part, merges it with the parts of worker processes into
+        <outputDir>/<stem>.folded (& .prof), removes the parts folder & returns the
+        run report section (see mergeProfiles).
+        """
+        self.writePart()
+        try:
+            return mergeProfiles(self.partsDir, os.path.join(outputDir, stem))
+        finally:
+            shutil.rmtree(self.partsDir, ignore_errors=True)
+            _PROCESS_PROFILERS.pop((self.pid, self.partsDir), None)
+
+    def _addTask(self, stage, name, seconds, unprofiled):
+        with self.lock:
+            task = self.tasks.setdefault('{0};{1}'.format(stage, name), {
+                'stage': stage, 'name': name, 'seconds': 0.0, 'calls': 0, 'unprofiled': 0})
+            task['seconds'] += seconds
+            task['calls'] += 1
+            task['unprofiled'] += unprofiled
+
+    def _addProfile(self, profile, root):
+        stats = pstats.Stats(profile)
+        folded = foldStats(stats.stats, root)
+        with self.lock:
+            for stack, microseconds in folded.items():
+                self.folded[stack] = self.folded.get(stack, 0) + microseconds
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.add(stats)
+
+    def _sampled(self, root, func, args, kwargs):
+        ident = threading.current_thread().ident
+        with self.lock:
+            self.running[ident] = root
+            if not self.sampling:
+                self.sampling = True
+                sampler = threading.Thread(target=self._sample, name='TaskProfiler')
+                sampler.daemon = True
+                sampler.start()
+        try:
+            return _runTask(func, args, kwargs)
+        finally:
+            with self.lock:
+                self.running.pop(ident, None)
+
+    def _sample(self):
+        # Each stack is weighted with the time since the previous one, so stacks taken late (the GIL
+        # held by a long C call) still add up to the time spent
+        last = self.clock()
+        while True:
+            time.sleep(self.interval)
+            now = self.clock()
+            microseconds, last = int((now - last) * 1e6), now
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.running:
+                    self.sampling = False
+                    return
+                for ident, root in self.running.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None and frame.f_code is not _runTask.__code__:
+                        stack.append(_codeLabel(frame.f_code))
+                        frame = frame.f_back
+                    if frame is None:
+                        continue
+                    key = ';'.join([root] + stack[::-1][:MAX_DEPTH])
+                    self.folded[key] = self.folded.get(key, 0) + microseconds
+
+
+def processProfiler(settings):
+    """
+    PURPOSE:
+    Function returns the TaskProfiler of this process for settings (TaskProfiler.settings())
+    and whether this is a worker process, whose part the caller writes after its tasks.
+    """
+    pid = os.getpid()
+    profiler = _PROCESS_PROFILERS.get((pid, settings['partsDir']))
+    if profiler is None:
+        profiler = TaskProfiler(settings['mode'], settings['interval'], settings['partsDir'])
+    return profiler, pid != settings['pid']
+
+
+def mergeProfiles(partsDir, outputStem):
+    """
+    PURPOSE:
+    Function adds up the part files of partsDir (one per process) into
+    <outputStem>.folded & (cprofile mode) <outputStem>.prof, and returns the
+    run report section 'profile'.
+
+    PARAMETERS:
+    partsDir = folder of part_<pid>.json / .prof files (TaskProfiler.writePart).
+    outputStem = path of the output files without extension.
+    """
+    folded, tasks, mode = {}, {}, None
+    parts = sorted(glob.glob(os.path.join(partsDir, 'part_*.json')))
+    for partPath in parts:
+        with open(partPath) as partFile:
+            part = json.load(partFile)
+        mode = part['mode']
+        for stack, microseconds in part['folded'].items():
+            folded[stack] = folded.get(stack, 0) + microseconds
+        for task in part['tasks']:
+            merged = tasks.setdefault('{0};{1}'.format(task['stage'], task['name']), {
+                'stage': task['stage'], 'name': task['name'], 'seconds': 0.0, 'calls': 0, 'unprofiled': 0})
+            for key in ('seconds', 'calls', 'unprofiled'):
+                merged[key] += task[key]
+    outputDir = os.path.dirname(outputStem)
+    if outputDir and not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+    foldedPath = outputStem + '.folded'
+    with open(foldedPath, 'w') as foldedFile:
+        for stack in sorted(folded):
+            foldedFile.write('{0} {1}\n'.format(stack, folded[stack]))
+    section = summarize(folded, tasks)
+    section.update({'mode': mode, 'processes': len(parts), 'folded': foldedPath})
+    statsParts = sorted(glob.glob(os.path.join(partsDir, 'part_*.prof')))
+    if statsParts:
+        stats = pstats.Stats(*statsParts)
+        stats.dump_stats(outputStem + '.prof')
+        section['stats'] = outputStem + '.prof'
+    return section
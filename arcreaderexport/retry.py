@@ -0,0 +1,336 @@
+"""
+Bounded retries and per-source circuit breakers for export tasks.
+
+A failed geoprocessing call is classified from its exception and ArcGIS messages:
+
+    transient = network / DBMS connection problems; retried with jittered backoff
+                and counted against the source's circuit breaker.
+    lock      = schema or file locks on the output; retried with a longer backoff.
+    schema    = missing datasets, bad names or fields; not retried.
+    unknown   = anything else; retried a limited number of times.
+
+When a source (an SDE connection) keeps failing with transient errors its breaker
+opens and the remaining tasks for that source are deferred instead of hammering
+the server. Once its cooldown has passed a single task probes the source while
+the others stay deferred. Deferred tasks get one more pass at the end of the run.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import errno
+import random
+import re
+import socket
+import threading
+import time
+
+TRANSIENT = 'transient'
+SCHEMA = 'schema'
+LOCK = 'lock'
+UNKNOWN = 'unknown'
+
+# Patterns are checked in this order; the first match wins.
+_ERROR_PATTERNS = [
+    (LOCK, re.compile(r'ERROR 000464|schema lock|cannot acquire a lock|lock request conflicts|'
+                      r'being used by another process|sharing violation', re.IGNORECASE)),
+    (SCHEMA, re.compile(r'ERROR 000732|ERROR 000354|ERROR 000728|ERROR 000840|ERROR 000725|'
+                        r'does not exist or is not supported|DBMS table not found|'
+                        r'Attribute column not found|invalid column|invalid characters', re.IGNORECASE)),
+    (TRANSIENT, re.compile(r'ERROR 999999|Underlying DBMS error|Network I/O error|'
+                           r'Failed to connect to database|connection (?:was )?(?:lost|reset|refused)|'
+                           r'timed? ?out|server is not available|DBMS error code: -?\d+|'
+                           r'communication link failure|TCP Provider', re.IGNORECASE)),
+]
+
+_TRANSIENT_ERRNOS = set(getattr(errno, name) for name in
+                        ('EAGAIN', 'ETIMEDOUT', 'ECONNRESET', 'ECONNREFUSED', 'ECONNABORTED',
+                         'ENETUNREACH', 'EHOSTUNREACH', 'EPIPE') if hasattr(errno, name))
+
+
+def classifyError(exc, messages=''):
+    """
+    PURPOSE:
+    Function sorts a failed task's exception into 'transient', 'lock', 'schema' or 'unknown'.
+
+    PARAMETERS:
+    exc = the exception raised by the task (arcpy.ExecuteError, IOError, ...).
+    messages = string of extra messages, such as arcpy.GetMessages(2).
+    """
+    text = '{0}\n{1}'.format(exc, messages or '')
+    for errorClass, pattern in _ERROR_PATTERNS:
+        if pattern.search(text):
+            return errorClass
+    if isinstance(exc, socket.timeout):
+        return TRANSIENT
+    if isinstance(exc, (IOError, OSError)):
+        if getattr(exc, 'winerror', None) in (32, 33):  # sharing / lock violation
+            return LOCK
+        if getattr(exc, 'errno', None) in _TRANSIENT_ERRNOS:
+            return TRANSIENT
+    return UNKNOWN
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class RetryPolicy(object):
+    """
+    PURPOSE:
+    Decides how often and how long to wait before retrying a failed task.
+
+    PARAMETERS:
+    maxAttempts = dictionary of error class to total attempts allowed (including the first).
+    baseDelay = seconds of the first backoff for transient / unknown errors; doubles each attempt.
+    lockDelay = seconds of the first backoff for lock errors.
+    maxDelay = upper bound of a single backoff in seconds.
+    rng = random.Random instance used for the jitter.
+    """
+
+    def __init__(self, maxAttempts=None, baseDelay=5.0, lockDelay=15.0, maxDelay=120.0, rng=None):
+        self.maxAttempts = {TRANSIENT: 4, LOCK: 3, SCHEMA: 1, UNKNOWN: 2}
+        if maxAttempts:
+            self.maxAttempts.update(maxAttempts)
+        self.baseDelay = baseDelay
+        self.lockDelay = lockDelay
+        self.maxDelay = maxDelay
+        self.rng = rng or random.Random()
+
+    def shouldRetry(self, errorClass, attempt):
+        return attempt < self.maxAttempts.get(errorClass, 1)
+
+    def delay(self, errorClass, attempt):
+        """
+        PURPOSE:
+        Returns seconds to sleep after failed attempt number 'attempt' (1-based),
+        using "full jitter" so that retries against one server do not line up.
+        """
+        base = self.lockDelay if errorClass == LOCK else self.baseDelay
+        ceiling = min(self.maxDelay, base * (2 ** (attempt - 1)))
+        return self.rng.uniform(ceiling / 2.0, ceiling)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class CircuitBreaker(object):
+    """
+    PURPOSE:
+    Tracks consecutive transient failures for one source and stops sending it work
+    while it looks down.
+
+    PARAMETERS:
+    source = string name of the source (SDE connection file).
+    failureThreshold = consecutive attempts failing with transient errors that open the breaker.
+    cooldown = seconds the breaker stays open before allowing a single probe task.
+    clock = function returning the current time in seconds.
+
+    Shared by the tasks of one source running in parallel: while the probe is out ('probing'),
+    every other caller is refused until the probe's outcome is recorded.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, source, failureThreshold=5, cooldown=300.0, clock=time.time):
+        self.source = source
+        self.failureThreshold = failureThreshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedAt = None
+        self.timesOpened = 0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a task for this source may run now (half-open: only the one probe)."""
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.openedAt >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.OPEN:
+                return False
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    return False
+                self.probing = True
+            return True
+
+    def remaining(self):
+        """Seconds left until an open breaker lets a probe through (0 if not open)."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (self.clock() - self.openedAt))
+
+    def recordSuccess(self):
+        with self.lock:
+            self._close()
+
+    def recordFailure(self, transient=True):
+        """
+        PURPOSE:
+        Records a failed attempt. Only transient failures count toward opening the breaker; any
+        other error (lock, schema) shows the source answered, so it closes a half-open breaker.
+        """
+        with self.lock:
+            if not transient:
+                if self.state == self.HALF_OPEN:
+                    self._close()
+                return
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state = self.OPEN
+                self.openedAt = self.clock()
+                self.timesOpened += 1
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class TaskRunner(object):
+    """
+    PURPOSE:
+    Runs export tasks with bounded retries and per-source circuit breakers, and
+    records each outcome in the run report.
+
+    PARAMETERS:
+    policy = RetryPolicy (default settings if None).
+    report = RunReport to record task outcomes in (optional).
+    logger = logging.Logger for retry / breaker messages (optional).
+    messagesFn = function returning extra error text for classification, such as
+        lambda: arcpy.GetMessages(2).
+    failureThreshold, cooldown = settings for each source's CircuitBreaker.
+    sleep, clock = time functions (replaceable for dry runs).
+
+    The 'stage' attribute ('copy' by default) labels the structured log event written
+    for each task; set it before running a different kind of task (such as 'clip').
+    Set the 'profiler' attribute to a profiling.TaskProfiler to profile every attempt, and
+    'metrics' to a metrics.ExportMetrics to count each task's outcome.
+    """
+
+    def __init__(self, policy=None, report=None, logger=None, messagesFn=None,
+                 failureThreshold=5, cooldown=300.0, sleep=time.sleep, clock=time.time):
+        self.policy = policy or RetryPolicy()
+        self.report = report
+        self.logger = logger
+        self.messagesFn = messagesFn
+        self.failureThreshold = failureThreshold
+        self.cooldown = cooldown
+        self.sleep = sleep
+        self.clock = clock
+        self.breakers = {}
+        self.deferred = []
+        self.stage = 'copy'
+        self.profiler = None
+        self.metrics = None
+
+    def breaker(self, source):
+        # setdefault, so tasks of one source run in parallel (autotune.AutotunedPool) share one breaker
+        if source not in self.breakers:
+            self.breakers.setdefault(source, CircuitBreaker(source, self.failureThreshold, self.cooldown, self.clock))
+        return self.breakers[source]
+
+    def run(self, name, source, func, *args, **kwargs):
+        """
+        PURPOSE:
+        Runs func(*args, **kwargs) for task 'name' reading from 'source'.
+        Returns 'done', 'failed' or 'deferred' (breaker open; retried by runDeferred).
+        """
+        task = {'name': name, 'source': source, 'func': func, 'args': args, 'kwargs': kwargs,
+                'stage': self.stage, 'attempts': 0, 'timeLost': 0.0, 'duration': 0.0}
+        breaker = self.breaker(source)
+        if not breaker.allow():
+            return self._defer(task, breaker)
+        return self._attempt(task, allowDefer=True)
+
+    def runDeferred(self, maxWait=None):
+        """
+        PURPOSE:
+        Gives every deferred task one more pass. Waits once per source (up to maxWait
+        seconds, default the breaker cooldown) for its breaker to allow a probe; tasks
+        whose source stays down are recorded as failed.
+        """
+        maxWait = self.cooldown if maxWait is None else maxWait
+        pending, self.deferred = self.deferred, []
+        waited = set()
+        for task in pending:
+            breaker = self.breaker(task['source'])
+            wait = breaker.remaining()
+            if 0 < wait <= maxWait and task['source'] not in waited:
+                waited.add(task['source'])
+                self._log('Waiting {0:0.0f} seconds for source {1} before retrying deferred tasks'.format(
+                    wait, task['source']))
+                self.sleep(wait)
+                task['timeLost'] += wait
+            if breaker.allow():
+                self._attempt(task, allowDefer=False)
+            else:
+                self._record(task, 'failed', TRANSIENT, 'source circuit still open; task skipped')
+        return len(pending)
+
+    def _defer(self, task, breaker):
+        self.deferred.append(task)
+        if breaker.probing:
+            self._log('Deferred {0}: source {1} is being probed'.format(task['name'], task['source']))
+        else:
+            self._log('Deferred {0}: source {1} circuit open for another {2:0.0f} seconds'.format(
+                task['name'], task['source'], breaker.remaining()))
+        return 'deferred'
+
+    def _attempt(self, task, allowDefer):
+        breaker = self.breaker(task['source'])
+        started = self.clock()
+        while True:
+            task['attempts'] += 1
+            attemptStarted = self.clock()
+            try:
+                if self.profiler is not None:
+                    result = self.profiler.call(task['stage'], task['name'], task['func'], task['args'], task['kwargs'])
+                else:
+                    result = task['func'](*task['args'], **task['kwargs'])
+            except Exception as e:
+                messages = self.messagesFn() if self.messagesFn else ''
+                errorClass = classifyError(e, messages)
+                task['timeLost'] += self.clock() - attemptStarted
+                self._log('XXX {0} attempt {1} failed ({2}): {3}'.format(
+                    task['name'], task['attempts'], errorClass, e))
+                breaker.recordFailure(transient=errorClass == TRANSIENT)
+                if self.policy.shouldRetry(errorClass, task['attempts']):
+                    if not breaker.allow():
+                        task['duration'] += self.clock() - started
+                        if allowDefer:
+                            return self._defer(task, breaker)
+                        self._record(task, 'failed', errorClass, '{0}'.format(e).strip())
+                        return 'failed'
+                    delay = self.policy.delay(errorClass, task['attempts'])
+                    self.sleep(delay)
+                    task['timeLost'] += delay
+                    continue
+                task['duration'] += self.clock() - started
+                self._record(task, 'failed', errorClass, '{0}'.format(e).strip())
+                return 'failed'
+            breaker.recordSuccess()
+            task['duration'] += self.clock() - started
+            self._record(task, 'done', None, None, **(result if isinstance(result, dict) else {}))
+            return 'done'
+
+    def _record(self, task, status, errorClass, error, **extra):
+        if self.report is not None:
+            self.report.recordTask(task['name'], task['source'], status, task['attempts'], task['duration'],
+                                   task['timeLost'], errorClass, error, stage=task['stage'], **extra)
+        if self.metrics is not None:
+            self.metrics.recordTask(task['stage'], task['source'], status, task['duration'], task['attempts'],
+                                    extra.get('rows'))
+        if self.logger is not None:
+            event = {'stage': task['stage'], 'className': task['name'], 'source': task['source'],
+                     'status': status, 'attempts': task['attempts'], 'duration': round(task['duration'], 3),
+                     'timeLost': round(task['timeLost'], 3), 'errorClass': errorClass}
+            event.update(extra)
+            self.logger.info('Task {0} {1}'.format(task['name'], status), extra={'event': event})
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
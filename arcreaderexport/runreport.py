@@ -0,0 +1,135 @@
+"""
+Run report for one export run.
+
+Every pipeline task (feature class copy, table copy, clip) records one entry with
+its status, attempt count and time lost to retries. At the end of the run the
+report is written as JSON next to ProcessLogfile.log and a summary is logged, so
+a silently missing layer shows up in the report instead of only as one
+"XXX Failed" line buried in the log.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import json
+import os
+import time
+
+# Default folder for run reports (next to ProcessLogfile.log)
+REPORT_DIR = r'S:\GIS_Public\Tools\Code\Python\ArcReaderExport\RunReports'
+
+
+class RunReport(object):
+    """
+    PURPOSE:
+    Collects per-task results of one export run and writes them out as JSON.
+
+    PARAMETERS:
+    runName = string label of the run, such as 'nightly'.
+    clock = function returning the current time in seconds (time.time by default).
+    """
+
+    def __init__(self, runName='export', clock=time.time):
+        self.runName = runName
+        self.clock = clock
+        self.startTime = clock()
+        self.endTime = None
+        self.tasks = []
+        self.sections = {}
+
+    def recordTask(self, name, source, status, attempts=1, duration=0.0,
+                   timeLost=0.0, errorClass=None, error=None, **extra):
+        """
+        PURPOSE:
+        Adds one task result to the report.
+
+        PARAMETERS:
+        name = string task name (usually the output feature class name).
+        source = string source the task reads from (SDE connection, gdb path).
+        status = 'done', 'failed' or 'deferred'.
+        attempts = number of times the task was tried.
+        duration = seconds spent on the task including retries.
+        timeLost = seconds spent on failed attempts and backoff sleeps.
+        errorClass = classified error of the last failure ('transient', 'schema', 'lock', 'unknown').
+        error = string message of the last failure.
+        extra = any other values to keep with the task (rows, bytes, ...).
+        """
+        task = {
+            'name': name,
+            'source': source,
+            'status': status,
+            'attempts': attempts,
+            'duration': round(duration, 3),
+            'timeLost': round(timeLost, 3),
+            'errorClass': errorClass,
+            'error': error,
+        }
+        task.update(extra)
+        self.tasks.append(task)
+        return task
+
+    def addSection(self, name, data):
+        """Attaches the results of a whole stage (such as validation) to the report."""
+        self.sections[name] = data
+
+    def finish(self):
+        """Marks the end of the run."""
+        self.endTime = self.clock()
+
+    def summary(self):
+        """
+        PURPOSE:
+        Returns a dictionary of run totals (task counts by status, retries, time lost).
+        """
+        endTime = self.endTime if self.endTime is not None else self.clock()
+        counts = {}
+        for task in self.tasks:
+            counts[task['status']] = counts.get(task['status'], 0) + 1
+        return {
+            'runName': self.runName,
+            'started': _isoTime(self.startTime),
+            'elapsed': round(endTime - self.startTime, 3),
+            'tasks': len(self.tasks),
+            'statusCounts': counts,
+            'retries': sum(max(task['attempts'] - 1, 0) for task in self.tasks),
+            'timeLost': round(sum(task['timeLost'] for task in self.tasks), 3),
+            'failedTasks': [task['name'] for task in self.tasks if task['status'] != 'done'],
+        }
+
+    def toDict(self):
+        report = {'summary': self.summary(), 'tasks': self.tasks}
+        report.update(self.sections)
+        return report
+
+    def fileStem(self, prefix='RunReport'):
+        """Returns <prefix>_<runName>_<YYYYmmdd_HHMMSS>, the name of this run's files without extension."""
+        stamp = datetime.datetime.fromtimestamp(self.startTime).strftime('%Y%m%d_%H%M%S')
+        return '{0}_{1}_{2}'.format(prefix, self.runName, stamp)
+
+    def write(self, reportDir=REPORT_DIR):
+        """
+        PURPOSE:
+        Writes the report to reportDir as RunReport_<runName>_<YYYYmmdd_HHMMSS>.json
+        and returns the file path.
+        """
+        if not os.path.isdir(reportDir):
+            os.makedirs(reportDir)
+        reportPath = os.path.join(reportDir, self.fileStem() + '.json')
+        with open(reportPath, 'w') as reportFile:
+            json.dump(self.toDict(), reportFile, indent=2, sort_keys=True)
+        return reportPath
+
+    def logSummary(self, logger):
+        """Logs the run totals and each task that did not finish."""
+        summary = self.summary()
+        logger.info('Run report: {0} tasks {1}; {2} retries; {3:0.1f} seconds lost to retries'.format(
+            summary['tasks'], summary['statusCounts'], summary['retries'], summary['timeLost']))
+        for task in self.tasks:
+            if task['status'] != 'done':
+                logger.info('XXX Task {0} from {1} {2} after {3} attempt(s) ({4}): {5}'.format(
+                    task['name'], task['source'], task['status'], task['attempts'],
+                    task['errorClass'], task['error']))
+
+
+def _isoTime(seconds):
+    return datetime.datetime.fromtimestamp(seconds).strftime('%Y-%m-%dT%H:%M:%S')
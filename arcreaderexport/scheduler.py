@@ -0,0 +1,265 @@
+"""
+Export scheduler: runs CreateRemoteArcReaderGDB_v2.py for each refresh tier when its window comes up.
+
+    python -m arcreaderexport.scheduler --script CreateRemoteArcReaderGDB_v2.py
+                                        [--python C:\\Python27\\ArcGIS10.5\\python.exe] [--once] [--dry-run]
+
+Default windows (SCHEDULE):
+
+    hourly  = 5 minutes past every hour, 06:00-18:00, Monday-Friday (hot layers only)
+    nightly = 01:00 every day (hourly + nightly layers)
+    weekly  = 01:00 Sunday (full rebuild of the gdb)
+
+When two windows fall together the less frequent tier runs, since it also exports
+the layers of the more frequent ones. Runs never overlap: a window missed while
+another export was running is run late only within its grace period, otherwise it
+is skipped. A window only counts as run once an export for it succeeded; a failed
+one is tried again RETRY_MINUTES later while the window is within its grace period.
+The last successful run of each tier and a short history are kept in a JSON state
+file next to the run reports.
+
+With --once the scheduler checks once and exits, so Windows Task Scheduler can call
+it every few minutes instead of keeping a process running; a lock file holding the
+process id keeps two such calls from exporting at the same time. A lock whose
+process is no longer running (or older than STALE_LOCK_HOURS) is left from a crash
+and is replaced.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import time
+
+from arcreaderexport.layers import TIERS
+from arcreaderexport.logs import processAlive
+from arcreaderexport.manifest import readJson, writeJson
+from arcreaderexport.runreport import REPORT_DIR
+
+STATE_PATH = os.path.join(REPORT_DIR, 'ExportSchedule.json')
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+HISTORY_LENGTH = 100
+STALE_LOCK_HOURS = 24
+RETRY_MINUTES = 30
+
+# Weekdays use datetime.weekday(): Monday = 0 ... Sunday = 6
+SCHEDULE = {
+    'hourly': {'minute': 5, 'hours': range(6, 19), 'weekdays': range(0, 5), 'graceMinutes': 45},
+    'nightly': {'minute': 0, 'hours': [1], 'weekdays': range(0, 7), 'graceMinutes': 240},
+    'weekly': {'minute': 0, 'hours': [1], 'weekdays': [6], 'graceMinutes': 720},
+}
+
+
+def lastSlot(window, now):
+    """Returns the latest start time of a window at or before now (None if none in the last 8 days)."""
+    slot = now.replace(minute=window['minute'], second=0, microsecond=0)
+    if slot > now:
+        slot -= datetime.timedelta(hours=1)
+    for _ in range(24 * 8):
+        if slot.hour in window['hours'] and slot.weekday() in window['weekdays']:
+            return slot
+        slot -= datetime.timedelta(hours=1)
+    return None
+
+
+def dueTier(now, lastRuns, schedule=None, lastFailures=None):
+    """
+    PURPOSE:
+    Function returns (tier, window start) of the least frequent tier whose window has
+    started, is still within its grace period and has not run successfully since (nor
+    failed in the last RETRY_MINUTES); (None, None) if nothing is due.
+
+    PARAMETERS:
+    now = datetime to check.
+    lastRuns = dictionary of tier to the datetime its last successful run started.
+    schedule = dictionary of tier to window (SCHEDULE by default).
+    lastFailures = dictionary of tier to the datetime its last failed run started.
+    """
+    schedule = SCHEDULE if schedule is None else schedule
+    lastFailures = lastFailures or {}
+    for tier in reversed(TIERS):
+        window = schedule.get(tier)
+        slot = lastSlot(window, now) if window else None
+        if slot is None or now - slot > datetime.timedelta(minutes=window['graceMinutes']):
+            continue
+        if lastRuns.get(tier) is not None and lastRuns[tier] >= slot:
+            continue
+        failed = lastFailures.get(tier)
+        if failed is not None and failed >= slot and now - failed < datetime.timedelta(minutes=RETRY_MINUTES):
+            continue
+        return tier, slot
+    return None, None
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class Scheduler(object):
+    """
+    PURPOSE:
+    Runs the export command for whichever tier is due, one run at a time.
+
+    PARAMETERS:
+    command = list of the program & arguments to run; '--tier <tier>' is appended.
+    statePath = string path of the JSON state file (last runs & history).
+    schedule = dictionary of tier to window (SCHEDULE by default).
+    clock = function returning the current datetime.
+    runner = function running a command list & returning its exit code (subprocess.call by default).
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, command, statePath=STATE_PATH, schedule=None, clock=datetime.datetime.now,
+                 runner=subprocess.call, logger=None):
+        self.command = list(command)
+        self.statePath = statePath
+        self.lockPath = statePath + '.lock'
+        self.schedule = SCHEDULE if schedule is None else schedule
+        self.clock = clock
+        self.runner = runner
+        self.logger = logger
+
+    def readState(self):
+        state = readJson(self.statePath) or {}
+        state.setdefault('lastRuns', {})
+        state.setdefault('lastFailures', {})
+        state.setdefault('history', [])
+        return state
+
+    def lastRuns(self, state=None, key='lastRuns'):
+        state = self.readState() if state is None else state
+        return dict((tier, datetime.datetime.strptime(value, TIME_FORMAT))
+                    for tier, value in state[key].items())
+
+    def due(self, now=None):
+        state = self.readState()
+        return dueTier(now or self.clock(), self.lastRuns(state), self.schedule, self.lastRuns(state, 'lastFailures'))
+
+    def runDue(self, now=None):
+        """Runs the due tier, if any. Returns (tier, exit code), or (None, None) if nothing ran."""
+        now = now or self.clock()
+        tier, slot = self.due(now)
+        if tier is None or not self._lock(now):
+            return None, None
+        try:
+            self._log('Starting {0} export (window {1})'.format(tier, slot.strftime(TIME_FORMAT)))
+            exitCode = self.runner(self.command + ['--tier', tier])
+            finished = self.clock()
+            state = self.readState()
+            # A run also covers the windows of every more frequent tier that started before it; a failed
+            ## one covers nothing & is retried after RETRY_MINUTES.
+            for covered in TIERS[:TIERS.index(tier) + 1]:
+                state['lastRuns' if exitCode == 0 else 'lastFailures'][covered] = now.strftime(TIME_FORMAT)
+            state['history'].append({'tier': tier, 'window': slot.strftime(TIME_FORMAT),
+                                     'started': now.strftime(TIME_FORMAT), 'finished': finished.strftime(TIME_FORMAT),
+                                     'exitCode': exitCode})
+            state['history'] = state['history'][-HISTORY_LENGTH:]
+            writeJson(self.statePath, state)
+            self._log('Finished {0} export with exit code {1} in {2:0.1f} minutes'.format(
+                tier, exitCode, (finished - now).total_seconds() / 60.0))
+            return tier, exitCode
+        finally:
+            self._unlock()
+
+    def runForever(self, pollInterval=60, sleep=time.sleep):
+        while True:
+            self.runDue()
+            sleep(pollInterval)
+
+    def _lock(self, now):
+        """
+        Creates the lock file holding this process's id. A lock whose process is no longer running, or older
+        than STALE_LOCK_HOURS (in case its id was reused), is left from a crashed run and is replaced.
+        """
+        stale, pid = self._staleLock(self.lockPath, now)
+        if stale:
+            self._claimStaleLock(now, pid)
+        try:
+            lockFile = os.open(self.lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            self._log('Another export is still running ({0} exists); skipping this check'.format(self.lockPath))
+            return False
+        try:
+            os.write(lockFile, str(os.getpid()).encode('ascii'))
+        finally:
+            os.close(lockFile)
+        return True
+
+    def _staleLock(self, path, now):
+        """Returns (True if the lock file at path is left from a run that is no longer going, its process id)."""
+        try:
+            with open(path) as lockFile:
+                pid = lockFile.read().strip()
+            age = now - datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        except (IOError, OSError):
+            return False, None
+        return (pid.isdigit() and not processAlive(int(pid))) or age > datetime.timedelta(hours=STALE_LOCK_HOURS), pid
+
+    def _claimStaleLock(self, now, pid):
+        """
+        Moves a stale lock out of the way without ever removing a fresh one: the lock is renamed to a name of
+        this process's own (only one process can rename it), then checked again, since another scheduler
+        may have replaced it by its own lock since it was read. A fresh lock claimed that way is put back.
+        """
+        claimedPath = '{0}.{1}.stale'.format(self.lockPath, os.getpid())
+        try:
+            os.rename(self.lockPath, claimedPath)
+        except OSError:
+            return      # claimed by another process first (or replaced on a system that cannot rename over it)
+        stale, _ = self._staleLock(claimedPath, now)
+        if not stale:
+            try:
+                # link / rename back fail rather than replace a lock made in the meantime
+                (os.link if hasattr(os, 'link') else os.rename)(claimedPath, self.lockPath)
+            except OSError:
+                pass
+        else:
+            self._log('Removing the lock of a run that is no longer going ({0}, process {1})'.format(
+                self.lockPath, pid or '?'))
+        try:
+            os.remove(claimedPath)
+        except OSError:
+            pass
+
+    def _unlock(self):
+        try:
+            os.remove(self.lockPath)
+        except OSError:
+            pass
+
+    def _log(self, message):
+        print(message)
+        if self.logger is not None:
+            self.logger.info(message)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='scheduler', description='Run hourly / nightly / weekly ArcReader exports.')
+    parser.add_argument('--script', default='CreateRemoteArcReaderGDB_v2.py', help='export script to run')
+    parser.add_argument('--python', default=sys.executable, help='ArcGIS python used to run the export script')
+    parser.add_argument('--state', default=STATE_PATH, help='JSON file of last runs')
+    parser.add_argument('--once', action='store_true', help='check once & exit (for Windows Task Scheduler)')
+    parser.add_argument('--dry-run', action='store_true', help='only print which tier is due')
+    parser.add_argument('--poll', type=float, default=60, help='seconds between checks')
+    args = parser.parse_args(argv)
+
+    scheduler = Scheduler([args.python, args.script], statePath=args.state)
+    if args.dry_run:
+        tier, slot = scheduler.due()
+        print('Due: {0}'.format('{0} (window {1})'.format(tier, slot.strftime(TIME_FORMAT)) if tier else 'nothing'))
+        return 0
+    if args.once:
+        tier, exitCode = scheduler.runDue()
+        return exitCode or 0
+    try:
+        scheduler.runForever(args.poll)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Local columnar cache of source classes (Arrow IPC files), keyed by source fingerprint.
+
+Every output product (PortableDuluth.gdb, the Rice Lake clips, validation, later
+tiles or GeoPackages) used to read its sources from SDE again. With the cache each
+source class is extracted once per change into an Arrow IPC file:
+
+    <cacheDir>/index.json                    source path -> fingerprint, file, rows, fields, extent
+    <cacheDir>/<name>-<fingerprint>.arrow    attributes + OBJECTID + geometry as WKB ('SHAPE')
+
+and every consumer reads it through CachedReader, which memory-maps the file so
+record batches are used in place rather than copied (CachedReader.table() hands
+out the mapped Arrow table itself).
+
+The fingerprint is made from the source's row count, extent and fields, plus the
+newest last_edited_date when the class has editor tracking. An entry older than
+maxAgeHours is extracted again even if the fingerprint did not change, which covers
+attribute edits on classes without editor tracking.
+
+Needs pyarrow (ArcGIS Pro's Python 3 ships it); HAVE_ARROW is False without it.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    HAVE_ARROW = True
+except ImportError:     # ArcMap's Python 2.7
+    pa = None
+    HAVE_ARROW = False
+
+from arcreaderexport import spatialorder
+from arcreaderexport.localstore import wkbMetrics
+from arcreaderexport.manifest import readJson, writeJson
+from arcreaderexport.streamcopy import DEFAULT_BATCH_SIZE, copyFields, curveOrderBatches
+
+CACHE_DIR = r'C:\ArcReaderExportCache'
+INDEX_FILE = 'index.json'
+EDIT_DATE_FIELDS = ('last_edited_date', 'LAST_EDITED_DATE')
+GEOMETRY_COLUMN = 'SHAPE'
+OID_COLUMN = 'OBJECTID'
+
+
+def _arrowType(fieldType):
+    return {'Integer': pa.int64(), 'SmallInteger': pa.int32(), 'Double': pa.float64(), 'Single': pa.float32(),
+            'Date': pa.timestamp('us'), 'Blob': pa.binary()}.get(fieldType, pa.string())
+
+
+def _toDatetime(value):
+    if hasattr(value, 'strip') and value:      # dates stored as text (LocalStore)
+        return datetime.datetime.strptime(value[:19].replace('T', ' '), '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _safeName(sourcePath):
+    return re.sub(r'[^A-Za-z0-9_.]+', '_', sourcePath.replace('\\', '/').rstrip('/').split('/')[-1])[-80:]
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class SourceCache(object):
+    """
+    PURPOSE:
+    Extracts source classes once into Arrow IPC files & keeps them while their fingerprint holds.
+
+    PARAMETERS:
+    cacheDir = string path of the local cache folder (created if missing).
+    reader = object with describe() & iterBatches() for the sources (validate.ArcpyReader, LocalStore).
+    batchSize = rows per extracted record batch.
+    maxAgeHours = age after which an entry is extracted again even with an unchanged fingerprint (None = never).
+    geometryToken = cursor token that returns WKB from the reader ('SHAPE@WKB' for arcpy).
+    """
+
+    def __init__(self, cacheDir=CACHE_DIR, reader=None, batchSize=DEFAULT_BATCH_SIZE, maxAgeHours=24,
+                 geometryToken='SHAPE@WKB'):
+        if not HAVE_ARROW:
+            raise ImportError('pyarrow is needed for the source cache (use the ArcGIS Pro Python 3 environment)')
+        if reader is None:
+            from arcreaderexport.validate import ArcpyReader
+            reader = ArcpyReader()
+        self.cacheDir = cacheDir
+        self.reader = reader
+        self.batchSize = batchSize
+        self.maxAgeHours = maxAgeHours
+        self.geometryToken = geometryToken
+        self.indexPath = os.path.join(cacheDir, INDEX_FILE)
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        self.index = readJson(self.indexPath) or {}
+        self.stats = {'hits': 0, 'extracted': 0, 'rowsExtracted': 0}
+
+    def fingerprint(self, sourcePath, description=None):
+        """Returns (fingerprint hex string, describe() result) of a source class."""
+        description = description or self.reader.describe(sourcePath)
+        if not description.get('exists'):
+            raise IOError('source does not exist: {0}'.format(sourcePath))
+        parts = {'count': description['count'], 'extent': description.get('extent'),
+                 'fields': [list(field) for field in description['fields']]}
+        fieldNames = [name for name, _ in description['fields']]
+        for editField in EDIT_DATE_FIELDS:
+            if editField in fieldNames:
+                newest = None
+                for batch in self.reader.iterBatches(sourcePath, [editField], self.batchSize * 10):
+                    values = [row[0] for row in batch if row[0] is not None]
+                    if values:
+                        newest = max(values + ([newest] if newest is not None else []))
+                parts['lastEdited'] = str(newest)
+                break
+        digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return digest, description
+
+    def lookup(self, sourcePath):
+        """Returns the index entry of a cached source whose file exists (None otherwise)."""
+        entry = self.index.get(sourcePath)
+        if entry and os.path.exists(os.path.join(self.cacheDir, entry['file'])):
+            return entry
+        return None
+
+    def ensure(self, sourcePath):
+        """
+        PURPOSE:
+        Function returns the index entry of sourcePath, extracting it first when it is
+        not cached, its fingerprint changed or the entry is older than maxAgeHours.
+        """
+        fingerprint, description = self.fingerprint(sourcePath)
+        entry = self.lookup(sourcePath)
+        fresh = entry is not None and entry['fingerprint'] == fingerprint and (
+            self.maxAgeHours is None or time.time() - entry['created'] < self.maxAgeHours * 3600)
+        if fresh:
+            self.stats['hits'] += 1
+            return entry
+        return self._extract(sourcePath, fingerprint, description, entry)
+
+    def _extract(self, sourcePath, fingerprint, description, oldEntry):
+        attributeFields = [(name, fieldType) for name, fieldType in description['fields']
+                           if name in copyFields(description)]
+        readFields = ['OID@'] + [name for name, _ in attributeFields]
+        schemaFields = [pa.field(OID_COLUMN, pa.int64())] + [pa.field(name, _arrowType(fieldType))
+                                                             for name, fieldType in attributeFields]
+        if description.get('hasShape'):
+            readFields.append(self.geometryToken)
+            schemaFields.append(pa.field(GEOMETRY_COLUMN, pa.binary()))
+        schema = pa.schema(schemaFields, metadata={'source': sourcePath, 'fingerprint': fingerprint})
+        dateColumns = set(index + 1 for index, (_, fieldType) in enumerate(attributeFields) if fieldType == 'Date')
+
+        fileName = '{0}-{1}.arrow'.format(_safeName(sourcePath), fingerprint[:16])
+        filePath = os.path.join(self.cacheDir, fileName)
+        rows = 0
+        with pa.OSFile(filePath + '.tmp', 'wb') as sink:
+            writer = pa.ipc.new_file(sink, schema)
+            try:
+                for batch in self.reader.iterBatches(sourcePath, readFields, self.batchSize):
+                    columns = list(zip(*batch))
+                    arrays = []
+                    for index, (values, field) in enumerate(zip(columns, schemaFields)):
+                        if index in dateColumns:
+                            values = [_toDatetime(value) for value in values]
+                        elif field.type == pa.binary():
+                            values = [bytes(value) if value is not None else None for value in values]
+                        arrays.append(pa.array(values, type=field.type))
+                    writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                    rows += len(batch)
+            finally:
+                writer.close()
+        if os.path.exists(filePath):
+            os.remove(filePath)
+        os.rename(filePath + '.tmp', filePath)
+
+        entry = {'fingerprint': fingerprint, 'file': fileName, 'rows': rows, 'created': time.time(),
+                 'fields': [[OID_COLUMN, 'OID']] + ([[GEOMETRY_COLUMN, 'Geometry']] if description.get('hasShape') else [])
+                 + [list(field) for field in attributeFields],
+                 'hasShape': bool(description.get('hasShape')), 'shapeType': description.get('shapeType'),
+                 'extent': description.get('extent'), 'spatialReference': description.get('spatialReference')}
+        self.index[sourcePath] = entry
+        writeJson(self.indexPath, self.index)
+        if oldEntry and oldEntry['file'] != fileName:
+            try:
+                os.remove(os.path.join(self.cacheDir, oldEntry['file']))
+            except OSError:
+                pass    # still memory-mapped by a reader on Windows; removed on the next extraction
+        self.stats['extracted'] += 1
+        self.stats['rowsExtracted'] += rows
+        return entry
+
+    def open(self, sourcePath):
+        """Returns the cached Arrow table of sourcePath, memory-mapped (no copy of the data)."""
+        entry = self.lookup(sourcePath)
+        if entry is None:
+            raise KeyError('not cached: {0}'.format(sourcePath))
+        source = pa.memory_map(os.path.join(self.cacheDir, entry['file']), 'r')
+        return pa.ipc.open_file(source).read_all()
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class CachedReader(object):
+    """
+    PURPOSE:
+    Reader (describe & iterBatches, like validate.ArcpyReader) over the cache; sources that
+    are not cached are read through the fallback reader.
+
+    The cache holds geometry as WKB, so it is served for the 'SHAPE@WKB' token (and the
+    derived SHAPE@XY / LENGTH / AREA); 'SHAPE@' asks for geometry objects, which are read
+    through the fallback reader. streamCopy copies with geometryToken ('SHAPE@WKB'), which
+    arcpy's insert cursor takes as well.
+
+    PARAMETERS:
+    cache = SourceCache.
+    fallback = reader for paths that are not cached (e.g. output classes during validation).
+    extract = True to extract a source into the cache on first use.
+    """
+
+    geometryToken = 'SHAPE@WKB'
+
+    def __init__(self, cache, fallback=None, extract=False):
+        self.cache = cache
+        self.fallback = fallback
+        self.extract = extract
+
+    def _entry(self, path):
+        entry = self.cache.lookup(path)
+        if entry is None and self.extract:
+            try:
+                entry = self.cache.ensure(path)
+            except IOError:
+                if self.fallback is None:
+                    raise
+        return entry
+
+    def table(self, path):
+        if self._entry(path) is None:
+            raise KeyError('not cached: {0}'.format(path))
+        return self.cache.open(path)
+
+    def describe(self, path):
+        entry = self._entry(path)
+        if entry is None:
+            return self.fallback.describe(path) if self.fallback else {'exists': False}
+        return {'exists': True, 'count': entry['rows'], 'extent': tuple(entry['extent']) if entry['extent'] else None,
+                'fields': [tuple(field) for field in entry['fields']], 'hasShape': entry['hasShape'],
+                'shapeType': entry['shapeType'], 'spatialReference': entry.get('spatialReference')}
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        """Yields lists of up to batchSize row tuples read from the memory-mapped file (filtered reads use the fallback)."""
+        if where or 'SHAPE@' in fields:
+            for batch in self.fallback.iterBatches(path, fields, batchSize, where=where):
+                yield batch
+            return
+        if self._entry(path) is None:
+            for batch in self.fallback.iterBatches(path, fields, batchSize):
+                yield batch
+            return
+        columns, derived = self._columns(fields)
+        selected = self.cache.open(path).select(columns)
+        for recordBatch in selected.to_batches(max_chunksize=batchSize):
+            yield self._rows(recordBatch, derived)
+
+    def curveOrderBatches(self, path, fields, batchSize, description, curve):
+        """
+        PURPOSE:
+        Yields the rows of a cached class in lists, in curve order of their centroids (see
+        streamcopy.streamCopy): the order is taken from the cached geometry & each batch is an
+        Arrow take() of the memory-mapped table, so the source is not read again. A class that
+        is not cached is ordered through the fallback reader.
+        """
+        if 'SHAPE@' in fields or self._entry(path) is None:
+            for batch in curveOrderBatches(self.fallback, path, fields, batchSize, description, curve):
+                yield batch
+            return
+        columns, derived = self._columns(fields)
+        table = self.cache.open(path)
+        points = [wkbMetrics(wkb)[0] if wkb is not None else None
+                  for chunk in table.column(GEOMETRY_COLUMN).chunks for wkb in chunk.to_pylist()]
+        order = spatialorder.spatialOrder(points, curve=curve)
+        del points
+        selected = table.select(columns)
+        for start in range(0, len(order), batchSize):
+            yield self._rows(selected.take(pa.array(order[start:start + batchSize], type=pa.int64())), derived)
+
+    def _columns(self, fields):
+        """Returns the cached column of each field & {index: token} of the derived shape tokens."""
+        columns, derived = [], {}
+        for index, field in enumerate(fields):
+            if field == 'OID@':
+                columns.append(OID_COLUMN)
+            elif field.startswith('SHAPE@'):
+                columns.append(GEOMETRY_COLUMN)
+                if field != 'SHAPE@WKB':
+                    derived[index] = field
+            else:
+                columns.append(field)
+        return columns, derived
+
+    def _rows(self, data, derived):
+        rows = list(zip(*[column.to_pylist() for column in data.columns]))
+        if derived:
+            rows = [self._deriveShape(row, derived) for row in rows]
+        return rows
+
+    def _deriveShape(self, row, derived):
+        row = list(row)
+        for index, token in derived.items():
+            if row[index] is not None:
+                centroid, length, area = wkbMetrics(row[index])
+                row[index] = {'SHAPE@XY': centroid, 'SHAPE@LENGTH': length, 'SHAPE@AREA': area}[token]
+        return tuple(row)
+
+
+def cacheSources(cache, sourcePaths, logger=None):
+    """Extracts every source path into the cache (skipping fresh entries); returns the cache stats."""
+    for sourcePath in sourcePaths:
+        entry = cache.ensure(sourcePath)
+        if logger is not None:
+            logger.info('Cached {0}: {1} rows in {2}'.format(sourcePath, entry['rows'], entry['file']))
+    return cache.stats
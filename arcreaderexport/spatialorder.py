@@ -0,0 +1,199 @@
+"""
+Space-filling curve keys of feature centroids, for storing features that are near each
+other on the map near each other in the output file.
+
+The extent of a class is cut into a 2**bits by 2**bits grid; each centroid gets the
+position of its grid cell along a Hilbert curve (or a Z-order / Morton curve, which
+is cheaper to compute but jumps across the extent more often). Rows written in key
+order put the features of a small map extent on a few neighbouring pages, so
+ArcReader reads fewer pages of a laptop's disk for each draw.
+
+With NumPy installed the keys of a whole class are computed as arrays (one pass over
+the points per bit of the grid); without it, point by point in Python. Both give the
+same keys.
+
+pagesPerExtent estimates that cost for a row order without reading any pages: rows
+are assumed to fill pages in storage order (rowsPerPage each) and the pages holding
+the rows inside each sample extent are counted.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+
+try:
+    import numpy
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+HILBERT = 'hilbert'
+ZORDER = 'zorder'
+CURVES = (HILBERT, ZORDER)
+DEFAULT_BITS = 16
+
+
+def extentOf(points):
+    """Returns (xmin, ymin, xmax, ymax) of a list of (x, y), or None for an empty list."""
+    if not points:
+        return None
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def gridCell(x, y, extent, bits=DEFAULT_BITS):
+    """Returns the (column, row) of the 2**bits grid over extent that holds (x, y)."""
+    cells = 1 << bits
+    width = (extent[2] - extent[0]) or 1.0
+    height = (extent[3] - extent[1]) or 1.0
+    column = min(cells - 1, max(0, int((x - extent[0]) / width * cells)))
+    row = min(cells - 1, max(0, int((y - extent[1]) / height * cells)))
+    return column, row
+
+
+def hilbertKey(column, row, bits=DEFAULT_BITS):
+    """Returns the distance of grid cell (column, row) along the Hilbert curve of a 2**bits grid."""
+    cells = 1 << bits
+    key = 0
+    size = cells >> 1
+    while size > 0:
+        rx = 1 if column & size else 0
+        ry = 1 if row & size else 0
+        key += size * size * ((3 * rx) ^ ry)
+        # Rotates the quadrant so the curve inside it starts & ends next to its neighbours
+        if ry == 0:
+            if rx == 1:
+                column = cells - 1 - column
+                row = cells - 1 - row
+            column, row = row, column
+        size >>= 1
+    return key
+
+
+def zOrderKey(column, row, bits=DEFAULT_BITS):
+    """Returns the Morton (Z-order) key of grid cell (column, row): the bits of both interleaved."""
+    key = 0
+    for bit in range(bits):
+        key |= ((column >> bit) & 1) << (2 * bit) | ((row >> bit) & 1) << (2 * bit + 1)
+    return key
+
+
+def _gridCellsArray(xs, ys, extent, bits):
+    cells = 1 << bits
+    width = (extent[2] - extent[0]) or 1.0
+    height = (extent[3] - extent[1]) or 1.0
+    columns = numpy.clip(((xs - extent[0]) / width * cells).astype(numpy.int64), 0, cells - 1)
+    rows = numpy.clip(((ys - extent[1]) / height * cells).astype(numpy.int64), 0, cells - 1)
+    return columns, rows
+
+
+def _hilbertKeysArray(columns, rows, bits):
+    cells = 1 << bits
+    keys = numpy.zeros(len(columns), dtype=numpy.int64)
+    size = cells >> 1
+    while size > 0:
+        rx = (columns & size) > 0
+        ry = (rows & size) > 0
+        keys += size * size * ((3 * rx.astype(numpy.int64)) ^ ry.astype(numpy.int64))
+        flip = rx & ~ry
+        columns = numpy.where(flip, cells - 1 - columns, columns)
+        rows = numpy.where(flip, cells - 1 - rows, rows)
+        columns, rows = numpy.where(ry, columns, rows), numpy.where(ry, rows, columns)
+        size >>= 1
+    return keys
+
+
+def _zOrderKeysArray(columns, rows, bits):
+    keys = numpy.zeros(len(columns), dtype=numpy.int64)
+    for bit in range(bits):
+        keys |= ((columns >> bit) & 1) << (2 * bit) | ((rows >> bit) & 1) << (2 * bit + 1)
+    return keys
+
+
+def _spatialKeysArray(points, extent, curve, bits):
+    located = numpy.array([point is not None for point in points], dtype=bool)
+    xy = numpy.array([point for point in points if point is not None], dtype=numpy.float64).reshape(-1, 2)
+    columns, rows = _gridCellsArray(xy[:, 0], xy[:, 1], extent, bits)
+    keys = numpy.full(len(points), -1, dtype=numpy.int64)
+    keys[located] = (_hilbertKeysArray if curve == HILBERT else _zOrderKeysArray)(columns, rows, bits)
+    return keys
+
+
+def spatialKeys(points, extent=None, curve=HILBERT, bits=DEFAULT_BITS):
+    """
+    PURPOSE:
+    Function returns the curve key of each (x, y) point (None points get key -1, sorting first).
+
+    PARAMETERS:
+    points = list of (x, y) centroids, or None for rows without geometry.
+    extent = (xmin, ymin, xmax, ymax) the grid covers (the points' extent by default).
+    curve = HILBERT or ZORDER.
+    bits = grid resolution (2**bits cells a side).
+    """
+    extent = extent or extentOf([point for point in points if point is not None])
+    if extent is None:
+        return [-1] * len(points)
+    if HAVE_NUMPY:
+        return _spatialKeysArray(points, extent, curve, bits).tolist()
+    keyOf = hilbertKey if curve == HILBERT else zOrderKey
+    return [-1 if point is None else keyOf(*(gridCell(point[0], point[1], extent, bits) + (bits,)))
+            for point in points]
+
+
+def spatialOrder(points, extent=None, curve=HILBERT, bits=DEFAULT_BITS):
+    """Returns the positions of points sorted by curve key (ties keep their order): the order to write them in."""
+    if HAVE_NUMPY:
+        extent = extent or extentOf([point for point in points if point is not None])
+        if extent is None:
+            return list(range(len(points)))
+        return numpy.argsort(_spatialKeysArray(points, extent, curve, bits), kind='stable').tolist()
+    keys = spatialKeys(points, extent, curve, bits)
+    return sorted(range(len(points)), key=keys.__getitem__)
+
+
+def sampleExtents(points, count=20, share=0.01, rng=None):
+    """Returns count extents covering 'share' of the points' extent, each centred on a random point."""
+    rng = rng or random.Random(0)
+    points = [point for point in points if point is not None]
+    extent = extentOf(points)
+    if extent is None:
+        return []
+    halfWidth = (extent[2] - extent[0]) * share ** 0.5 / 2.0
+    halfHeight = (extent[3] - extent[1]) * share ** 0.5 / 2.0
+    centres = [rng.choice(points) for _ in range(count)]
+    return [(x - halfWidth, y - halfHeight, x + halfWidth, y + halfHeight) for x, y in centres]
+
+
+def pagesPerExtent(points, extents, rowsPerPage, grid=64):
+    """
+    PURPOSE:
+    Function returns the mean number of pages holding the rows inside each extent, for rows
+    stored in the order of 'points' (rowsPerPage to a page).
+
+    PARAMETERS:
+    points = list of (x, y) centroids (or None) in storage order.
+    extents = list of (xmin, ymin, xmax, ymax).
+    rowsPerPage = rows stored per page.
+    grid = cells a side of the bucket grid used to find the rows of an extent.
+    """
+    located = [(position, point) for position, point in enumerate(points) if point is not None]
+    extent = extentOf([point for _, point in located])
+    if extent is None or not extents:
+        return 0.0
+    bits = max(1, (grid - 1).bit_length())
+    buckets = {}
+    for position, point in located:
+        buckets.setdefault(gridCell(point[0], point[1], extent, bits), []).append((position, point))
+    rowsPerPage = max(1, int(rowsPerPage))
+    total = 0
+    for xmin, ymin, xmax, ymax in extents:
+        low, high = gridCell(xmin, ymin, extent, bits), gridCell(xmax, ymax, extent, bits)
+        pages = set()
+        for column in range(low[0], high[0] + 1):
+            for row in range(low[1], high[1] + 1):
+                for position, (x, y) in buckets.get((column, row), ()):
+                    if xmin <= x <= xmax and ymin <= y <= ymax:
+                        pages.add(position // rowsPerPage)
+        total += len(pages)
+    return total / float(len(extents))
@@ -0,0 +1,589 @@
+"""
+The export steps of CreateRemoteArcReaderGDB_v2.py, written against a storage backend.
+
+ExportSteps holds the step functions that used to call arcpy directly (createEmpytGDB,
+copyFeatureDatasets, copyFCtoFC, copySingleFCtoFC, updateAssessorTable,
+clipAndCopyRiceLakeFC, backupGDB, restoreBackupGDB) with the same names & parameters.
+Every read, write and geoprocessing call goes through the backend
+(arcreaderexport.backends), so the same steps run on ArcpyBackend for the real export
+and on LocalBackend to test, time or profile the pipeline without ArcGIS.
+
+Copies still go through the TaskRunner (retries, circuit breakers, run report);
+errors are logged the same way as before ("XXX" lines & tracebacks) and do not stop
+the run.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+
+from arcreaderexport import layers
+
+# Feature class whose spatial reference (St Louis County Transverse Mercator System 96, feet) new datasets get
+SPATIAL_REFERENCE_SOURCE = layers.SDE_CONNECTION + r'\sde.SDE.GPS\sde.SDE.EngGPSPts'
+RICE_LAKE_BOUNDARY = layers.DEFAULT_GDB + '/RiceLakeTownshipClipBoundary'
+RICE_LAKE_DATASET = 'Rice_Lake_Twnshp'
+
+
+def sdeClassPath(fromGDBpath, dataset, fc):
+    """Returns the path of an SDE feature class inside a feature dataset ('sde.SDE.' prefixed)."""
+    return fromGDBpath + '\\sde.SDE.' + dataset + '\\sde.SDE.' + fc
+
+
+def _name(spatialReference):
+    return str(getattr(spatialReference, 'name', spatialReference))
+
+
+def _backupName(name):
+    # Backed up classes sit at the root of the backup gdb, so it needs no feature datasets
+    return name.replace('/', '__')
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ExportSteps(object):
+    """
+    PURPOSE:
+    Export steps of PortableDuluth.gdb run against one storage backend.
+
+    PARAMETERS:
+    backend = ArcpyBackend or LocalBackend (see arcreaderexport.backends).
+    taskRunner = retry.TaskRunner the copies run through.
+    logger = logging.Logger for the process log.
+    sourceReader = reader for streamed copies (a sourcecache.CachedReader; the backend by default).
+    sourceCache = optional sourcecache.SourceCache that streamed sources are extracted into first.
+    changeCapture = optional changecapture.ChangeCapture that keeps layers.CHANGE_CAPTURE_CLASSES
+        up to date from their SDE adds / deletes tables.
+    annotationExport = optional annotation.AnnotationExport that copies layers.ANNOTATION_CLASSES
+        without their unplaced & hidden annotation and merges layers.ANNOTATION_MERGE_GROUPS.
+    contentHashes = optional contenthash.ContentHashes that keeps or reuses the published copy of
+        a plain class whose source is unchanged since the last export.
+    copyPool = optional autotune.AutotunedPool the copies of copyFCtoFC run in parallel on (one at a time
+        through taskRunner without it).
+    estimator = optional planner.DurationEstimator; the copy pool starts the longest copies first.
+    """
+
+    def __init__(self, backend, taskRunner, logger, sourceReader=None, sourceCache=None, changeCapture=None,
+                 annotationExport=None, contentHashes=None, copyPool=None, estimator=None):
+        self.backend = backend
+        self.taskRunner = taskRunner
+        self.logger = logger
+        self.sourceReader = sourceReader or backend
+        self.sourceCache = sourceCache
+        self.changeCapture = changeCapture
+        self.annotationExport = annotationExport
+        self.contentHashes = contentHashes
+        self.copyPool = copyPool
+        self.estimator = estimator
+
+    def _fail(self, message, functionName):
+        print(message.replace('XXX ', ''))
+        print(self.backend.messages())
+        self.logger.info(message)
+        self.logger.error('Error in function {0}.'.format(functionName), exc_info=True)
+
+    def createEmpytGDB(self, directoryPath=layers.PUBLISH_DIR,
+                       originalGDB='PortableDuluth.gdb',
+                       backupNameGDB='PortableDuluth_backup.gdb'):
+        """
+        PURPOSE:
+        Function takes existing geodatabase, makes a copy as a backup, then
+        creates a new empty gdb with the original oldNameGDB's file name.
+
+        PARAMETERS:
+        directoryPath = string of file path; needs to use forward slashes '/'
+        originalGDB = string of gdb name
+        backupNameGDB = string of gdb name
+        """
+        backend = self.backend
+        originalPath = os.path.join(directoryPath, originalGDB)
+        backupPath = os.path.join(directoryPath, backupNameGDB)
+        print('Current directory being checked: ' + directoryPath)
+        try:
+            if not backend.exists(originalPath):
+                # create new empty gdb with original name
+                backend.createWorkspace(directoryPath, originalGDB)
+                print('Created new gdb {0}'.format(originalGDB))
+                return
+
+            # Delete backup PortableGIS_backup.gdb to be replaced
+            if backend.exists(backupPath):
+                backend.deleteWorkspace(backupPath)
+                print('Removed ' + backupNameGDB)
+                self.logger.info('Removed {0}'.format(backupNameGDB))
+
+            # Compacts gdb & removes locks on gdb
+            backend.compact(originalPath)
+            print('Compacted ' + originalGDB)
+            self.logger.info('Compacted {0}'.format(originalGDB))
+
+            # Renames existing PortableDuluth.gdb to "PortableDuluth_backup.gdb"
+            backend.moveWorkspace(originalPath, backupPath)
+            print('Renamed', originalGDB, 'to', backupNameGDB)
+            self.logger.info('Renamed {0} to {1}'.format(originalGDB, backupNameGDB))
+
+            # Create new empty gdb with original name of 'PortableGIS.gdb'
+            backend.createWorkspace(directoryPath, originalGDB)
+            print('Created new empty gdb: ' + originalGDB)
+            self.logger.info('Created new empty GDB {0} in {1}'.format(originalGDB, directoryPath))
+
+        except (IOError, OSError) as e:
+            print('Error: %s' % e)
+            self.logger.info('Error: %s' % e)
+        except Exception:
+            self._fail('XXX Failed to create empty GDB in {0}'.format(directoryPath), 'createEmpytGDB')
+
+    def copyFeatureDatasets(self, fdList, toGDBpath, spatialRefSource=SPATIAL_REFERENCE_SOURCE):
+        """
+        PURPOSE:
+        Function takes a list of feature datasets from another geodatabase, &
+        creates them (empty) in another gdb, plus the Rice_Lake_Twnshp dataset.
+
+        PARAMETERS:
+        fdList = list of feature datasets to create in the new gdb.
+        toGDBpath = the full file path to gdb, such as 'S:/GIS_Public/GIS_Data/MapDocuments/Published_Maps/ArcReaderRemoteUpdate/PortableDuluth.gdb'
+        spatialRefSource = feature class whose spatial reference the datasets get. All datasets use
+            the St Louis County Transverse Mercator System 96 (custom, feet), the same as Esri's
+            "NAD_1983_HARN_Adj_MN_St_Louis_CS96_Feet" (WKID = 103777).
+        """
+        try:
+            spatialRef = self.backend.spatialReference(spatialRefSource)
+            print('Datasets will be copied using Spatial Reference:', _name(spatialRef))
+            for fd in list(fdList) + [RICE_LAKE_DATASET]:
+                self.backend.createDataset(toGDBpath, fd, spatialRef)
+                print('Copied Feature Dataset into Gdb:', fd)
+            self.logger.info('Copied list of feature datasets into {0}, spatialRef = {1}'.format(toGDBpath, _name(spatialRef)))
+        except Exception:
+            self._fail('XXX Failed to create feature datasets in {0}'.format(toGDBpath), 'copyFeatureDatasets')
+
+    def copyFeatureClassTask(self, inFC, outDatasetPath, fc):
+        '''
+        PURPOSE: Function runs one feature class copy; used as the task that taskRunner
+        retries, so errors are raised rather than caught here.
+
+        PARAMETERS:
+        inFC = full path of the feature class to copy.
+        outDatasetPath = gdb or feature dataset path to copy into.
+        fc = output feature class name.
+        '''
+        result = self._reuse(inFC, outDatasetPath, fc)
+        if result is not None:
+            return result
+        self.backend.copyClass(inFC, outDatasetPath, fc)
+        print('Feature class successfully copied: ', fc)
+        self.logger.info('Copied fc: {0} to fc: {1}'.format(inFC, os.path.join(outDatasetPath, fc)))
+        # Row count for the run report, the planner & the copy pool's rows / second
+        return {'rows': self.backend.describe(os.path.join(outDatasetPath, fc)).get('count')}
+
+    def copyFeatureClassStreamingTask(self, inFC, outDatasetPath, fc):
+        '''
+        PURPOSE: Function copies one large feature class in batches of layers.STREAMING_BATCH_SIZE
+        rows (see arcreaderexport.streamcopy), so memory use stays flat however many rows the
+        class has, in spatial order if layers.SPATIAL_SORT_ON_WRITE. Used instead of copyFeatureClassTask for layers.STREAMING_COPY_CLASSES.
+
+        PARAMETERS:
+        inFC = full path of the feature class to copy.
+        outDatasetPath = gdb or feature dataset path to copy into.
+        fc = output feature class name.
+        '''
+        from arcreaderexport.streamcopy import streamCopy
+        if self.sourceCache is not None:
+            self.sourceCache.ensure(inFC)
+        stats = streamCopy(self.sourceReader, self.backend, inFC, os.path.join(outDatasetPath, fc),
+                           layers.STREAMING_BATCH_SIZE,
+                           spatialOrder=layers.SPATIAL_ORDER_CURVE if layers.SPATIAL_SORT_ON_WRITE else None)
+        print('Feature class successfully copied: ', fc)
+        self.logger.info('Copied fc: {0} to fc: {1}'.format(inFC, os.path.join(outDatasetPath, fc)))
+        self.logger.info('Streamed {0} rows of {1} in {2} batches ({3} rows/sec{4})'.format(
+            stats['rows'], fc, stats['batches'], stats['rowsPerSecond'],
+            ', {0} order'.format(stats['spatialOrder']) if stats['spatialOrder'] else ''))
+        return {'rows': stats['rows']}
+
+    def copyFeatureClassChangesTask(self, inFC, outDatasetPath, fc):
+        '''
+        PURPOSE: Function brings one versioned feature class up to date from its SDE adds / deletes
+        tables (see arcreaderexport.changecapture): only rows edited since the last export are copied,
+        or the whole class when it has no usable exported state. Used instead of copyFeatureClassTask
+        for layers.CHANGE_CAPTURE_CLASSES.
+
+        PARAMETERS:
+        inFC = full path of the versioned feature class.
+        outDatasetPath = gdb or feature dataset path of the output.
+        fc = output feature class name.
+        '''
+        result = self.changeCapture.sync(inFC, os.path.join(outDatasetPath, fc))
+        print('Feature class successfully updated ({0} copy): '.format(result['mode']), fc)
+        self.logger.info('Updated fc: {0} from fc: {1} ({2} copy, {3} rows)'.format(
+            os.path.join(outDatasetPath, fc), inFC, result['mode'], result['rows']))
+        return result
+
+    def copyNetworkClassesTask(self, inFCs, outDatasetPath, fcs):
+        '''
+        PURPOSE: Function copies the plain classes of a geometric network dataset together as simple
+        features (layers.FLATTENED_NETWORK_DATASETS); the network is not copied or rebuilt.
+
+        PARAMETERS:
+        inFCs = full paths of the feature classes to copy.
+        outDatasetPath = feature dataset path to copy into.
+        fcs = output feature class names (the unqualified source names).
+        '''
+        copies = [(inFC, fc) for inFC, fc in zip(inFCs, fcs) if self._reuse(inFC, outDatasetPath, fc) is None]
+        if copies:
+            self.backend.copyClasses([inFC for inFC, _ in copies], outDatasetPath, [fc for _, fc in copies])
+            print('Network classes successfully copied as simple features: ', ', '.join(fc for _, fc in copies))
+            self.logger.info('Copied {0} network fcs into: {1} ({2})'.format(len(copies), outDatasetPath,
+                                                                            ', '.join(fc for _, fc in copies)))
+        return {'classes': len(fcs), 'copied': len(copies)}
+
+    def _reuse(self, inFC, outDatasetPath, fc):
+        # Keeps or reuses the published copy of a class whose source is unchanged (see arcreaderexport/contenthash.py)
+        if self.contentHashes is None:
+            return None
+        result = self.contentHashes.reuse(inFC, os.path.join(outDatasetPath, fc))
+        if result is not None:
+            print('Feature class unchanged since the last export ({0}): '.format(result['content']), fc)
+            self.logger.info('Kept fc: {0} for unchanged fc: {1} ({2})'.format(os.path.join(outDatasetPath, fc), inFC,
+                                                                             result['content']))
+        return result
+
+    def _runCopy(self, name, source, func, args, onDone):
+        # Runs a copy through taskRunner now, or queues it on the copy pool (longest first); onDone(status)
+        # follows either way
+        if self.copyPool is not None:
+            priority = self.estimator.seconds(name, source, args[0]) if self.estimator is not None else 0.0
+            self.copyPool.submit(name, source, func, args, onDone, priority)
+        else:
+            onDone(self.taskRunner.run(name, source, func, *args))
+
+    def _copyClass(self, fromGDBpath, key, fc, outDatasetPath):
+        inFC = sdeClassPath(fromGDBpath, key, fc)
+        outFC = os.path.join(outDatasetPath, fc)
+
+        def done(status):
+            if status == 'failed':
+                print('Failed to copy from SDE dbs ({0}) to PortableGIS fc ({1})'.format(inFC, outFC))
+                self.logger.info('XXX Failed to copy from SDE dbs ({0}) to PortableGIS fc ({1})'.format(inFC, outFC))
+        # Copies with retries; deferred copies are retried by taskRunner.runDeferred()
+        self._runCopy(fc, fromGDBpath, self._copyTask(fc, inFC), (inFC, outDatasetPath, fc), done)
+
+    def _copyNetworkDataset(self, fromGDBpath, key, fcs, outDatasetPath):
+        # Copies the plain classes in bulk & the filtered, streamed or change-captured classes one by one;
+        # every class is copied one by one if the bulk copy failed (so each gets its own retries)
+        bulk = [fc for fc in fcs if self._copyTask(fc, sdeClassPath(fromGDBpath, key, fc)) == self.copyFeatureClassTask]
+        if len(bulk) < 2:
+            bulk = []
+
+        def done(status):
+            if status == 'failed':
+                print('Failed to copy network dataset ({0}) in bulk; copying its classes one by one'.format(key))
+                self.logger.info('XXX Failed to copy network dataset ({0}) in bulk into ({1}); copying its classes one by one'.format(
+                    key, outDatasetPath))
+                for fc in bulk:
+                    self._copyClass(fromGDBpath, key, fc, outDatasetPath)
+        if bulk:
+            self._runCopy(key, fromGDBpath, self.copyNetworkClassesTask,
+                          ([sdeClassPath(fromGDBpath, key, fc) for fc in bulk], outDatasetPath, bulk), done)
+        for fc in fcs:
+            if fc not in bulk:
+                self._copyClass(fromGDBpath, key, fc, outDatasetPath)
+
+    def copyAnnotationTask(self, inFC, outDatasetPath, fc):
+        '''
+        PURPOSE: Function copies the drawn annotation of one annotation class (see
+        arcreaderexport.annotation); a class without annotation fields is copied whole.
+
+        PARAMETERS:
+        inFC = full path of the annotation feature class.
+        outDatasetPath = gdb or feature dataset path to copy into.
+        fc = output feature class name.
+        '''
+        result = self.annotationExport.copy(inFC, outDatasetPath, fc)
+        if result is None:
+            return self.copyFeatureClassTask(inFC, outDatasetPath, fc)
+        print('Annotation class successfully copied ({0} of {1} rows): '.format(result['rows'], result['sourceRows']), fc)
+        self.logger.info('Copied annotation fc: {0} to fc: {1}'.format(inFC, os.path.join(outDatasetPath, fc)))
+        return result
+
+    def mergeAnnotationTask(self, sources, outPath, referenceScale):
+        '''
+        PURPOSE: Function merges the drawn annotation of a theme's classes into one class.
+
+        PARAMETERS:
+        sources = list of (class name, full path) of the annotation classes.
+        outPath = merged feature class path.
+        referenceScale = reference scale of the merged class.
+        '''
+        result = self.annotationExport.merge(sources, outPath, referenceScale)
+        print('Annotation classes successfully merged into: ', outPath)
+        self.logger.info('Merged annotation fcs: {0} into fc: {1}'.format(', '.join(name for name, _ in sources), outPath))
+        return result
+
+    def _mergeAnnotationGroups(self, fromGDBpath, fdToFc_Dict, toGDBpath):
+        # Per-theme annotation merged into one class (layers.ANNOTATION_MERGE_GROUPS)
+        for name, group in sorted(layers.ANNOTATION_MERGE_GROUPS.items()):
+            sources = [(fc, sdeClassPath(fromGDBpath, group['dataset'], fc)) for fc in group['classes']
+                       if fc in fdToFc_Dict.get(group['dataset'], ())]
+            if not sources:
+                continue
+            outFC = os.path.join(toGDBpath, group['dataset'], name)
+            status = self.taskRunner.run(name, fromGDBpath, self.mergeAnnotationTask, sources, outFC,
+                                         group['referenceScale'])
+            if status == 'failed':
+                print('Failed to merge annotation into PortableGIS fc ({0})'.format(outFC))
+                self.logger.info('XXX Failed to merge annotation from SDE dbs ({0}) into PortableGIS fc ({1})'.format(
+                    fromGDBpath, outFC))
+
+    def _mergedAnnotation(self):
+        if self.annotationExport is None:
+            return set()
+        return set(fc for group in layers.ANNOTATION_MERGE_GROUPS.values() for fc in group['classes'])
+
+    def _copyTask(self, fc, inFC):
+        if self.annotationExport is not None and fc in layers.ANNOTATION_CLASSES:
+            return self.copyAnnotationTask
+        if self.changeCapture is not None and fc in layers.CHANGE_CAPTURE_CLASSES and self.changeCapture.handles(inFC):
+            return self.copyFeatureClassChangesTask
+        if fc in layers.STREAMING_COPY_CLASSES:
+            return self.copyFeatureClassStreamingTask
+        return self.copyFeatureClassTask
+
+    def copyFCtoFC(self, fromGDBpath, fdToFc_Dict, toGDBpath, gasGDBpath=None):
+        '''
+        PURPOSE: Function takes a dictionary of keys (feature datasets) mapped to
+        values (a list of feature classes) and copies each feature class to the
+        mapped feature dataset in the out-geodatabase ('toGDBpath').
+
+        PARAMETERS:
+        fromGDBpath = string of GDB from which feature classes will be copied.
+        fdToFc_Dict = a crosswalk of feature dataset keys mapped to a list of all feature classes.
+        toGDBpath = string of GDB to which feature classes will be copied.
+        gasGDBpath = not used (kept for the gas schema copy that is waiting on the new SDE gas data).
+        '''
+        self.taskRunner.stage = 'copy'
+        merged = self._mergedAnnotation()
+        try:
+            for key, val in fdToFc_Dict.items():
+                outDatasetPath = os.path.join(toGDBpath, key)
+                val = [fc for fc in val if fc not in merged]        # merged ones are copied by their merge group below
+                if key in layers.FLATTENED_NETWORK_DATASETS:
+                    self._copyNetworkDataset(fromGDBpath, key, val, outDatasetPath)
+                    continue
+                for fc in val:
+                    self._copyClass(fromGDBpath, key, fc, outDatasetPath)
+            # Parallel copies (see arcreaderexport/autotune.py) all finish before the merges & later steps
+            if self.copyPool is not None:
+                self.copyPool.join()
+                self.backend.close()        # connections the pool threads opened
+            if merged:
+                self._mergeAnnotationGroups(fromGDBpath, fdToFc_Dict, toGDBpath)
+        except Exception:
+            self._fail('XXX Failed to access feature classes or feature datasets in: {0} or {1}'.format(
+                fromGDBpath, toGDBpath), 'copyFCtoFC')
+
+    def copySingleFCtoFC(self, fromGDBpath, toGDBpath, fc):
+        '''
+        PURPOSE: Function takes specific feature class & copies into output GDB.
+
+        PARAMETERS:
+        fromGDBpath = string of GDB from which feature classes will be copied.
+        toGDBpath = string of GDB dataset to which feature classes will be copied.
+        fc = feature class to be copied.
+        '''
+        self.taskRunner.stage = 'copy'
+        inFC = os.path.join(fromGDBpath, fc)
+        status = self.taskRunner.run(fc, fromGDBpath, self.copyFeatureClassTask, inFC, toGDBpath, fc)
+        if status == 'failed':
+            print('Failed to access feature class of {0} in: {1} or {2}'.format(fc, fromGDBpath, toGDBpath))
+            print(self.backend.messages())
+            self.logger.info('XXX Failed to access feature classes or feature datasets in: {0} or {1}'.format(
+                fromGDBpath, toGDBpath))
+
+    def updateAssessorTable(self, toGDBpath, assessorDBtable=layers.ASSESSOR_TABLE):
+        """
+        PURPOSE:
+        Function takes the SDE Assessor's table (downloaded daily) & copies it into another gdb.
+
+        PARAMETERS:
+        toGDBpath = string of file path to the output geodatabase (PortableGIS.gdb)
+        assessorDBtable = string file path of the Assessor's table (view) in the MCIS database
+        """
+        copiedAssessorTablePath = os.path.join(toGDBpath, 'Assessor')
+        self.taskRunner.stage = 'table'
+        try:
+            status = self.taskRunner.run('Assessor', assessorDBtable, self.backend.copyTable,
+                                         assessorDBtable, copiedAssessorTablePath)
+            if status == 'failed':
+                raise RuntimeError("Assessor's table copy failed after retries (see run report)")
+            if status == 'done':
+                print('Completed copy of {0}'.format(copiedAssessorTablePath))
+                self.logger.info("Copied updated Assessor's table into {0}".format(toGDBpath))
+        except Exception:
+            self._fail("XXX Failed to copy updated Assessor's table into {0}. \nArcGIS Messages: {1}".format(
+                toGDBpath, self.backend.messages()), 'updateAssessorTable')
+
+    def clipAndCopyRiceLakeFC(self, toGDB_RiceLake_path=layers.PORTABLE_GDB + '/' + RICE_LAKE_DATASET,
+                              countyServDbs=layers.COUNTY_SDE, boundaryRiceLakeFC=RICE_LAKE_BOUNDARY):
+        """
+        PURPOSE:
+        Function takes the Rice Lake Township outline & clips St. Louis County's
+        updated data to the township outline into another gdb.
+
+        PARAMETERS:
+        toGDB_RiceLake_path = feature dataset of PortableGIS.gdb (or other) to clip the features into.
+        countyServDbs = string of database connection to St Louis County's SDE.
+        boundaryRiceLakeFC = Rice Lake Township clip boundary.
+        """
+        try:
+            if not self.backend.exists(countyServDbs):
+                print('Cannot access St Louis County database {0}'.format(countyServDbs))
+                self.logger.info('Failed to copy updated Rice Lake Township parcels into {0}'.format(toGDB_RiceLake_path))
+                return
+
+            # Dictionary of County's filenames: new PortableGIS filename
+            clipDict = {countyServDbs + 'sde.STLOUIS.CDSTRL_ROW': toGDB_RiceLake_path + '/RLT_ROW',
+                        countyServDbs + 'sde.STLOUIS.TRANS_RoadCenterlinesPW': toGDB_RiceLake_path + '/RLT_Streets',
+                        countyServDbs + 'sde.STLOUIS.CDSTRL_ParcelInfo': toGDB_RiceLake_path + '/RLT_Parcels'}
+
+            # Features are written into the dataset with the St. Louis County Coord. System (custom, feet);
+            # the transformation error is negligible.
+            self.taskRunner.stage = 'clip'
+            for inLyr, outLyr in clipDict.items():
+                status = self.taskRunner.run(os.path.basename(outLyr), countyServDbs, self.backend.clip,
+                                             inLyr, boundaryRiceLakeFC, outLyr)
+                if status == 'failed':
+                    print('Failed to clip feature class: ({0}) into PortableDuluth.gdb: ({1})'.format(inLyr, outLyr))
+                    self.logger.info('XXX Failed to clip {0} by {1} into {2}'.format(inLyr, boundaryRiceLakeFC, outLyr))
+                if status != 'done':
+                    continue
+                print('Successfully clipped feature class: ({0}) by Rice Lake southern boundary ({1}) into '
+                      'PortableDuluth.gdb: ({2})'.format(inLyr, boundaryRiceLakeFC, outLyr))
+                self.logger.info('Clipped {0} by {1} into {2}'.format(inLyr, boundaryRiceLakeFC, outLyr))
+        except Exception:
+            self._fail('XXX Something failed with the clipping of Rice Lake Township features. \nArcGIS Messages: {0}'.format(
+                self.backend.messages()), 'clipAndCopyRiceLakeFC')
+
+    def backupGDB(self, directoryPath=layers.PUBLISH_DIR,
+                  originalGDB='PortableDuluth.gdb',
+                  backupNameGDB='PortableDuluth_backup.gdb'):
+        """
+        PURPOSE:
+        Function copies the existing geodatabase to backupNameGDB (replacing an older backup)
+        & leaves the original in place, so restoreBackupGDB can put it back if the
+        incremental export fails validation. Returns True if the backup was made.
+
+        PARAMETERS:
+        directoryPath = string of file path; needs to use forward slashes '/'
+        originalGDB = string of gdb name
+        backupNameGDB = string of gdb name
+        """
+        backend = self.backend
+        try:
+            if backend.exists(os.path.join(directoryPath, backupNameGDB)):
+                backend.deleteWorkspace(os.path.join(directoryPath, backupNameGDB))
+                self.logger.info('Removed {0}'.format(backupNameGDB))
+
+            # Compacts gdb & removes locks on gdb before copying it
+            backend.compact(os.path.join(directoryPath, originalGDB))
+            backend.copyWorkspace(os.path.join(directoryPath, originalGDB), os.path.join(directoryPath, backupNameGDB))
+            print('Copied', originalGDB, 'to', backupNameGDB)
+            self.logger.info('Copied {0} to {1}'.format(originalGDB, backupNameGDB))
+            return True
+        except Exception:
+            self._fail('XXX Failed to copy {0} to {1} in {2}'.format(originalGDB, backupNameGDB, directoryPath), 'backupGDB')
+            return False
+
+    def backupClasses(self, classNames, directoryPath=layers.PUBLISH_DIR,
+                      originalGDB='PortableDuluth.gdb',
+                      backupNameGDB='PortableDuluth_backup.gdb'):
+        """
+        PURPOSE:
+        Function copies the classes an incremental export rewrites from the existing geodatabase
+        into a new backupNameGDB (replacing an older backup), so restoreBackupClasses can put them
+        back if the export fails validation. Unlike backupGDB, the cost follows the classes the
+        run updates, not the size of the gdb. Returns the names backed up (classes that do not
+        exist yet are skipped), or None if the backup failed.
+
+        PARAMETERS:
+        classNames = list of class names relative to the gdb ('dataset/class'), e.g. layers.outputClasses(tier)
+        directoryPath = string of file path; needs to use forward slashes '/'
+        originalGDB = string of gdb name
+        backupNameGDB = string of gdb name
+        """
+        backend = self.backend
+        originalPath, backupPath = directoryPath + '/' + originalGDB, directoryPath + '/' + backupNameGDB
+        try:
+            if backend.exists(backupPath):
+                backend.deleteWorkspace(backupPath)
+            backend.createWorkspace(directoryPath, backupNameGDB)
+            backedUp = []
+            for name in classNames:
+                if backend.exists(originalPath + '/' + name):
+                    backend.reuseClass(originalPath + '/' + name, backupPath + '/' + _backupName(name))
+                    backedUp.append(name)
+            print('Copied', len(backedUp), 'classes of', originalGDB, 'to', backupNameGDB)
+            self.logger.info('Copied {0} classes of {1} to {2}: {3}'.format(len(backedUp), originalGDB, backupNameGDB,
+                                                                           ', '.join(backedUp)))
+            return backedUp
+        except Exception:
+            self._fail('XXX Failed to copy the classes of {0} to {1} in {2}'.format(originalGDB, backupNameGDB,
+                                                                                   directoryPath), 'backupClasses')
+            return None
+
+    def restoreBackupClasses(self, classNames, directoryPath=layers.PUBLISH_DIR,
+                             originalGDB='PortableDuluth.gdb',
+                             backupNameGDB='PortableDuluth_backup.gdb'):
+        """
+        PURPOSE:
+        Function puts the classes backed up by backupClasses back into the geodatabase after an
+        incremental export failed validation, so field laptops keep copying the last good data.
+
+        PARAMETERS:
+        classNames = list of class names returned by backupClasses
+        directoryPath = string of file path; needs to use forward slashes '/'
+        originalGDB = string of gdb name that failed validation
+        backupNameGDB = string of gdb name holding the previous (good) classes
+        """
+        backend = self.backend
+        originalPath, backupPath = directoryPath + '/' + originalGDB, directoryPath + '/' + backupNameGDB
+        try:
+            for name in classNames:
+                backend.reuseClass(backupPath + '/' + _backupName(name), originalPath + '/' + name)
+            print('Validation failed; restored {0} classes of {1} from {2}'.format(len(classNames), originalGDB,
+                                                                                 backupNameGDB))
+            self.logger.info('XXX Validation failed; restored {0} classes of {1} from {2}'.format(
+                len(classNames), originalGDB, backupNameGDB))
+        except Exception:
+            self._fail('XXX Failed to restore the classes of {0} from {1} in {2}'.format(
+                originalGDB, backupNameGDB, directoryPath), 'restoreBackupClasses')
+
+    def restoreBackupGDB(self, directoryPath=layers.PUBLISH_DIR,
+                         originalGDB='PortableDuluth.gdb',
+                         backupNameGDB='PortableDuluth_backup.gdb',
+                         rejectedNameGDB='PortableDuluth_rejected.gdb'):
+        """
+        PURPOSE:
+        Function keeps a gdb that failed validation from being published: it moves the new gdb
+        to rejectedNameGDB (kept for review) & moves the backup gdb back to the original name,
+        so field laptops keep copying the last good database.
+
+        PARAMETERS:
+        directoryPath = string of file path; needs to use forward slashes '/'
+        originalGDB = string of gdb name that failed validation
+        backupNameGDB = string of gdb name of the previous (good) gdb
+        rejectedNameGDB = string of gdb name to move the failed gdb to
+        """
+        backend = self.backend
+        try:
+            if backend.exists(os.path.join(directoryPath, rejectedNameGDB)):
+                backend.deleteWorkspace(os.path.join(directoryPath, rejectedNameGDB))
+
+            # Compacts gdb & removes locks on gdb before moving it
+            backend.compact(os.path.join(directoryPath, originalGDB))
+            backend.moveWorkspace(os.path.join(directoryPath, originalGDB), os.path.join(directoryPath, rejectedNameGDB))
+            backend.moveWorkspace(os.path.join(directoryPath, backupNameGDB), os.path.join(directoryPath, originalGDB))
+            print('Validation failed; restored {0} from {1}'.format(originalGDB, backupNameGDB))
+            self.logger.info('XXX Validation failed; moved new gdb to {0} & restored {1} from {2}'.format(
+                rejectedNameGDB, originalGDB, backupNameGDB))
+        except Exception:
+            self._fail('XXX Failed to restore {0} from {1} in {2}'.format(originalGDB, backupNameGDB, directoryPath),
+                       'restoreBackupGDB')
@@ -0,0 +1,146 @@
+"""
+Memory-bounded streaming copy of one feature class or table.
+
+Instead of handing a whole class to FeatureClassToFeatureClass, rows are read
+from the source in fixed-size batches with a search cursor and written to the
+output with one insert cursor, so at most one batch is held in memory
+whatever the size of the class (Parcels, dem_ctour10ft). Peak memory is set by
+batchSize rather than by the row count, without del / gc.collect() juggling.
+
+With spatialOrder set, a class with geometry is written in the order of a space-filling
+curve over its centroids (arcreaderexport.spatialorder): a first pass reads the OIDs &
+centroids, a second reads the rows by OID in curve order, ID_CHUNK at a time. Only the
+OIDs & centroids of the whole class are held in memory, not its rows. A reader with its
+own curveOrderBatches() (sourcecache.CachedReader, which takes the rows from its cached
+table in curve order) is asked for the batches instead, so a cached class is not read again.
+
+Readers have describe() & iterBatches() (validate.ArcpyReader, localstore.LocalStore);
+writers have createLike() & openInsert() (ArcpyWriter, localstore.LocalStore).
+Streaming copies plain attributes & geometry only: annotation, relationship classes
+and network classes still go through the geoprocessing tools.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import time
+
+from arcreaderexport import oidquery, spatialorder
+from arcreaderexport.validate import SKIP_FIELD_TYPES, SHAPE_METRIC_FIELD
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def copyFields(description, geometryToken='SHAPE@'):
+    """Returns the field names & cursor tokens to copy for a describe() result (geometry as geometryToken)."""
+    fields = [name for name, fieldType in description['fields']
+              if fieldType not in SKIP_FIELD_TYPES and not SHAPE_METRIC_FIELD.match(name)]
+    if description.get('hasShape'):
+        fields.append(geometryToken)
+    return fields
+
+
+def curveOrderBatches(reader, sourcePath, fields, batchSize, description, curve):
+    """Yields the rows of sourcePath in lists, in curve order of their centroids."""
+    oids, points = [], []
+    for batch in reader.iterBatches(sourcePath, ['OID@', 'SHAPE@XY'], batchSize):
+        for oid, point in batch:
+            oids.append(oid)
+            points.append(tuple(point) if point else None)
+    order = [oids[index] for index in spatialorder.spatialOrder(points, curve=curve)]
+    del oids, points
+    oidField = oidquery.oidField(description)
+    for start in range(0, len(order), oidquery.ID_CHUNK):
+        ids = order[start:start + oidquery.ID_CHUNK]
+        rows = {}
+        for batch in reader.iterBatches(sourcePath, ['OID@'] + fields, batchSize, where=oidquery.inList(oidField, ids)):
+            for row in batch:
+                rows[row[0]] = tuple(row[1:])
+        # rows deleted from the source since the first pass are skipped
+        yield [rows[oid] for oid in ids if oid in rows]
+
+
+def streamCopy(reader, writer, sourcePath, outputPath, batchSize=DEFAULT_BATCH_SIZE, fields=None, spatialOrder=None):
+    """
+    PURPOSE:
+    Function creates outputPath like sourcePath & copies every row across in
+    batches. Returns a dictionary of rows, batches, seconds & rowsPerSecond.
+
+    PARAMETERS:
+    reader = object with describe() & iterBatches() for the source.
+    writer = object with createLike() & openInsert() for the output.
+    sourcePath = source class path (or name in a LocalStore).
+    outputPath = output class path (or name in a LocalStore).
+    batchSize = rows read & inserted at a time; bounds memory use.
+    fields = field names to copy (all copyable fields by default, with the geometry as the reader's
+        'geometryToken' attribute: 'SHAPE@WKB' for a sourcecache.CachedReader, else 'SHAPE@').
+    spatialOrder = optional spatialorder curve (HILBERT / ZORDER) to write a feature class's rows in.
+    """
+    started = time.time()
+    description = reader.describe(sourcePath)
+    if not description.get('exists'):
+        raise IOError('source does not exist: {0}'.format(sourcePath))
+    fields = fields or copyFields(description, getattr(reader, 'geometryToken', 'SHAPE@'))
+    writer.createLike(outputPath, sourcePath, description)
+    rows = batches = 0
+    spatialOrder = spatialOrder if description.get('hasShape') else None
+    if spatialOrder and hasattr(reader, 'curveOrderBatches'):
+        batchIter = reader.curveOrderBatches(sourcePath, fields, batchSize, description, spatialOrder)
+    elif spatialOrder:
+        batchIter = curveOrderBatches(reader, sourcePath, fields, batchSize, description, spatialOrder)
+    else:
+        batchIter = reader.iterBatches(sourcePath, fields, batchSize)
+    inserter = writer.openInsert(outputPath, fields)
+    try:
+        for batch in batchIter:
+            inserter.insertRows(batch)
+            rows += len(batch)
+            batches += 1
+    finally:
+        inserter.close()
+    seconds = time.time() - started
+    return {'rows': rows, 'batches': batches, 'batchSize': batchSize, 'spatialOrder': spatialOrder,
+            'seconds': round(seconds, 3),
+            'rowsPerSecond': round(rows / seconds, 1) if seconds > 0 else None}
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ArcpyWriter(object):
+    """
+    PURPOSE:
+    Creates output classes from a template & inserts rows with one arcpy insert cursor (arcpy imported on first use).
+    """
+
+    def createLike(self, outputPath, sourcePath, description):
+        import arcpy
+        outDir, outName = os.path.split(outputPath)
+        if arcpy.Exists(outputPath):
+            arcpy.Delete_management(outputPath)
+        if description.get('hasShape'):
+            desc = arcpy.Describe(sourcePath)
+            arcpy.CreateFeatureclass_management(outDir, outName, desc.shapeType, template=sourcePath,
+                                                has_m='SAME_AS_TEMPLATE', has_z='SAME_AS_TEMPLATE',
+                                                spatial_reference=desc.spatialReference)
+        else:
+            arcpy.CreateTable_management(outDir, outName, template=sourcePath)
+
+    def openInsert(self, path, fields):
+        return _ArcpyInserter(path, fields)
+
+
+class _ArcpyInserter(object):
+
+    def __init__(self, path, fields):
+        import arcpy
+        self.cursor = arcpy.da.InsertCursor(path, fields)
+
+    def insertRows(self, rows):
+        insertRow = self.cursor.insertRow
+        for row in rows:
+            insertRow(row)
+
+    def close(self):
+        if self.cursor is not None:
+            del self.cursor     # releases the output's schema lock
+            self.cursor = None
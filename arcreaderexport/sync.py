@@ -0,0 +1,459 @@
+"""
+Resumable, bandwidth-limited laptop sync of the published ArcReader bundle.
+
+Replaces the wholesale copy in the laptop batch script:
+
+    python -m arcreaderexport.sync --share S:\\GIS_Public\\GIS_Data\\MapDocuments\\Published_Maps\\ArcReaderRemoteUpdate
+                                   --local C:\\ArcReader [--streams 4] [--limit-kbps 2000]
+    python -m arcreaderexport.sync --server http://gisdist:8765 --local C:\\ArcReader
+
+1) The version file is probed (one small read); nothing happens if the laptop is current.
+2) The manifest is fetched and checked against the SHA-1 in the version file.
+3) Every bundle file is transferred block by block into a staging folder
+   (<local>/.incoming) and each block is checked against the manifest's SHA-1.
+   Blocks that the installed copy already has (same hash at the same position)
+   are copied locally instead of over the network.
+4) If the Wi-Fi drops, the next run resumes from the last verified block of each
+   partial file instead of starting over.
+5) Several files are transferred at once (gdb folders hold many small files), and
+   all streams share one bandwidth limit so 30 returning trucks do not saturate the
+   office uplink.
+6) Only when every file is verified are the installed gdb & pmf swapped for the
+   staged ones, and the version file is written last, so an interrupted sync never
+   leaves a torn gdb behind.
+
+A block that does not match the manifest (or a file gone from the share) is not
+retried: it means the bundle was published again during the sync, so the version file & manifest are read again (up
+to MAX_RELOADS times) and the sync goes on with the new version, re-verifying the
+blocks already staged.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    import http.client as httplib
+    from urllib.parse import quote, urlsplit
+except ImportError:     # Python 2.7 (ArcMap)
+    import httplib
+    from urllib import quote
+    from urlparse import urlsplit
+
+from arcreaderexport.freshness import LOCAL_PATH, SHARE_PATH
+from arcreaderexport.manifest import MANIFEST_FILE, VERSION_FILE, readManifest, readVersion, replaceFile, writeJson
+from arcreaderexport.retry import RetryPolicy, classifyError, SCHEMA
+
+STAGING_DIR = '.incoming'
+OLD_SUFFIX = '.old'
+MAX_RELOADS = 3         # times one sync reloads the manifest when the bundle is published again during it
+
+
+class SyncError(Exception):
+    pass
+
+
+class BlockChangedError(SyncError):
+    """A block read from the source does not match the manifest: the bundle was published again since."""
+    pass
+
+
+class LocalSource(object):
+    """
+    PURPOSE:
+    Reads a published bundle from a folder (the S: share, or any local folder standing in for it).
+
+    PARAMETERS:
+    bundleDir = string path of the published bundle folder.
+    """
+
+    def __init__(self, bundleDir):
+        self.bundleDir = bundleDir
+
+    def __repr__(self):
+        return 'LocalSource({0!r})'.format(self.bundleDir)
+
+    def readVersion(self):
+        return readVersion(self.bundleDir)
+
+    def readManifestBytes(self):
+        with open(os.path.join(self.bundleDir, MANIFEST_FILE), 'rb') as manifestFile:
+            return manifestFile.read()
+
+    def readRange(self, relPath, offset, length):
+        with open(os.path.join(self.bundleDir, *relPath.split('/')), 'rb') as dataFile:
+            dataFile.seek(offset)
+            return dataFile.read(length)
+
+
+class HttpSource(object):
+    """
+    PURPOSE:
+    Reads a published bundle from the distribution server (arcreaderexport.distserver)
+    with range requests. Each transfer stream keeps its own keep-alive connection.
+
+    PARAMETERS:
+    baseUrl = string url of the server, e.g. 'http://gisdist:8765'.
+    timeout = seconds to wait on the network before a block is retried.
+    """
+
+    def __init__(self, baseUrl, timeout=30):
+        parts = urlsplit(baseUrl)
+        self.baseUrl = baseUrl
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def __repr__(self):
+        return 'HttpSource({0!r})'.format(self.baseUrl)
+
+    def _get(self, path, headers=None):
+        """Returns (status, body) of a GET; a dropped keep-alive connection is reopened once."""
+        for attempt in (1, 2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request('GET', path, headers=headers or {})
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (httplib.HTTPException, IOError, OSError) as e:
+                connection.close()
+                self.local.connection = None
+                if attempt == 2:
+                    raise IOError('{0}{1}: {2}'.format(self.baseUrl, path, e))
+
+    def readVersion(self):
+        try:
+            status, body = self._get('/version')
+        except IOError:
+            return None
+        return json.loads(body.decode('utf-8')) if status == 200 else None
+
+    def readManifestBytes(self):
+        status, body = self._get('/manifest')
+        if status != 200:
+            raise IOError('{0}/manifest returned HTTP {1}'.format(self.baseUrl, status))
+        return body
+
+    def readRange(self, relPath, offset, length):
+        status, body = self._get('/files/' + quote(relPath),
+                                 {'Range': 'bytes={0}-{1}'.format(offset, offset + length - 1)})
+        if status not in (200, 206):
+            raise IOError('{0} {1} returned HTTP {2}'.format(self.baseUrl, relPath, status))
+        return body if status == 206 else body[offset:offset + length]
+
+
+class TokenBucket(object):
+    """
+    PURPOSE:
+    Thread-safe bandwidth limiter shared by all transfer streams.
+
+    PARAMETERS:
+    rate = bytes per second allowed (None or 0 for no limit).
+    burst = largest number of bytes allowed at once (one second's worth by default).
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """Blocks until 'amount' bytes may be sent."""
+        if not self.rate:
+            return
+        while amount > 0:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                take = min(amount, self.tokens)
+                self.tokens -= take
+                amount -= take
+                wait = min(amount, self.capacity) / float(self.rate) if amount else 0
+            if wait:
+                self.sleep(wait)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class SyncClient(object):
+    """
+    PURPOSE:
+    Brings a laptop bundle folder up to the version published by a source.
+
+    PARAMETERS:
+    source = LocalSource (or another object with readVersion, readManifestBytes, readRange).
+    localDir = string path of the laptop's bundle folder.
+    streams = number of files transferred at once.
+    rateLimit = bytes per second shared by all streams (None for no limit).
+    policy = RetryPolicy for failed block reads.
+    logger = optional logging.Logger.
+    """
+
+    def __init__(self, source, localDir=LOCAL_PATH, streams=4, rateLimit=None, policy=None, logger=None):
+        self.source = source
+        self.localDir = localDir
+        self.stagingDir = os.path.join(localDir, STAGING_DIR)
+        self.streams = max(1, streams)
+        self.bucket = TokenBucket(rateLimit)
+        self.policy = policy or RetryPolicy(baseDelay=1.0, maxDelay=30.0, maxAttempts={'unknown': 3})
+        self.logger = logger
+        self.stats = {'downloaded': 0, 'reused': 0, 'resumed': 0, 'retries': 0, 'reloads': 0, 'files': 0}
+        self.statsLock = threading.Lock()
+
+    def sync(self, force=False):
+        """
+        PURPOSE:
+        Runs one sync. Returns a dictionary with the 'result' ('current' or 'synced'),
+        the version now installed and transfer statistics.
+        """
+        started = time.time()
+        self._recoverSwap()
+        for reload in range(MAX_RELOADS + 1):
+            published = self.source.readVersion()
+            if published is None:
+                raise SyncError('no version file published at {0!r}'.format(self.source))
+            local = readVersion(self.localDir)
+            if not force and local and int(local.get('version', 0)) >= int(published['version']):
+                return {'result': 'current', 'version': local['version']}
+            try:
+                manifest = self._stage(published, local)
+                break
+            except BlockChangedError as e:
+                if reload == MAX_RELOADS:
+                    raise
+                self._count('reloads', 1)
+                self._log('{0}; reading the version file & manifest again'.format(e))
+
+        writeJson(os.path.join(self.stagingDir, MANIFEST_FILE), manifest)
+        self._swap(manifest['items'], published)
+        result = {'result': 'synced', 'version': published['version'],
+                  'elapsed': round(time.time() - started, 3)}
+        result.update(self.stats)
+        self._log('Synced version {0}: {1}'.format(published['version'], result))
+        return result
+
+    def _stage(self, published, local):
+        """Transfers every file of the published version's manifest into the staging folder & returns the manifest."""
+        manifestBytes = self.source.readManifestBytes()
+        if hashlib.sha1(manifestBytes).hexdigest() != published.get('manifestSha1'):
+            raise SyncError('manifest does not match version file (publication in progress?); try again later')
+        manifest = json.loads(manifestBytes.decode('utf-8'))
+        installed = readManifest(self.localDir) if local else None
+        installedFiles = dict((entry['path'], entry) for entry in (installed or {}).get('files', [])
+                              if installed.get('blockSize') == manifest['blockSize'])
+
+        # Files staged by an interrupted sync of another version that are not in this manifest would be
+        ## installed with it; partial files of this manifest's files are kept & re-verified block by block.
+        self._pruneStaging(manifest)
+        # Largest files first so one big table does not start last.
+        entries = sorted(manifest['files'], key=lambda entry: -entry['size'])
+        pool = ThreadPool(self.streams)
+        try:
+            for _ in pool.imap_unordered(lambda entry: self._syncFile(entry, manifest['blockSize'],
+                                                                      installedFiles.get(entry['path'])), entries):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+        return manifest
+
+    def _syncFile(self, entry, blockSize, installedEntry):
+        relPath = entry['path']
+        finalPath = os.path.join(self.stagingDir, *relPath.split('/'))
+        partPath = finalPath + '.part'
+        if os.path.exists(finalPath):
+            replaceFile(finalPath, partPath)   # finished in an earlier run; re-verified below like a partial file
+        if not os.path.isdir(os.path.dirname(finalPath)):
+            try:
+                os.makedirs(os.path.dirname(finalPath))
+            except OSError:
+                if not os.path.isdir(os.path.dirname(finalPath)):
+                    raise
+
+        blocks = entry['blocks']
+        verified = self._verifiedBlocks(partPath, entry['size'], blocks, blockSize)
+        if verified:
+            self._count('resumed', min(verified * blockSize, entry['size']))
+        installedPath = os.path.join(self.localDir, *relPath.split('/'))
+        installedBlocks = installedEntry['blocks'] if installedEntry and os.path.exists(installedPath) else []
+
+        with open(partPath, 'r+b' if os.path.exists(partPath) else 'w+b') as partFile:
+            partFile.truncate(verified * blockSize)
+            partFile.seek(verified * blockSize)
+            for number in range(verified, len(blocks)):
+                offset = number * blockSize
+                length = min(blockSize, entry['size'] - offset)
+                data = None
+                if number < len(installedBlocks) and installedBlocks[number] == blocks[number]:
+                    with open(installedPath, 'rb') as installedFile:
+                        installedFile.seek(offset)
+                        data = installedFile.read(length)
+                    if hashlib.sha1(data).hexdigest() == blocks[number]:
+                        self._count('reused', length)
+                    else:
+                        data = None
+                if data is None:
+                    data = self._fetchBlock(relPath, offset, length, blocks[number])
+                    self._count('downloaded', length)
+                partFile.write(data)
+        replaceFile(partPath, finalPath)
+        self._count('files', 1)
+
+    def _verifiedBlocks(self, partPath, size, blocks, blockSize):
+        """Returns how many leading blocks of a partial file match the manifest."""
+        if not os.path.exists(partPath):
+            return 0
+        verified = 0
+        with open(partPath, 'rb') as partFile:
+            for number, expected in enumerate(blocks):
+                data = partFile.read(blockSize)
+                if len(data) != min(blockSize, size - number * blockSize) or hashlib.sha1(data).hexdigest() != expected:
+                    break
+                verified += 1
+        return verified
+
+    def _fetchBlock(self, relPath, offset, length, expected):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.bucket.consume(length)
+                data = self.source.readRange(relPath, offset, length)
+            except (IOError, OSError) as e:
+                if getattr(e, 'errno', None) == errno.ENOENT:
+                    raise BlockChangedError('{0} is no longer published ({1})'.format(relPath, e))
+                errorClass = classifyError(e)
+                if errorClass == SCHEMA or not self.policy.shouldRetry(errorClass, attempt):
+                    raise SyncError('could not read {0} at offset {1}: {2}'.format(relPath, offset, e))
+                self._count('retries', 1)
+                time.sleep(self.policy.delay(errorClass, attempt))
+                continue
+            if len(data) != length or hashlib.sha1(data).hexdigest() != expected:
+                raise BlockChangedError('block at {0} of {1} does not match the manifest (published again?)'.format(
+                    offset, relPath))
+            return data
+
+    def _pruneStaging(self, manifest):
+        """Removes every staged file (finished or '.part') that is not a file of manifest, & emptied folders."""
+        if not os.path.isdir(self.stagingDir):
+            return
+        keep = set()
+        for entry in manifest['files']:
+            finalPath = os.path.normcase(os.path.join(self.stagingDir, *entry['path'].split('/')))
+            keep.update([finalPath, finalPath + '.part'])
+        for folder, folders, files in os.walk(self.stagingDir, topdown=False):
+            for name in files:
+                path = os.path.join(folder, name)
+                if os.path.normcase(path) not in keep:
+                    _remove(path)
+            if folder != self.stagingDir and not os.listdir(folder):
+                os.rmdir(folder)
+
+    def _swap(self, items, published):
+        """Replaces the installed bundle items with the staged ones, then writes the version file."""
+        moved = []
+        swapped = []
+        try:
+            for item in items:
+                staged = os.path.join(self.stagingDir, item)
+                if not os.path.exists(staged):
+                    continue
+                current = os.path.join(self.localDir, item)
+                if os.path.exists(current):
+                    os.rename(current, current + OLD_SUFFIX)
+                    moved.append(item)
+                os.rename(staged, current)
+                swapped.append(item)
+        except OSError as e:
+            # Put the installed copy back the way it was; the staged files stay for the next run.
+            for done in swapped:
+                os.rename(os.path.join(self.localDir, done), os.path.join(self.stagingDir, done))
+            for done in moved:
+                os.rename(os.path.join(self.localDir, done + OLD_SUFFIX), os.path.join(self.localDir, done))
+            raise SyncError('could not replace {0} (is ArcReader open?): {1}'.format(item, e))
+        replaceFile(os.path.join(self.stagingDir, MANIFEST_FILE), os.path.join(self.localDir, MANIFEST_FILE))
+        writeJson(os.path.join(self.localDir, VERSION_FILE), published)
+        for item in moved:
+            _remove(os.path.join(self.localDir, item + OLD_SUFFIX))
+        shutil.rmtree(self.stagingDir, ignore_errors=True)
+
+    def _recoverSwap(self):
+        """Puts back installed items left as '<item>.old' by a swap that was interrupted."""
+        if not os.path.isdir(self.localDir):
+            os.makedirs(self.localDir)
+        for name in os.listdir(self.localDir):
+            if name.endswith(OLD_SUFFIX):
+                current = os.path.join(self.localDir, name[:-len(OLD_SUFFIX)])
+                if os.path.exists(current):
+                    _remove(os.path.join(self.localDir, name))
+                else:
+                    os.rename(os.path.join(self.localDir, name), current)
+
+    def _count(self, key, amount):
+        with self.statsLock:
+            self.stats[key] += amount
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sync', description='Copy the published ArcReader bundle to this laptop.')
+    parser.add_argument('--share', default=SHARE_PATH, help='published bundle folder')
+    parser.add_argument('--server', help='distribution server url (e.g. http://gisdist:8765), used instead of --share')
+    parser.add_argument('--local', default=LOCAL_PATH, help='laptop bundle folder')
+    parser.add_argument('--streams', type=int, default=4, help='files transferred at once')
+    parser.add_argument('--limit-kbps', type=float, default=0, help='bandwidth cap in kilobytes/second (0 = none)')
+    parser.add_argument('--force', action='store_true', help='sync even if the version numbers match')
+    parser.add_argument('--peers', help='comma separated host:port of laptops serving the bundle (arcreaderexport.peer)')
+    parser.add_argument('--discover', action='store_true', help='look for peer laptops on the LAN first')
+    args = parser.parse_args(argv)
+
+    source = HttpSource(args.server) if args.server else LocalSource(args.share)
+    if args.peers or args.discover:
+        from arcreaderexport.peer import PeerSource, discoverPeers
+        peers = [peer for peer in (args.peers or '').split(',') if peer]
+        if args.discover:
+            peers.extend(peer for peer, version in discoverPeers() if peer not in peers)
+        source = PeerSource(source, peers)
+    client = SyncClient(source, args.local, args.streams, args.limit_kbps * 1024 or None)
+    try:
+        result = client.sync(force=args.force)
+    except SyncError as e:
+        print('Sync failed: {0}'.format(e))
+        return 1
+    if result['result'] == 'synced':
+        result.update(getattr(source, 'stats', {}))
+    print(json.dumps(result, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Post-export validation of PortableDuluth.gdb against its sources.
+
+For every copied class the validation stage compares:
+    1) row counts (cheap; a mismatch skips the remaining checks),
+    2) extents (within a tolerance, in map units),
+    3) an order-independent checksum of attributes plus a geometry fingerprint
+       (centroid, length, area), read with cursors in batches and hashed as it
+       streams so memory stays flat for Parcels-sized classes.
+
+Classes are validated in parallel by a worker pool: threads with a thread-safe
+reader, worker processes with arcpy (see ArcpyReader). A ValidationReport that did
+not pass should block publication of the new gdb.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import re
+import time
+from multiprocessing.pool import Pool, ThreadPool
+
+from arcreaderexport.checksum import TableChecksum
+
+# Field types not compared (renumbered, rebuilt or binary on copy).
+SKIP_FIELD_TYPES = ('OID', 'Geometry', 'GlobalID', 'Blob', 'Raster')
+
+# Shape length / area fields are maintained by the database and named differently in SDE.
+SHAPE_METRIC_FIELD = re.compile(r'^(shape[._]?(st)?(area|length|len)(\(\))?|st_area\(shape\)|st_length\(shape\))$',
+                                 re.IGNORECASE)
+
+# Geometry fingerprint read alongside the attributes (centroid, length, area).
+GEOMETRY_TOKENS = ['SHAPE@XY', 'SHAPE@LENGTH', 'SHAPE@AREA']
+
+OK = 'ok'
+MISMATCH = 'mismatch'
+MISSING = 'missing'
+ERROR = 'error'
+
+
+class ArcpyReader(object):
+    """
+    PURPOSE:
+    Reads class descriptions and row batches with arcpy (imported on first use).
+
+    Not thread-safe: arcpy cursors, Describe & GetCount share process-global state, so
+    validateOutput validates in worker processes with it.
+    """
+
+    threadSafe = False
+
+    def describe(self, path):
+        """Returns {'exists', 'count', 'extent', 'fields', 'hasShape'} for a feature class or table."""
+        import arcpy
+        if not arcpy.Exists(path):
+            return {'exists': False}
+        desc = arcpy.Describe(path)
+        hasShape = hasattr(desc, 'shapeFieldName')
+        extent = None
+        if hasShape:
+            extent = (desc.extent.XMin, desc.extent.YMin, desc.extent.XMax, desc.extent.YMax)
+        return {
+            'exists': True,
+            'count': int(arcpy.GetCount_management(path).getOutput(0)),
+            'extent': extent,
+            'fields': [(field.name, field.type) for field in desc.fields],
+            'hasShape': hasShape,
+        }
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        """Yields lists of up to batchSize row tuples (of the rows matching the optional where clause)."""
+        import arcpy
+        with arcpy.da.SearchCursor(path, fields, where) as cursor:
+            batch = []
+            for row in cursor:
+                batch.append(row)
+                if len(batch) >= batchSize:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+def comparableFields(sourceFields, outputFields):
+    """
+    PURPOSE:
+    Function returns (fields compared, source fields missing from the output).
+    Fields are matched case-insensitively on their unqualified name.
+
+    PARAMETERS:
+    sourceFields, outputFields = lists of (name, type) tuples.
+    """
+    def usable(fields):
+        names = {}
+        for name, fieldType in fields:
+            if fieldType in SKIP_FIELD_TYPES or SHAPE_METRIC_FIELD.match(name):
+                continue
+            names[name.split('.')[-1].lower()] = name
+        return names
+    source = usable(sourceFields)
+    output = usable(outputFields)
+    compared = sorted(key for key in source if key in output)
+    missing = sorted(source[key] for key in source if key not in output)
+    return [(source[key], output[key]) for key in compared], missing
+
+
+def _iterSources(reader, sources, fields, batchSize):
+    for sourcePath, where in sources:
+        if where:
+            for batch in reader.iterBatches(sourcePath, fields, batchSize, where=where):
+                yield batch
+        else:
+            for batch in reader.iterBatches(sourcePath, fields, batchSize):
+                yield batch
+
+
+def describeSources(reader, sources, batchSize):
+    """
+    PURPOSE:
+    Function returns one describe() result for a list of (source path, where clause) read
+    together (a filtered copy or a merge): counts are summed, or counted with the where
+    clause, and the extent is left out (None) once any source is filtered.
+
+    PARAMETERS:
+    reader = object with describe() & iterBatches().
+    sources = list of (path, where clause or None).
+    batchSize = rows read per batch when counting filtered rows.
+    """
+    descriptions = [reader.describe(sourcePath) for sourcePath, _ in sources]
+    if len(sources) == 1 and not sources[0][1]:
+        return descriptions[0]
+    if not all(description.get('exists') for description in descriptions):
+        return {'exists': False}
+    description = dict(descriptions[0])
+    description['count'] = sum(len(batch) for batch in _iterSources(reader, sources, ['OID@'], batchSize))
+    extents = [item['extent'] for item in descriptions]
+    if any(where for _, where in sources) or None in extents:
+        description['extent'] = None
+    else:
+        description['extent'] = (min(e[0] for e in extents), min(e[1] for e in extents),
+                                 max(e[2] for e in extents), max(e[3] for e in extents))
+    return description
+
+
+def extentsMatch(sourceExtent, outputExtent, tolerance):
+    if sourceExtent is None or outputExtent is None:
+        return sourceExtent == outputExtent
+    return all(abs(a - b) <= tolerance for a, b in zip(sourceExtent, outputExtent))
+
+
+def compareClass(task, reader=None, batchSize=5000, sampleEvery=1, extentTolerance=0.01, precision=3):
+    """
+    PURPOSE:
+    Function validates one copied class and returns a result dictionary with its
+    status ('ok', 'mismatch', 'missing', 'error') and the list of problems found.
+
+    PARAMETERS:
+    task = dictionary with 'name', 'source' (path read from, or a list of paths merged into the output)
+        and 'output' (path written to); optionally 'sourceWhere' (where clause of the rows copied, or a
+        list of them per source) and 'ignoreFields' (fields not compared, e.g. renumbered by a merge).
+    reader = object with describe() & iterBatches() (ArcpyReader by default).
+    batchSize = rows read and hashed per batch.
+    sampleEvery = 1 for a full checksum, N to hash ~1/N of the rows of a feature class, picked by
+        their centroid; rows left out are not hashed. Tables are always hashed in full.
+    extentTolerance = largest allowed difference of each extent coordinate (map units).
+    precision = decimals that float values & geometry fingerprints are rounded to.
+    """
+    reader = reader or ArcpyReader()
+    started = time.time()
+    result = {'name': task['name'], 'source': task['source'], 'output': task['output'],
+              'status': OK, 'problems': []}
+    try:
+        sourcePaths = task['source'] if isinstance(task['source'], (list, tuple)) else [task['source']]
+        wheres = task.get('sourceWhere')
+        wheres = wheres if isinstance(wheres, (list, tuple)) else [wheres] * len(sourcePaths)
+        sources = list(zip(sourcePaths, wheres))
+        filtered = len(sources) > 1 or bool(wheres[0])
+        source = describeSources(reader, sources, batchSize)
+        output = reader.describe(task['output'])
+        if not source.get('exists'):
+            result['problems'].append('source does not exist')
+            result['status'] = ERROR
+        elif not output.get('exists'):
+            result['problems'].append('output does not exist')
+            result['status'] = MISSING
+        else:
+            result['rows'] = source['count']
+            if source['count'] != output['count']:
+                result['problems'].append('row count {0} != {1}'.format(source['count'], output['count']))
+            if not filtered and not extentsMatch(source['extent'], output['extent'], extentTolerance):
+                result['problems'].append('extent {0} != {1}'.format(source['extent'], output['extent']))
+            ignored = set(name.lower() for name in task.get('ignoreFields', ()))
+            pairs, missingFields = comparableFields([field for field in source['fields'] if field[0].lower() not in ignored],
+                                                    output['fields'])
+            if missingFields:
+                result['problems'].append('fields missing from output: {0}'.format(', '.join(missingFields)))
+            if not result['problems']:
+                tokens = GEOMETRY_TOKENS if source['hasShape'] and output['hasShape'] else []
+                # A sample is picked by the centroid (SHAPE@XY, right after the fields); a table has no such
+                ## cheap value, & picking by the whole row would hash every row anyway
+                sampleField = len(pairs) if tokens else None
+                sourceSum = TableChecksum(sampleEvery if tokens else 1, precision, sampleField)
+                outputSum = TableChecksum(sampleEvery if tokens else 1, precision, sampleField)
+                for batch in _iterSources(reader, sources, [p[0] for p in pairs] + tokens, batchSize):
+                    sourceSum.update(batch)
+                for batch in reader.iterBatches(task['output'], [p[1] for p in pairs] + tokens, batchSize):
+                    outputSum.update(batch)
+                result['checksum'] = outputSum.hexdigest()
+                result['sampledRows'] = outputSum.sampled
+                if sourceSum.total != outputSum.total or sourceSum.sampled != outputSum.sampled:
+                    result['problems'].append('checksum {0} != {1}'.format(sourceSum.hexdigest(), outputSum.hexdigest()))
+            if result['problems']:
+                result['status'] = MISMATCH
+    except Exception as e:
+        result['status'] = ERROR
+        result['problems'].append('{0}: {1}'.format(type(e).__name__, e))
+    result['duration'] = round(time.time() - started, 3)
+    return result
+
+
+def _compareTask(args):
+    task, reader, options, profileSettings = args
+    if profileSettings is None:
+        return compareClass(task, reader, **options)
+    # Profiled (see arcreaderexport/profiling.py); a worker process writes its part after each class
+    from arcreaderexport.profiling import processProfiler
+    profiler, inWorker = processProfiler(profileSettings)
+    try:
+        return profiler.call('validate', task['name'], compareClass, (task, reader), options)
+    finally:
+        if inWorker:
+            profiler.writePart()
+
+#-------------------------------------------------------------------------------------------------------
+#-------------------------------------------------------------------------------------------------------
+
+class ValidationReport(object):
+    """
+    PURPOSE:
+    Holds the validation results of one output gdb.
+    """
+
+    def __init__(self, results, elapsed):
+        self.results = sorted(results, key=lambda result: result['name'])
+        self.elapsed = elapsed
+
+    @property
+    def failures(self):
+        return [result for result in self.results if result['status'] != OK]
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    def toDict(self):
+        return {'passed': self.passed, 'elapsed': round(self.elapsed, 3),
+                'classes': len(self.results), 'failures': len(self.failures), 'results': self.results}
+
+    def logSummary(self, logger):
+        for result in self.results:
+            logger.info('Validation {0} for {1}'.format(result['status'], result['name']), extra={'event': {
+                'stage': 'validate', 'className': result['name'], 'status': result['status'],
+                'rows': result.get('rows'), 'duration': result['duration']}})
+        logger.info('Validated {0} classes in {1:0.1f} seconds: {2} failed'.format(
+            len(self.results), self.elapsed, len(self.failures)))
+        for result in self.failures:
+            logger.info('XXX Validation {0} for {1}: {2}'.format(
+                result['status'], result['output'], '; '.join(result['problems'])))
+
+
+def validateOutput(tasks, reader=None, workers=4, useProcesses=None, profiler=None, **options):
+    """
+    PURPOSE:
+    Function validates every task's output against its source in parallel and
+    returns a ValidationReport.
+
+    PARAMETERS:
+    tasks = list of dictionaries with 'name', 'source' and 'output' paths.
+    reader = object with describe() & iterBatches() (ArcpyReader by default).
+    workers = number of classes validated at once.
+    useProcesses = True to use worker processes instead of threads; only safe when the
+        calling script is guarded by "if __name__ == '__main__':". None (default) uses processes
+        unless the reader is threadSafe (arcpy is not, see ArcpyReader).
+    profiler = profiling.TaskProfiler each class is profiled with (optional; worker processes
+        write their stacks to its parts folder).
+    options = batchSize, sampleEvery, extentTolerance, precision (see compareClass).
+    """
+    reader = reader or ArcpyReader()
+    if useProcesses is None:
+        useProcesses = not getattr(reader, 'threadSafe', False)
+    started = time.time()
+    profileSettings = profiler.settings() if profiler is not None else None
+    jobs = [(task, reader, options, profileSettings) for task in tasks]
+    pool = (Pool if useProcesses else ThreadPool)(max(1, min(workers, len(jobs) or 1)))
+    try:
+        results = list(pool.imap_unordered(_compareTask, jobs))
+    finally:
+        pool.close()
+        pool.join()
+        if not useProcesses and hasattr(reader, 'close'):
+            # Connections the pool threads opened (see backends.LocalBackend.close)
+            reader.close()
+    return ValidationReport(results, time.time() - started)
@@ -0,0 +1,128 @@
+"""
+Benchmark: filtered annotation copies (arcreaderexport.annotation) against full copies,
+on the local backend.
+
+Seeds stand-ins of the annotation classes of portableGISdict with the fields of a
+geodatabase annotation class (an Element blob per feature, part of them unplaced or
+without text, some in a hidden annotation class), then copies each class whole and
+through AnnotationExport and prints the rows & seconds of both, the size of the two
+output workspaces and the validation of the filtered copies:
+
+    python benchmarks/bench_annotation.py [--rows 20000] [--unplaced 0.3] [--element-bytes 600]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.annotation import AnnotationExport, annotationTasks  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.localstore import polygonWkb  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+from arcreaderexport.validate import compareClass  # noqa: E402
+
+ANNOTATION_FIELDS = [('FeatureID', 'Integer'), ('ZOrder', 'Integer'), ('AnnotationClassID', 'Integer'),
+                     ('Element', 'Blob'), ('SymbolID', 'Integer'), ('Status', 'SmallInteger'),
+                     ('TextString', 'String'), ('FontName', 'String'), ('FontSize', 'Double'), ('Angle', 'Double')]
+HIDDEN_CLASS_ID = 2
+
+
+def seedAnnotation(backend, path, rows, unplaced, elementBytes, rng):
+    workspacePath, parts = splitWorkspace(path)
+    store = backend.store(workspacePath)
+    name = '/'.join(parts)
+    store.createClass(name, ANNOTATION_FIELDS, 'Polygon', 'NAD_1983_HARN_Adj_MN_St_Louis_CS96_Feet')
+    inserter = store.openInsert(name, [field for field, _ in ANNOTATION_FIELDS] + ['SHAPE@'])
+    batch = []
+    for number in range(rows):
+        x, y, angle = rng.uniform(0, 50000), rng.uniform(0, 50000), rng.uniform(0, 6.283)
+        box = [(x, y), (x + 60 * math.cos(angle), y + 60 * math.sin(angle)),
+               (x + 60 * math.cos(angle) - 12 * math.sin(angle), y + 60 * math.sin(angle) + 12 * math.cos(angle)),
+               (x - 12 * math.sin(angle), y + 12 * math.cos(angle)), (x, y)]
+        text = '' if rng.random() < 0.05 else '{0}" {1}'.format(rng.choice((4, 6, 8, 12)), rng.choice(('PVC', 'DIP', 'CI')))
+        status = 1 if rng.random() < unplaced else 0
+        element = sqlite3.Binary(bytearray(rng.getrandbits(8) for _ in range(elementBytes)))
+        batch.append((number, 0, rng.randint(0, 3), element, 0, status, text, 'Arial', 8.0, math.degrees(angle),
+                      polygonWkb([box])))
+        if len(batch) == 2000:
+            inserter.insertRows(batch)
+            batch = []
+    inserter.insertRows(batch)
+
+
+def workspaceSize(backend, workspacePath):
+    backend.compact(workspacePath)
+    return os.path.getsize(backend.workspaceFile(workspacePath))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare filtered annotation copies with full copies.')
+    parser.add_argument('--rows', type=int, default=20000, help='features per annotation class')
+    parser.add_argument('--unplaced', type=float, default=0.3, help='share of unplaced (Status 1) annotation')
+    parser.add_argument('--element-bytes', type=int, default=600, help='size of each Element blob')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='annotation_')
+    logger = logging.getLogger('bench_annotation')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        rng = random.Random(1)
+        fullGdb, filteredGdb = layers.PUBLISH_DIR + '/Full.gdb', layers.PUBLISH_DIR + '/Filtered.gdb'
+        backend.createWorkspace(layers.PUBLISH_DIR, 'Full.gdb')
+        backend.createWorkspace(layers.PUBLISH_DIR, 'Filtered.gdb')
+        hidden = dict((fc, (HIDDEN_CLASS_ID,)) for fc in layers.ANNOTATION_CLASSES)
+        annotationExport = AnnotationExport(backend, hidden, logger)
+
+        print('{0:<26} {1:>9} {2:>9} {3:>10} {4:>10}'.format('class', 'rows', 'kept', 'full (s)', 'filtered (s)'))
+        tasks, fullSeconds, filteredSeconds = [], 0.0, 0.0
+        for dataset, classes in sorted(layers.portableGISdict.items()):
+            for fc in classes:
+                if fc not in layers.ANNOTATION_CLASSES:
+                    continue
+                sourcePath = sdeClassPath(layers.SDE_CONNECTION, dataset, fc)
+                seedAnnotation(backend, sourcePath, args.rows, args.unplaced, args.element_bytes, rng)
+                for gdb in (fullGdb, filteredGdb):
+                    if dataset not in backend.store(gdb).listDatasets():
+                        backend.createDataset(gdb, dataset, None)
+                started = time.time()
+                backend.copyClass(sourcePath, fullGdb + '/' + dataset, fc)
+                full = time.time() - started
+                started = time.time()
+                result = annotationExport.copy(sourcePath, filteredGdb + '/' + dataset, fc)
+                filtered = time.time() - started
+                fullSeconds += full
+                filteredSeconds += filtered
+                tasks.append({'name': fc, 'source': sourcePath, 'output': filteredGdb + '/' + dataset + '/' + fc})
+                print('{0:<26} {1:>9} {2:>9} {3:>10.3f} {4:>10.3f}'.format(fc, result['sourceRows'], result['rows'],
+                                                                          full, filtered))
+
+        fullSize, filteredSize = workspaceSize(backend, fullGdb), workspaceSize(backend, filteredGdb)
+        summary = annotationExport.summary()
+        print('{0} classes: {1} of {2} rows kept; {3:0.2f} s -> {4:0.2f} s; {5:0.1f} MB -> {6:0.1f} MB ({7:0.0f}% smaller)'.format(
+            summary['classes'], summary['rows'], summary['sourceRows'], fullSeconds, filteredSeconds,
+            fullSize / 1e6, filteredSize / 1e6, 100.0 * (1 - filteredSize / max(fullSize, 1))))
+        checks = [compareClass(task, reader=backend) for task in annotationTasks(tasks, backend, hidden)]
+        failed = [check['name'] for check in checks if check['status'] != 'ok']
+        print('Validation: {0} of {1} classes passed{2}'.format(len(checks) - len(failed), len(checks),
+                                                               ' (failed: {0})'.format(', '.join(failed)) if failed else ''))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
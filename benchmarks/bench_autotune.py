@@ -0,0 +1,127 @@
+"""
+Benchmark: copies run on a fixed number of workers against the autotuned pool
+(arcreaderexport.autotune), on a simulated source that slows down past a knee.
+
+The simulated source moves --capacity rows / second in total, shared by the tasks in
+flight, as long as at most --knee of them run at once; each task past the knee costs
+it --penalty of its capacity (like an SDE server swapping or queueing), makes its
+latency probe slower and may fail a task attempt with a transient error. --tasks copy
+tasks of log-normal row counts run through a TaskRunner (retries as in a real run) on
+each worker count, then through an AutotunedPool that starts at one task in flight:
+
+    python benchmarks/bench_autotune.py [--tasks 60] [--capacity 400000] [--knee 3] [--workers 1,2,4,8]
+
+Prints the time to copy every task, the rows / second reached, the failed attempts and
+the mean number of tasks in flight (the autotuned pool's limit changes are listed).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.autotune import AutotunedPool  # noqa: E402
+from arcreaderexport.retry import RetryPolicy, TaskRunner  # noqa: E402
+
+SOURCE = 'Database Connections\\simulated.sde'
+STEP_SECONDS = 0.01
+
+
+class SimulatedSource(object):
+    """Rows / second shared by the tasks in flight, falling past the knee."""
+
+    def __init__(self, capacity, knee, penalty, failRate, rng):
+        self.capacity = capacity
+        self.knee = knee
+        self.penalty = penalty
+        self.failRate = failRate
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.inFlight = 0
+        self.failures = 0
+
+    def totalRate(self, inFlight):
+        return self.capacity * min(inFlight, self.knee) / float(self.knee) / (1.0 + self.penalty * max(0, inFlight - self.knee))
+
+    def copy(self, rows):
+        with self.lock:
+            self.inFlight += 1
+            overloaded = self.inFlight > self.knee and self.rng.random() < self.failRate * (self.inFlight - self.knee)
+        try:
+            if overloaded:
+                time.sleep(STEP_SECONDS)
+                with self.lock:
+                    self.failures += 1
+                raise IOError('Network I/O error: simulated overload')
+            left = rows
+            while left > 0:
+                time.sleep(STEP_SECONDS)
+                with self.lock:
+                    left -= self.totalRate(self.inFlight) / self.inFlight * STEP_SECONDS
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+        return {'rows': rows}
+
+    def probe(self, source):
+        time.sleep(0.005 * (1.0 + 4.0 * max(0, self.inFlight - self.knee)))
+
+
+def runPool(source, sizes, workers, autotune, logger):
+    """Copies every task & returns (seconds, pool summary of the source)."""
+    taskRunner = TaskRunner(policy=RetryPolicy(baseDelay=0.05, lockDelay=0.05, maxDelay=0.2), logger=logger)
+    if autotune:
+        pool = AutotunedPool(taskRunner, workers=workers, perSource=workers, probe=source.probe, probeInterval=0.5,
+                             sampleInterval=0.1, logger=logger, hold=0.5)
+    else:
+        pool = AutotunedPool(taskRunner, workers=workers, perSource=workers, sampleInterval=0.1, logger=logger,
+                             initial=workers, minimum=workers)
+    for index, rows in enumerate(sizes):
+        pool.submit('Class{0:03d}'.format(index), SOURCE, source.copy, (rows,))
+    started = time.time()
+    pool.join()
+    return time.time() - started, pool.summary()['sources'][SOURCE]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare fixed worker counts with the autotuned copy pool.')
+    parser.add_argument('--tasks', type=int, default=60)
+    parser.add_argument('--rows', type=int, default=20000, help='median rows per task')
+    parser.add_argument('--capacity', type=float, default=400000, help='rows / second of the source up to the knee')
+    parser.add_argument('--knee', type=int, default=3, help='tasks in flight the source handles without slowing')
+    parser.add_argument('--penalty', type=float, default=0.5, help='share of capacity lost per task past the knee')
+    parser.add_argument('--fail-rate', type=float, default=0.02, help='chance of a transient failure per task past the knee')
+    parser.add_argument('--workers', default='1,2,4,8', help='comma-separated fixed worker counts')
+    args = parser.parse_args(argv)
+
+    logger = logging.getLogger('bench_autotune')
+    logger.addHandler(logging.NullHandler())
+    rng = random.Random(1)
+    sizes = [int(args.rows * rng.lognormvariate(0, 1)) for _ in range(args.tasks)]
+    fixed = [int(value) for value in args.workers.split(',')]
+    print('{0} tasks, {1} rows; source: {2:0.0f} rows/sec up to {3} in flight'.format(
+        len(sizes), sum(sizes), args.capacity, args.knee))
+    print('{0:>12} {1:>10} {2:>10} {3:>9} {4:>11}'.format('workers', 'seconds', 'rows/sec', 'failures', 'mean limit'))
+    for workers, autotune in [(workers, False) for workers in fixed] + [(max(fixed), True)]:
+        source = SimulatedSource(args.capacity, args.knee, args.penalty, args.fail_rate, random.Random(2))
+        seconds, summary = runPool(source, sizes, workers, autotune, logger)
+        print('{0:>12} {1:>10.2f} {2:>10.0f} {3:>9} {4:>11}'.format(
+            'auto ({0})'.format(workers) if autotune else workers, seconds, sum(sizes) / seconds, source.failures,
+            summary['meanLimit']))
+        if autotune:
+            print('Limit changes: ' + ', '.join('{0} at {1:0.1f} s ({2})'.format(change['limit'], change['time'],
+                                                                                 change['reason'])
+                                                 for change in summary['changes'][1:]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
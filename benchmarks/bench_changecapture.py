@@ -0,0 +1,100 @@
+"""
+Benchmark: incremental update of a versioned class from its adds / deletes tables
+(arcreaderexport.changecapture) against a full copy, on the local SQLite stand-in.
+
+Seeds a stand-in SDE class, registers it as versioned and exports it once (a full
+keyed copy). Then for each edit count it makes one edit session of that many
+updates, inserts & deletes, brings the output up to date from the A/D tables and
+times it next to a full copy of the class; every output is validated against the
+source:
+
+    python benchmarks/bench_changecapture.py [--rows 200000] [--edits 10,100,1000,10000]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedClass  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.changecapture import ChangeCapture, editVersioned, keyedCopy, registerVersioned  # noqa: E402
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+from arcreaderexport.validate import compareClass  # noqa: E402
+
+DATASET, CLASS_NAME = 'GPS', 'EngGPSPts'
+
+
+def makeEdits(store, className, edits, rng):
+    """One edit session: half updates, a quarter inserts & a quarter deletes of random rows."""
+    oids = [row[0] for row in store.connection.execute('SELECT OBJECTID FROM "{0}"'.format(className))]
+    picked = rng.sample(oids, min(len(oids), edits - edits // 4))
+    updates = dict((oid, {'VALUE': rng.uniform(0, 1000), 'SHAPE': pointWkb(rng.uniform(0, 50000), rng.uniform(0, 50000))})
+                   for oid in picked[:edits // 2])
+    deletes = picked[edits // 2:]
+    inserts = [{'NAME': 'new {0}'.format(number), 'VALUE': rng.uniform(0, 1000), 'YEAR': 2024,
+                'SHAPE': pointWkb(rng.uniform(0, 50000), rng.uniform(0, 50000))} for number in range(edits // 4)]
+    return editVersioned(store, className, inserts=inserts, updates=updates, deletes=deletes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time change capture from A/D tables against full copies.')
+    parser.add_argument('--rows', type=int, default=200000, help='rows of the versioned class')
+    parser.add_argument('--edits', default='10,100,1000,10000', help='comma-separated edits per session')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='changecapture_')
+    logger = logging.getLogger('bench_changecapture')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        rng = random.Random(1)
+        sourcePath = sdeClassPath(layers.SDE_CONNECTION, DATASET, CLASS_NAME)
+        outputPath = layers.PORTABLE_GDB + '/' + DATASET + '/' + CLASS_NAME
+        fullPath = layers.PORTABLE_GDB + '/' + DATASET + '/' + CLASS_NAME + '_full'
+        seedClass(backend, sourcePath, args.rows, 'Point', rng)
+        workspacePath, parts = splitWorkspace(sourcePath)
+        store = backend.store(workspacePath)
+        registerVersioned(store, '/'.join(parts))
+        backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+
+        capture = ChangeCapture(backend, statePath=os.path.join(workDir, 'state.json'), logger=logger)
+        started = time.time()
+        result = capture.sync(sourcePath, outputPath)
+        capture.commit()
+        print('Initial {0} copy of {1} rows in {2:0.2f} seconds'.format(result['mode'], result['rows'], time.time() - started))
+
+        print('{0:>8} {1:>8} {2:>12} {3:>12} {4:>9}  {5}'.format('edits', 'changed', 'delta (s)', 'full (s)', 'speedup',
+                                                                 'validation'))
+        for edits in [int(value) for value in args.edits.split(',')]:
+            makeEdits(store, '/'.join(parts), edits, rng)
+            started = time.time()
+            result = capture.sync(sourcePath, outputPath)
+            deltaSeconds = time.time() - started
+            capture.commit()
+            started = time.time()
+            keyedCopy(backend, sourcePath, fullPath)
+            fullSeconds = time.time() - started
+            check = compareClass({'name': CLASS_NAME, 'source': sourcePath, 'output': outputPath}, reader=backend)
+            print('{0:>8} {1:>8} {2:>12.3f} {3:>12.3f} {4:>8.1f}x  {5} ({6} copy)'.format(
+                edits, result['changedIds'], deltaSeconds, fullSeconds, fullSeconds / max(deltaSeconds, 1e-6),
+                check['status'], result['mode']))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
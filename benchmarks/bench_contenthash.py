@@ -0,0 +1,102 @@
+"""
+Benchmark: full rebuilds with content hashes (arcreaderexport.contenthash) against
+exporting every class again, on the local backend.
+
+Seeds --classes stand-in SDE classes, exports them once into PortableDuluth.gdb with
+their hashes saved, then for each share of changed sources (re-seeded between runs)
+rebuilds the gdb twice: once copying every class from its source, once through
+ContentHashes (unchanged classes reused from the backup gdb). Prints both times, the
+hashing rate and how many classes were reused:
+
+    python benchmarks/bench_contenthash.py [--classes 20] [--rows 50000] [--changed 0,0.1,0.5]
+
+On ArcGIS the copy side is FeatureClassToFeatureClass from SDE, so the hash (a cursor
+read) and the reuse (a local gdb-to-gdb copy) save more than the local numbers show.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedClass  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.contenthash import REUSED, ContentHashes  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+
+DATASET = 'Bench'
+BACKUP_GDB = os.path.join(layers.PUBLISH_DIR, 'PortableDuluth_backup.gdb')
+
+
+def rebuild(backend, names, contentHashes=None):
+    """Moves the gdb to the backup name, then fills a new one; returns the seconds the copies took."""
+    backend.moveWorkspace(layers.PORTABLE_GDB, BACKUP_GDB)
+    backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+    backend.createDataset(layers.PORTABLE_GDB, DATASET, None)
+    started = time.time()
+    for name in names:
+        sourcePath = sdeClassPath(layers.SDE_CONNECTION, DATASET, name)
+        if contentHashes is None or contentHashes.reuse(sourcePath, layers.PORTABLE_GDB + '/' + DATASET + '/' + name) is None:
+            backend.copyClass(sourcePath, layers.PORTABLE_GDB + '/' + DATASET, name)
+    seconds = time.time() - started
+    if contentHashes is not None:
+        contentHashes.commit()
+    return seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time full rebuilds that reuse unchanged classes.')
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=50000, help='rows per class')
+    parser.add_argument('--changed', default='0,0.1,0.5', help='comma-separated shares of changed sources')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='contenthash_')
+    logger = logging.getLogger('bench_contenthash')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        rng = random.Random(1)
+        names = ['Class{0:02d}'.format(number) for number in range(args.classes)]
+        shapeTypes = ['Point', 'Polyline', 'Polygon']
+        for index, name in enumerate(names):
+            seedClass(backend, sdeClassPath(layers.SDE_CONNECTION, DATASET, name), args.rows, shapeTypes[index % 3], rng)
+        statePath = os.path.join(workDir, 'hashes.json')
+        backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+        seconds = rebuild(backend, names, ContentHashes(backend, layers.PORTABLE_GDB, statePath=statePath, logger=logger))
+        print('Initial export of {0} classes ({1} rows each) with hashes in {2:0.2f} seconds'.format(
+            len(names), args.rows, seconds))
+
+        print('{0:>8} {1:>14} {2:>14} {3:>9} {4:>8} {5:>14}'.format('changed', 'copy all (s)', 'hashed (s)', 'speedup',
+                                                                  'reused', 'hash rows/s'))
+        for share in [float(value) for value in args.changed.split(',')]:
+            for index in rng.sample(range(len(names)), int(round(share * len(names)))):
+                seedClass(backend, sdeClassPath(layers.SDE_CONNECTION, DATASET, names[index]), args.rows,
+                          shapeTypes[index % 3], rng)
+            copySeconds = rebuild(backend, names)
+            contentHashes = ContentHashes(backend, layers.PORTABLE_GDB, previousGdb=BACKUP_GDB, statePath=statePath,
+                                          logger=logger)
+            hashedSeconds = rebuild(backend, names, contentHashes)
+            reused = sum(1 for result in contentHashes.results if result['content'] == REUSED)
+            hashSeconds = sum(result['seconds'] for result in contentHashes.results)
+            print('{0:>7.0%} {1:>14.3f} {2:>14.3f} {3:>8.1f}x {4:>8} {5:>14.0f}'.format(
+                share, copySeconds, hashedSeconds, copySeconds / max(hashedSeconds, 1e-6), reused,
+                len(names) * args.rows / max(hashSeconds, 1e-6)))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
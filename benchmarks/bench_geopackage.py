@@ -0,0 +1,81 @@
+"""
+Benchmark: GeoPackage insert throughput by batch size, page size & journal mode.
+
+Builds a Parcels-like polygon class (see bench_streamcopy.makeSource), reads its rows
+into memory once, then writes them into a fresh geopackage.GeoPackageStore for each
+combination, so only the GeoPackage side is timed (GeoPackage binary encoding, the
+table & R-tree inserts, the trigger creation and the final WAL checkpoint):
+
+    python benchmarks/bench_geopackage.py [--rows 100000] [--batch-sizes 1,100,1000,5000,50000]
+                                          [--page-sizes 4096,8192,65536] [--journal wal,delete]
+
+Each batch is one transaction, so batch size 1 shows the cost of a commit per row.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from arcreaderexport.geopackage import GeoPackageStore  # noqa: E402
+from arcreaderexport.localstore import LocalStore  # noqa: E402
+from arcreaderexport.streamcopy import copyFields  # noqa: E402
+from bench_streamcopy import makeSource  # noqa: E402
+
+
+def writeGeoPackage(gpkgPath, description, fields, rows, batchSize, pageSize, wal):
+    started = time.time()
+    store = GeoPackageStore(gpkgPath, pageSize=pageSize, wal=wal)
+    store.createLike('ParcelFeatures/Parcels', 'Parcels', description)
+    inserter = store.openInsert('ParcelFeatures/Parcels', fields)
+    for start in range(0, len(rows), batchSize):
+        inserter.insertRows(rows[start:start + batchSize])
+    inserter.close()
+    store.close()
+    return time.time() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark GeoPackage insert throughput.')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-sizes', default='1,100,1000,5000,50000')
+    parser.add_argument('--page-sizes', default='4096,8192,65536')
+    parser.add_argument('--journal', default='wal,delete')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='geopackage_')
+    try:
+        sourcePath = os.path.join(workDir, 'source.sqlite')
+        makeSource(sourcePath, args.rows)
+        source = LocalStore(sourcePath)
+        description = source.describe('Parcels')
+        fields = copyFields(description)
+        rows = [row for batch in source.iterBatches('Parcels', fields, 10000) for row in batch]
+        source.close()
+
+        print('{0} polygon rows'.format(len(rows)))
+        print('{0:<8} {1:>10} {2:>10} {3:>10} {4:>12} {5:>10}'.format('journal', 'page size', 'batch', 'seconds',
+                                                                      'rows/sec', 'MB'))
+        for journal in args.journal.split(','):
+            for pageSize in [int(size) for size in args.page_sizes.split(',')]:
+                for batchSize in [int(size) for size in args.batch_sizes.split(',')]:
+                    gpkgPath = os.path.join(workDir, 'out.gpkg')
+                    seconds = writeGeoPackage(gpkgPath, description, fields, rows, batchSize, pageSize, journal == 'wal')
+                    print('{0:<8} {1:>10} {2:>10} {3:>10.2f} {4:>12.0f} {5:>10.1f}'.format(
+                        journal, pageSize, batchSize, seconds, len(rows) / seconds, os.path.getsize(gpkgPath) / 1048576.0))
+                    os.remove(gpkgPath)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Benchmark: the Prometheus metrics of an export (arcreaderexport.metrics), scraped from a
+local export on the local backend.
+
+Seeds the stand-in sources of bench_pipeline_local, then runs --runs exports (runExport
+on LocalBackend) with the textfile written to the work folder and the metrics served
+on a free local port. A thread scrapes http://127.0.0.1:<port>/metrics every --interval
+seconds during the runs, the way Prometheus would; every scrape is checked against the
+text format. Prints the run times against a run without metrics, the scrapes & their
+times, and the main series of the last scrape & of the textfile:
+
+    python benchmarks/bench_metrics.py [--rows 1000] [--tier weekly] [--runs 2] [--interval 0.5]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedSources  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.export import runExport  # noqa: E402
+from arcreaderexport.metrics import CONTENT_TYPE, METRICS_FILE, PREFIX  # noqa: E402
+
+LINE = re.compile(r'^(# (HELP|TYPE) \S+ .+|[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+                  r'(-?[0-9.e+-]+|\+Inf|NaN))$')
+SHOWN = ('tasks_total', 'rows_copied_total', 'runs_total', 'run_in_progress', 'last_run_duration_seconds',
+         'task_duration_seconds_count', 'source_latency_seconds_count')
+
+
+def freePort():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def badLines(text):
+    """Returns the lines of a scrape that are not in the Prometheus text format."""
+    return [line for line in text.splitlines() if line and not LINE.match(line)]
+
+
+class Scraper(object):
+    """Scrapes a metrics URL every interval seconds on a thread until stopped."""
+
+    def __init__(self, url, interval):
+        self.url = url
+        self.interval = interval
+        self.scrapes = []
+        self.refused = 0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def _run(self):
+        while not self.stopped:
+            started = time.time()
+            try:
+                response = urlopen(self.url, timeout=5)
+                self.scrapes.append((time.time() - started, response.info().get('Content-Type'),
+                                     response.read().decode('utf-8')))
+            except (IOError, OSError):
+                self.refused += 1       # between runs, no server is listening
+            time.sleep(self.interval)
+
+
+def shown(text):
+    return [line for line in text.splitlines()
+            if not line.startswith('#') and any(line.startswith(PREFIX + name) for name in SHOWN)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape the metrics of local exports.')
+    parser.add_argument('--rows', type=int, default=1000, help='rows per source class')
+    parser.add_argument('--tier', choices=layers.TIERS, default=layers.FULL_TIER)
+    parser.add_argument('--runs', type=int, default=2, help='exports run with metrics (the counters add up)')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between scrapes')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='metrics_')
+    logger = logging.getLogger('bench_metrics')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        seedSources(backend, args.rows, random.Random(1))
+        port = freePort()
+
+        def run(**options):
+            stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')     # runExport prints progress like the script
+            try:
+                return runExport(args.tier, backend=backend, logger=logger, publish=False, useSourceCache=False,
+                                 reportDir=workDir, **options)['elapsed']
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+
+        baseline = run(writeMetrics=False)
+        scraper = Scraper('http://127.0.0.1:{0}/metrics'.format(port), args.interval)
+        scraper.thread.start()
+        elapsed = [run(metricsPort=port) for _ in range(args.runs)]
+        scraper.stopped = True
+        scraper.thread.join()
+
+        print('{0} export, {1} rows per class: {2:0.2f} s without metrics; with: {3}'.format(
+            args.tier, args.rows, baseline, ', '.join('{0:0.2f} s'.format(seconds) for seconds in elapsed)))
+        if not scraper.scrapes:
+            print('XXX No scrape succeeded')
+            return 1
+        times = sorted(seconds for seconds, _, _ in scraper.scrapes)
+        invalid = sum(len(badLines(text)) for _, _, text in scraper.scrapes)
+        contentTypes = set(contentType for _, contentType, _ in scraper.scrapes)
+        print('{0} scrapes ({1} refused between runs): median {2:0.1f} ms, max {3:0.1f} ms, {4:0.1f} KB; '
+              '{5} lines not in the text format; Content-Type {6}'.format(
+                  len(times), scraper.refused, times[len(times) // 2] * 1000, times[-1] * 1000,
+                  len(scraper.scrapes[-1][2]) / 1024.0, invalid,
+                  'ok' if contentTypes == set([CONTENT_TYPE]) else ', '.join(contentTypes)))
+        print('\nLast scrape during a run:')
+        for line in shown(scraper.scrapes[-1][2]):
+            print('  ' + line)
+        with open(os.path.join(workDir, METRICS_FILE)) as textFile:
+            text = textFile.read()
+        print('\nTextfile after the last run ({0} lines not in the text format):'.format(len(badLines(text))))
+        for line in shown(text):
+            print('  ' + line)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
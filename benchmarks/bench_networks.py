@@ -0,0 +1,167 @@
+"""
+Benchmark: the geometric network datasets (layers.FLATTENED_NETWORK_DATASETS) copied
+whole, network included, against the flattened bulk copy of their classes as simple
+features (ExportSteps.copyNetworkClassesTask).
+
+With --sde it runs on ArcGIS: for each network dataset of the SDE connection it times
+Copy_management of the feature dataset (the geometric network is copied and its
+connectivity rebuilt; its annotation classes come along) against one
+FeatureClassToGeodatabase call of its plain classes, each into a new file gdb under --out:
+
+    python benchmarks/bench_networks.py --sde <connection.sde> --out <folder>
+
+Without --sde it runs on the local backend, where there is no geometric network: the
+network copy is stood in for by the class copies plus a rebuild of the edge / junction
+connectivity (every edge end point looked up among the junctions), which is the part
+of a network copy the flattened path leaves out:
+
+    python benchmarks/bench_networks.py [--rows 20000]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedClass  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.retry import TaskRunner  # noqa: E402
+from arcreaderexport.steps import ExportSteps, sdeClassPath  # noqa: E402
+
+# Classes of the network datasets that are edges (lines); the others are junctions (points)
+EDGE_WORDS = ('Main', 'Lateral', 'Line')
+
+
+def networkClasses(dataset):
+    """Returns the plain (not annotation or leader) classes of a network dataset."""
+    return [fc for fc in layers.portableGISdict[dataset]
+            if fc not in layers.ANNOTATION_CLASSES and not fc.endswith('Leaders')]
+
+
+def endPoints(wkb):
+    """Returns the first & last vertex of a WKB line string (the local store's geometry)."""
+    count = struct.unpack('<I', wkb[5:9])[0]
+    first = struct.unpack('<2d', wkb[9:25])
+    last = struct.unpack('<2d', wkb[9 + 16 * (count - 1):9 + 16 * count])
+    return first, last
+
+
+def rebuildConnectivity(backend, outDatasetPath, fcs, tolerance=1.0):
+    """Stand-in of a network's connectivity rebuild: snaps every edge end point to a junction (or a new one)."""
+    junctions, connections = {}, 0
+    for fc in fcs:
+        if not any(word in fc for word in EDGE_WORDS):
+            for batch in backend.iterBatches(outDatasetPath + '/' + fc, ['OID@', 'SHAPE@XY'], 5000):
+                for oid, xy in batch:
+                    junctions.setdefault((round(xy[0] / tolerance), round(xy[1] / tolerance)), (fc, oid))
+    for fc in fcs:
+        if any(word in fc for word in EDGE_WORDS):
+            for batch in backend.iterBatches(outDatasetPath + '/' + fc, ['OID@', 'SHAPE@WKB'], 5000):
+                for oid, wkb in batch:
+                    for x, y in endPoints(bytes(wkb)):
+                        junctions.setdefault((round(x / tolerance), round(y / tolerance)), ('orphan', oid))
+                        connections += 1
+    return {'junctions': len(junctions), 'connections': connections}
+
+
+def timed(func, *args):
+    """Returns the seconds func(*args) took, with the progress the steps print hidden."""
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        started = time.time()
+        func(*args)
+        return time.time() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def copyNetwork(steps, backend, dataset, fcs, outDatasetPath):
+    for fc in fcs:
+        steps.copyFeatureClassTask(sdeClassPath(layers.SDE_CONNECTION, dataset, fc), outDatasetPath, fc)
+    rebuildConnectivity(backend, outDatasetPath, fcs)
+
+
+def benchLocal(args, logger):
+    from arcreaderexport.backends import LocalBackend
+    workDir = tempfile.mkdtemp(prefix='networks_')
+    try:
+        backend = LocalBackend(workDir)
+        rng = random.Random(1)
+        for dataset in layers.FLATTENED_NETWORK_DATASETS:
+            for fc in networkClasses(dataset):
+                seedClass(backend, sdeClassPath(layers.SDE_CONNECTION, dataset, fc), args.rows,
+                          'Polyline' if any(word in fc for word in EDGE_WORDS) else 'Point', rng)
+        print('{0:<28} {1:>8} {2:>14} {3:>14} {4:>9}'.format('dataset', 'classes', 'network (s)', 'flattened (s)',
+                                                             'speedup'))
+        for dataset in layers.FLATTENED_NETWORK_DATASETS:
+            fcs = networkClasses(dataset)
+            for gdb in ('Network.gdb', 'Flattened.gdb'):
+                backend.createWorkspace(layers.PUBLISH_DIR, gdb)
+                backend.createDataset(layers.PUBLISH_DIR + '/' + gdb, dataset, None)
+            steps = ExportSteps(backend, TaskRunner(sleep=lambda seconds: None), logger)
+
+            networkSeconds = timed(copyNetwork, steps, backend, dataset, fcs,
+                                   layers.PUBLISH_DIR + '/Network.gdb/' + dataset)
+            flattenedSeconds = timed(steps.copyNetworkClassesTask,
+                                     [sdeClassPath(layers.SDE_CONNECTION, dataset, fc) for fc in fcs],
+                                     layers.PUBLISH_DIR + '/Flattened.gdb/' + dataset, fcs)
+            print('{0:<28} {1:>8} {2:>14.3f} {3:>14.3f} {4:>8.1f}x'.format(
+                dataset, len(fcs), networkSeconds, flattenedSeconds, networkSeconds / max(flattenedSeconds, 1e-6)))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def benchArcpy(args, logger):
+    from arcreaderexport.backends import ArcpyBackend
+    backend = ArcpyBackend()
+    print('{0:<28} {1:>8} {2:>14} {3:>14} {4:>9}'.format('dataset', 'classes', 'network (s)', 'flattened (s)',
+                                                         'speedup'))
+    for dataset in layers.FLATTENED_NETWORK_DATASETS:
+        fcs = networkClasses(dataset)
+        networkGdb, flattenedGdb = dataset + '_network.gdb', dataset + '_flattened.gdb'
+        for gdb in (networkGdb, flattenedGdb):
+            backend.createWorkspace(args.out, gdb)
+        spatialRef = backend.spatialReference(args.sde + '\\sde.SDE.' + dataset)
+        backend.createDataset(os.path.join(args.out, flattenedGdb), dataset, spatialRef)
+
+        networkSeconds = timed(backend.copyDataset, args.sde + '\\sde.SDE.' + dataset,
+                               os.path.join(args.out, networkGdb, dataset))
+        steps = ExportSteps(backend, TaskRunner(), logger)
+        flattenedSeconds = timed(steps.copyNetworkClassesTask, [sdeClassPath(args.sde, dataset, fc) for fc in fcs],
+                                 os.path.join(args.out, flattenedGdb, dataset), fcs)
+        print('{0:<28} {1:>8} {2:>14.3f} {3:>14.3f} {4:>8.1f}x'.format(
+            dataset, len(fcs), networkSeconds, flattenedSeconds, networkSeconds / max(flattenedSeconds, 1e-6)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time network dataset copies against flattened bulk copies.')
+    parser.add_argument('--rows', type=int, default=20000, help='rows per class (local backend)')
+    parser.add_argument('--sde', help='SDE connection to read the network datasets from (runs on ArcGIS)')
+    parser.add_argument('--out', help='folder the file gdbs are written to (with --sde)')
+    args = parser.parse_args(argv)
+    if args.sde and not args.out:
+        parser.error('--sde needs --out')
+
+    logger = logging.getLogger('bench_networks')
+    logger.addHandler(logging.NullHandler())
+    if args.sde:
+        benchArcpy(args, logger)
+    else:
+        benchLocal(args, logger)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Benchmark: the post-build optimization (arcreaderexport.optimize) of an output gdb on
+the local backend: file size, free space, fragmentation and read times before & after.
+
+Seeds an output workspace with --classes feature classes in random (insertion) order,
+then churns them like hourly change-capture runs do (rows deleted & new rows appended)
+to leave free pages and out-of-order leaf pages. Measures the workspace, runs
+GdbOptimizer.optimize and measures again:
+
+    python benchmarks/bench_optimize.py [--classes 6] [--rows 100000] [--churn 0.2] [--curve hilbert]
+
+Reads are timed on a fresh connection: a full scan of every class (sequential read)
+and --extents queries of 1% of each class's extent (a map draw), with the pages those
+draws touch estimated from the row order (spatialorder.pagesPerExtent).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedClass  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.optimize import GdbOptimizer  # noqa: E402
+from arcreaderexport.spatialorder import CURVES, pagesPerExtent, sampleExtents  # noqa: E402
+
+DATASET = 'Bench'
+
+
+def extentWhere(extent):
+    return 'maxx >= {0!r} AND minx <= {2!r} AND maxy >= {1!r} AND miny <= {3!r}'.format(*extent)
+
+
+def readPoints(backend, path):
+    return [tuple(point) if point else None for batch in backend.iterBatches(path, ['SHAPE@XY'], 5000)
+            for (point,) in batch]
+
+
+def measureReads(backend, workspacePath, names, extentCount):
+    """Returns (scan seconds, extent query seconds, mean pages per extent) over the classes, on a fresh connection."""
+    backend._closeStore(workspacePath)
+    stats = backend.workspaceStats(workspacePath)
+    scanSeconds = querySeconds = pages = 0.0
+    for name in names:
+        path = workspacePath + '/' + DATASET + '/' + name
+        started = time.time()
+        points = readPoints(backend, path)
+        scanSeconds += time.time() - started
+        extents = sampleExtents(points, count=extentCount, rng=random.Random(0))
+        started = time.time()
+        for extent in extents:
+            for _ in backend.iterBatches(path, ['OID@', 'SHAPE@'], 5000, where=extentWhere(extent)):
+                pass
+        querySeconds += time.time() - started
+        pages += pagesPerExtent(points, extents, stats['tables'][DATASET + '/' + name]['rowsPerPage'])
+    return scanSeconds, querySeconds, pages / len(names)
+
+
+def churn(backend, path, share, rng, shapeType):
+    """Deletes a share of the rows & appends as many new ones (like change-capture updates)."""
+    count = backend.describe(path)['count']
+    deleted = backend.deleteRows(path, 'abs(random() % 1000) < {0:d}'.format(int(share * 1000)))
+    scratch = layers.SDE_CONNECTION + '\\sde.SDE.' + DATASET + '\\sde.SDE.scratch'
+    seedClass(backend, scratch, deleted, shapeType, rng)
+    inserter = backend.openInsert(path, ['NAME', 'VALUE', 'YEAR', 'SHAPE@'])
+    for batch in backend.iterBatches(scratch, ['NAME', 'VALUE', 'YEAR', 'SHAPE@'], 5000):
+        inserter.insertRows(batch)
+    inserter.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure an output gdb before & after GdbOptimizer.')
+    parser.add_argument('--classes', type=int, default=6)
+    parser.add_argument('--rows', type=int, default=100000, help='rows per class')
+    parser.add_argument('--churn', type=float, default=0.2, help='share of rows deleted & re-added')
+    parser.add_argument('--curve', choices=CURVES, default=layers.SPATIAL_ORDER_CURVE)
+    parser.add_argument('--extents', type=int, default=50, help='1%% extent queries per class')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='optimize_')
+    logger = logging.getLogger('bench_optimize')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        rng = random.Random(1)
+        workspacePath = layers.PORTABLE_GDB
+        backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+        shapeTypes = ['Point', 'Polyline', 'Polygon']
+        names = ['Class{0:02d}'.format(number) for number in range(args.classes)]
+        for index, name in enumerate(names):
+            path = workspacePath + '/' + DATASET + '/' + name
+            seedClass(backend, path, args.rows, shapeTypes[index % 3], rng)
+            churn(backend, path, args.churn, rng, shapeTypes[index % 3])
+
+        before = measureReads(backend, workspacePath, names, args.extents)
+        summary = GdbOptimizer(backend, curve=args.curve, minRows=1, logger=logger).optimize(workspacePath)
+        after = measureReads(backend, workspacePath, names, args.extents)
+
+        fragmentation = [(table['before']['fragmentation'], table['after']['fragmentation'])
+                         for table in summary['tables'].values() if 'before' in table and 'after' in table]
+        rows = [('file size (MB)', summary['bytesBefore'] / 1e6, summary['bytesAfter'] / 1e6),
+                ('free space (MB)', summary['freeBytesBefore'] / 1e6, summary['freeBytesAfter'] / 1e6),
+                ('mean fragmentation', sum(pair[0] for pair in fragmentation) / len(fragmentation),
+                 sum(pair[1] for pair in fragmentation) / len(fragmentation)),
+                ('full scans (s)', before[0], after[0]),
+                ('1% extent queries (s)', before[1], after[1]),
+                ('pages per 1% extent', before[2], after[2])]
+        print('{0} classes of {1} rows, {2:0.0%} churned; {3} order; optimized in {4:0.2f} s'.format(
+            args.classes, args.rows, args.churn, args.curve, summary['seconds']))
+        print('{0:<24} {1:>12} {2:>12}'.format('', 'before', 'after'))
+        for label, valueBefore, valueAfter in rows:
+            print('{0:<24} {1:>12.3f} {2:>12.3f}'.format(label, valueBefore, valueAfter))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
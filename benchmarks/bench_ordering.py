@@ -0,0 +1,90 @@
+"""
+Benchmark: makespan of the weekly copies started in different orders, simulated with
+planner.scheduleTasks on the real task list (layers.exportTasks).
+
+Each task gets a true duration (a per-task overhead plus log-normal rows at a fixed
+rate, the streamed classes --big times larger), and two estimates the way a run gets
+them: its duration in past runs (the true one with --noise log-normal run-to-run
+variation) and its source row count / a rate off by up to 2x per source. The tasks are
+then started in each order on --workers slots and take their true durations:
+
+    python benchmarks/bench_ordering.py [--workers 2,4,8] [--noise 0.3] [--big 20] [--seed 1]
+
+    dict order       portableGISdict order, as the copies ran before
+    random           mean of --shuffles random orders
+    shortest first   true durations, shortest first
+    rows, LPT        longest first by row count estimate (a run without history)
+    history, LPT     longest first by past durations (DurationEstimator with history)
+    true, LPT        longest first by true durations (the best an estimate can do)
+
+The lower bound is the larger of the total / workers and the longest task.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import random
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.planner import DEFAULT_TASK_OVERHEAD, scheduleTasks  # noqa: E402
+
+
+def makespan(tasks, order, workers):
+    """Returns the makespan of the tasks started in the order of the 'order' key, lasting their true seconds."""
+    ordered = [dict(task, seconds=task['true']) for task in sorted(tasks, key=lambda task: task[order])]
+    return scheduleTasks(ordered, workers, largestFirst=False)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate the weekly copies in different start orders.')
+    parser.add_argument('--workers', default='2,4,8', help='comma-separated worker counts')
+    parser.add_argument('--rows', type=int, default=20000, help='median rows per class')
+    parser.add_argument('--rate', type=float, default=2000.0, help='rows per second of a copy')
+    parser.add_argument('--big', type=float, default=20.0, help='how many times larger the streamed classes are')
+    parser.add_argument('--noise', type=float, default=0.3, help='sigma of the run-to-run variation of durations')
+    parser.add_argument('--shuffles', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    tasks = [task for task in layers.exportTasks(layers.FULL_TIER) if task['stage'] == 'copy']
+    sourceError = {}
+    for index, task in enumerate(tasks):
+        rows = args.rows * rng.lognormvariate(0, 1.5) * (args.big if task['name'] in layers.STREAMING_COPY_CLASSES else 1)
+        task['true'] = DEFAULT_TASK_OVERHEAD + rows / args.rate
+        rate = args.rate * sourceError.setdefault(task['source'], rng.uniform(0.5, 2.0))
+        task['dict order'] = index
+        task['shortest first'] = task['true']
+        task['rows, LPT'] = -(DEFAULT_TASK_OVERHEAD + rows / rate)
+        task['history, LPT'] = -task['true'] * rng.lognormvariate(0, args.noise)
+        task['true, LPT'] = -task['true']
+
+    total = sum(task['true'] for task in tasks)
+    print('{0} copy tasks, {1:0.0f} s one after another; longest {2:0.0f} s'.format(
+        len(tasks), total, max(task['true'] for task in tasks)))
+    orders = ['dict order', 'random', 'shortest first', 'rows, LPT', 'history, LPT', 'true, LPT']
+    print('{0:>8} {1:>12} '.format('workers', 'lower bound') + ' '.join('{0:>15}'.format(order) for order in orders))
+    for workers in [int(value) for value in args.workers.split(',')]:
+        results = []
+        for order in orders:
+            if order == 'random':
+                spans = []
+                for _ in range(args.shuffles):
+                    for task in tasks:
+                        task['random'] = rng.random()
+                    spans.append(makespan(tasks, 'random', workers))
+                results.append(sum(spans) / len(spans))
+            else:
+                results.append(makespan(tasks, order, workers))
+        bound = max(total / workers, max(task['true'] for task in tasks))
+        print('{0:>8} {1:>12.0f} '.format(workers, bound) + ' '.join('{0:>15.0f}'.format(value) for value in results))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Benchmark: the export steps run end to end on the local backend (no arcpy).
+
+Seeds a backends.LocalBackend with stand-ins of every source the export reads (the
+City SDE with the portableGISdict classes, ArcReaderUpdate_files.gdb, the Assessor's
+table & the County SDE), then runs steps.ExportSteps in the order of
+CreateRemoteArcReaderGDB_v2.py (create gdb, datasets, copies, Sections_SLC, Assessor,
+Rice Lake clips, validation) and prints the time of each step:
+
+    python benchmarks/bench_pipeline_local.py [--rows 2000] [--tier weekly] [--keep DIR]
+
+Classes in layers.STREAMING_COPY_CLASSES get ten times --rows.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.localstore import lineWkb, pointWkb, polygonWkb  # noqa: E402
+from arcreaderexport.retry import TaskRunner  # noqa: E402
+from arcreaderexport.runreport import RunReport  # noqa: E402
+from arcreaderexport.steps import RICE_LAKE_BOUNDARY, RICE_LAKE_DATASET, SPATIAL_REFERENCE_SOURCE, ExportSteps, sdeClassPath  # noqa: E402
+from arcreaderexport.validate import validateOutput  # noqa: E402
+
+FIELDS = [('NAME', 'String'), ('VALUE', 'Double'), ('YEAR', 'Integer')]
+SPATIAL_REFERENCE = 'NAD_1983_HARN_Adj_MN_St_Louis_CS96_Feet'
+
+
+def seedClass(backend, path, rows, shapeType, rng):
+    workspacePath, parts = splitWorkspace(path)
+    store = backend.store(workspacePath)
+    name = '/'.join(parts)
+    store.createClass(name, FIELDS, shapeType, SPATIAL_REFERENCE)
+    inserter = store.openInsert(name, ['NAME', 'VALUE', 'YEAR'] + (['SHAPE@'] if shapeType else []))
+    batch = []
+    for number in range(rows):
+        x, y = rng.uniform(0, 50000), rng.uniform(0, 50000)
+        row = ('{0} {1}'.format(parts[-1], number), rng.uniform(0, 1000), rng.randint(1900, 2024))
+        if shapeType == 'Point':
+            row += (pointWkb(x, y),)
+        elif shapeType == 'Polyline':
+            row += (lineWkb([(x + 30 * k, y + rng.uniform(-20, 20)) for k in range(6)]),)
+        elif shapeType == 'Polygon':
+            ring = [(x + 40 * math.cos(6.283 * k / 8), y + 40 * math.sin(6.283 * k / 8)) for k in range(8)]
+            row += (polygonWkb([ring + ring[:1]]),)
+        batch.append(row)
+        if len(batch) == 5000:
+            inserter.insertRows(batch)
+            batch = []
+    inserter.insertRows(batch)
+
+
+def seedSources(backend, rows, rng):
+    shapeTypes = ['Point', 'Polyline', 'Polygon']
+    for dataset, classes in sorted(layers.portableGISdict.items()):
+        for index, fc in enumerate(classes):
+            count = rows * 10 if fc in layers.STREAMING_COPY_CLASSES else rows
+            seedClass(backend, sdeClassPath(layers.SDE_CONNECTION, dataset, fc), count, shapeTypes[index % 3], rng)
+    seedClass(backend, SPATIAL_REFERENCE_SOURCE, 1, 'Point', rng)
+    seedClass(backend, layers.DEFAULT_GDB + '/Sections_SLC', rows, 'Polygon', rng)
+    seedClass(backend, layers.ASSESSOR_TABLE, rows * 5, None, rng)
+    boundary = splitWorkspace(RICE_LAKE_BOUNDARY)
+    store = backend.store(boundary[0])
+    store.createClass(boundary[1][-1], [], 'Polygon', SPATIAL_REFERENCE)
+    store.openInsert(boundary[1][-1], ['SHAPE@']).insertRows(
+        [(polygonWkb([[(0, 0), (25000, 0), (25000, 25000), (0, 25000), (0, 0)]]),)])
+    for name, shapeType in (('sde.STLOUIS.CDSTRL_ROW', 'Polygon'), ('sde.STLOUIS.TRANS_RoadCenterlinesPW', 'Polyline'),
+                            ('sde.STLOUIS.CDSTRL_ParcelInfo', 'Polygon')):
+        seedClass(backend, layers.COUNTY_SDE + name, rows * 2, shapeType, rng)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the export steps on the local backend and time each one.')
+    parser.add_argument('--rows', type=int, default=2000, help='rows per source class')
+    parser.add_argument('--tier', choices=layers.TIERS, default=layers.FULL_TIER)
+    parser.add_argument('--keep', help='folder to keep the workspace files in (a temporary folder by default)')
+    args = parser.parse_args(argv)
+
+    workDir = args.keep or tempfile.mkdtemp(prefix='pipeline_')
+    logger = logging.getLogger('bench_pipeline_local')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        started = time.time()
+        seedSources(backend, args.rows, random.Random(1))
+        print('Seeded sources in {0:0.2f} seconds'.format(time.time() - started))
+
+        report = RunReport(runName=args.tier)
+        steps = ExportSteps(backend, TaskRunner(report=report, messagesFn=backend.messages), logger)
+        tierDict = layers.layersForTier(args.tier)
+        outputDataset = layers.PORTABLE_GDB + '/ParcelFeatures'
+        timings = []
+
+        def timed(label, func, *funcArgs, **funcKwargs):
+            stepStarted = time.time()
+            result = func(*funcArgs, **funcKwargs)
+            timings.append((label, time.time() - stepStarted))
+            return result
+
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')     # the steps print progress like the script
+        try:
+            timed('1 createEmpytGDB', steps.createEmpytGDB, layers.PUBLISH_DIR)
+            timed('2 copyFeatureDatasets', steps.copyFeatureDatasets, list(layers.portableGISdict.keys()), layers.PORTABLE_GDB)
+            timed('3a copyFCtoFC', steps.copyFCtoFC, layers.SDE_CONNECTION, tierDict, layers.PORTABLE_GDB)
+            if layers.includesLayer(args.tier, 'Sections_SLC'):
+                timed('3b copySingleFCtoFC', steps.copySingleFCtoFC, layers.DEFAULT_GDB, outputDataset, 'Sections_SLC')
+            if layers.includesLayer(args.tier, 'Assessor'):
+                timed('4 updateAssessorTable', steps.updateAssessorTable, layers.PORTABLE_GDB)
+            if layers.includesLayer(args.tier, RICE_LAKE_DATASET):
+                timed('5 clipAndCopyRiceLakeFC', steps.clipAndCopyRiceLakeFC)
+            tasks = [{'name': fc, 'source': sdeClassPath(layers.SDE_CONNECTION, key, fc),
+                      'output': os.path.join(layers.PORTABLE_GDB, key, fc)} for key, val in tierDict.items() for fc in val]
+            validation = timed('7 validateOutput', validateOutput, tasks, reader=backend, workers=4)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        summary = report.summary()
+        print('{0:<26} {1:>10}'.format('step', 'seconds'))
+        for label, seconds in timings:
+            print('{0:<26} {1:>10.2f}'.format(label, seconds))
+        print('Tasks: {0}; validation passed: {1} ({2} classes)'.format(
+            ', '.join('{0} {1}'.format(count, status) for status, count in sorted(summary['statusCounts'].items())),
+            validation.passed, len(validation.results)))
+        for result in validation.failures:
+            print('  {0}: {1}'.format(result['name'], '; '.join(result['problems'])))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
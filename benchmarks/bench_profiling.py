@@ -0,0 +1,96 @@
+"""
+Benchmark: cost of profiling an export (arcreaderexport.profiling) on the local backend,
+and what the profile shows.
+
+Seeds the stand-in sources of bench_pipeline_local, then runs the same export
+(runExport on LocalBackend) without a profile and once in each profile mode, and prints
+the run time, the overhead against the unprofiled run, the stacks written & the time
+per stage; then the functions with the most time of their own in each mode:
+
+    python benchmarks/bench_profiling.py [--rows 2000] [--tier weekly] [--workers 4] [--keep DIR]
+
+With --keep, the Profile_<run>_<stamp>.folded files are kept in DIR for flamegraph.pl
+or speedscope.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline_local import seedSources  # noqa: E402
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.export import runExport  # noqa: E402
+from arcreaderexport.profiling import MODES  # noqa: E402
+
+
+def runOnce(backend, workDir, tier, workers, profile, logger):
+    """Returns (seconds, run report) of one export."""
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')     # runExport prints progress like the script
+    try:
+        result = runExport(tier, backend=backend, logger=logger, publish=False, useSourceCache=False,
+                           reportDir=workDir, copyWorkers=workers, profile=profile)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    with open(result['runReport']) as reportFile:
+        return result['elapsed'], json.load(reportFile)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the overhead of each profile mode on a local export.')
+    parser.add_argument('--rows', type=int, default=2000, help='rows per source class')
+    parser.add_argument('--tier', choices=layers.TIERS, default=layers.FULL_TIER)
+    parser.add_argument('--workers', type=int, default=layers.COPY_WORKERS)
+    parser.add_argument('--top', type=int, default=8, help='functions listed per mode')
+    parser.add_argument('--keep', help='folder to keep the workspaces & profiles in (a temporary folder by default)')
+    args = parser.parse_args(argv)
+
+    workDir = args.keep or tempfile.mkdtemp(prefix='profiling_')
+    logger = logging.getLogger('bench_profiling')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        seedSources(backend, args.rows, random.Random(1))
+        runOnce(backend, workDir, args.tier, args.workers, None, logger)     # warm-up: page cache & content hashes
+
+        print('{0} export, {1} rows per class, {2} copy workers'.format(args.tier, args.rows, args.workers))
+        print('{0:>10} {1:>10} {2:>10} {3:>10} {4:>12}  {5}'.format(
+            'profile', 'seconds', 'overhead', 'stacks', 'task (s)', 'stages (s)'))
+        baseline, profiles = None, []
+        for profile in (None,) + MODES:
+            seconds, report = runOnce(backend, workDir, args.tier, args.workers, profile, logger)
+            baseline = baseline or seconds
+            section = report.get('profile')
+            if section is None:
+                print('{0:>10} {1:>10.2f} {2:>10} {3:>10} {4:>12}'.format('none', seconds, '-', '-', '-'))
+                continue
+            with open(section['folded']) as foldedFile:
+                stacks = sum(1 for _ in foldedFile)
+            print('{0:>10} {1:>10.2f} {2:>10.0%} {3:>10} {4:>12.2f}  {5}'.format(
+                profile, seconds, seconds / baseline - 1, stacks, section['seconds'],
+                ', '.join('{0} {1:0.1f}'.format(stage, value) for stage, value in sorted(section['stages'].items()))))
+            profiles.append((profile, section))
+        for profile, section in profiles:
+            print('\nSelf time, {0}:'.format(profile))
+            for entry in section['selfTime'][:args.top]:
+                print('  {0:>6.1%} {1:>9.2f} s  {2}'.format(entry['share'], entry['seconds'], entry['function']))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
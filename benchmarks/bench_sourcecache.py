@@ -0,0 +1,94 @@
+"""
+Benchmark: reading a source class N times from the source vs from the Arrow source cache.
+
+Builds a Parcels-like polygon class in a localstore.LocalStore (the SDE stand-in)
+and has N consumers (outputs derived from the same source) read every row of it:
+
+    source     = each consumer reads the class from the store again
+    cache      = the class is extracted once into sourcecache.SourceCache, then each
+                 consumer reads the memory-mapped Arrow file through CachedReader
+    arrow      = each consumer takes the mapped Arrow table & sums one column without
+                 converting rows to Python (the zero-copy path)
+
+    python benchmarks/bench_sourcecache.py [--rows 200000] [--consumers 4]
+
+Against SDE the source reads also pay the network round trips, so the gap is wider
+than on the local stand-in.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from arcreaderexport.localstore import LocalStore  # noqa: E402
+from arcreaderexport.sourcecache import HAVE_ARROW, CachedReader, SourceCache  # noqa: E402
+from arcreaderexport.streamcopy import copyFields  # noqa: E402
+from bench_streamcopy import makeSource  # noqa: E402
+
+
+def readAll(reader, path, batchSize=5000):
+    fields = copyFields(reader.describe(path), getattr(reader, 'geometryToken', 'SHAPE@'))
+    return sum(len(batch) for batch in reader.iterBatches(path, fields, batchSize))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark source re-reads vs the Arrow source cache.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--consumers', type=int, default=4)
+    args = parser.parse_args(argv)
+    if not HAVE_ARROW:
+        print('pyarrow is not installed')
+        return 1
+
+    workDir = tempfile.mkdtemp(prefix='sourcecache_')
+    try:
+        store = os.path.join(workDir, 'source.sqlite')
+        makeSource(store, args.rows)
+        source = LocalStore(store)
+
+        started = time.time()
+        for _ in range(args.consumers):
+            readAll(source, 'Parcels')
+        sourceSeconds = time.time() - started
+
+        cache = SourceCache(os.path.join(workDir, 'cache'), source)
+        started = time.time()
+        entry = cache.ensure('Parcels')
+        extractSeconds = time.time() - started
+        reader = CachedReader(cache, source)
+        started = time.time()
+        for _ in range(args.consumers):
+            readAll(reader, 'Parcels')
+        cacheSeconds = time.time() - started
+
+        import pyarrow.compute as pc
+        started = time.time()
+        for _ in range(args.consumers):
+            pc.sum(reader.table('Parcels').column('ACRES'))
+        arrowSeconds = time.time() - started
+
+        cacheMb = os.path.getsize(os.path.join(cache.cacheDir, entry['file'])) / 1048576.0
+        print('{0} rows, {1} consumers, cache file {2:0.1f} MB'.format(args.rows, args.consumers, cacheMb))
+        print('{0:<28} {1:>10}'.format('variant', 'seconds'))
+        print('{0:<28} {1:>10.2f}'.format('source x{0}'.format(args.consumers), sourceSeconds))
+        print('{0:<28} {1:>10.2f}'.format('cache extract (once)', extractSeconds))
+        print('{0:<28} {1:>10.2f}'.format('cache rows x{0}'.format(args.consumers), cacheSeconds))
+        print('{0:<28} {1:>10.2f}'.format('cache + rows total', extractSeconds + cacheSeconds))
+        print('{0:<28} {1:>10.3f}'.format('arrow column x{0}'.format(args.consumers), arrowSeconds))
+        source.close()
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
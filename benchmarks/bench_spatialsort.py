@@ -0,0 +1,153 @@
+"""
+Benchmark: extent-query I/O of a class streamed in SDE insertion order against the same
+class streamed in Hilbert / Z-order (streamcopy.streamCopy with spatialOrder), on the
+local backend.
+
+Seeds one stand-in SDE class of --rows features in random order, streams it into the
+output gdb once per order, then runs --extents map draws of 1% of its extent against
+each copy. Like a draw on a file gdb, the rows of each extent are looked up first (here
+from the stored centroids held in memory, standing in for the gdb's spatial index) and
+then read by OBJECTID, so the pages read depend on where those rows are stored. Every
+draw opens its own connection with a --cacheKb page cache, so the pages it needs are
+read from the file; the bytes read are taken from /proc/self/io (Linux; elsewhere only
+times & the page estimate are printed):
+
+    python benchmarks/bench_spatialsort.py [--rows 200000] [--shape Polygon] [--extents 50]
+
+Also times the curve keys of the class with & without NumPy (spatialorder.HAVE_NUMPY).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_optimize import readPoints  # noqa: E402
+from bench_pipeline_local import seedClass  # noqa: E402
+from arcreaderexport import layers, spatialorder  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.localstore import LocalStore  # noqa: E402
+from arcreaderexport.oidquery import ID_CHUNK  # noqa: E402
+from arcreaderexport.spatialorder import CURVES, pagesPerExtent, sampleExtents  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+from arcreaderexport.streamcopy import streamCopy  # noqa: E402
+
+DATASET = 'Bench'
+INSERTION = 'insertion'
+
+
+def bytesRead():
+    """Returns the bytes this process has read through read() calls so far, or None off Linux."""
+    try:
+        with open('/proc/self/io') as ioFile:
+            for line in ioFile:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        return None
+
+
+def timeKeys(points, curve):
+    """Returns the seconds the curve keys of points take with NumPy (None if not installed) & without."""
+    haveNumpy = spatialorder.HAVE_NUMPY
+    seconds = []
+    for useNumpy in (True, False):
+        if useNumpy and not haveNumpy:
+            seconds.append(None)
+            continue
+        spatialorder.HAVE_NUMPY = useNumpy
+        started = time.time()
+        spatialorder.spatialOrder(points, curve=curve)
+        seconds.append(time.time() - started)
+    spatialorder.HAVE_NUMPY = haveNumpy
+    return seconds
+
+
+def lookup(stored, extent):
+    """Returns the OIDs of the stored (oid, (x, y)) rows with their centroid inside extent."""
+    xmin, ymin, xmax, ymax = extent
+    return [oid for oid, point in stored if point and xmin <= point[0] <= xmax and ymin <= point[1] <= ymax]
+
+
+def measureQueries(dbFile, name, stored, extents, cacheKb):
+    """Returns (seconds, bytes read or None, rows) of reading the rows of each extent, each on a fresh connection."""
+    seconds, readBytes, rows = 0.0, 0, 0
+    for extent in extents:
+        oids = lookup(stored, extent)
+        store = LocalStore(dbFile, cacheKb=cacheKb)
+        before = bytesRead()
+        started = time.time()
+        for start in range(0, len(oids), ID_CHUNK):
+            where = 'OBJECTID IN ({0})'.format(', '.join(str(oid) for oid in oids[start:start + ID_CHUNK]))
+            for batch in store.iterBatches(name, ['OID@', 'SHAPE@'], 5000, where=where):
+                rows += len(batch)
+        seconds += time.time() - started
+        after = bytesRead()
+        readBytes = None if before is None or readBytes is None else readBytes + after - before
+        store.close()
+    return seconds, readBytes, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure extent-query I/O of spatially sorted streamed copies.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--shape', choices=('Point', 'Polyline', 'Polygon'), default='Polygon')
+    parser.add_argument('--extents', type=int, default=50, help='1%% extent queries per copy')
+    parser.add_argument('--cacheKb', type=int, default=64, help='page cache of each query connection')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='spatialsort_')
+    logger = logging.getLogger('bench_spatialsort')
+    logger.addHandler(logging.NullHandler())
+    try:
+        backend = LocalBackend(workDir)
+        sourcePath = sdeClassPath(layers.SDE_CONNECTION, DATASET, 'Source')
+        seedClass(backend, sourcePath, args.rows, args.shape, random.Random(1))
+        points = readPoints(backend, sourcePath)
+        extents = sampleExtents(points, count=args.extents, rng=random.Random(0))
+        backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+        backend.createDataset(layers.PORTABLE_GDB, DATASET, None)
+        dbFile = backend.workspaceFile(layers.PORTABLE_GDB)
+
+        print('{0} {1} rows, {2} queries of 1% of the extent, {3} KB cache per query'.format(
+            args.rows, args.shape, args.extents, args.cacheKb))
+        print('{0:>10} {1:>10} {2:>12} {3:>14} {4:>12} {5:>10}'.format(
+            'order', 'copy (s)', 'queries (s)', 'KB per query', 'pages est.', 'rows'))
+        for order in (INSERTION,) + CURVES:
+            name = DATASET + '/' + order
+            stats = streamCopy(backend, backend, sourcePath, layers.PORTABLE_GDB + '/' + name,
+                               spatialOrder=None if order == INSERTION else order)
+            backend._closeStore(layers.PORTABLE_GDB)
+            store = LocalStore(dbFile)
+            rowsPerPage = store.tableStats()['tables'][name]['rowsPerPage']
+            stored = [(oid, tuple(point) if point else None)
+                      for batch in store.iterBatches(name, ['OID@', 'SHAPE@XY'], 5000) for oid, point in batch]
+            store.close()
+            seconds, readBytes, rows = measureQueries(dbFile, name, stored, extents, args.cacheKb)
+            print('{0:>10} {1:>10.2f} {2:>12.3f} {3:>14} {4:>12.1f} {5:>10}'.format(
+                order, stats['seconds'], seconds,
+                '-' if readBytes is None else '{0:0.1f}'.format(readBytes / 1024.0 / len(extents)),
+                pagesPerExtent([point for _, point in stored], extents, rowsPerPage), rows))
+
+        for curve in CURVES:
+            withNumpy, withoutNumpy = timeKeys(points, curve)
+            print('{0} order of {1} centroids: NumPy {2}, Python {3:0.3f} s'.format(
+                curve, len(points), 'not installed' if withNumpy is None else '{0:0.3f} s'.format(withNumpy),
+                withoutNumpy))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
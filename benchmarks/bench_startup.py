@@ -0,0 +1,74 @@
+"""
+Benchmark: start-up time of the command line (arcreaderexport.cli).
+
+Runs each command in a fresh interpreter several times and prints the median
+wall time, then checks which heavy modules the quick commands imported:
+
+    python benchmarks/bench_startup.py [--repeat 5]
+
+'import arcreaderexport.cli', 'status' and 'plan --help' should not import arcpy or
+pyarrow; only 'export' & 'validate' on the arcpy backend need arcpy.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('arcpy', 'pyarrow', 'numpy', 'sqlite3')
+
+# Runs a command of the CLI, then prints the heavy modules it left in sys.modules as the last line
+PROBE = """
+import json, sys
+sys.argv = ['arcreaderexport'] + {argv!r}
+try:
+    {statement}
+except SystemExit:
+    pass
+sys.stdout.write('\\n' + json.dumps(sorted(name for name in {heavy!r} if name in sys.modules)) + '\\n')
+"""
+
+
+def runProbe(statement, argv=()):
+    source = PROBE.format(argv=list(argv), statement=statement, heavy=HEAVY_MODULES)
+    started = time.time()
+    output = subprocess.check_output([sys.executable, '-c', source], cwd=REPO_DIR)
+    elapsed = time.time() - started
+    return elapsed, json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the start-up of the arcreaderexport command line.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    stateDir = tempfile.mkdtemp(prefix='startup_')
+    statusArgs = ['status', '--share', stateDir, '--local', stateDir, '--state', os.path.join(stateDir, 'state.json')]
+    probes = [('python -c pass', 'pass', []),
+              ('import arcreaderexport.cli', 'import arcreaderexport.cli', []),
+              ('status', 'from arcreaderexport.cli import main; main(sys.argv[1:])', statusArgs),
+              ('plan --help', 'from arcreaderexport.cli import main; main(sys.argv[1:])', ['plan', '--help']),
+              ('export --help', 'from arcreaderexport.cli import main; main(sys.argv[1:])', ['export', '--help'])]
+
+    print('{0:<28} {1:>12}  {2}'.format('command', 'median (ms)', 'heavy modules imported'))
+    for label, statement, probeArgs in probes:
+        timings, imported = [], []
+        for _ in range(args.repeat):
+            elapsed, imported = runProbe(statement, probeArgs)
+            timings.append(elapsed)
+        timings.sort()
+        print('{0:<28} {1:>12.1f}  {2}'.format(label, timings[len(timings) // 2] * 1000, ', '.join(imported) or '-'))
+    shutil.rmtree(stateDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Benchmark: streaming batched copy vs whole-class copy on the local stand-in backend.
+
+Builds a Parcels-like polygon class in a localstore.LocalStore (SQLite) and copies
+it to a second store, each variant in its own process so its peak RSS can be read:
+
+    whole      = every row read into memory, then inserted at once (memory grows with
+                 the class, like handing the whole class to one tool call)
+    stream N   = streamcopy.streamCopy with a batch size of N
+
+    python benchmarks/bench_streamcopy.py [--rows 200000] [--batch-sizes 500,5000,50000]
+
+Peak RSS comes from resource.getrusage on Linux / macOS and from psutil on Windows
+(reported as n/a when neither is available).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.localstore import LocalStore, polygonWkb  # noqa: E402
+from arcreaderexport.streamcopy import copyFields, streamCopy  # noqa: E402
+
+FIELDS = [('PIN', 'String'), ('OWNER', 'String'), ('ADDRESS', 'String'), ('ACRES', 'Double'), ('YEAR_BUILT', 'Integer')]
+
+
+def makeSource(dbPath, rows, seed=1):
+    """Writes a Parcels-like class of 'rows' polygons (6-24 vertices each)."""
+    rng = random.Random(seed)
+    store = LocalStore(dbPath)
+    store.createClass('Parcels', FIELDS, 'Polygon')
+    inserter = store.openInsert('Parcels', ['PIN', 'OWNER', 'ADDRESS', 'ACRES', 'YEAR_BUILT', 'SHAPE@'])
+    batch = []
+    for number in range(rows):
+        x, y = rng.uniform(0, 50000), rng.uniform(0, 50000)
+        vertices = rng.randint(6, 24)
+        ring = [(x + 40 * math.cos(6.283 * k / vertices), y + 40 * math.sin(6.283 * k / vertices))
+                for k in range(vertices)]
+        ring.append(ring[0])
+        batch.append(('{0:010d}'.format(number), 'OWNER NAME {0}'.format(rng.randint(1, 99999)),
+                      '{0} W SUPERIOR ST'.format(rng.randint(1, 9999)), rng.uniform(0.05, 40), rng.randint(1880, 2024),
+                      polygonWkb([ring])))
+        if len(batch) == 10000:
+            inserter.insertRows(batch)
+            batch = []
+    if batch:
+        inserter.insertRows(batch)
+    store.close()
+
+
+def peakRssMb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+        except (ImportError, AttributeError):
+            return None
+
+
+def runChild(mode, batchSize, sourcePath, outputPath):
+    baseline = peakRssMb()
+    source = LocalStore(sourcePath)
+    output = LocalStore(outputPath)
+    started = time.time()
+    if mode == 'whole':
+        description = source.describe('Parcels')
+        fields = copyFields(description)
+        rows = [row for batch in source.iterBatches('Parcels', fields, 1 << 30) for row in batch]
+        output.createLike('Parcels', 'Parcels', description)
+        output.openInsert('Parcels', fields).insertRows(rows)
+        count = len(rows)
+    else:
+        count = streamCopy(source, output, 'Parcels', 'Parcels', batchSize)['rows']
+    seconds = time.time() - started
+    print(json.dumps({'rows': count, 'seconds': seconds, 'peakRssMb': peakRssMb(), 'baselineRssMb': baseline}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark streaming vs whole-class copy on the local backend.')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-sizes', default='500,5000,50000')
+    parser.add_argument('--child', nargs=4, metavar=('MODE', 'BATCH', 'SOURCE', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        runChild(args.child[0], int(args.child[1]), args.child[2], args.child[3])
+        return 0
+
+    workDir = tempfile.mkdtemp(prefix='streamcopy_')
+    try:
+        sourcePath = os.path.join(workDir, 'source.sqlite')
+        makeSource(sourcePath, args.rows)
+        print('Source: {0} rows, {1:0.1f} MB'.format(args.rows, os.path.getsize(sourcePath) / 1048576.0))
+        variants = [('whole', 0)] + [('stream', int(size)) for size in args.batch_sizes.split(',')]
+        print('{0:<16} {1:>10} {2:>12} {3:>14} {4:>16}'.format('variant', 'seconds', 'rows/sec', 'peak RSS MB',
+                                                              'above start MB'))
+        for mode, batchSize in variants:
+            outputPath = os.path.join(workDir, 'output_{0}_{1}.sqlite'.format(mode, batchSize))
+            result = json.loads(subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, str(batchSize), sourcePath, outputPath]
+            ).decode('utf-8'))
+            label = 'whole class' if mode == 'whole' else 'stream {0}'.format(batchSize)
+            peak, baseline = result['peakRssMb'], result['baselineRssMb']
+            print('{0:<16} {1:>10.2f} {2:>12.0f} {3:>14} {4:>16}'.format(
+                label, result['seconds'], result['rows'] / result['seconds'],
+                'n/a' if peak is None else '{0:0.1f}'.format(peak),
+                'n/a' if peak is None else '{0:0.1f}'.format(peak - baseline)))
+            os.remove(outputPath)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Load test for arcreaderexport.distserver: many laptops pulling one bundle at once.
+
+Builds a synthetic published bundle (or uses --bundle), starts the distribution
+server in its own process on loopback, then simulates N laptops as asyncio clients.
+Each laptop probes /version, fetches /manifest and downloads every file in
+manifest-sized range requests over one keep-alive connection, checking each
+block's SHA-1. Prints aggregate throughput and per-laptop completion times:
+
+    python benchmarks/loadtest_distserver.py [--laptops 60] [--size-mb 32] [--client-kbps 0]
+
+Every laptop connects from 127.0.0.1 here, so --client-kbps caps all of them
+together (the server limits per client address). Requires Python 3.7+.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.manifest import publishManifest  # noqa: E402
+
+
+def makeBundle(bundleDir, sizeMb, files=40, blockSize=1024 * 1024):
+    """Writes a fake PortableDuluth.gdb (one large file & many small ones) and a pmf, then publishes it."""
+    gdb = os.path.join(bundleDir, 'PortableDuluth.gdb')
+    os.makedirs(gdb)
+    total = sizeMb * 1024 * 1024
+    large = total // 2
+    sizes = [large] + [(total - large) // files] * files
+    for index, size in enumerate(sizes):
+        with open(os.path.join(gdb, 'a{0:08x}.gdbtable'.format(index + 1)), 'wb') as dataFile:
+            dataFile.write(os.urandom(size))
+    with open(os.path.join(bundleDir, 'TapNCurb.pmf'), 'wb') as pmfFile:
+        pmfFile.write(os.urandom(256 * 1024))
+    return publishManifest(bundleDir, blockSize=blockSize)
+
+
+def freePort():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+async def request(reader, writer, path, headers=None):
+    lines = ['GET {0} HTTP/1.1'.format(path), 'Host: loadtest']
+    lines.extend('{0}: {1}'.format(name, value) for name, value in (headers or {}).items())
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def laptop(port, results):
+    start = time.time()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    received = 0
+    try:
+        status, _ = await request(reader, writer, '/version')
+        status, body = await request(reader, writer, '/manifest')
+        manifest = json.loads(body.decode('utf-8'))
+        blockSize = manifest['blockSize']
+        for entry in manifest['files']:
+            for index, expected in enumerate(entry['blocks']):
+                offset = index * blockSize
+                end = min(offset + blockSize, entry['size']) - 1
+                status, data = await request(reader, writer, '/files/' + entry['path'],
+                                             {'Range': 'bytes={0}-{1}'.format(offset, end)})
+                if status != 206 or hashlib.sha1(data).hexdigest() != expected:
+                    raise IOError('bad block {0} of {1}'.format(index, entry['path']))
+                received += len(data)
+        results.append({'seconds': time.time() - start, 'bytes': received, 'ok': True})
+    except (IOError, OSError, ValueError, asyncio.IncompleteReadError) as e:
+        results.append({'seconds': time.time() - start, 'bytes': received, 'ok': False, 'error': str(e)})
+    finally:
+        writer.close()
+
+
+async def runLaptops(port, laptops):
+    results = []
+    start = time.time()
+    await asyncio.gather(*[laptop(port, results) for _ in range(laptops)])
+    return results, time.time() - start
+
+
+def waitForServer(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('distribution server did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many laptops downloading from the distribution server.')
+    parser.add_argument('--laptops', type=int, default=60)
+    parser.add_argument('--size-mb', type=int, default=32, help='size of the synthetic bundle')
+    parser.add_argument('--bundle', help='published bundle folder to serve instead of a synthetic one')
+    parser.add_argument('--client-kbps', type=float, default=0)
+    parser.add_argument('--total-kbps', type=float, default=0)
+    args = parser.parse_args(argv)
+
+    workDir = None
+    bundleDir = args.bundle
+    if bundleDir is None:
+        workDir = bundleDir = tempfile.mkdtemp(prefix='distload_')
+        makeBundle(bundleDir, args.size_mb)
+    port = freePort()
+    server = subprocess.Popen([sys.executable, '-m', 'arcreaderexport.distserver', '--bundle', bundleDir,
+                               '--host', '127.0.0.1', '--port', str(port), '--max-clients', str(args.laptops + 10),
+                               '--client-kbps', str(args.client_kbps), '--total-kbps', str(args.total_kbps)],
+                              cwd=REPO_DIR, stdout=subprocess.DEVNULL)
+    try:
+        waitForServer(port)
+        results, elapsed = asyncio.run(runLaptops(port, args.laptops))
+    finally:
+        server.terminate()
+        server.wait()
+        if workDir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    seconds = sorted(result['seconds'] for result in results)
+    totalBytes = sum(result['bytes'] for result in results)
+    failed = [result for result in results if not result['ok']]
+    print('laptops:            {0} ({1} failed)'.format(len(results), len(failed)))
+    print('bytes delivered:    {0:0.1f} MB'.format(totalBytes / 1048576.0))
+    print('wall time:          {0:0.2f} s'.format(elapsed))
+    print('aggregate rate:     {0:0.1f} MB/s'.format(totalBytes / 1048576.0 / elapsed))
+    print('per laptop (s):     min {0:0.2f}  median {1:0.2f}  p95 {2:0.2f}  max {3:0.2f}'.format(
+        seconds[0], seconds[len(seconds) // 2], seconds[int(len(seconds) * 0.95) - 1], seconds[-1]))
+    for result in failed[:5]:
+        print('  failed: {0}'.format(result['error']))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
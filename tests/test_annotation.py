@@ -0,0 +1,109 @@
+"""
+Tests of the filtered annotation copies & merges of arcreaderexport.annotation through a LocalBackend.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import itertools
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.annotation import MERGED_FIELDS, AnnotationExport, annotationTasks, annotationWhere  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.localstore import polygonWkb  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+from arcreaderexport.validate import validateOutput  # noqa: E402
+
+ANNOTATION_FIELDS = [('FeatureID', 'Integer'), ('AnnotationClassID', 'Integer'), ('Element', 'Blob'),
+                     ('Status', 'SmallInteger'), ('TextString', 'String'), ('FontSize', 'Double')]
+DATASET = 'StormSewerNetwork'
+GDB = layers.PUBLISH_DIR + '/PortableDuluth.gdb'
+HIDDEN_CLASS_ID = 2
+MERGE_GROUPS = {'stsAnnoAll': {'dataset': DATASET, 'classes': ('stsAnno', 'stsAnnoCB'), 'referenceScale': 1200}}
+
+
+def annotationRows():
+    """One row of each status, text & class id; (row, drawn if HIDDEN_CLASS_ID is hidden)."""
+    rows = []
+    for number, (status, text, classId) in enumerate(itertools.product((0, 1), ('8" PVC', '', None), (0, 1, 2))):
+        box = polygonWkb([[(number, 0.0), (number + 1.0, 0.0), (number + 1.0, 1.0), (number, 0.0)]])
+        row = (number, classId, sqlite3.Binary(b'element'), status, text, 8.0, box)
+        rows.append((row, status == 0 and bool(text) and classId != HIDDEN_CLASS_ID))
+    return rows
+
+
+class AnnotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='annotationtest_')
+        self.backend = LocalBackend(self.workDir)
+        self.backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+        self.backend.createDataset(GDB, DATASET, None)
+        self.rows = annotationRows()
+        self.sources = {}
+        for fc in ('stsAnno', 'stsAnnoCB'):
+            self.sources[fc] = sdeClassPath(layers.SDE_CONNECTION, DATASET, fc)
+            workspacePath, parts = splitWorkspace(self.sources[fc])
+            store = self.backend.store(workspacePath)
+            store.createClass('/'.join(parts), ANNOTATION_FIELDS, 'Polygon')
+            store.openInsert('/'.join(parts), [name for name, _ in ANNOTATION_FIELDS] + ['SHAPE@']).insertRows(
+                [row for row, _ in self.rows])
+        self.plainSource = sdeClassPath(layers.SDE_CONNECTION, DATASET, 'stsGravityMain')
+        workspacePath, parts = splitWorkspace(self.plainSource)
+        self.backend.store(workspacePath).createClass('/'.join(parts), [('FACILITYID', 'String')], 'Polyline')
+        self.export = AnnotationExport(self.backend, {'stsAnno': (HIDDEN_CLASS_ID,)})
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def task(self, fc):
+        return {'name': fc, 'source': self.sources.get(fc, self.plainSource), 'output': GDB + '/' + DATASET + '/' + fc}
+
+    def test_where_leaves_out_hidden_classes(self):
+        self.assertEqual(annotationWhere(), "Status = 0 AND TextString IS NOT NULL AND TextString <> ''")
+        self.assertEqual(annotationWhere((2, 5)), "Status = 0 AND TextString IS NOT NULL AND TextString <> '' "
+                                                  "AND AnnotationClassID NOT IN (2, 5)")
+
+    def test_copy_drops_unplaced_empty_and_hidden_annotation(self):
+        drawn = sum(1 for _, isDrawn in self.rows if isDrawn)
+        result = self.export.copy(self.sources['stsAnno'], GDB + '/' + DATASET, 'stsAnno')
+        self.assertEqual(result, {'rows': drawn, 'sourceRows': len(self.rows), 'droppedRows': len(self.rows) - drawn})
+        output = GDB + '/' + DATASET + '/stsAnno'
+        copied = [row for batch in self.backend.iterBatches(output, ['FeatureID'], 100) for row in batch]
+        self.assertEqual(sorted(row[0] for row in copied), [row[0] for row, isDrawn in self.rows if isDrawn])
+        self.assertNotIn('Element', [name for name, _ in self.backend.describe(output)['fields']])
+        # the hidden class id is only dropped for the class it is hidden in
+        self.assertEqual(self.export.copy(self.sources['stsAnnoCB'], GDB + '/' + DATASET, 'stsAnnoCB')['rows'], 3)
+        self.assertIsNone(self.export.copy(self.plainSource, GDB + '/' + DATASET, 'stsGravityMain'))
+
+    def test_merge_group_is_validated_as_one_task(self):
+        tasks = annotationTasks([self.task('stsAnnoCB'), self.task('stsGravityMain'), self.task('stsAnno')],
+                                self.backend, {'stsAnno': (HIDDEN_CLASS_ID,)}, MERGE_GROUPS)
+        self.assertEqual(tasks, [self.task('stsGravityMain'),
+                                 {'name': 'stsAnnoAll', 'source': [self.sources['stsAnnoCB'], self.sources['stsAnno']],
+                                  'output': GDB + '/' + DATASET + '/stsAnnoAll',
+                                  'sourceWhere': [annotationWhere(), annotationWhere((HIDDEN_CLASS_ID,))],
+                                  'ignoreFields': MERGED_FIELDS}])
+
+    def test_merged_class_passes_validation(self):
+        result = self.export.merge([('stsAnnoCB', self.sources['stsAnnoCB']), ('stsAnno', self.sources['stsAnno'])],
+                                   GDB + '/' + DATASET + '/stsAnnoAll', 1200)
+        self.assertEqual((result['rows'], result['sourceRows']), (3 + 2, 2 * len(self.rows)))
+        tasks = annotationTasks([self.task('stsAnnoCB'), self.task('stsAnno')], self.backend,
+                                {'stsAnno': (HIDDEN_CLASS_ID,)}, MERGE_GROUPS)
+        report = validateOutput(tasks, reader=self.backend, workers=1)
+        self.assertTrue(report.passed, report.toDict())
+        # not filtered like the copy, the sources do not match the merged class
+        unfiltered = [dict(tasks[0], sourceWhere=None)]
+        self.assertFalse(validateOutput(unfiltered, reader=self.backend, workers=1).passed)
+
+
+if __name__ == '__main__':
+    unittest.main()
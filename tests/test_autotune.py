@@ -0,0 +1,142 @@
+"""
+Tests of the per-source concurrency limits of arcreaderexport.autotune, on a fake clock.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.autotune import AimdLimiter, AutotunedPool  # noqa: E402
+from arcreaderexport.retry import RetryPolicy, TaskRunner  # noqa: E402
+
+SOURCE = 'GISDB.sde'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Monitor(object):
+    """Stands in for ResourceMonitor: returns the same sample every time."""
+
+    def __init__(self, cpu=None, disk=None):
+        self.cpu, self.disk = cpu, disk
+
+    def sample(self):
+        return {'cpu': self.cpu, 'disk': self.disk}
+
+    def summary(self):
+        return {}
+
+
+class AimdLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def limiter(self, initial=1):
+        return AimdLimiter(SOURCE, initial=initial, maximum=8, clock=self.clock)
+
+    def round(self, limiter, rows, seconds):
+        """Runs one round of tasks (as many as the limit), together taking seconds to copy rows."""
+        tasks = limiter.limit
+        for _ in range(tasks):
+            limiter.taskStarted()
+        self.clock.now += seconds
+        for _ in range(tasks):
+            limiter.taskDone(rows // tasks)
+
+    def test_good_round_adds_one_task(self):
+        limiter = self.limiter()
+        self.round(limiter, 1000, 10.0)
+        self.assertEqual(limiter.limit, 2)
+        self.round(limiter, 4000, 10.0)
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual([change['reason'] for change in limiter.changes],
+                         ['start', '100 rows/sec with 1 in flight', '400 rows/sec with 2 in flight'])
+
+    def test_slower_round_with_more_in_flight_halves_the_limit(self):
+        limiter = self.limiter(initial=2)
+        self.round(limiter, 4000, 10.0)
+        self.assertEqual(limiter.limit, 3)
+        self.round(limiter, 3000, 10.0)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_transient_failure_halves_the_limit(self):
+        limiter = self.limiter(initial=4)
+        limiter.failure('transient failure of Parcels')
+        self.assertEqual((limiter.limit, limiter.failures), (2, 1))
+
+    def test_latency_spike_halves_the_limit(self):
+        limiter = self.limiter(initial=4)
+        limiter.latencySample(0.3)
+        limiter.latencySample(0.6)
+        self.assertEqual(limiter.limit, 4)
+        limiter.latencySample(0.9)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_saturated_machine_halves_and_holds_the_limit(self):
+        pool = AutotunedPool(None, workers=8, perSource=8, monitor=Monitor(cpu=0.95), clock=self.clock, initial=4)
+        limiter = pool.limiter(SOURCE)
+        pool.inFlight[SOURCE] = 4
+        pool._sample()
+        self.assertEqual((limiter.limit, limiter.saturated), (2, True))
+        self.assertEqual(limiter.changes[-1]['reason'], 'cpu 95% busy')
+        self.round(limiter, 1000, 10.0)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_decrease_holds_for_the_hold_window(self):
+        limiter = self.limiter(initial=8)
+        limiter.failure('first')
+        self.clock.now += limiter.hold - 1.0
+        limiter.failure('same overload')
+        self.assertEqual(limiter.limit, 4)
+        self.clock.now += 1.0
+        limiter.failure('new overload')
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.failures, 3)
+
+
+class AutotunedPoolTest(unittest.TestCase):
+
+    def test_tasks_in_flight_per_source_stay_under_the_limit(self):
+        clock = FakeClock()     # never moves, so no round has a rate & the limits stay where they start
+        runner = TaskRunner(policy=RetryPolicy(), sleep=clock.sleep, clock=clock)
+        pool = AutotunedPool(runner, workers=3, perSource=4, sampleInterval=0.05, clock=clock, initial=2)
+        lock = threading.Lock()
+        inFlight, most, done = {}, {}, []
+
+        def copy(source):
+            with lock:
+                inFlight[source] = inFlight.get(source, 0) + 1
+                most[source] = max(most.get(source, 0), inFlight[source])
+                most['all'] = max(most.get('all', 0), sum(inFlight.values()))
+            time.sleep(0.02)
+            with lock:
+                inFlight[source] -= 1
+            return {'rows': 10}
+        for number in range(6):
+            for source in ('A.sde', 'B.sde'):
+                pool.submit('{0} {1}'.format(source, number), source, copy, (source,), done.append)
+        pool.join()
+        self.assertEqual(done, ['done'] * 12)
+        self.assertEqual((most['A.sde'], most['B.sde'], most['all']), (2, 2, 3))
+        self.assertEqual(dict((source, limiter.limit) for source, limiter in pool.limiters.items()),
+                         {'A.sde': 2, 'B.sde': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests of the connections of arcreaderexport.backends.LocalBackend: one store per thread, all closed by close().
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+
+GDB = 'PortableDuluth.gdb'
+
+
+class LocalBackendStoresTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='backendstest_')
+        self.backend = LocalBackend(self.workDir)
+        self.backend.createWorkspace(self.workDir, GDB)
+        self.gdb = self.workDir + '/' + GDB
+        self.backend.store(self.gdb).createClass('Hydrants', [('NAME', 'String')], 'Point')
+        self.backend.openInsert(self.gdb + '/Hydrants', ['NAME', 'SHAPE@']).insertRows([('HYD1', pointWkb(1, 2))])
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def poolStores(self, workers=3):
+        """Reads the class from workers pool threads & returns the stores they used."""
+        lock, started, allStarted = threading.Lock(), [], threading.Event()
+
+        def read(_):
+            store = self.backend.store(self.gdb)
+            self.assertEqual(self.backend.describe(self.gdb + '/Hydrants')['count'], 1)
+            # every task waits for the others, so each runs on a thread of its own
+            with lock:
+                started.append(store)
+                if len(started) == workers:
+                    allStarted.set()
+            allStarted.wait(30)
+            return store
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(read, range(workers))
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_close_closes_the_stores_of_finished_pool_threads(self):
+        stores = self.poolStores()
+        self.assertEqual(len(set(id(store) for store in stores)), 3)
+        mainStore = self.backend.store(self.gdb)
+        self.assertFalse(any(store.closed for store in stores + [mainStore]))
+        self.backend.close()
+        for store in stores + [mainStore]:
+            self.assertTrue(store.closed)
+            self.assertRaises(sqlite3.ProgrammingError, store.connection.execute, 'SELECT 1')
+        self.assertEqual(self.backend._stores, [])
+        # the backend opens its stores again
+        self.assertEqual(self.backend.describe(self.gdb + '/Hydrants')['count'], 1)
+        self.assertIsNot(self.backend.store(self.gdb), mainStore)
+
+    def test_deleting_a_workspace_closes_every_threads_store_of_it(self):
+        self.backend.createWorkspace(self.workDir, 'Other.gdb')
+        other = self.backend.store(self.workDir + '/Other.gdb')
+        stores = self.poolStores()
+        self.backend.deleteWorkspace(self.gdb)
+        self.assertTrue(all(store.closed for store in stores))
+        self.assertFalse(other.closed)
+        self.assertFalse(os.path.exists(self.backend.workspaceFile(self.gdb)))
+
+
+if __name__ == '__main__':
+    unittest.main()
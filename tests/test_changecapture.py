@@ -0,0 +1,138 @@
+"""
+Tests of arcreaderexport.changecapture on its local SQLite stand-in of the SDE versioning tables.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.changecapture import (DELTA, FULL, SOURCE_OID_FIELD, ChangeCapture, compressVersions,  # noqa: E402
+                                           editVersioned, keyedCopy, registerVersioned)
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+
+SOURCE = 'Database Connections/GISDB.sde/sde.SDE.GPS/sde.SDE.EngGPSPts'
+OUTPUT = 'Output.gdb/GPS/EngGPSPts'
+FIELDS = [('NAME', 'String'), ('VALUE', 'Double')]
+ROWS = 300
+
+
+class CursorCheckingBackend(LocalBackend):
+    """Local backend that fails, like arcpy outside an edit session, on a delete while an insert cursor is open."""
+
+    def __init__(self, rootDir):
+        LocalBackend.__init__(self, rootDir)
+        self.openInserts = 0
+
+    def openInsert(self, path, fields):
+        inserter = LocalBackend.openInsert(self, path, fields)
+        close = inserter.close
+        self.openInserts += 1
+
+        def closeOnce():
+            if inserter.close is not close:
+                inserter.close = close
+                self.openInserts -= 1
+            close()
+        inserter.close = closeOnce
+        return inserter
+
+    def deleteRows(self, path, where):
+        if self.openInserts:
+            raise RuntimeError('Cannot open an update cursor while an insert cursor is open')
+        return LocalBackend.deleteRows(self, path, where)
+
+
+class ChangeCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='changecapturetest_')
+        self.backend = CursorCheckingBackend(self.workDir)
+        self.rng = random.Random(1)
+        workspacePath, parts = splitWorkspace(SOURCE)
+        self.store = self.backend.store(workspacePath)
+        self.className = '/'.join(parts)
+        self.store.createClass(self.className, FIELDS, 'Point')
+        self.store.openInsert(self.className, ['NAME', 'VALUE', 'SHAPE@']).insertRows(
+            [('Point {0}'.format(number), self.rng.uniform(0, 1000), self.point()) for number in range(ROWS)])
+        registerVersioned(self.store, self.className)
+        self.backend.createWorkspace(self.workDir, 'Output.gdb')
+        self.statePath = os.path.join(self.workDir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def point(self):
+        return pointWkb(self.rng.uniform(0, 5000), self.rng.uniform(0, 5000))
+
+    def capture(self):
+        return ChangeCapture(self.backend, statePath=self.statePath)
+
+    def edit(self):
+        return editVersioned(self.store, self.className,
+                             inserts=[{'NAME': 'New {0}'.format(number), 'VALUE': 1.5, 'SHAPE': self.point()}
+                                      for number in range(5)],
+                             updates={3: {'VALUE': 42.0}, 7: {'SHAPE': self.point()}, 11: {'NAME': 'Renamed'}},
+                             deletes=[1, 2, 200])
+
+    def rows(self, path):
+        fields = [SOURCE_OID_FIELD, 'NAME', 'VALUE', 'SHAPE@WKB']
+        return sorted(tuple(bytes(value) if isinstance(value, (bytearray, memoryview)) else value for value in row)
+                      for batch in self.backend.iterBatches(path, fields, 100) for row in batch)
+
+    def exported(self):
+        """Exports the class once (a full keyed copy) & saves its state, like a run that passed validation."""
+        capture = self.capture()
+        self.assertEqual(capture.sync(SOURCE, OUTPUT)['mode'], FULL)
+        capture.commit()
+
+    def test_delta_run_matches_a_full_copy(self):
+        self.exported()
+        self.edit()
+        result = self.capture().sync(SOURCE, OUTPUT)
+        self.assertEqual((result['mode'], result['changedIds'], result['rows']), (DELTA, 11, 8))
+        keyedCopy(self.backend, SOURCE, OUTPUT + '_full')
+        self.assertEqual(self.rows(OUTPUT), self.rows(OUTPUT + '_full'))
+        self.assertEqual(len(self.rows(OUTPUT)), ROWS + 5 - 3)
+
+    def test_unchanged_state_writes_nothing(self):
+        self.exported()
+        result = self.capture().sync(SOURCE, OUTPUT)
+        self.assertEqual((result['mode'], result['changedIds'], result['rows']), (DELTA, 0, 0))
+
+    def test_compress_falls_back_to_a_full_copy(self):
+        self.exported()
+        self.edit()
+        compressVersions(self.store)
+        self.assertEqual(self.capture().sync(SOURCE, OUTPUT)['mode'], FULL)
+        keyedCopy(self.backend, SOURCE, OUTPUT + '_full')
+        self.assertEqual(self.rows(OUTPUT), self.rows(OUTPUT + '_full'))
+
+    def test_schema_change_falls_back_to_a_full_copy(self):
+        self.exported()
+        self.backend.addField(SOURCE, 'OWNER', 'String')
+        self.assertEqual(self.capture().sync(SOURCE, OUTPUT)['mode'], FULL)
+
+    def test_discarded_run_keeps_the_old_state(self):
+        self.exported()
+        firstState = self.capture().saved[OUTPUT]['state']
+        self.edit()
+        rejected = self.capture()
+        self.assertEqual(rejected.sync(SOURCE, OUTPUT)['mode'], DELTA)
+        rejected.discard()
+        rejected.commit()
+        nextRun = self.capture()
+        self.assertEqual(nextRun.saved[OUTPUT]['state'], firstState)
+        result = nextRun.sync(SOURCE, OUTPUT)
+        self.assertEqual((result['fromState'], result['changedIds']), (firstState, 11))
+
+
+if __name__ == '__main__':
+    unittest.main()
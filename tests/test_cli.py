@@ -0,0 +1,96 @@
+"""
+Tests of the command line of arcreaderexport.cli: what the quick commands import & the old script entry point.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport import cli  # noqa: E402
+
+# Modules status & plan must start without: arcpy & pyarrow take seconds to import, and sqlite3 comes
+## with the copy modules (localstore, changecapture, ...) only export & validate need.
+HEAVY_MODULES = ('arcpy', 'pyarrow', 'numpy', 'sqlite3', 'arcreaderexport.localstore', 'arcreaderexport.backends',
+                 'arcreaderexport.export', 'arcreaderexport.validate', 'arcreaderexport.streamcopy')
+
+# Runs one command in a new process & writes the modules it loaded to the file named first
+COMMAND_PROCESS = """
+import json, sys
+sys.path.insert(0, {repoDir!r})
+from arcreaderexport import cli
+try:
+    code = cli.main(sys.argv[2:])
+except SystemExit as e:
+    code = e.code
+with open(sys.argv[1], 'w') as modulesFile:
+    json.dump({{'code': code, 'modules': sorted(sys.modules)}}, modulesFile)
+"""
+
+
+class QuickCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='clitest_')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def runCommand(self, *argv):
+        modulesPath = os.path.join(self.workDir, 'modules.json')
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([sys.executable, '-c', COMMAND_PROCESS.format(repoDir=REPO_DIR), modulesPath] +
+                                  list(argv), stdout=devnull)
+        with open(modulesPath) as modulesFile:
+            return json.load(modulesFile)
+
+    def test_status_loads_no_heavy_module(self):
+        result = self.runCommand('status', '--share', os.path.join(self.workDir, 'share'), '--local',
+                                 os.path.join(self.workDir, 'laptop'), '--state',
+                                 os.path.join(self.workDir, 'ExportSchedule.json'))
+        self.assertEqual(result['code'], 0)
+        self.assertEqual([module for module in HEAVY_MODULES if module in result['modules']], [])
+
+    def test_plan_help_loads_no_heavy_module(self):
+        result = self.runCommand('plan', '--help')
+        self.assertEqual(result['code'], 0)
+        self.assertIn('arcreaderexport.planner', result['modules'])
+        self.assertEqual([module for module in HEAVY_MODULES if module in result['modules']], [])
+
+
+class ScriptEntryPointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.main, self.argv = cli.main, sys.argv
+        self.calls = []
+
+        def recordingMain(argv=None):
+            self.calls.append(list(argv))
+            return 3
+        cli.main = recordingMain
+
+    def tearDown(self):
+        cli.main, sys.argv = self.main, self.argv
+
+    def test_script_runs_the_export_command_of_its_tier(self):
+        sys.argv = ['CreateRemoteArcReaderGDB_v2.py', '--tier', 'hourly']
+        with self.assertRaises(SystemExit) as raised:
+            runpy.run_path(os.path.join(REPO_DIR, 'CreateRemoteArcReaderGDB_v2.py'), run_name='__main__')
+        self.assertEqual((self.calls, raised.exception.code), ([['export', '--tier', 'hourly']], 3))
+
+    def test_script_import_runs_nothing(self):
+        runpy.run_path(os.path.join(REPO_DIR, 'CreateRemoteArcReaderGDB_v2.py'), run_name='CreateRemoteArcReaderGDB_v2')
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
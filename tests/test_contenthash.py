@@ -0,0 +1,114 @@
+"""
+Tests of the content hashes of arcreaderexport.contenthash through a LocalBackend: when a plain class is
+left in place, reused from the previous gdb or copied again.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.contenthash import COPIED, REUSED, UNCHANGED, ContentHashes, contentHash  # noqa: E402
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+from arcreaderexport.steps import sdeClassPath  # noqa: E402
+
+DATASET = 'Water_Distribution_Network'
+FIELDS = [('FACILITYID', 'String'), ('DIAMETER', 'Double')]
+ROWS = [('HYD{0:04d}'.format(number), 6.0 + number % 3, pointWkb(number, 2.0 * number)) for number in range(12)]
+
+
+class ContentHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='contenthashtest_')
+        self.backend = LocalBackend(self.workDir)
+        self.gdb = self.workDir + '/PortableDuluth.gdb'
+        self.backupGdb = self.workDir + '/PortableDuluth_backup.gdb'
+        for name in ('PortableDuluth.gdb', 'PortableDuluth_backup.gdb'):
+            self.backend.createWorkspace(self.workDir, name)
+        self.backend.createDataset(self.gdb, DATASET, None)
+        self.statePath = os.path.join(self.workDir, 'ExportContentHashes.json')
+        self.source = self.createSource('wHydrant', ROWS)
+        self.output = self.gdb + '/' + DATASET + '/wHydrant'
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def createSource(self, fc, rows, fields=FIELDS):
+        path = sdeClassPath(layers.SDE_CONNECTION, DATASET, fc)
+        workspacePath, parts = splitWorkspace(path)
+        store = self.backend.store(workspacePath)
+        store.createClass('/'.join(parts), fields, 'Point')
+        store.openInsert('/'.join(parts), [name for name, _ in fields] + ['SHAPE@']).insertRows(rows)
+        return path
+
+    def hashes(self, previousGdb=None):
+        return ContentHashes(self.backend, self.gdb, previousGdb=previousGdb, statePath=self.statePath)
+
+    def export(self, source=None):
+        """One run copying the source into the gdb (unless it is unchanged) & committing; returns the content."""
+        hashes = self.hashes()
+        result = hashes.reuse(source or self.source, self.output)
+        if result is None:
+            self.backend.copyClass(source or self.source, self.gdb + '/' + DATASET, 'wHydrant')
+        hashes.commit()
+        return hashes.results[-1]['content']
+
+    def test_hash_does_not_depend_on_row_order_or_objectids(self):
+        reordered = self.createSource('wHydrantReordered', [ROWS[0]] + ROWS[::-1])
+        self.backend.deleteRows(reordered, 'OBJECTID = 1')
+        self.assertEqual(contentHash(self.backend, reordered), contentHash(self.backend, self.source))
+        edited = self.createSource('wHydrantEdited', ROWS[:-1] + [('HYD9999',) + ROWS[-1][1:]])
+        self.assertNotEqual(contentHash(self.backend, edited)['hash'], contentHash(self.backend, self.source)['hash'])
+
+    def test_unchanged_source_is_left_in_place_on_an_incremental_run(self):
+        self.assertEqual(self.export(), COPIED)
+        hashes = self.hashes()
+        self.assertEqual(hashes.reuse(self.source, self.output)['content'], UNCHANGED)
+        self.assertEqual(hashes.summary()[UNCHANGED], 1)
+        # not if the output class is gone
+        self.backend.deleteRows(self.output, '1 = 1')
+        self.assertIsNone(self.hashes().reuse(self.source, self.output))
+
+    def test_unchanged_source_is_reused_from_the_previous_gdb_on_a_full_rebuild(self):
+        self.export()
+        self.backend.createDataset(self.backupGdb, DATASET, None)
+        self.backend.copyClass(self.output, self.backupGdb + '/' + DATASET, 'wHydrant')
+        self.backend.deleteRows(self.output, '1 = 1')
+        result = self.hashes(previousGdb=self.backupGdb).reuse(self.source, self.output)
+        self.assertEqual((result['content'], result['rows']), (REUSED, len(ROWS)))
+        self.assertEqual(contentHash(self.backend, self.output)['hash'], contentHash(self.backend, self.source)['hash'])
+
+    def test_changed_rows_schema_or_count_are_copied(self):
+        self.export()
+        changes = [('HYD9999',) + ROWS[0][1:]] + ROWS[1:], ROWS + [('HYD0100', 6.0, pointWkb(100, 200))]
+        for fc, rows in zip(('wHydrantEdited', 'wHydrantAdded'), changes):
+            self.assertIsNone(self.hashes().reuse(self.createSource(fc, rows), self.output), fc)
+        widened = self.createSource('wHydrantWidened', [row[:2] + (None,) + row[2:] for row in ROWS],
+                                    FIELDS + [('MANUFACTURER', 'String')])
+        hashes = self.hashes()
+        self.assertIsNone(hashes.reuse(widened, self.output))
+        self.assertEqual(hashes.summary()[COPIED], 1)
+
+    def test_hashes_are_saved_by_commit_only(self):
+        hashes = self.hashes()
+        hashes.reuse(self.source, self.output)
+        self.backend.copyClass(self.source, self.gdb + '/' + DATASET, 'wHydrant')
+        self.assertFalse(os.path.exists(self.statePath))
+        hashes.discard()
+        hashes.commit()
+        self.assertFalse(os.path.exists(self.statePath))
+        self.assertIsNone(self.hashes().reuse(self.source, self.output))
+        self.assertEqual(self.export(), COPIED)
+        self.assertEqual(self.export(), UNCHANGED)
+
+
+if __name__ == '__main__':
+    unittest.main()
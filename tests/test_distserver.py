@@ -0,0 +1,112 @@
+"""
+Tests of arcreaderexport.distserver on loopback (need Python 3.7+; skipped on 2.7).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.manifest import MANIFEST_FILE, publishManifest  # noqa: E402
+
+try:
+    import asyncio
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+    from arcreaderexport.distserver import DistributionServer
+    HAVE_DISTSERVER = True
+except (ImportError, SyntaxError):
+    HAVE_DISTSERVER = False
+
+
+def writeBundle(bundleDir, data):
+    """Writes a bundle of one gdb file & the pmf, and publishes a new version of it."""
+    gdb = os.path.join(bundleDir, 'PortableDuluth.gdb')
+    if not os.path.isdir(gdb):
+        os.makedirs(gdb)
+    with open(os.path.join(gdb, 'a00000001.gdbtable'), 'wb') as dataFile:
+        dataFile.write(data)
+    with open(os.path.join(bundleDir, 'TapNCurb.pmf'), 'wb') as pmfFile:
+        pmfFile.write(b'pmf')
+    return publishManifest(bundleDir, blockSize=64)
+
+
+class ServerThread(object):
+    """Runs a DistributionServer on its own event loop in a thread, on a free loopback port."""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.port = self.call(server.start('127.0.0.1', 0))
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(30)
+
+    def get(self, path, headers=None):
+        """Returns (status, body) of a GET on the server."""
+        try:
+            response = urlopen(Request('http://127.0.0.1:{0}{1}'.format(self.port, path), headers=headers or {}),
+                               timeout=10)
+        except HTTPError as e:
+            return e.code, e.read()
+        return response.status, response.read()
+
+    def stop(self):
+        self.call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@unittest.skipUnless(HAVE_DISTSERVER, 'the distribution server needs Python 3.7+')
+class DistributionServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bundleDir = tempfile.mkdtemp(prefix='disttest_')
+        self.first = writeBundle(self.bundleDir, b'a' * 200)
+        self.thread = ServerThread(DistributionServer(self.bundleDir, checkInterval=0.1))
+
+    def tearDown(self):
+        self.thread.stop()
+        shutil.rmtree(self.bundleDir, ignore_errors=True)
+
+    def test_serves_the_bundle(self):
+        status, body = self.thread.get('/version')
+        self.assertEqual((status, json.loads(body.decode('utf-8'))['version']), (200, self.first['version']))
+        status, body = self.thread.get('/manifest')
+        paths = [entry['path'] for entry in json.loads(body.decode('utf-8'))['files']]
+        self.assertIn('PortableDuluth.gdb/a00000001.gdbtable', paths)
+        self.assertEqual(self.thread.get('/files/PortableDuluth.gdb/a00000001.gdbtable', {'Range': 'bytes=10-19'}),
+                         (206, b'a' * 10))
+        self.assertEqual(self.thread.get('/files/elsewhere.txt')[0], 404)
+
+    def test_manifest_is_read_once_per_publish(self):
+        os.remove(os.path.join(self.bundleDir, MANIFEST_FILE))
+        status, body = self.thread.get('/manifest')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8'))['version'], self.first['version'])
+
+    def test_new_publish_is_picked_up(self):
+        time.sleep(0.05)        # a new mtime even on a coarse clock
+        second = writeBundle(self.bundleDir, b'b' * 300)
+        deadline = time.time() + 10
+        while self.thread.server.version.get('version') != second['version'] and time.time() < deadline:
+            time.sleep(0.05)
+        status, body = self.thread.get('/version')
+        self.assertEqual(json.loads(body.decode('utf-8'))['version'], second['version'])
+        self.assertEqual(self.thread.get('/files/PortableDuluth.gdb/a00000001.gdbtable'), (200, b'b' * 300))
+
+
+if __name__ == '__main__':
+    unittest.main()
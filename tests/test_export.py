@@ -0,0 +1,72 @@
+"""
+Tests of the metrics of an export (arcreaderexport.export.runExport) that raises, on the local backend.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.export import runExport  # noqa: E402
+from arcreaderexport.metrics import METRICS_FILE, PREFIX  # noqa: E402
+
+
+def freePort():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+class FailingBackend(LocalBackend):
+    """Local backend that raises when the export looks for the published gdb (step 1)."""
+
+    def exists(self, path):
+        if path == layers.PORTABLE_GDB:
+            raise RuntimeError('lost the connection')
+        return LocalBackend.exists(self, path)
+
+
+class FailedRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='exporttest_')
+        self.logger = logging.getLogger('arcreaderexport.tests.export')
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def test_failed_run_is_recorded_the_server_stopped_and_the_stores_closed(self):
+        port = freePort()
+        backend = FailingBackend(self.workDir)
+        store = backend.store(layers.SDE_CONNECTION)
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')     # runExport prints progress like the script
+        try:
+            with self.assertRaises(RuntimeError):
+                runExport(layers.FULL_TIER, backend=backend, logger=self.logger, publish=False,
+                          useSourceCache=False, reportDir=self.workDir, metricsPort=port)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        with open(os.path.join(self.workDir, METRICS_FILE)) as textfile:
+            series = textfile.read().splitlines()
+        self.assertIn(PREFIX + 'run_in_progress 0', series)
+        self.assertIn(PREFIX + 'runs_total{{tier="{0}",result="failed"}} 1'.format(layers.FULL_TIER), series)
+        self.assertRaises(socket.error, socket.create_connection, ('127.0.0.1', port), 1)
+        self.assertTrue(store.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
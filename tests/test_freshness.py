@@ -0,0 +1,98 @@
+"""
+Tests of the laptop freshness check of arcreaderexport.freshness, with local folders standing in for the
+share & the laptop.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import freshness  # noqa: E402
+from arcreaderexport.freshness import CURRENT, OFFLINE, STALE, SYNC, checkFreshness  # noqa: E402
+from arcreaderexport.manifest import VERSION_FILE, publishManifest  # noqa: E402
+
+NOW = datetime.datetime(2024, 5, 20, 8, 0, 0)
+
+
+class FreshnessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='freshnesstest_')
+        self.share = os.path.join(self.workDir, 'share')
+        self.laptop = os.path.join(self.workDir, 'laptop')
+        for folder in (self.share, self.laptop):
+            os.makedirs(folder)
+            with open(os.path.join(folder, 'TapNCurb.pmf'), 'wb') as pmfFile:
+                pmfFile.write(b'pmf')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def publish(self, daysAgo):
+        return publishManifest(self.share, published=NOW - datetime.timedelta(days=daysAgo))
+
+    def install(self):
+        """Copies the share's version file to the laptop, the way a finished sync leaves it."""
+        shutil.copy(os.path.join(self.share, VERSION_FILE), os.path.join(self.laptop, VERSION_FILE))
+
+    def check(self, sharePath=None):
+        return checkFreshness(sharePath or self.share, self.laptop, maxAgeDays=7, now=NOW)
+
+    def test_nothing_installed_syncs(self):
+        self.publish(1)
+        self.assertEqual(self.check()['decision'], SYNC)
+
+    def test_newer_published_version_syncs(self):
+        self.publish(3)
+        self.install()
+        self.publish(1)
+        result = self.check()
+        self.assertEqual((result['decision'], result['sharedVersion'], result['localVersion']), (SYNC, 2, 1))
+
+    def test_installed_published_version_is_current(self):
+        self.publish(2)
+        self.install()
+        result = self.check()
+        self.assertEqual((result['decision'], result['localAgeDays'], result['publishedAgeDays']), (CURRENT, 2.0, 2.0))
+
+    def test_old_published_version_is_stale_even_when_installed(self):
+        self.publish(9)
+        self.install()
+        result = self.check()
+        self.assertEqual((result['decision'], result['publishedAgeDays']), (STALE, 9.0))
+        self.assertIn('9 days ago', result['message'])
+
+    def test_offline_laptop_with_a_recent_copy(self):
+        self.publish(3)
+        self.install()
+        self.assertEqual(self.check(os.path.join(self.workDir, 'unreachable'))['decision'], OFFLINE)
+
+    def test_offline_laptop_with_an_old_copy_is_stale(self):
+        self.publish(8)
+        self.install()
+        self.assertEqual(self.check(os.path.join(self.workDir, 'unreachable'))['decision'], STALE)
+
+    def test_exit_codes(self):
+        publishManifest(self.share)     # main checks against the current time
+        stdout, sys.stdout = sys.stdout, io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+        try:
+            codes = [freshness.main(['--share', self.share, '--local', self.laptop])]
+            self.install()
+            codes.append(freshness.main(['--share', self.share, '--local', self.laptop]))
+            codes.append(freshness.main(['--share', os.path.join(self.workDir, 'unreachable'), '--local',
+                                         os.path.join(self.workDir, 'new laptop')]))
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(codes, [10, 0, 20])
+
+
+if __name__ == '__main__':
+    unittest.main()
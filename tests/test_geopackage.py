@@ -0,0 +1,111 @@
+"""
+Tests of the GeoPackage output of arcreaderexport.geopackage: the file a bulk load leaves & reading it back.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.geopackage import (GPKG_APPLICATION_ID, GPKG_USER_VERSION, GeoPackageStore,  # noqa: E402
+                                        gpkgGeometry)
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+
+FIELDS = [('FACILITYID', 'String'), ('DIAMETER', 'Double'), ('INSTALLED', 'Date')]
+ROWS = 30
+
+
+def hydrant(number):
+    return ('HYD{0:04d}'.format(number), 6.0 + number % 3, '2001-05-01', pointWkb(1000.0 + number, 2000.0 - 2 * number))
+
+
+class GeoPackageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='geopackagetest_')
+        self.gpkgPath = os.path.join(self.workDir, 'PortableDuluth.gpkg')
+        self.store = GeoPackageStore(self.gpkgPath)
+        self.store.createClass('Water_Distribution_Network/wHydrant', FIELDS, 'Point')
+        self.store.createClass('Assessor', [('PARCELID', 'String'), ('VALUE', 'Integer')])
+        inserter = self.store.openInsert('Water_Distribution_Network/wHydrant', [name for name, _ in FIELDS] + ['SHAPE@'])
+        inserter.insertRows([hydrant(number) for number in range(20)])
+        inserter.insertRows([hydrant(number) for number in range(20, ROWS)])
+        inserter.close()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def query(self, sql, *args):
+        return self.store.connection.execute(sql, args).fetchall()
+
+    def rtreeCount(self):
+        return self.query('SELECT COUNT(*) FROM rtree_wHydrant_SHAPE')[0][0]
+
+    def test_file_is_marked_as_a_geopackage(self):
+        self.assertEqual(self.query('PRAGMA application_id')[0][0], GPKG_APPLICATION_ID)
+        self.assertEqual(self.query('PRAGMA user_version')[0][0], GPKG_USER_VERSION)
+
+    def test_classes_are_registered(self):
+        self.assertEqual(self.query('SELECT table_name, data_type, min_x, min_y, max_x, max_y, srs_id FROM gpkg_contents '
+                                    'ORDER BY table_name'),
+                         [('Assessor', 'attributes', None, None, None, None, None),
+                          ('wHydrant', 'features', 1000.0, 2000.0 - 2 * (ROWS - 1), 1000.0 + ROWS - 1, 2000.0, -1)])
+        self.assertEqual(self.query('SELECT * FROM gpkg_geometry_columns'), [('wHydrant', 'SHAPE', 'POINT', -1, 0, 0)])
+        self.assertEqual(self.query('SELECT table_name, extension_name FROM gpkg_extensions'),
+                         [('wHydrant', 'gpkg_rtree_index')])
+        self.assertEqual(self.store.layout(), {'Water_Distribution_Network': ['wHydrant'], None: ['Assessor']})
+
+    def test_rtree_holds_every_feature(self):
+        self.assertEqual(self.rtreeCount(), ROWS)
+        self.assertEqual(self.query('SELECT minx, maxx, miny, maxy FROM rtree_wHydrant_SHAPE WHERE id = 3'),
+                         [(1002.0, 1002.0, 1996.0, 1996.0)])
+
+    def test_rtree_triggers_follow_edits(self):
+        blob, _ = gpkgGeometry(pointWkb(50.0, 60.0))
+        with self.store.connection:
+            self.store.connection.execute('UPDATE wHydrant SET SHAPE = ? WHERE OBJECTID = 3', (sqlite3.Binary(blob),))
+            self.store.connection.execute('DELETE FROM wHydrant WHERE OBJECTID IN (4, 5)')
+        self.assertEqual(self.query('SELECT minx, maxx, miny, maxy FROM rtree_wHydrant_SHAPE WHERE id = 3'),
+                         [(50.0, 50.0, 60.0, 60.0)])
+        self.assertEqual(self.rtreeCount(), ROWS - 2)
+        self.assertEqual(self.query('SELECT id FROM rtree_wHydrant_SHAPE WHERE id IN (4, 5)'), [])
+        inserter = self.store.openInsert('Water_Distribution_Network/wHydrant', [name for name, _ in FIELDS] + ['SHAPE@'])
+        inserter.insertRows([hydrant(ROWS)])
+        inserter.close()
+        self.assertEqual(self.rtreeCount(), ROWS - 1)
+
+    def test_describe_and_batches_read_back_the_rows(self):
+        description = self.store.describe('Water_Distribution_Network/wHydrant')
+        self.assertEqual((description['count'], description['hasShape'], description['shapeType']), (ROWS, True, 'Point'))
+        self.assertEqual(description['fields'], [('OBJECTID', 'OID'), ('SHAPE', 'Geometry')] + FIELDS)
+        self.assertEqual(description['extent'], (1000.0, 2000.0 - 2 * (ROWS - 1), 1000.0 + ROWS - 1, 2000.0))
+        batches = list(self.store.iterBatches('Water_Distribution_Network/wHydrant',
+                                              ['OID@'] + [name for name, _ in FIELDS] + ['SHAPE@'], 7))
+        self.assertEqual([len(batch) for batch in batches], [7, 7, 7, 7, 2])
+        self.assertEqual([row for batch in batches for row in batch],
+                         [(number + 1,) + hydrant(number) for number in range(ROWS)])
+        self.assertEqual(self.store.describe('Assessor')['hasShape'], False)
+        self.assertEqual(self.store.describe('Missing'), {'exists': False})
+
+    def test_close_leaves_a_single_file(self):
+        self.assertEqual(self.query('PRAGMA journal_mode')[0][0], 'wal')
+        self.assertTrue(os.path.exists(self.gpkgPath + '-wal'))
+        self.store.close()
+        self.assertFalse(os.path.exists(self.gpkgPath + '-wal'))
+        connection = sqlite3.connect(self.gpkgPath)
+        try:
+            self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM wHydrant').fetchone()[0], ROWS)
+        finally:
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
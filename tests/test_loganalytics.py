@@ -0,0 +1,124 @@
+"""
+Tests of the run index & the text / events parsing of arcreaderexport.loganalytics, on logs written by
+arcreaderexport.logs into a local folder standing in for the share.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.loganalytics import RunIndex, classTrend, failureFrequency, readRuns  # noqa: E402
+from arcreaderexport.logs import RESTART_HEADER  # noqa: E402
+
+# One export process: setLogger writes the restart header, then each class is logged the way
+## ExportSteps (text) & TaskRunner (events) log it.
+EXPORT_PROCESS = """
+import json, sys
+sys.path.insert(0, {repoDir!r})
+from arcreaderexport.logs import flushLogs, setLogger
+logPath, eventsPath, bufferDir, classes = json.loads(sys.argv[1])
+logger = setLogger('arcreaderexport.export', logPath, eventsPath, bufferDir=bufferDir, flushInterval=0.05)
+for name, status in classes:
+    inFC, outFC = 'GISDB.sde/sde.SDE.' + name, 'PortableDuluth.gdb/Utilities/' + name
+    if status == 'done':
+        logger.info('Copied fc: {{0}} to fc: {{1}}'.format(inFC, outFC))
+    else:
+        logger.info('XXX Failed to copy from SDE dbs ({{0}}) to PortableGIS fc ({{1}})'.format(inFC, outFC))
+    logger.info('Task {{0}} {{1}}'.format(name, status),
+                extra={{'event': {{'stage': 'copy', 'className': name, 'status': status, 'duration': 0.5}}}})
+flushLogs()
+"""
+
+
+def textRun(day, classes):
+    """Returns the text log lines of one run on day (YYYY-mm-dd) copying classes."""
+    line = '{0} 10:00:{1:02d},000 - Running Module: arcreaderexport.export; Line#: 1}} INFO |-| {2}\n'
+    lines = [line.format(day, 0, RESTART_HEADER)]
+    for number, name in enumerate(classes):
+        lines.append(line.format(day, number + 1, 'Copied fc: GISDB.sde/sde.SDE.{0} to fc: Out.gdb/{0}'.format(name)))
+    return ''.join(lines).encode('utf-8')
+
+
+class LogAnalyticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='loganalyticstest_')
+        self.logPath = os.path.join(self.workDir, 'ProcessLogfile.log')
+        self.eventsPath = os.path.join(self.workDir, 'ProcessEvents.jsonl')
+        self.scanned = []
+        self.scan = RunIndex._scan
+
+        def recordingScan(index, data, start, end):
+            self.scanned.append((start, end))
+            return self.scan(index, data, start, end)
+        RunIndex._scan = recordingScan
+
+    def tearDown(self):
+        RunIndex._scan = self.scan
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def export(self, classes):
+        """Runs one export process logging classes [(name, 'done' / 'failed')]."""
+        arguments = json.dumps([self.logPath, self.eventsPath, os.path.join(self.workDir, 'buffer'), classes])
+        subprocess.check_call([sys.executable, '-c', EXPORT_PROCESS.format(repoDir=REPO_DIR), arguments])
+
+    def writeLog(self, data):
+        with open(self.logPath, 'wb') as logFile:
+            logFile.write(data)
+
+    def test_runs_of_two_processes_read_the_same_from_text_and_events(self):
+        self.export([('Parcels', 'done'), ('Hydrants', 'failed')])
+        self.export([('Parcels', 'done'), ('Hydrants', 'done'), ('Valves', 'failed')])
+        textRuns, eventRuns = readRuns(self.logPath), readRuns(self.eventsPath, events=True)
+        self.assertEqual((len(textRuns), len(eventRuns)), (2, 2))
+        self.assertEqual([run['start'] for run in textRuns], [run['start'] for run in eventRuns])
+        expected = [{'className': 'Hydrants', 'failedRuns': 1, 'ofRuns': 2, 'rate': 0.5},
+                    {'className': 'Valves', 'failedRuns': 1, 'ofRuns': 2, 'rate': 0.5}]
+        self.assertEqual((failureFrequency(textRuns), failureFrequency(eventRuns)), (expected, expected))
+        self.assertEqual([row['start'] for row in classTrend(textRuns, 'parcels')],
+                         [row['start'] for row in classTrend(eventRuns, 'parcels')])
+        self.assertEqual(len(classTrend(textRuns, 'Hydrants')), 1)
+
+    def test_index_scans_only_the_appended_bytes(self):
+        self.export([('Parcels', 'done')])
+        index = RunIndex(self.logPath).load()
+        firstSize = index.size
+        self.assertEqual((len(index.runs), self.scanned), (1, [(0, firstSize)]))
+        self.export([('Hydrants', 'done')])
+        del self.scanned[:]
+        index = RunIndex(self.logPath).load()
+        start, end = self.scanned[0]
+        self.assertEqual((len(self.scanned), end, len(index.runs)), (1, os.path.getsize(self.logPath), 2))
+        self.assertTrue(firstSize - 200 < start < firstSize)
+        del self.scanned[:]
+        self.assertEqual((len(RunIndex(self.logPath).load().runs), self.scanned), (2, []))
+
+    def test_index_is_rebuilt_when_the_log_is_rotated(self):
+        self.writeLog(textRun('2024-05-01', ['Parcels', 'Hydrants', 'Valves']))
+        self.assertEqual([run[1] for run in RunIndex(self.logPath).load().runs], ['2024-05-01 10:00:00'])
+        # a new log, longer than the old one, whose first bytes differ
+        self.writeLog(textRun('2024-05-02', ['Parcels']) + textRun('2024-05-03', ['Parcels', 'Hydrants']))
+        index = RunIndex(self.logPath).load()
+        self.assertEqual([run[1] for run in index.runs], ['2024-05-02 10:00:00', '2024-05-03 10:00:00'])
+        self.assertEqual(self.scanned[-1][0], 0)
+        self.assertEqual([len(run['records']) for run in readRuns(self.logPath)], [1, 2])
+
+    def test_index_is_rebuilt_when_the_log_is_truncated(self):
+        self.writeLog(textRun('2024-05-01', ['Parcels']) + textRun('2024-05-02', ['Parcels']))
+        self.assertEqual(len(RunIndex(self.logPath).load().runs), 2)
+        self.writeLog(textRun('2024-05-03', ['Valves']))
+        index = RunIndex(self.logPath).load()
+        self.assertEqual((index.runs, index.size), ([[0, '2024-05-03 10:00:00']], os.path.getsize(self.logPath)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests of the batching log handlers of arcreaderexport.logs, with a local folder standing in for the share.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.logs import BatchingFileHandler, logEvent, processAlive  # noqa: E402
+
+
+def endedPid():
+    """Returns the id of a process that has ended."""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class BatchingFileHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='logtest_')
+        self.bufferDir = os.path.join(self.workDir, 'buffer')
+        self.targetPath = os.path.join(self.workDir, 'share', 'Process.log')
+        os.makedirs(os.path.dirname(self.targetPath))
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def handler(self):
+        handler = BatchingFileHandler(self.targetPath, bufferDir=self.bufferDir, flushInterval=0.05)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.handlers.append(handler)
+        return handler
+
+    def log(self, handler, message):
+        handler.handle(logging.makeLogRecord({'msg': message, 'levelno': logging.INFO, 'levelname': 'INFO'}))
+        handler.flush()
+
+    def target(self):
+        with io.open(self.targetPath, encoding='utf-8') as targetFile:
+            return targetFile.read().splitlines()
+
+    def test_buffer_is_per_process(self):
+        handler = self.handler()
+        self.assertEqual(os.path.basename(handler.bufferPath), 'Process.log.{0}.buffer'.format(os.getpid()))
+
+    def test_buffer_of_an_ended_process_is_appended_once(self):
+        pid = endedPid()
+        self.assertFalse(processAlive(pid))
+        os.makedirs(self.bufferDir)
+        orphan = os.path.join(self.bufferDir, 'Process.log.{0}.buffer'.format(pid))
+        with io.open(orphan, 'w', encoding='utf-8') as orphanFile:
+            orphanFile.write(u'left behind\n')
+        live = os.path.join(self.bufferDir, 'Process.log.{0}.buffer'.format(os.getppid()))
+        with io.open(live, 'w', encoding='utf-8') as liveFile:
+            liveFile.write(u'still being written\n')
+        self.log(self.handler(), 'first')
+        self.log(self.handler(), 'second')
+        self.assertEqual(sorted(self.target()), ['first', 'left behind', 'second'])
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(live))
+
+    def test_writer_keeps_going_after_a_failed_batch(self):
+        handler = self.handler()
+        writeBatch, failures = handler._writeBatch, []
+
+        def failOnce(records):
+            if not failures:
+                failures.append(records)
+                raise IOError('disk full')
+            writeBatch(records)
+        handler._writeBatch = failOnce
+        stderr, sys.stderr = sys.stderr, io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+        try:
+            self.log(handler, 'lost')
+        finally:
+            sys.stderr = stderr
+        self.log(handler, 'written')
+        self.assertEqual((handler.writeErrors, self.target()), (1, ['written']))
+
+
+class LogEventTest(unittest.TestCase):
+
+    def test_record_has_the_caller_line(self):
+        logger = logging.getLogger('arcreaderexport.tests.logEvent')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        recorder = RecordingHandler()
+        logger.addHandler(recorder)
+        try:
+            line = sys._getframe().f_lineno + 1
+            logEvent(logger, 'Copied fc', className='Parcels', rows=3)
+        finally:
+            logger.removeHandler(recorder)
+        record, = recorder.records
+        self.assertEqual((record.lineno, record.funcName, record.module), (line, 'test_record_has_the_caller_line',
+                                                                           'test_logs'))
+        self.assertEqual(record.event, {'className': 'Parcels', 'rows': 3})
+        self.assertEqual(record.getMessage(), 'Copied fc')
+
+
+if __name__ == '__main__':
+    unittest.main()
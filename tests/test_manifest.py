@@ -0,0 +1,86 @@
+"""
+Tests of the version file & manifest of arcreaderexport.manifest, with a local folder standing in for the share.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import manifest  # noqa: E402
+from arcreaderexport.manifest import MANIFEST_FILE, VERSION_FILE, publishManifest, readManifest, readVersion  # noqa: E402
+
+GDB = 'PortableDuluth.gdb'
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.share = tempfile.mkdtemp(prefix='manifesttest_')
+        os.makedirs(os.path.join(self.share, GDB))
+        self.writeFile(GDB + '/a00000001.gdbtable', b'a' * 2500)
+        self.writeFile(GDB + '/a00000002.gdbtable', b'b' * 100)
+        self.writeFile(GDB + '/_gdb.EDITOR.1234.sr.lock', b'')
+        self.writeFile('TapNCurb.pmf', b'pmf')
+        self.writeFile('Elsewhere.txt', b'not in the bundle')
+        self.hashed = []
+        self.blockHashes = manifest.blockHashes
+
+        def countingBlockHashes(path, blockSize=manifest.BLOCK_SIZE):
+            self.hashed.append(os.path.basename(path))
+            return self.blockHashes(path, blockSize)
+        manifest.blockHashes = countingBlockHashes
+
+    def tearDown(self):
+        manifest.blockHashes = self.blockHashes
+        shutil.rmtree(self.share, ignore_errors=True)
+
+    def writeFile(self, relPath, data):
+        with open(os.path.join(self.share, relPath), 'wb') as dataFile:
+            dataFile.write(data)
+
+    def test_version_file_points_at_the_manifest(self):
+        versionInfo = publishManifest(self.share, published=datetime.datetime(2024, 5, 6, 7, 8, 9), blockSize=1024,
+                                      extra={'tier': 'weekly'})
+        self.assertEqual(readVersion(self.share), versionInfo)
+        self.assertEqual((versionInfo['version'], versionInfo['published'], versionInfo['tier']),
+                         (1, '2024-05-06T07:08:09', 'weekly'))
+        self.assertEqual((versionInfo['files'], versionInfo['bytes']), (3, 2603))
+        with open(os.path.join(self.share, MANIFEST_FILE), 'rb') as manifestFile:
+            self.assertEqual(versionInfo['manifestSha1'], hashlib.sha1(manifestFile.read()).hexdigest())
+        self.assertEqual(sorted(os.listdir(self.share)), sorted([GDB, 'TapNCurb.pmf', 'Elsewhere.txt',
+                                                                 MANIFEST_FILE, VERSION_FILE]))
+
+    def test_manifest_lists_the_bundle_files_and_their_blocks(self):
+        publishManifest(self.share, blockSize=1024)
+        files = dict((entry['path'], entry) for entry in readManifest(self.share)['files'])
+        self.assertEqual(sorted(files), [GDB + '/a00000001.gdbtable', GDB + '/a00000002.gdbtable', 'TapNCurb.pmf'])
+        blocks = files[GDB + '/a00000001.gdbtable']['blocks']
+        self.assertEqual(blocks, [hashlib.sha1(b'a' * 1024).hexdigest()] * 2 + [hashlib.sha1(b'a' * 452).hexdigest()])
+        self.assertEqual(files['TapNCurb.pmf']['size'], 3)
+
+    def test_next_publish_rehashes_only_changed_files(self):
+        publishManifest(self.share, blockSize=1024)
+        self.writeFile(GDB + '/a00000002.gdbtable', b'c' * 200)
+        del self.hashed[:]
+        versionInfo = publishManifest(self.share, blockSize=1024)
+        self.assertEqual(versionInfo['version'], 2)
+        self.assertEqual(self.hashed, ['a00000002.gdbtable'])
+        files = dict((entry['path'], entry) for entry in readManifest(self.share)['files'])
+        self.assertEqual(files[GDB + '/a00000002.gdbtable']['blocks'], [hashlib.sha1(b'c' * 200).hexdigest()])
+
+    def test_missing_or_torn_version_file_reads_as_none(self):
+        self.assertIsNone(readVersion(self.share))
+        self.writeFile(VERSION_FILE, b'{"version": 3, "publ')
+        self.assertIsNone(readVersion(self.share))
+
+
+if __name__ == '__main__':
+    unittest.main()
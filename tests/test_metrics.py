@@ -0,0 +1,127 @@
+"""
+Tests of the Prometheus metrics of arcreaderexport.metrics: the text format, the textfile read back by the
+next run & the publication gauges read from the version file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.manifest import publishManifest  # noqa: E402
+from arcreaderexport.metrics import PREFIX, ExportMetrics, MetricsRegistry  # noqa: E402
+
+SOURCE = 'Database Connections\\GISDB.sde'
+PUBLISHED = datetime.datetime(2024, 5, 1, 6, 30, 0)
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def seriesValue(text, series):
+    """Returns the value of one series (name & labels as rendered) of a rendered registry."""
+    values = [line.rsplit(' ', 1)[1] for line in text.splitlines() if line.rsplit(' ', 1)[0] == series]
+    if len(values) != 1:
+        raise AssertionError('{0} found {1} times'.format(series, len(values)))
+    return float(values[0])
+
+
+class RegistryRenderTest(unittest.TestCase):
+
+    def test_render_writes_help_type_and_escaped_series(self):
+        registry = MetricsRegistry()
+        copies = registry.counter('copies_total', 'Copies by source.', ('source',))
+        copies.inc(source=SOURCE)
+        copies.inc(2, source='line\nbreak "quoted"')
+        registry.gauge('in_progress', 'Run going.').set(1)
+        duration = registry.histogram('duration_seconds', 'Copy durations.', ('stage',), buckets=(1.0, 5.0))
+        for seconds in (0.5, 3.0, 10.0):
+            duration.observe(seconds, stage='copy')
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP copies_total Copies by source.',
+            '# TYPE copies_total counter',
+            'copies_total{source="Database Connections\\\\GISDB.sde"} 1',
+            'copies_total{source="line\\nbreak \\"quoted\\""} 2',
+            '# HELP in_progress Run going.',
+            '# TYPE in_progress gauge',
+            'in_progress 1',
+            '# HELP duration_seconds Copy durations.',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{stage="copy",le="1"} 1',
+            'duration_seconds_bucket{stage="copy",le="5"} 2',
+            'duration_seconds_bucket{stage="copy",le="+Inf"} 3',
+            'duration_seconds_sum{stage="copy"} 13.5',
+            'duration_seconds_count{stage="copy"} 3']) + '\n')
+
+
+class ExportMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='metricstest_')
+        self.textfilePath = os.path.join(self.workDir, 'reports', 'arcreaderexport.prom')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def exportRun(self, tier, duration, **kwargs):
+        metrics = ExportMetrics(self.textfilePath, **kwargs)
+        metrics.runStarted(tier)
+        metrics.recordTask('copy', SOURCE, 'done', duration, 2, rows=100)
+        metrics.recordTask('copy', SOURCE, 'failed', 1.0, 1)
+        metrics.runFinished(tier, 60.0, True)
+        with open(self.textfilePath) as textFile:
+            return textFile.read()
+
+    def test_counters_keep_counting_across_runs(self):
+        self.exportRun('hourly', 3.0)
+        text = self.exportRun('daily', 45.0)
+        labels = '{{stage="copy",source="{0}"'.format(SOURCE.replace('\\', '\\\\'))
+        self.assertEqual(seriesValue(text, PREFIX + 'tasks_total{stage="copy",status="done"}'), 2)
+        self.assertEqual(seriesValue(text, PREFIX + 'tasks_total{stage="copy",status="failed"}'), 2)
+        self.assertEqual(seriesValue(text, PREFIX + 'task_retries_total{stage="copy"}'), 2)
+        self.assertEqual(seriesValue(text, PREFIX + 'rows_copied_total{stage="copy"}'), 200)
+        self.assertEqual(seriesValue(text, PREFIX + 'task_duration_seconds_bucket' + labels + ',le="5"}'), 1)
+        self.assertEqual(seriesValue(text, PREFIX + 'task_duration_seconds_bucket' + labels + ',le="60"}'), 2)
+        self.assertEqual(seriesValue(text, PREFIX + 'task_duration_seconds_sum' + labels + '}'), 48)
+        self.assertEqual(seriesValue(text, PREFIX + 'task_duration_seconds_count' + labels + '}'), 2)
+        # the last run of each tier stays listed
+        for tier in ('hourly', 'daily'):
+            self.assertEqual(seriesValue(text, PREFIX + 'runs_total{{tier="{0}",result="validated"}}'.format(tier)), 1)
+            self.assertEqual(seriesValue(text, PREFIX + 'last_run_success{{tier="{0}"}}'.format(tier)), 1)
+        self.assertEqual(seriesValue(text, PREFIX + 'run_in_progress'), 0)
+        self.assertFalse(os.path.exists(self.textfilePath + '.tmp'))
+
+    def test_publication_gauges_are_read_from_the_version_file(self):
+        bundleDir = os.path.join(self.workDir, 'ArcReaderRemoteUpdate')
+        os.makedirs(bundleDir)
+        with open(os.path.join(bundleDir, 'TapNCurb.pmf'), 'wb') as pmfFile:
+            pmfFile.write(b'pmf' * 100)
+        versionInfo = publishManifest(bundleDir, published=PUBLISHED)
+        publishedTime = time.mktime(PUBLISHED.timetuple())
+        metrics = ExportMetrics(self.textfilePath, bundleDir=bundleDir, clock=FakeClock(publishedTime + 90.0))
+        metrics.runStarted('hourly')
+        metrics.runFinished('hourly', 60.0, True, versionInfo=versionInfo)
+        with open(self.textfilePath) as textFile:
+            text = textFile.read()
+        self.assertEqual(seriesValue(text, PREFIX + 'published_version'), 1)
+        self.assertEqual(seriesValue(text, PREFIX + 'published_bytes'), 300)
+        self.assertEqual(seriesValue(text, PREFIX + 'published_timestamp_seconds'), publishedTime)
+        self.assertEqual(seriesValue(text, PREFIX + 'publication_age_seconds'), 90)
+        self.assertEqual(seriesValue(text, PREFIX + 'bytes_published_total'), 300)
+        self.assertEqual(seriesValue(text, PREFIX + 'runs_total{tier="hourly",result="published"}'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests of which classes arcreaderexport.optimize rewrites in spatial order, on the local backend.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.annotation import ANNOTATION_FIELDS  # noqa: E402
+from arcreaderexport.backends import LocalBackend  # noqa: E402
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+from arcreaderexport.optimize import GdbOptimizer  # noqa: E402
+
+ROWS = 200
+
+
+class OptimizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='optimizetest_')
+        self.backend = LocalBackend(self.workDir)
+        self.workspacePath = self.workDir + '/Output.gdb'
+        self.backend.createWorkspace(self.workDir, 'Output.gdb')
+        store = self.backend.store(self.workspacePath)
+        rng = random.Random(1)
+        annotationFields = [('AnnotationClassID', 'Integer'), ('Element', 'Blob'), ('Status', 'Integer'),
+                            ('TextString', 'String')]
+        self.assertEqual(tuple(name for name, _ in annotationFields), ANNOTATION_FIELDS)
+        for name, fields in (('Water/Hydrants', []), ('Water/HydrantsAnno', annotationFields),
+                             ('Water/EngGPSPts', [])):
+            store.createClass(name, fields, 'Point')
+            store.openInsert(name, ['SHAPE@']).insertRows(
+                [(pointWkb(rng.uniform(0, 1000), rng.uniform(0, 1000)),) for _ in range(ROWS)])
+
+    def tearDown(self):
+        self.backend._closeStore(self.workspacePath)
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def reordered(self, **options):
+        summary = GdbOptimizer(self.backend, minRows=ROWS).optimize(self.workspacePath, **options)
+        return sorted(name for name, table in summary['tables'].items() if table.get('ordered'))
+
+    def test_annotation_is_never_reordered(self):
+        self.assertEqual(self.reordered(), ['Water/EngGPSPts', 'Water/Hydrants'])
+
+    def test_only_the_given_classes_are_reordered(self):
+        self.assertEqual(self.reordered(classes=set(['Water/Hydrants', 'Water/HydrantsAnno'])), ['Water/Hydrants'])
+
+    def test_plain_copy_classes(self):
+        plain = layers.plainCopyClasses(fdToFc_Dict={'Cadastral': ['ParcelAnno', 'Parcels', 'EngGPSPts']}, tiers={})
+        self.assertEqual(plain - set(['ParcelFeatures/Sections_SLC']), set(['Cadastral/Parcels']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests of LAN peer mode (arcreaderexport.peer & distserver.PeerServer) with laptops as
+separate processes on loopback. Serving needs Python 3.7+; skipped on 2.7.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.manifest import publishManifest, readVersion  # noqa: E402
+from arcreaderexport.peer import DISCOVERY_QUERY, PeerSource, discoverPeers  # noqa: E402
+from arcreaderexport.sync import HttpSource, LocalSource, SyncClient  # noqa: E402
+
+try:
+    import asyncio
+    from arcreaderexport import distserver
+    HAVE_DISTSERVER = True
+except (ImportError, SyntaxError):
+    HAVE_DISTSERVER = False
+
+GDB = 'PortableDuluth.gdb'
+
+
+def freePort(kind=socket.SOCK_STREAM):
+    probe = socket.socket(socket.AF_INET, kind)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def writeBundle(bundleDir):
+    os.makedirs(os.path.join(bundleDir, GDB))
+    for index in range(3):
+        with open(os.path.join(bundleDir, GDB, 'a{0:08x}.gdbtable'.format(index + 1)), 'wb') as dataFile:
+            dataFile.write(os.urandom(5000))
+    with open(os.path.join(bundleDir, 'TapNCurb.pmf'), 'wb') as pmfFile:
+        pmfFile.write(b'pmf')
+    return publishManifest(bundleDir, blockSize=1024)
+
+
+@unittest.skipUnless(HAVE_DISTSERVER, 'serving needs Python 3.7+')
+class PeerProcessTest(unittest.TestCase):
+    """A share, two laptops serving their copy with 'python -m arcreaderexport.peer' & a third pulling from them."""
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='peertest_')
+        self.share = os.path.join(self.workDir, 'share')
+        self.published = writeBundle(self.share)
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def laptop(self, name):
+        localDir = os.path.join(self.workDir, name)
+        SyncClient(LocalSource(self.share), localDir, streams=2).sync()
+        return localDir
+
+    def servePeer(self, localDir):
+        """Starts a peer process serving localDir; returns its (port, discovery port)."""
+        port, discoveryPort = freePort(), freePort(socket.SOCK_DGRAM)
+        self.processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'arcreaderexport.peer', '--local', localDir, '--host', '127.0.0.1',
+             '--port', str(port), '--discovery-port', str(discoveryPort)], cwd=REPO_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return port, discoveryPort
+            except (IOError, OSError):
+                time.sleep(0.1)
+        self.fail('peer on port {0} did not start'.format(port))
+
+    def test_sync_from_peers_skips_a_peer_with_a_bad_install(self):
+        goodPort, goodDiscovery = self.servePeer(self.laptop('good'))
+        bad = self.laptop('bad')
+        with open(os.path.join(bad, GDB, 'a00000001.gdbtable'), 'r+b') as dataFile:
+            dataFile.write(b'corrupted')
+        badPort, badDiscovery = self.servePeer(bad)
+
+        self.assertEqual(discoverPeers(timeout=2, port=goodDiscovery, address='127.0.0.1'),
+                         [('127.0.0.1:{0}'.format(goodPort), self.published['version'])])
+        self.assertEqual(discoverPeers(timeout=1, port=badDiscovery, address='127.0.0.1'), [])
+        self.assertIsNone(HttpSource('http://127.0.0.1:{0}'.format(badPort)).readVersion())
+
+        source = PeerSource(LocalSource(self.share), ['127.0.0.1:{0}'.format(badPort),
+                                                      '127.0.0.1:{0}'.format(goodPort)])
+        target = os.path.join(self.workDir, 'target')
+        result = SyncClient(source, target, streams=2).sync()
+        self.assertEqual((result['result'], readVersion(target)['version']), ('synced', self.published['version']))
+        self.assertEqual([peer.port for peer in source.peers], [goodPort])
+        self.assertEqual(source.stats['primaryBytes'], 0)
+        for name in sorted(os.listdir(os.path.join(self.share, GDB))):
+            with open(os.path.join(self.share, GDB, name), 'rb') as published:
+                with open(os.path.join(target, GDB, name), 'rb') as installed:
+                    self.assertEqual(installed.read(), published.read())
+
+
+@unittest.skipUnless(HAVE_DISTSERVER, 'serving needs Python 3.7+')
+class PeerServerTest(unittest.TestCase):
+    """PeerServer checks the installed files once per version, in a worker thread, before serving."""
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='peertest_')
+        self.localDir = os.path.join(self.workDir, 'laptop')
+        self.published = writeBundle(self.localDir)
+        self.checks = []
+        self.verifyInstalled = distserver.verifyInstalled
+        distserver.verifyInstalled = self.recordCheck
+
+    def tearDown(self):
+        distserver.verifyInstalled = self.verifyInstalled
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def recordCheck(self, bundleDir):
+        self.checks.append(threading.current_thread().name)
+        return self.verifyInstalled(bundleDir)
+
+    def test_installed_files_are_checked_once_off_the_event_loop(self):
+        loop = asyncio.new_event_loop()
+        server = distserver.PeerServer(self.localDir, checkInterval=0.05)
+        try:
+            port = loop.run_until_complete(server.start('127.0.0.1', 0))
+            self.assertEqual(len(self.checks), 1)
+            protocol = distserver.DiscoveryProtocol(server, port)
+            answers = []
+            protocol.transport = type('Transport', (), {'sendto': lambda _, data, sender: answers.append(data)})()
+            for _ in range(20):
+                protocol.datagram_received(DISCOVERY_QUERY, ('127.0.0.1', 1))
+            loop.run_until_complete(asyncio.sleep(0.3))
+            self.assertEqual(len(answers), 20)
+            self.assertEqual(len(self.checks), 1)
+            self.assertNotEqual(self.checks[0], threading.current_thread().name)
+        finally:
+            loop.run_until_complete(server.close())
+            loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
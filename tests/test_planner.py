@@ -0,0 +1,58 @@
+"""
+Tests of the run history of arcreaderexport.planner.
+
+    python -m pytest tests        (or python -m unittest discover tests)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.planner import History, loadReports  # noqa: E402
+
+
+def task(name, duration, **extra):
+    result = {'name': name, 'source': 'sde', 'status': 'done', 'duration': duration, 'rows': 1000}
+    result.update(extra)
+    return result
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reportDir = tempfile.mkdtemp(prefix='planner_')
+
+    def tearDown(self):
+        shutil.rmtree(self.reportDir, ignore_errors=True)
+
+    def writeReport(self, started, tier, tasks):
+        with open(os.path.join(self.reportDir, 'RunReport_{0}.json'.format(started)), 'w') as reportFile:
+            json.dump({'summary': {'started': started, 'runName': tier}, 'tasks': tasks}, reportFile)
+
+    def test_reports_of_the_tier_only(self):
+        self.writeReport('2024-01-01T01', 'weekly', [task('Parcels', 600.0)])
+        self.writeReport('2024-01-01T02', 'hourly', [task('Parcels', 20.0)])
+        self.writeReport('2024-01-01T03', 'weekly', [task('Parcels', 620.0)])
+        reports = loadReports(self.reportDir, tier='weekly')
+        self.assertEqual([report['summary']['started'] for report in reports], ['2024-01-01T01', '2024-01-01T03'])
+        self.assertEqual(History(reports).durations['Parcels'], 610.0)
+        self.assertEqual(len(loadReports(self.reportDir)), 3)
+        self.assertEqual(len(loadReports(self.reportDir, last=1, tier='weekly')), 1)
+
+    def test_tasks_that_did_not_copy_are_left_out(self):
+        history = History([{'tasks': [task('Parcels', 600.0), task('Parcels', 2.0, content='unchanged'),
+                                      task('Parcels', 3.0, content='reused'), task('Hydrants', 1.0, mode='delta'),
+                                      task('Hydrants', 40.0, mode='full'), task('Roads', 90.0, content='copied')]}])
+        self.assertEqual(history.durations, {'Parcels': 600.0, 'Hydrants': 40.0, 'Roads': 90.0})
+        self.assertAlmostEqual(history.rowsPerSecond['sde'], 3000 / 730.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Tests of the task profiles of arcreaderexport.profiling: folding cProfile stats, sampling tasks running in
+parallel & merging the parts of several processes into a .folded file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from arcreaderexport.profiling import TaskProfiler, foldStats, mergeProfiles  # noqa: E402
+
+MAIN = ('export.py', 10, 'main')
+COPY = ('steps.py', 20, 'copyClass')
+CLIP = ('steps.py', 30, 'clip')
+READ = ('~', 0, "<method 'read' of '_io.FileIO' objects>")
+
+# pstats entries (primitive calls, calls, own time, cumulative time, {caller: same per caller}): main calls
+## copyClass & clip, which both read; read spends 0.25 s under copyClass & 0.35 s under clip.
+STATS = {
+    MAIN: (1, 1, 0.1, 0.95, {}),
+    COPY: (1, 1, 0.2, 0.45, {MAIN: (1, 1, 0.2, 0.45)}),
+    CLIP: (1, 1, 0.05, 0.4, {MAIN: (1, 1, 0.05, 0.4)}),
+    READ: (4, 4, 0.6, 0.6, {COPY: (2, 2, 0.25, 0.25), CLIP: (2, 2, 0.35, 0.35)}),
+}
+
+# Profiles one task in a new process (a worker of validateOutput) & writes its part
+WORKER_PROCESS = """
+import json, sys
+sys.path.insert(0, {repoDir!r})
+from arcreaderexport.profiling import processProfiler
+profiler, isWorker = processProfiler(json.loads(sys.argv[1]))
+profiler.call('validate', 'Parcels', sorted, (list(range(20000, 0, -1)),))
+profiler.writePart()
+"""
+
+FOLDED_LINE = re.compile(r'^[^; ]+;[^; ]+(;[^;]+)* \d+$')
+
+
+def spin(seconds):
+    """Keeps the thread busy in Python for seconds."""
+    ended = time.time() + seconds
+    while time.time() < ended:
+        pass
+
+
+def spinAgain(seconds):
+    spin(seconds)
+
+
+class FoldStatsTest(unittest.TestCase):
+
+    def test_self_time_is_split_across_callers(self):
+        folded = foldStats(STATS, 'copy;Parcels')
+        self.assertEqual(folded, {
+            'copy;Parcels;main (export.py:10)': 100000,
+            'copy;Parcels;main (export.py:10);copyClass (steps.py:20)': 200000,
+            'copy;Parcels;main (export.py:10);copyClass (steps.py:20);' + READ[2]: 250000,
+            'copy;Parcels;main (export.py:10);clip (steps.py:30)': 50000,
+            'copy;Parcels;main (export.py:10);clip (steps.py:30);' + READ[2]: 350000})
+        # the own time of every function adds up to the cumulative time of the root call
+        self.assertEqual(sum(folded.values()), 950000)
+
+
+class TaskProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='profilingtest_')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def test_sample_mode_keeps_the_stacks_of_each_thread(self):
+        profiler = TaskProfiler('sample', interval=0.002, partsDir=os.path.join(self.workDir, 'parts'))
+        threads = [threading.Thread(target=profiler.call, args=('copy', name, func, (0.3,)))
+                   for name, func in (('Parcels', spin), ('Hydrants', spinAgain))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted((task['name'], task['calls']) for task in profiler.tasks.values()),
+                         [('Hydrants', 1), ('Parcels', 1)])
+        stacks = dict((name, [stack.split(';')[2:] for stack in profiler.folded
+                              if stack.startswith('copy;' + name + ';')]) for name in ('Parcels', 'Hydrants'))
+        self.assertTrue(stacks['Parcels'] and stacks['Hydrants'])
+        # the stacks start at the task's function: no frame of the profiler or the other thread
+        self.assertEqual(set(frames[0].split(' ')[0] for frames in stacks['Parcels']), set(['spin']))
+        self.assertEqual(set(frames[0].split(' ')[0] for frames in stacks['Hydrants']), set(['spinAgain']))
+        self.assertEqual([frames for frames in stacks['Parcels'] if 'spinAgain' in ';'.join(frames)], [])
+        sampled = sum(profiler.folded.values()) / 1e6
+        self.assertTrue(0.3 < sampled < 1.5, sampled)
+
+    def test_parts_of_two_processes_add_up(self):
+        partsDir = os.path.join(self.workDir, 'parts')
+        profiler = TaskProfiler('cprofile', partsDir=partsDir)
+        profiler.call('validate', 'Parcels', sorted, (list(range(20000, 0, -1)),))
+        profiler.call('copy', 'Hydrants', sorted, (list(range(100)),))
+        profiler.writePart()
+        subprocess.check_call([sys.executable, '-c', WORKER_PROCESS.format(repoDir=REPO_DIR),
+                               json.dumps(profiler.settings())])
+        parts = []
+        for partName in sorted(os.listdir(partsDir)):
+            if partName.endswith('.json'):
+                with open(os.path.join(partsDir, partName)) as partFile:
+                    parts.append(json.load(partFile))
+        self.assertEqual(len(parts), 2)
+        section = mergeProfiles(partsDir, os.path.join(self.workDir, 'Profile_hourly_20240501'))
+        self.assertEqual((section['mode'], section['processes'], section['tasks']), ('cprofile', 2, 2))
+        self.assertTrue(os.path.exists(section['stats']))
+        calls = dict((task['name'], task['calls']) for task in section['slowestTasks'])
+        self.assertEqual(calls, {'Parcels': 2, 'Hydrants': 1})
+        expected = {}
+        for part in parts:
+            for stack, microseconds in part['folded'].items():
+                expected[stack] = expected.get(stack, 0) + microseconds
+        with open(section['folded']) as foldedFile:
+            lines = foldedFile.read().splitlines()
+        self.assertEqual(dict(line.rsplit(' ', 1) for line in lines),
+                         dict((stack, str(microseconds)) for stack, microseconds in expected.items()))
+        self.assertEqual(section['profiledSeconds'], round(sum(expected.values()) / 1e6, 3))
+
+    def test_folded_lines_are_stacks_and_microseconds(self):
+        profiler = TaskProfiler('cprofile', partsDir=os.path.join(self.workDir, 'parts'))
+        profiler.folded = foldStats(STATS, 'copy;Parcels')
+        section = profiler.finish(self.workDir, 'Profile_hourly_20240501')
+        with open(section['folded']) as foldedFile:
+            lines = foldedFile.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines, sorted(lines))
+        for line in lines:
+            self.assertTrue(FOLDED_LINE.match(line), line)
+        self.assertEqual(lines[0], 'copy;Parcels;main (export.py:10) 100000')
+        self.assertFalse(os.path.exists(os.path.join(self.workDir, 'parts')))
+
+
+if __name__ == '__main__':
+    unittest.main()
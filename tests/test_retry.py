@@ -0,0 +1,101 @@
+"""
+Tests of the per-source circuit breakers of arcreaderexport.retry.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.retry import CircuitBreaker, RetryPolicy, TaskRunner  # noqa: E402
+
+SOURCE = 'GISDB.sde'
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def openBreaker(clock):
+    breaker = CircuitBreaker(SOURCE, failureThreshold=2, cooldown=60.0, clock=clock)
+    breaker.recordFailure()
+    breaker.recordFailure()
+    return breaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_half_open_admits_a_single_probe(self):
+        breaker = openBreaker(self.clock)
+        self.assertFalse(breaker.allow())
+        self.clock.now += 60.0
+        self.assertEqual([breaker.allow() for _ in range(3)], [True, False, False])
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.recordSuccess()
+        self.assertEqual([breaker.allow() for _ in range(3)], [True, True, True])
+
+    def test_failed_probe_opens_the_breaker_again(self):
+        breaker = openBreaker(self.clock)
+        self.clock.now += 60.0
+        self.assertTrue(breaker.allow())
+        breaker.recordFailure()
+        self.assertEqual((breaker.state, breaker.timesOpened), (CircuitBreaker.OPEN, 2))
+        self.assertFalse(breaker.allow())
+        self.clock.now += 60.0
+        self.assertEqual([breaker.allow(), breaker.allow()], [True, False])
+
+    def test_probe_failing_with_a_lock_closes_the_breaker(self):
+        breaker = openBreaker(self.clock)
+        self.clock.now += 60.0
+        self.assertTrue(breaker.allow())
+        breaker.recordFailure(transient=False)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual([breaker.allow(), breaker.allow()], [True, True])
+
+
+class TaskRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.runner = TaskRunner(policy=RetryPolicy(), failureThreshold=2, cooldown=60.0, sleep=self.clock.sleep,
+                                 clock=self.clock)
+        self.runner.breakers[SOURCE] = openBreaker(self.clock)
+        self.clock.now += 60.0
+
+    def test_tasks_arriving_during_the_probe_are_deferred(self):
+        results = []
+
+        def probe():
+            results.append(self.runner.run('Hydrants', SOURCE, lambda: None))
+        self.assertEqual(self.runner.run('Parcels', SOURCE, probe), 'done')
+        self.assertEqual(results, ['deferred'])
+        self.assertEqual([task['name'] for task in self.runner.deferred], ['Hydrants'])
+        self.assertEqual(self.runner.runDeferred(), 1)
+        self.assertEqual(self.runner.breakers[SOURCE].state, CircuitBreaker.CLOSED)
+
+    def test_probe_retried_on_a_lock_is_not_refused(self):
+        attempts = []
+
+        def lockedOnce():
+            attempts.append(self.clock.now)
+            if len(attempts) == 1:
+                raise RuntimeError('ERROR 000464: Cannot get exclusive schema lock.')
+        self.assertEqual(self.runner.run('Parcels', SOURCE, lockedOnce), 'done')
+        self.assertEqual(len(attempts), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
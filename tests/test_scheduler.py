@@ -0,0 +1,102 @@
+"""
+Tests of arcreaderexport.scheduler: which tier is due, retries of failed runs & the lock file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.scheduler import RETRY_MINUTES, Scheduler  # noqa: E402
+
+MONDAY_9 = datetime.datetime(2024, 6, 3, 9, 5)      # an hourly window
+
+
+class Runner(object):
+    """Stands in for subprocess.call: records the commands & returns the next exit code."""
+
+    def __init__(self, *exitCodes):
+        self.exitCodes = list(exitCodes)
+        self.commands = []
+
+    def __call__(self, command):
+        self.commands.append(command)
+        return self.exitCodes.pop(0)
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='schedulertest_')
+        self.statePath = os.path.join(self.workDir, 'ExportSchedule.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def scheduler(self, runner):
+        return Scheduler(['export'], statePath=self.statePath, runner=runner)
+
+    def test_failed_run_is_retried_after_the_retry_interval(self):
+        runner = Runner(1, 0)
+        scheduler = self.scheduler(runner)
+        self.assertEqual(scheduler.runDue(MONDAY_9), ('hourly', 1))
+        self.assertEqual(scheduler.readState()['lastRuns'], {})
+        self.assertEqual(scheduler.runDue(MONDAY_9 + datetime.timedelta(minutes=5)), (None, None))
+        self.assertEqual(scheduler.runDue(MONDAY_9 + datetime.timedelta(minutes=RETRY_MINUTES)), ('hourly', 0))
+        self.assertEqual(scheduler.readState()['lastRuns'], {'hourly': '2024-06-03T09:35:00'})
+        self.assertEqual(scheduler.runDue(MONDAY_9 + datetime.timedelta(minutes=40)), (None, None))
+        self.assertEqual(len(runner.commands), 2)
+
+    def test_lock_of_a_running_process_is_kept(self):
+        with open(self.statePath + '.lock', 'w') as lockFile:
+            lockFile.write(str(os.getppid()))
+        runner = Runner(0)
+        self.assertEqual(self.scheduler(runner).runDue(MONDAY_9), (None, None))
+        self.assertEqual(runner.commands, [])
+
+    def test_lock_of_an_ended_process_is_replaced(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        with open(self.statePath + '.lock', 'w') as lockFile:
+            lockFile.write(str(process.pid))
+        runner = Runner(0)
+
+        def run(command):
+            with open(self.statePath + '.lock') as lockFile:
+                self.assertEqual(lockFile.read(), str(os.getpid()))
+            return runner(command)
+        self.assertEqual(self.scheduler(run).runDue(MONDAY_9), ('hourly', 0))
+        self.assertFalse(os.path.exists(self.statePath + '.lock'))
+
+    def test_stale_lock_replaced_by_another_scheduler_meanwhile_is_kept(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        with open(self.statePath + '.lock', 'w') as lockFile:
+            lockFile.write(str(process.pid))
+        first, second = self.scheduler(Runner()), self.scheduler(Runner())
+        staleLock = second._staleLock
+        replaced = []
+
+        def staleThenReplaced(path, now):
+            # the other scheduler replaces the stale lock between this one reading it & claiming it
+            result = staleLock(path, now)
+            if not replaced:
+                replaced.append(first._lock(now))
+            return result
+        second._staleLock = staleThenReplaced
+        self.assertFalse(second._lock(MONDAY_9))
+        self.assertEqual(replaced, [True])
+        with open(self.statePath + '.lock') as lockFile:
+            self.assertEqual(lockFile.read(), str(os.getpid()))
+        self.assertEqual(sorted(os.listdir(self.workDir)), ['ExportSchedule.json.lock'])
+
+
+if __name__ == '__main__':
+    unittest.main()
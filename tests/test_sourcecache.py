@@ -0,0 +1,118 @@
+"""
+Tests of arcreaderexport.sourcecache reads & the streamed copies made from them (need pyarrow).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.localstore import LocalStore, pointWkb, polygonWkb  # noqa: E402
+from arcreaderexport.sourcecache import HAVE_ARROW  # noqa: E402
+from arcreaderexport.spatialorder import HILBERT  # noqa: E402
+from arcreaderexport.streamcopy import curveOrderBatches, streamCopy  # noqa: E402
+
+
+class RecordingReader(object):
+    """Reader that passes reads to a LocalStore & records the fields of each."""
+
+    def __init__(self, store):
+        self.store = store
+        self.reads = []
+
+    def describe(self, path):
+        return self.store.describe(path)
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        self.reads.append(list(fields))
+        return self.store.iterBatches(path, fields, batchSize, where=where)
+
+
+class RecordingWriter(object):
+    """Writer (like streamcopy.ArcpyWriter) that keeps the fields & rows inserted."""
+
+    def __init__(self):
+        self.fields = None
+        self.rows = []
+
+    def createLike(self, outputPath, sourcePath, description):
+        pass
+
+    def openInsert(self, path, fields):
+        self.fields = list(fields)
+        return self
+
+    def insertRows(self, rows):
+        self.rows.extend(rows)
+
+    def close(self):
+        pass
+
+
+@unittest.skipUnless(HAVE_ARROW, 'pyarrow is not installed')
+class CachedReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        from arcreaderexport.sourcecache import CachedReader, SourceCache
+        self.workDir = tempfile.mkdtemp(prefix='cachetest_')
+        self.store = LocalStore(os.path.join(self.workDir, 'source.sqlite'))
+        self.store.createClass('Parcels', [('PIN', 'String')], 'Polygon')
+        self.store.openInsert('Parcels', ['PIN', 'SHAPE@']).insertRows(
+            [('{0:04d}'.format(number), polygonWkb([[(number, 0), (number + 1, 0), (number + 1, 1), (number, 0)]]))
+             for number in range(25)])
+        self.source = RecordingReader(self.store)
+        self.cache = SourceCache(os.path.join(self.workDir, 'cache'), reader=self.source, batchSize=10)
+        self.cache.ensure('Parcels')
+        self.reader = CachedReader(self.cache, self.source)
+        del self.source.reads[:]
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def test_stream_copy_from_cache_inserts_wkb(self):
+        writer = RecordingWriter()
+        stats = streamCopy(self.reader, writer, 'Parcels', 'Out', batchSize=10)
+        self.assertEqual(stats['rows'], 25)
+        self.assertEqual(writer.fields[-1], 'SHAPE@WKB')
+        self.assertTrue(all(isinstance(row[-1], bytes) for row in writer.rows))
+        self.assertEqual(self.source.reads, [])       # every row came from the cache
+
+    def test_geometry_objects_are_read_from_the_source(self):
+        rows = [row for batch in self.reader.iterBatches('Parcels', ['PIN', 'SHAPE@'], 10) for row in batch]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(self.source.reads, [['PIN', 'SHAPE@']])
+
+    def test_wkb_and_derived_tokens_are_served_from_the_cache(self):
+        rows = [row for batch in self.reader.iterBatches('Parcels', ['OID@', 'SHAPE@WKB', 'SHAPE@XY'], 10)
+                for row in batch]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(self.source.reads, [])
+        expected = [row for batch in self.store.iterBatches('Parcels', ['OID@', 'SHAPE@XY'], 10) for row in batch]
+        self.assertEqual([(row[0], tuple(row[2])) for row in rows], [(oid, tuple(xy)) for oid, xy in expected])
+
+    def test_sorted_copy_from_the_cache_does_not_read_the_source(self):
+        rng = random.Random(1)
+        self.store.createClass('Hydrants', [('FACILITYID', 'Integer')], 'Point')
+        self.store.openInsert('Hydrants', ['FACILITYID', 'SHAPE@']).insertRows(
+            [(number, pointWkb(rng.uniform(0, 1000), rng.uniform(0, 1000))) for number in range(200)])
+        self.cache.ensure('Hydrants')
+        del self.source.reads[:]
+        writer = RecordingWriter()
+        stats = streamCopy(self.reader, writer, 'Hydrants', 'Out', batchSize=30, spatialOrder=HILBERT)
+        self.assertEqual(self.source.reads, [])
+        self.assertEqual((stats['rows'], stats['batches'], stats['spatialOrder']), (200, 7, HILBERT))
+        expected = [row for batch in curveOrderBatches(self.store, 'Hydrants', ['FACILITYID', 'SHAPE@WKB'], 30,
+                                                       self.store.describe('Hydrants'), HILBERT) for row in batch]
+        self.assertEqual(writer.rows, expected)
+        self.assertNotEqual([row[0] for row in writer.rows], list(range(200)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Tests of the export steps (arcreaderexport.steps) on the local backend: the backup & restore of an incremental
+export and the copies of a flattened network dataset.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import layers  # noqa: E402
+from arcreaderexport.annotation import AnnotationExport  # noqa: E402
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.localstore import pointWkb  # noqa: E402
+from arcreaderexport.retry import RetryPolicy, TaskRunner  # noqa: E402
+from arcreaderexport.runreport import RunReport  # noqa: E402
+from arcreaderexport.steps import ExportSteps, sdeClassPath  # noqa: E402
+
+DATASET = 'StormSewerNetwork'
+GDB = layers.PUBLISH_DIR + '/PortableDuluth.gdb'
+PLAIN_CLASSES = ['stsGravityMain', 'stsManhole', 'stsCatchBasin']
+NETWORK_CLASSES = PLAIN_CLASSES + ['stsAnno', 'stsFitting', 'stsSystemValve']
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class WholeClassCapture(object):
+    """Change capture of every class, copying it whole (the first sync of changecapture.ChangeCapture)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def handles(self, sourcePath):
+        return True
+
+    def sync(self, sourcePath, outputPath):
+        outDatasetPath, name = outputPath.rsplit('/', 1)
+        self.backend.copyClass(sourcePath, outDatasetPath, name)
+        return {'mode': 'full', 'rows': self.backend.describe(outputPath)['count']}
+
+
+class BackupClassesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='stepstest_')
+        self.backend = LocalBackend(self.workDir)
+        self.backend.createWorkspace(self.workDir, 'Portable.gdb')
+        self.gdb = self.workDir + '/Portable.gdb'
+        store = self.backend.store(self.gdb)
+        for name in ('GPS/EngGPSPts', 'Water/Hydrants'):
+            store.createClass(name, [('NAME', 'String')], 'Point')
+            store.openInsert(name, ['NAME', 'SHAPE@']).insertRows([('old', pointWkb(1, 2))])
+        logger = logging.getLogger('stepstest')
+        logger.addHandler(logging.NullHandler())
+        self.steps = ExportSteps(self.backend, None, logger)
+
+    def tearDown(self):
+        for name in ('Portable.gdb', 'Portable_backup.gdb'):
+            self.backend._closeStore(self.workDir + '/' + name)
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def names(self, path):
+        return [row[0] for batch in self.backend.iterBatches(path, ['NAME'], 100) for row in batch]
+
+    def test_only_the_classes_of_the_run_are_backed_up_and_restored(self):
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            backedUp = self.steps.backupClasses(['GPS/EngGPSPts', 'GPS/NotYetExported'], self.workDir,
+                                                'Portable.gdb', 'Portable_backup.gdb')
+            self.assertEqual(backedUp, ['GPS/EngGPSPts'])
+            self.assertEqual(self.backend.listClasses(self.workDir + '/Portable_backup.gdb'), ['GPS__EngGPSPts'])
+            self.backend.deleteRows(self.gdb + '/GPS/EngGPSPts', '1 = 1')
+            self.backend.openInsert(self.gdb + '/GPS/EngGPSPts', ['NAME', 'SHAPE@']).insertRows([('new', None)])
+            self.steps.restoreBackupClasses(backedUp, self.workDir, 'Portable.gdb', 'Portable_backup.gdb')
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        self.assertEqual(self.names(self.gdb + '/GPS/EngGPSPts'), ['old'])
+        self.assertEqual(self.names(self.gdb + '/Water/Hydrants'), ['old'])
+
+
+class NetworkDatasetCopyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='stepstest_')
+        self.backend = LocalBackend(self.workDir)
+        self.backend.createWorkspace(layers.PUBLISH_DIR, 'PortableDuluth.gdb')
+        self.backend.createDataset(GDB, DATASET, None)
+        for number, fc in enumerate(NETWORK_CLASSES):
+            workspacePath, parts = splitWorkspace(sdeClassPath(layers.SDE_CONNECTION, DATASET, fc))
+            store = self.backend.store(workspacePath)
+            store.createClass('/'.join(parts), [('FACILITYID', 'String')], 'Point')
+            store.openInsert('/'.join(parts), ['FACILITYID', 'SHAPE@']).insertRows(
+                [('{0}{1}'.format(fc, row), pointWkb(number, row)) for row in range(number + 1)])
+        self.streaming, self.changeCapture = layers.STREAMING_COPY_CLASSES, layers.CHANGE_CAPTURE_CLASSES
+        layers.STREAMING_COPY_CLASSES, layers.CHANGE_CAPTURE_CLASSES = ('stsFitting',), ('stsSystemValve',)
+        self.bulkCopies, self.failures = [], {}
+        copyClasses, copyClass = self.backend.copyClasses, self.backend.copyClass
+
+        def recordingCopyClasses(inPaths, outDatasetPath, names):
+            self.bulkCopies.append(list(names))
+            copyClasses(inPaths, outDatasetPath, names)
+
+        def failingCopyClass(inPath, outDatasetPath, name):
+            if self.failures.get(name):
+                self.failures[name] -= 1
+                raise IOError('cannot read a row of {0}'.format(name))
+            copyClass(inPath, outDatasetPath, name)
+        self.backend.copyClasses, self.backend.copyClass = recordingCopyClasses, failingCopyClass
+        self.clock = FakeClock()
+        self.report = RunReport(clock=self.clock)
+        runner = TaskRunner(policy=RetryPolicy(), report=self.report, sleep=self.clock.sleep, clock=self.clock)
+        logger = logging.getLogger('stepstest')
+        logger.addHandler(logging.NullHandler())
+        self.steps = ExportSteps(self.backend, runner, logger, changeCapture=WholeClassCapture(self.backend),
+                                 annotationExport=AnnotationExport(self.backend, {}))
+        self.stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+        layers.STREAMING_COPY_CLASSES, layers.CHANGE_CAPTURE_CLASSES = self.streaming, self.changeCapture
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def tasks(self):
+        return [(task['name'], task['status'], task['attempts']) for task in self.report.tasks]
+
+    def assertEveryClassCopied(self):
+        for number, fc in enumerate(NETWORK_CLASSES):
+            self.assertEqual(self.backend.describe(GDB + '/' + DATASET + '/' + fc)['count'], number + 1, fc)
+
+    def test_plain_classes_are_copied_in_one_bulk_copy(self):
+        self.steps.copyFCtoFC(layers.SDE_CONNECTION, {DATASET: NETWORK_CLASSES}, GDB)
+        self.assertEqual(self.bulkCopies, [PLAIN_CLASSES])
+        # the annotation, streamed & change-captured classes are each a task of their own
+        self.assertEqual(self.tasks(), [(DATASET, 'done', 1), ('stsAnno', 'done', 1), ('stsFitting', 'done', 1),
+                                        ('stsSystemValve', 'done', 1)])
+        self.assertEqual(self.report.tasks[0]['copied'], len(PLAIN_CLASSES))
+        self.assertEveryClassCopied()
+
+    def test_failed_bulk_copy_falls_back_to_retried_class_copies(self):
+        # an unknown error is tried twice: both bulk attempts fail on stsGravityMain, then stsManhole fails once
+        self.failures = {'stsGravityMain': 2, 'stsManhole': 1}
+        self.steps.copyFCtoFC(layers.SDE_CONNECTION, {DATASET: NETWORK_CLASSES}, GDB)
+        self.assertEqual(self.bulkCopies, [PLAIN_CLASSES] * 2)
+        self.assertEqual(self.tasks(), [(DATASET, 'failed', 2), ('stsGravityMain', 'done', 1),
+                                        ('stsManhole', 'done', 2), ('stsCatchBasin', 'done', 1),
+                                        ('stsAnno', 'done', 1), ('stsFitting', 'done', 1),
+                                        ('stsSystemValve', 'done', 1)])
+        self.assertEveryClassCopied()
+
+
+if __name__ == '__main__':
+    unittest.main()
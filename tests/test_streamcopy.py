@@ -0,0 +1,69 @@
+"""
+Tests of the batched copies of arcreaderexport.streamcopy through a LocalBackend.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.backends import LocalBackend, splitWorkspace  # noqa: E402
+from arcreaderexport.localstore import lineWkb  # noqa: E402
+from arcreaderexport.streamcopy import copyFields, streamCopy  # noqa: E402
+
+SOURCE = 'Database Connections/GISDB.sde/sde.SDE.SanitarySewerNetwork/sde.SDE.ssGravityMain'
+OUTPUT = 'PortableDuluth.gdb/SanitarySewerNetwork/ssGravityMain'
+COPIED = [('FACILITYID', 'String'), ('DIAMETER', 'Double'), ('INSTALLED', 'Date')]
+SKIPPED = [('GLOBALID', 'GlobalID'), ('INSPECTIONS', 'Blob'), ('SCAN', 'Raster'), ('Shape_Length', 'Double'),
+           ('SHAPE.STLength()', 'Double')]
+ROWS = 23
+
+
+class StreamCopyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='streamcopytest_')
+        self.backend = LocalBackend(self.workDir)
+        self.backend.createWorkspace(self.workDir, 'PortableDuluth.gdb')
+        self.backend.createDataset('PortableDuluth.gdb', 'SanitarySewerNetwork', 'NAD 1983 UTM Zone 15N')
+        workspacePath, parts = splitWorkspace(SOURCE)
+        self.backend.store(workspacePath).createClass('/'.join(parts), COPIED + SKIPPED, 'Polyline')
+        inserter = self.backend.openInsert(SOURCE, [name for name, _ in COPIED + SKIPPED] + ['SHAPE@'])
+        inserter.insertRows([('SS{0:04d}'.format(number), 8.0 + number, '2001-05-{0:02d}'.format(number % 28 + 1),
+                              '{{{0:08d}-0000-0000-0000-000000000000}}'.format(number), b'\x00\x01', 'scan',
+                              10.0 * number, 10.0 * number,
+                              lineWkb([(number, 0.0), (number, 10.0 * number + 1.0)])) for number in range(ROWS)])
+        inserter.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def rows(self, path, fields):
+        return [tuple(bytes(value) if isinstance(value, (bytearray, memoryview)) else value for value in row)
+                for batch in self.backend.iterBatches(path, fields, 100) for row in batch]
+
+    def test_copy_fields_leave_out_database_maintained_fields(self):
+        self.assertEqual(copyFields(self.backend.describe(SOURCE)), ['FACILITYID', 'DIAMETER', 'INSTALLED', 'SHAPE@'])
+        self.assertEqual(copyFields(self.backend.describe(SOURCE), 'SHAPE@WKB')[-1], 'SHAPE@WKB')
+
+    def test_small_batches_copy_every_row_and_field(self):
+        stats = streamCopy(self.backend, self.backend, SOURCE, OUTPUT, batchSize=5)
+        self.assertEqual((stats['rows'], stats['batches'], stats['batchSize']), (ROWS, 5, 5))
+        fields = [name for name, _ in COPIED] + ['SHAPE@WKB']
+        self.assertEqual(self.rows(OUTPUT, fields), self.rows(SOURCE, fields))
+        self.assertEqual(self.backend.describe(OUTPUT)['shapeType'], 'Polyline')
+        self.assertEqual(set(self.rows(OUTPUT, [name for name, _ in SKIPPED])), set([(None,) * len(SKIPPED)]))
+
+    def test_batch_count_rounds_up(self):
+        for batchSize, batches in ((1, ROWS), (ROWS, 1), (ROWS - 1, 2), (1000, 1)):
+            stats = streamCopy(self.backend, self.backend, SOURCE, OUTPUT, batchSize=batchSize)
+            self.assertEqual((stats['rows'], stats['batches']), (ROWS, batches))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Tests of arcreaderexport.sync against a local folder standing in for the share.
+
+    python -m pytest tests        (or python -m unittest discover tests)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport.manifest import publishManifest  # noqa: E402
+from arcreaderexport.retry import RetryPolicy  # noqa: E402
+from arcreaderexport.sync import STAGING_DIR, LocalSource, SyncClient  # noqa: E402
+
+GDB = 'PortableDuluth.gdb'
+
+
+def writeBundle(bundleDir, files):
+    """Replaces the bundle's gdb with files ({name: bytes}) & the pmf, and publishes a new version."""
+    shutil.rmtree(os.path.join(bundleDir, GDB), ignore_errors=True)
+    os.makedirs(os.path.join(bundleDir, GDB))
+    for name, data in files.items():
+        with open(os.path.join(bundleDir, GDB, name), 'wb') as dataFile:
+            dataFile.write(data)
+    with open(os.path.join(bundleDir, 'TapNCurb.pmf'), 'wb') as pmfFile:
+        pmfFile.write(b'pmf')
+    return publishManifest(bundleDir, blockSize=64)
+
+
+class FailingSource(LocalSource):
+    """LocalSource whose first range reads fail with an error message."""
+
+    def __init__(self, bundleDir, message, failures):
+        LocalSource.__init__(self, bundleDir)
+        self.message = message
+        self.failures = failures
+
+    def readRange(self, relPath, offset, length):
+        if self.failures:
+            self.failures -= 1
+            raise IOError(self.message)
+        return LocalSource.readRange(self, relPath, offset, length)
+
+
+class RepublishingSource(LocalSource):
+    """LocalSource that publishes a new version of the bundle after its first range read."""
+
+    def __init__(self, bundleDir, files):
+        LocalSource.__init__(self, bundleDir)
+        self.files = files
+
+    def readRange(self, relPath, offset, length):
+        data = LocalSource.readRange(self, relPath, offset, length)
+        if self.files:
+            writeBundle(self.bundleDir, self.files)
+            self.files = None
+        return data
+
+
+class RecordingPolicy(RetryPolicy):
+    def __init__(self):
+        RetryPolicy.__init__(self, baseDelay=0, lockDelay=0, maxDelay=0, maxAttempts={'transient': 3, 'lock': 3})
+        self.asked = []
+
+    def shouldRetry(self, errorClass, attempt):
+        self.asked.append(errorClass)
+        return RetryPolicy.shouldRetry(self, errorClass, attempt)
+
+
+class SyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='synctest_')
+        self.share = os.path.join(self.workDir, 'share')
+        self.local = os.path.join(self.workDir, 'laptop')
+        os.makedirs(self.share)
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def installed(self):
+        return sorted(os.listdir(os.path.join(self.local, GDB)))
+
+    def test_sync_installs_published_version(self):
+        writeBundle(self.share, {'a00000001.gdbtable': b'x' * 200, 'gdb': b'header'})
+        result = SyncClient(LocalSource(self.share), self.local, streams=2).sync()
+        self.assertEqual(result['result'], 'synced')
+        self.assertEqual(self.installed(), ['a00000001.gdbtable', 'gdb'])
+        self.assertEqual(SyncClient(LocalSource(self.share), self.local).sync()['result'], 'current')
+
+    def test_stale_staged_files_of_older_version_are_not_installed(self):
+        writeBundle(self.share, {'a00000009.gdbtable': b'old' * 100, 'gdb': b'header'})
+        # A v1 sync interrupted part way: one partial & one finished file left in staging
+        staged = os.path.join(self.local, STAGING_DIR, GDB)
+        os.makedirs(staged)
+        with open(os.path.join(staged, 'a00000009.gdbtable.part'), 'wb') as partFile:
+            partFile.write(b'old' * 30)
+        with open(os.path.join(staged, 'a00000008.gdbtable'), 'wb') as stagedFile:
+            stagedFile.write(b'stale')
+        os.makedirs(os.path.join(staged, 'leftover'))
+        # v2 renumbers the tables
+        writeBundle(self.share, {'a00000001.gdbtable': b'new' * 100, 'gdb': b'header'})
+        SyncClient(LocalSource(self.share), self.local).sync()
+        self.assertEqual(self.installed(), ['a00000001.gdbtable', 'gdb'])
+        self.assertFalse(os.path.exists(os.path.join(self.local, STAGING_DIR)))
+
+    def test_partial_file_of_current_version_is_resumed(self):
+        data = bytes(bytearray(range(256))) * 2
+        writeBundle(self.share, {'a00000001.gdbtable': data})
+        staged = os.path.join(self.local, STAGING_DIR, GDB)
+        os.makedirs(staged)
+        with open(os.path.join(staged, 'a00000001.gdbtable.part'), 'wb') as partFile:
+            partFile.write(data[:200])
+        result = SyncClient(LocalSource(self.share), self.local).sync()
+        self.assertEqual(result['resumed'], 192)
+        with open(os.path.join(self.local, GDB, 'a00000001.gdbtable'), 'rb') as dataFile:
+            self.assertEqual(dataFile.read(), data)
+
+    def test_block_retries_use_the_error_class(self):
+        writeBundle(self.share, {'a00000001.gdbtable': b'x' * 10})
+        policy = RecordingPolicy()
+        source = FailingSource(self.share, 'ERROR 000464: Cannot get exclusive schema lock', failures=2)
+        SyncClient(source, self.local, streams=1, policy=policy).sync()
+        self.assertEqual(policy.asked, ['lock', 'lock'])
+
+    def test_publish_during_the_sync_reloads_the_manifest(self):
+        writeBundle(self.share, {'a00000001.gdbtable': b'x' * 200, 'a00000002.gdbtable': b'y' * 100})
+        policy = RecordingPolicy()
+        source = RepublishingSource(self.share, {'a00000001.gdbtable': b'x' * 150 + b'z' * 60, 'gdb': b'header'})
+        result = SyncClient(source, self.local, streams=1, policy=policy).sync()
+        self.assertEqual((result['version'], result['reloads'], result['retries']), (2, 1, 0))
+        self.assertEqual(policy.asked, [])
+        self.assertEqual(self.installed(), ['a00000001.gdbtable', 'gdb'])
+        with open(os.path.join(self.local, GDB, 'a00000001.gdbtable'), 'rb') as dataFile:
+            self.assertEqual(dataFile.read(), b'x' * 150 + b'z' * 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
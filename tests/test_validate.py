@@ -0,0 +1,112 @@
+"""
+Tests of the sampled checksums of arcreaderexport.checksum & of the worker pool arcreaderexport.validate picks.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcreaderexport import checksum, validate  # noqa: E402
+
+ROWS = 2000
+
+
+def sampleRows(rng):
+    """Rows of a feature class: two attributes followed by the SHAPE@XY, SHAPE@LENGTH & SHAPE@AREA tokens."""
+    return [(index, 'Hydrant {0}'.format(index), (rng.uniform(0, 1000), rng.uniform(0, 1000)), 0.0, 0.0)
+            for index in range(ROWS)]
+
+
+class ListReader(object):
+    """Reader of in-memory rows; picklable, so worker processes can use it."""
+
+    def __init__(self, rows, threadSafe):
+        self.rows = rows
+        self.threadSafe = threadSafe
+
+    def describe(self, path):
+        return {'exists': True, 'count': len(self.rows), 'extent': None, 'hasShape': True,
+                'fields': [('OBJECTID', 'OID'), ('FACILITYID', 'Integer'), ('NAME', 'String')]}
+
+    def iterBatches(self, path, fields, batchSize, where=None):
+        rows = self.rows[::-1] if path == 'output' else self.rows
+        for start in range(0, len(rows), batchSize):
+            yield rows[start:start + batchSize]
+
+
+class CountingPool(object):
+    """Stands in for Pool / ThreadPool of arcreaderexport.validate & records which one was made."""
+
+    def __init__(self, kind, made, pool):
+        self.kind = kind
+        self.made = made
+        self.pool = pool
+
+    def __call__(self, workers):
+        self.made.append(self.kind)
+        return self.pool(workers)
+
+
+class SampledChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rowHash = checksum.rowHash
+        self.hashed = []
+
+        def countingRowHash(row, precision=6):
+            self.hashed.append(row)
+            return self.rowHash(row, precision)
+        checksum.rowHash = countingRowHash
+
+    def tearDown(self):
+        checksum.rowHash = self.rowHash
+
+    def test_rows_left_out_of_the_sample_are_not_hashed(self):
+        rows = sampleRows(random.Random(1))
+        source = checksum.TableChecksum(10, 3, sampleField=2).update(rows)
+        output = checksum.TableChecksum(10, 3, sampleField=2).update(rows[::-1])
+        self.assertEqual((source.total, source.sampled), (output.total, output.sampled))
+        self.assertEqual(len(self.hashed), source.sampled * 2)
+        self.assertTrue(ROWS // 20 < source.sampled < ROWS // 5)
+        self.assertEqual(source.rows, ROWS)
+
+    def test_full_checksum_hashes_every_row(self):
+        full = checksum.TableChecksum(1, 3, sampleField=2).update(sampleRows(random.Random(1)))
+        self.assertEqual((full.sampled, len(self.hashed)), (ROWS, ROWS))
+
+
+class ValidatePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.made = []
+        self.pools = validate.Pool, validate.ThreadPool
+        validate.Pool = CountingPool('processes', self.made, validate.Pool)
+        validate.ThreadPool = CountingPool('threads', self.made, validate.ThreadPool)
+
+    def tearDown(self):
+        validate.Pool, validate.ThreadPool = self.pools
+
+    def validate(self, reader, **options):
+        return validate.validateOutput([{'name': 'Water/Hydrants', 'source': 'source', 'output': 'output'}],
+                                       reader=reader, workers=2, batchSize=500, **options)
+
+    def test_reader_that_is_not_thread_safe_is_used_in_processes(self):
+        self.assertFalse(validate.ArcpyReader.threadSafe)
+        report = self.validate(ListReader(sampleRows(random.Random(1)), threadSafe=False), sampleEvery=4)
+        self.assertTrue(report.passed)
+        self.assertEqual(self.made, ['processes'])
+
+    def test_thread_safe_reader_is_used_on_threads(self):
+        report = self.validate(ListReader(sampleRows(random.Random(1)), threadSafe=True))
+        self.assertTrue(report.passed)
+        self.assertEqual(report.results[0]['sampledRows'], ROWS)
+        self.assertEqual(self.made, ['threads'])
+
+
+if __name__ == '__main__':
+    unittest.main()